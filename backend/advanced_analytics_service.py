@@ -8,6 +8,8 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any
 import logging
 
+from modules.analytics.rollup import day_key, sum_by_key
+
 logger = logging.getLogger(__name__)
 
 class AdvancedAnalyticsService:
@@ -19,84 +21,31 @@ class AdvancedAnalyticsService:
         Get site visit statistics with time metrics
         """
         try:
-            start_date = datetime.now(timezone.utc) - timedelta(days=days)
+            since_day = day_key(datetime.now(timezone.utc) - timedelta(days=days))
             
-            # Get page views
-            page_views = await self.db.analytics_events.count_documents({
-                "event_type": "page_view",
-                "created_at": {"$gte": start_date.isoformat()}
-            })
+            # Page views and unique visitors from daily rollups
+            views = await sum_by_key(self.db, "page_views", since_day)
+            page_views = int(views[0]["n"]) if views else 0
             
-            # Get unique visitors
-            pipeline = [
-                {
-                    "$match": {
-                        "event_type": "page_view",
-                        "created_at": {"$gte": start_date.isoformat()}
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": "$user_id"
-                    }
-                },
+            unique_result = await self.db.analytics_rollups.aggregate([
+                {"$match": {"kind": "visitor", "day": {"$gte": since_day}}},
+                {"$group": {"_id": "$key"}},
                 {"$count": "unique_visitors"}
-            ]
-            
-            unique_result = await self.db.analytics_events.aggregate(pipeline).to_list(1)
+            ]).to_list(1)
             unique_visitors = unique_result[0]["unique_visitors"] if unique_result else 0
             
-            # Get average session duration
-            session_pipeline = [
-                {
-                    "$match": {
-                        "event_type": "session_end",
-                        "created_at": {"$gte": start_date.isoformat()}
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": None,
-                        "avg_duration": {"$avg": "$session_duration"},
-                        "total_sessions": {"$sum": 1}
-                    }
-                }
-            ]
-            
-            session_result = await self.db.analytics_events.aggregate(session_pipeline).to_list(1)
-            
+            # Sessions: average duration and bounce rate (sessions with only 1 page view)
+            sessions = await sum_by_key(self.db, "sessions", since_day, fields=("n", "dur_n", "dur_sum", "bounced"))
             avg_session_duration = 0
             total_sessions = 0
-            if session_result:
-                avg_duration = session_result[0].get("avg_duration", 0)
-                avg_session_duration = avg_duration / 1000 if avg_duration else 0  # Convert to seconds
-                total_sessions = session_result[0].get("total_sessions", 0)
-            
-            # Get bounce rate (sessions with only 1 page view)
-            bounce_pipeline = [
-                {
-                    "$match": {
-                        "event_type": "session_end",
-                        "created_at": {"$gte": start_date.isoformat()}
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": None,
-                        "bounced": {
-                            "$sum": {
-                                "$cond": [{"$lte": ["$pages_viewed", 1]}, 1, 0]
-                            }
-                        },
-                        "total": {"$sum": 1}
-                    }
-                }
-            ]
-            
-            bounce_result = await self.db.analytics_events.aggregate(bounce_pipeline).to_list(1)
             bounce_rate = 0
-            if bounce_result and bounce_result[0]["total"] > 0:
-                bounce_rate = (bounce_result[0]["bounced"] / bounce_result[0]["total"]) * 100
+            if sessions:
+                row = sessions[0]
+                total_sessions = int(row["n"])
+                if row["dur_n"]:
+                    avg_session_duration = row["dur_sum"] / row["dur_n"] / 1000  # Convert to seconds
+                if total_sessions > 0:
+                    bounce_rate = (row["bounced"] / total_sessions) * 100
             
             return {
                 "unique_visitors": unique_visitors,
@@ -514,36 +463,17 @@ class AdvancedAnalyticsService:
         Get average time spent on different pages
         """
         try:
-            pipeline = [
-                {
-                    "$match": {
-                        "event_type": "page_leave",
-                        "time_spent": {"$exists": True, "$gt": 0}
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": "$page_path",
-                        "avg_time": {"$avg": "$time_spent"},
-                        "total_visits": {"$sum": 1},
-                        "min_time": {"$min": "$time_spent"},
-                        "max_time": {"$max": "$time_spent"}
-                    }
-                },
-                {"$sort": {"total_visits": -1}},
-                {"$limit": 20}
-            ]
-            
-            results = await self.db.analytics_events.aggregate(pipeline).to_list(100)
+            rows = await sum_by_key(self.db, "page", fields=("time_n", "time_sum"), match={"time_n": {"$gt": 0}})
+            rows.sort(key=lambda r: r["time_n"], reverse=True)
             
             formatted_results = []
-            for item in results:
+            for item in rows[:20]:
                 formatted_results.append({
                     "page": item["_id"],
-                    "avg_time_seconds": round(item["avg_time"] / 1000, 2),
-                    "total_visits": item["total_visits"],
-                    "min_time_seconds": round(item["min_time"] / 1000, 2),
-                    "max_time_seconds": round(item["max_time"] / 1000, 2)
+                    "avg_time_seconds": round(item["time_sum"] / item["time_n"] / 1000, 2),
+                    "total_visits": int(item["time_n"]),
+                    "min_time_seconds": round(item["time_min"] / 1000, 2),
+                    "max_time_seconds": round(item["time_max"] / 1000, 2)
                 })
             
             return formatted_results
@@ -556,66 +486,47 @@ class AdvancedAnalyticsService:
         Get analytics for product pages (time spent, conversion)
         """
         try:
-            # Get time spent on product pages
-            pipeline = [
-                {
-                    "$match": {
-                        "event_type": "page_leave",
-                        "page_path": {"$regex": "^/product/"}
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": "$page_path",
-                        "avg_time": {"$avg": "$time_spent"},
-                        "visits": {"$sum": 1}
-                    }
-                },
-                {"$sort": {"visits": -1}},
-                {"$limit": 50}
-            ]
+            # Time spent on product pages
+            time_results = await sum_by_key(
+                self.db, "page", fields=("leaves", "time_n", "time_sum"),
+                match={"key": {"$regex": "^/product/"}}
+            )
+            time_results.sort(key=lambda r: r["leaves"], reverse=True)
+            time_results = time_results[:50]
             
-            time_results = await self.db.analytics_events.aggregate(pipeline).to_list(100)
+            product_ids = [item["_id"].split("/")[-1] for item in time_results]
             
-            # Get add to cart events
-            cart_pipeline = [
-                {"$match": {"event_type": "add_to_cart"}},
-                {
-                    "$group": {
-                        "_id": "$product_id",
-                        "cart_adds": {"$sum": 1}
-                    }
-                }
-            ]
-            
-            cart_results = await self.db.analytics_events.aggregate(cart_pipeline).to_list(1000)
-            cart_map = {item["_id"]: item["cart_adds"] for item in cart_results}
+            # Add to cart counts and product details for just these products
+            cart_results = await sum_by_key(self.db, "cart", match={"key": {"$in": product_ids}})
+            cart_map = {item["_id"]: item["n"] for item in cart_results}
+            products = await self.db.products.find(
+                {"id": {"$in": product_ids}},
+                {"_id": 0, "id": 1, "title": 1, "price": 1, "category_name": 1}
+            ).to_list(len(product_ids))
+            product_map = {p["id"]: p for p in products}
             
             formatted_results = []
             for item in time_results:
-                product_id = item["_id"].split("/")[-1] if "/" in item["_id"] else None
+                product_id = item["_id"].split("/")[-1]
+                product = product_map.get(product_id)
+                if not product:
+                    continue
                 
-                if product_id:
-                    # Get product details
-                    product = await self.db.products.find_one(
-                        {"id": product_id},
-                        {"_id": 0, "title": 1, "price": 1, "category_name": 1}
-                    )
-                    
-                    if product:
-                        cart_adds = cart_map.get(product_id, 0)
-                        conversion_rate = (cart_adds / item["visits"] * 100) if item["visits"] > 0 else 0
-                        
-                        formatted_results.append({
-                            "product_id": product_id,
-                            "product_name": product.get("title", "Unknown"),
-                            "category": product.get("category_name", "N/A"),
-                            "price": product.get("price", 0),
-                            "page_visits": item["visits"],
-                            "avg_time_seconds": round(item["avg_time"] / 1000, 2),
-                            "add_to_cart_count": cart_adds,
-                            "view_to_cart_rate": round(conversion_rate, 2)
-                        })
+                visits = int(item["leaves"])
+                cart_adds = int(cart_map.get(product_id, 0))
+                conversion_rate = (cart_adds / visits * 100) if visits > 0 else 0
+                avg_time = (item["time_sum"] / item["time_n"]) if item["time_n"] else 0
+                
+                formatted_results.append({
+                    "product_id": product_id,
+                    "product_name": product.get("title", "Unknown"),
+                    "category": product.get("category_name", "N/A"),
+                    "price": product.get("price", 0),
+                    "page_visits": visits,
+                    "avg_time_seconds": round(avg_time / 1000, 2),
+                    "add_to_cart_count": cart_adds,
+                    "view_to_cart_rate": round(conversion_rate, 2)
+                })
             
             return formatted_results
         except Exception as e:
@@ -627,42 +538,18 @@ class AdvancedAnalyticsService:
         Get user behavior flow (which pages they visit in sequence)
         """
         try:
-            # Get most common page sequences
-            pipeline = [
-                {"$match": {"event_type": "page_view"}},
-                {"$sort": {"session_id": 1, "created_at": 1}},
-                {
-                    "$group": {
-                        "_id": "$session_id",
-                        "pages": {"$push": "$page_path"}
-                    }
-                },
-                {"$limit": 1000}
-            ]
-            
-            sessions = await self.db.analytics_events.aggregate(pipeline).to_list(1000)
-            
-            # Count page transitions
-            transitions = {}
-            for session in sessions:
-                pages = session["pages"]
-                for i in range(len(pages) - 1):
-                    from_page = pages[i]
-                    to_page = pages[i + 1]
-                    key = f"{from_page} → {to_page}"
-                    transitions[key] = transitions.get(key, 0) + 1
-            
-            # Sort by frequency
-            sorted_transitions = sorted(
-                transitions.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:20]
+            # Page transitions are counted per session by the rollup job
+            sorted_transitions = await self.db.analytics_rollups.aggregate([
+                {"$match": {"kind": "flow"}},
+                {"$group": {"_id": "$key", "count": {"$sum": "$n"}}},
+                {"$sort": {"count": -1}},
+                {"$limit": 20}
+            ]).to_list(20)
             
             return {
                 "top_transitions": [
-                    {"flow": k, "count": v} 
-                    for k, v in sorted_transitions
+                    {"flow": t["_id"], "count": t["count"]}
+                    for t in sorted_transitions
                 ]
             }
         except Exception as e:
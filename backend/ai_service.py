@@ -1,18 +1,53 @@
 """
 AI Service for Product Descriptions and Recommendations
-Uses OpenAI GPT-5-mini via Emergent LLM Key
+Uses OpenAI GPT-5-mini / GPT-4o via Emergent LLM Key
+
+- every LLM call goes through complete(); outputs are cached in ai_cache
+  under sha256(model, system message, prompt), so the same inputs never pay
+  for a second generation and identical calls in flight share one request
+- force=True regenerates and replaces the cached output
+- only usable outputs are cached (JSON operations must parse); per-operation
+  TTLs expire outputs that depend on changing context (CACHE_TTL_SEC)
+- LLM_STANDIN=1 swaps the LLM for llm_local.LocalLLMStandIn (no key, no network)
 """
 
+import asyncio
+import hashlib
+import json
 import os
 import logging
-from typing import List, Dict, Any, Optional
+import uuid
+from datetime import timedelta
+from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 from emergentintegrations.llm.chat import LlmChat, UserMessage
+from core.dates import as_datetime, utcnow
+from core.metrics import outbound
+from llm_local import LocalLLMStandIn
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+GPT4O = ("openai", "gpt-4o")
+
+# op -> seconds a cached output stays valid (ops not listed never expire)
+CACHE_TTL_SEC = {
+    "recommendations": 6 * 3600,
+    "generate_recommendations": 6 * 3600,
+    "chat": 24 * 3600,
+}
+
+
+def strip_fences(text: str) -> str:
+    """JSON body of a reply that may be wrapped in ```json fences"""
+    text = text.strip()
+    if "```json" in text:
+        return text.split("```json")[1].split("```")[0].strip()
+    if "```" in text:
+        return text.split("```")[1].split("```")[0].strip()
+    return text
+
 
 class AIService:
     """Service for AI-powered features using GPT-5-mini"""
@@ -21,18 +56,116 @@ class AIService:
         self.api_key = os.environ.get('EMERGENT_LLM_KEY')
         self.model_provider = "openai"
         self.model_name = "gpt-5-mini"
+        self.standin = LocalLLMStandIn() if os.environ.get("LLM_STANDIN") == "1" else None
+        self.db = None
+        self._inflight: Dict[str, asyncio.Future] = {}
         
-        if not self.api_key:
+        if not self.api_key and not self.standin:
             logger.error("EMERGENT_LLM_KEY not found in environment")
             raise ValueError("AI Service requires EMERGENT_LLM_KEY")
         
-        logger.info(f"AI Service initialized with {self.model_provider}/{self.model_name}")
+        backend = "local stand-in" if self.standin else f"{self.model_provider}/{self.model_name}"
+        logger.info(f"AI Service initialized with {backend}")
+    
+    def bind(self, db):
+        """Enable the output cache (without a db every call goes to the LLM)"""
+        self.db = db
+    
+    async def ensure_indexes(self):
+        if self.db is not None:
+            await self.db.ai_cache.create_index("expires_at", expireAfterSeconds=0)
+    
+    # ---------- LLM gateway ----------
+    
+    def _model(self, model: Optional[Tuple[str, str]]) -> Tuple[str, str]:
+        if self.standin:
+            return self.standin.model
+        return model or (self.model_provider, self.model_name)
+    
+    @staticmethod
+    def cache_key(model: Tuple[str, str], system: str, prompt: str) -> str:
+        raw = json.dumps([list(model), system, prompt], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    async def _send(self, op: str, system: str, prompt: str, model: Tuple[str, str]) -> str:
+        if self.standin:
+            return await self.standin.send(op, system, prompt)
+        chat = LlmChat(
+            api_key=self.api_key,
+            session_id=f"{op}-{uuid.uuid4().hex}",
+            system_message=system
+        ).with_model(*model)
+        async with outbound("llm", op):
+            return await chat.send_message(UserMessage(text=prompt))
+    
+    async def _generate(self, key: str, op: str, system: str, prompt: str,
+                        model: Tuple[str, str], parse_json: bool) -> Any:
+        response = await self._send(op, system, prompt, model)
+        # raises ValueError on unparseable JSON; nothing is cached then
+        output = json.loads(strip_fences(response)) if parse_json else response
+        if self.db is not None:
+            now = utcnow()
+            doc = {"op": op, "model": "/".join(model), "output": output, "created_at": now}
+            ttl = CACHE_TTL_SEC.get(op)
+            if ttl:
+                doc["expires_at"] = now + timedelta(seconds=ttl)
+            try:
+                await self.db.ai_cache.replace_one({"_id": key}, doc, upsert=True)
+            except Exception as e:
+                logger.warning(f"AI cache write failed ({op}): {e}")
+        return output
+    
+    async def complete(
+        self,
+        op: str,
+        system: str,
+        prompt: str,
+        model: Optional[Tuple[str, str]] = None,
+        parse_json: bool = False,
+        force: bool = False
+    ) -> Tuple[Any, bool]:
+        """
+        LLM output for a prompt; returns (output, cached)
+        
+        parse_json: output is the parsed JSON reply (ValueError if it is not JSON)
+        force: skip the cache lookup and replace the stored output
+        """
+        model = self._model(model)
+        key = self.cache_key(model, system, prompt)
+        if not force and self.db is not None:
+            hit = await self.db.ai_cache.find_one({"_id": key}, {"output": 1, "expires_at": 1})
+            # the TTL monitor runs once a minute; do not serve what it has not removed yet
+            expires = as_datetime(hit.get("expires_at")) if hit else None
+            if hit and not (expires and expires <= utcnow()):
+                return hit["output"], True
+        
+        fut = self._inflight.get(key)
+        if fut is not None:
+            return await asyncio.shield(fut), True
+        
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            output = await self._generate(key, op, system, prompt, model, parse_json)
+            fut.set_result(output)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            # retrieved here so a failure with no waiters is not logged as unhandled
+            fut.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        return output, False
     
     async def generate_product_description(
         self,
         product_name: str,
         category: str,
-        existing_info: Optional[Dict[str, Any]] = None
+        existing_info: Optional[Dict[str, Any]] = None,
+        force: bool = False
     ) -> Dict[str, Any]:
         """
         Generate compelling product description using AI
@@ -46,9 +179,6 @@ class AIService:
             Dict with generated description and SEO keywords
         """
         try:
-            # Create unique session for this generation
-            session_id = f"desc-{product_name[:20]}-{os.urandom(4).hex()}"
-            
             # Prepare prompt
             prompt = f"""Ти — експерт з написання описів товарів для українського інтернет-магазину.
 
@@ -82,35 +212,27 @@ class AIService:
 
 Відповідай ТІЛЬКИ у форматі JSON, без додаткового тексту."""
 
-            # Initialize chat
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id=session_id,
-                system_message="Ти експерт з e-commerce контенту. Відповідай тільки у форматі JSON."
-            ).with_model(self.model_provider, self.model_name)
-            
-            # Send message
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            result, cached = await self.complete(
+                "generate_product_description",
+                "Ти експерт з e-commerce контенту. Відповідай тільки у форматі JSON.",
+                prompt,
+                parse_json=True,
+                force=force
+            )
             
-            # Parse response
-            import json
-            result = json.loads(response)
-            
-            logger.info(f"Generated description for: {product_name}")
+            logger.info(f"Generated description for: {product_name}" + (" (cached)" if cached else ""))
             
             return {
                 "success": True,
-                "data": result
+                "data": result,
+                "cached": cached
             }
         
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse AI response: {str(e)}")
-            logger.error(f"Response was: {response}")
             return {
                 "success": False,
-                "error": "Failed to parse AI response",
-                "raw_response": response
+                "error": "Failed to parse AI response"
             }
         except Exception as e:
             logger.error(f"Error generating description: {str(e)}")
@@ -139,8 +261,6 @@ class AIService:
             Dict with recommended product IDs and reasoning
         """
         try:
-            session_id = f"rec-{os.urandom(6).hex()}"
-            
             # Prepare context
             history_text = "\n".join([
                 f"- {p.get('title', 'Unknown')} (категорія: {p.get('category', 'N/A')})"
@@ -185,17 +305,12 @@ class AIService:
 
 Відповідай ТІЛЬКИ у форматі JSON."""
 
-            chat = LlmChat(
-                api_key=self.api_key,
-                session_id=session_id,
-                system_message="Ти AI система рекомендацій. Відповідай тільки у форматі JSON."
-            ).with_model(self.model_provider, self.model_name)
-            
-            user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
-            
-            import json
-            result = json.loads(response)
+            result, _ = await self.complete(
+                "generate_recommendations",
+                "Ти AI система рекомендацій. Відповідай тільки у форматі JSON.",
+                prompt,
+                parse_json=True
+            )
             
             logger.info(f"Generated {len(result.get('recommendations', []))} recommendations")
             
@@ -211,6 +326,112 @@ class AIService:
                 "error": str(e)
             }
 
+    
+    # ---------- storefront / seller endpoints (GPT-4o) ----------
+    
+    async def describe(
+        self,
+        product_title: str,
+        category: str,
+        key_features: Optional[List[str]] = None,
+        force: bool = False
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Description + short description; returns (result, cached)"""
+        features_text = "\n".join(key_features) if key_features else "No specific features provided"
+        prompt = f"""Create a product description for:
+
+Product Title: {product_title}
+Category: {category}
+Key Features:
+{features_text}
+
+Provide:
+1. A detailed product description (2-3 paragraphs, 150-200 words)
+2. A short description (1 sentence, max 160 characters)
+
+Format your response as JSON with keys: "description" and "short_description"""
+        return await self.complete(
+            "describe",
+            "You are a professional product description writer for an e-commerce marketplace. Create engaging, SEO-friendly product descriptions.",
+            prompt,
+            model=GPT4O,
+            parse_json=True,
+            force=force
+        )
+    
+    async def seo(
+        self,
+        product_name: str,
+        category: str,
+        features: Optional[List[str]] = None,
+        force: bool = False
+    ) -> Tuple[Dict[str, Any], bool]:
+        """SEO title, meta description and keywords; returns (result, cached)"""
+        features_text = ", ".join(features) if features else "No specific features"
+        prompt = f"""Create SEO-optimized texts for product:
+
+Product Name: {product_name}
+Category: {category}
+Features: {features_text}
+
+Respond in JSON format:
+{{
+  "title": "SEO title (up to 60 characters)",
+  "metaDescription": "Meta description (up to 160 characters)",
+  "keywords": ["keyword1", "keyword2"]
+}}"""
+        return await self.complete(
+            "seo",
+            "You are an SEO specialist. Create optimized titles and descriptions for products.",
+            prompt,
+            model=GPT4O,
+            parse_json=True,
+            force=force
+        )
+    
+    async def recommend(
+        self,
+        product_name: str,
+        category: str,
+        price: float,
+        available_products: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, Any], bool]:
+        """3-5 products from available_products with reasons; returns (result, cached)"""
+        products_context = "\n".join([
+            f"ID: {p.get('id')}, Title: {p.get('title')}, Category: {p.get('category', 'N/A')}, Price: ${p.get('price', 0)}"
+            for p in available_products[:20]
+        ])
+        prompt = f"""User is viewing product:
+Title: {product_name}
+Category: {category}
+Price: ${price}
+
+Available products for recommendation:
+{products_context}
+
+Task: Select 3-5 most suitable products for recommendation and explain why.
+
+Respond in JSON format:
+{{
+  "recommendations": [
+    {{
+      "productId": "product id",
+      "reason": "short reason (1 sentence)"
+    }}
+  ]
+}}"""
+        return await self.complete(
+            "recommendations",
+            "You are an AI assistant for e-commerce, specializing in personalized product recommendations. Analyze products and suggest the most relevant options.",
+            prompt,
+            model=GPT4O,
+            parse_json=True
+        )
+    
+    async def chat(self, system: str, message: str) -> Tuple[str, bool]:
+        """One chatbot reply; returns (text, cached)"""
+        return await self.complete("chat", system, message, model=GPT4O)
+
 
 # Create singleton instance
 ai_service = AIService()
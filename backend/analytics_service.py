@@ -6,6 +6,8 @@ from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from core.dates import date_range, day_bucket
+
 class AnalyticsService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
@@ -28,9 +30,7 @@ class AnalyticsService:
             "created_at": {"$gte": month_ago.isoformat()}
         })
         
-        orders_this_month = await self.db.orders.count_documents({
-            "created_at": {"$gte": month_ago.isoformat()}
-        })
+        orders_this_month = await self.db.orders.count_documents(date_range("created_at", gte=month_ago))
         
         return {
             "total_users": total_users,
@@ -51,17 +51,12 @@ class AnalyticsService:
             {
                 "$match": {
                     "payment_status": "paid",
-                    "created_at": {"$gte": start_date.isoformat()}
+                    **date_range("created_at", gte=start_date)
                 }
             },
             {
                 "$group": {
-                    "_id": {
-                        "$dateToString": {
-                            "format": "%Y-%m-%d",
-                            "date": {"$dateFromString": {"dateString": "$created_at"}}
-                        }
-                    },
+                    "_id": day_bucket("$created_at"),
                     "revenue": {"$sum": "$total_amount"},
                     "orders": {"$sum": 1}
                 }
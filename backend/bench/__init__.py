@@ -0,0 +1,4 @@
+"""
+Load tests and benchmarks for the core API flows and background engines.
+See bench/run.py for usage.
+"""
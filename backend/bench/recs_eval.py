@@ -0,0 +1,112 @@
+"""
+Offline evaluation of the item-to-item recommendations
+
+    cd backend
+    export MONGO_URL=mongodb://localhost:27017 DB_NAME=ystore_bench
+    python -m bench.recs_eval --holdout-days 30 --k 10
+
+Builds the co-occurrence model from the data before the holdout window
+(same windows and weights as the production job) and replays the orders
+inside it: every product of a multi-item order is a query, the other
+products of that order are the targets. Prints hit rate / recall / MRR at k
+for the model (with the popularity fallback) and for popularity alone, the
+share of queries that had neighbours, catalog coverage and the latency of
+Recommender.similar().
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from core.dates import date_range, utcnow
+from modules.products.recommender import POPULAR_SIZE, Recommender, build_counts
+
+from .stats import percentile
+
+
+def _score(recs: list, targets: set, acc: dict):
+    hits = [r for r in recs if r in targets]
+    acc["queries"] += 1
+    acc["hit"] += 1 if hits else 0
+    acc["recall"] += len(hits) / len(targets)
+    acc["mrr"] += next((1 / (n + 1) for n, r in enumerate(recs) if r in targets), 0.0)
+    acc["recommended"].update(recs)
+
+
+def _summary(acc: dict, products: int) -> dict:
+    q = acc["queries"] or 1
+    return {
+        "queries": acc["queries"],
+        "hit_rate": round(acc["hit"] / q, 4),
+        "recall": round(acc["recall"] / q, 4),
+        "mrr": round(acc["mrr"] / q, 4),
+        "catalog_coverage": round(len(acc["recommended"]) / (products or 1), 4),
+    }
+
+
+async def evaluate(db, holdout_days: int, k: int) -> dict:
+    cutoff = utcnow() - timedelta(days=holdout_days)
+    t0 = time.monotonic()
+    co = await build_counts(db, until=cutoff)
+    build_s = time.monotonic() - t0
+    neighbors = co.neighbors(k)
+
+    # lookup structure exactly as the API serves it (categories left out)
+    rec = Recommender(db)
+    rec.table = {p: (None, [n for n, _ in near]) for p, near in neighbors.items()}
+    rec.popular = [p for p, _ in co.popular()[:POPULAR_SIZE]]
+
+    model = {"queries": 0, "hit": 0, "recall": 0.0, "mrr": 0.0, "recommended": set()}
+    popular = {"queries": 0, "hit": 0, "recall": 0.0, "mrr": 0.0, "recommended": set()}
+    with_neighbors = 0
+    lookup_us = []
+    q = {"status_c": {"$ne": "CANCELED"}, **date_range("created_at", gte=cutoff)}
+    async for order in db.orders.find(q, {"_id": 0, "items.product_id": 1}):
+        basket = list(dict.fromkeys(i.get("product_id") for i in order.get("items") or [] if i.get("product_id")))
+        if len(basket) < 2:
+            continue
+        for query in basket:
+            targets = set(basket) - {query}
+            s = time.perf_counter()
+            recs, source = rec.similar(query, k)
+            lookup_us.append((time.perf_counter() - s) * 1e6)
+            with_neighbors += source == "similar"
+            _score(recs, targets, model)
+            _score([p for p in rec.popular if p != query][:k], targets, popular)
+
+    products = await db.products.count_documents({"status": "published"})
+    lookup_us.sort()
+    return {
+        "holdout_days": holdout_days,
+        "k": k,
+        "train": {"products": len(co.ids), "pairs": len(co.pairs), "build_s": round(build_s, 2)},
+        "item_to_item": _summary(model, products),
+        "popularity": _summary(popular, products),
+        "queries_with_neighbors": round(with_neighbors / (model["queries"] or 1), 4),
+        "lookup_us": {
+            "p50": round(percentile(lookup_us, 50), 2) if lookup_us else None,
+            "p99": round(percentile(lookup_us, 99), 2) if lookup_us else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline evaluation of item-to-item recommendations")
+    parser.add_argument("--holdout-days", type=int, default=30)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    try:
+        db = client[os.environ.get("DB_NAME", "ystore_bench")]
+        report = asyncio.run(evaluate(db, args.holdout_days, args.k))
+    finally:
+        client.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Benchmark runner
+
+    cd backend
+    export MONGO_URL=mongodb://localhost:27017 DB_NAME=ystore_bench
+    python -m bench.run seed --scale full
+    uvicorn server:app --port 8001 --workers 1   # same MONGO_URL / DB_NAME
+    python -m bench.run run --scale full --base-url http://localhost:8001
+    python -m bench.run run --scale full --save-baseline
+
+`run` prints p50/p95/p99 and ops/s per scenario, writes the report to
+bench/results/<scale>-latest.json and compares it with the stored
+baseline bench/baselines/<scale>.json; the exit code is 1 when a scenario
+regressed past --tolerance (p95 up, ops/s down, or new errors).
+Baselines are only comparable on the same machine and scale.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+from pathlib import Path
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from core.dates import utcnow
+
+from .scenarios import (
+    ENGINE_SCENARIOS, HTTP_SCENARIOS, Context, run_engine, run_http, run_image_upload, run_ttn_bulk,
+)
+from .seed import SCALES, SEED, seed
+from .stats import DEFAULT_TOLERANCE, compare
+
+ROOT = Path(__file__).resolve().parent
+BASELINES = ROOT / "baselines"
+RESULTS = ROOT / "results"
+ALL_SCENARIOS = list(HTTP_SCENARIOS) + list(ENGINE_SCENARIOS) + ["ttn_bulk", "image_upload",
+                                                                  "image_upload.inline"]
+
+
+def _db():
+    db_name = os.environ.get("DB_NAME", "ystore_bench")
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    return client, client[db_name]
+
+
+def _print_table(results: dict):
+    cols = ("count", "errors", "ops_s", "p50_ms", "p95_ms", "p99_ms", "max_ms", "loop_lag_p99_ms")
+    widths = [max(10, len(c) + 2) for c in cols]
+    print(f"\n{'scenario':<26}" + "".join(f"{c:>{w}}" for c, w in zip(cols, widths)))
+    for name, r in results.items():
+        print(f"{name:<26}" + "".join(f"{r.get(c, '-'):>{w}}" for c, w in zip(cols, widths)))
+
+
+async def cmd_seed(args):
+    client, db = _db()
+    try:
+        print(f"Seeding {db.name} ({args.scale}: {SCALES[args.scale]})")
+        counts = await seed(db, args.scale, reseed=args.reseed)
+        # same text / filter indexes production uses for search
+        from setup_search_index import setup_search_indexes
+        os.environ["DB_NAME"] = db.name
+        await setup_search_indexes()
+        print(f"Seeded: {counts}")
+    finally:
+        client.close()
+
+
+async def cmd_run(args):
+    client, db = _db()
+    meta = await db.bench_meta.find_one({"_id": "seed"})
+    if not meta or meta.get("scale") != args.scale:
+        client.close()
+        print(f"{db.name} is not seeded at scale {args.scale}; run `python -m bench.run seed` first")
+        return 2
+
+    selected = args.scenario or ALL_SCENARIOS
+    unknown = [s for s in selected if s not in ALL_SCENARIOS]
+    if unknown:
+        client.close()
+        print(f"Unknown scenarios: {', '.join(unknown)}")
+        return 2
+
+    results = {}
+    try:
+        http = [s for s in selected if s in HTTP_SCENARIOS]
+        if http:
+            limits = httpx.Limits(max_connections=args.concurrency * 2)
+            async with httpx.AsyncClient(timeout=30.0, limits=limits) as hc:
+                ctx = Context(db, args.base_url, random.Random(SEED))
+                await ctx.prepare(hc)
+                for name in http:
+                    print(f"  {name} ({args.duration}s x {args.concurrency})")
+                    results[name] = await run_http(name, ctx, hc, args.duration, args.concurrency)
+        for name in (s for s in selected if s in ENGINE_SCENARIOS):
+            print(f"  {name} ({args.iterations} runs)")
+            results[name] = await run_engine(name, db, args.iterations)
+        if "ttn_bulk" in selected:
+            print(f"  ttn_bulk ({args.ttn_orders} orders x {args.ttn_concurrency} workers, "
+                  f"NP {args.np_latency_ms} ms)")
+            results["ttn_bulk"] = await run_ttn_bulk(db, args.ttn_orders, args.ttn_concurrency, args.np_latency_ms)
+        for name in ("image_upload", "image_upload.inline"):
+            if name in selected:
+                print(f"  {name} ({args.images} images x {args.image_concurrency} in flight)")
+                results[name] = await run_image_upload(args.images, args.image_concurrency, args.image_workers,
+                                                       inline=name.endswith(".inline"))
+    finally:
+        client.close()
+
+    _print_table(results)
+    report = {
+        "scale": args.scale,
+        "counts": meta.get("counts"),
+        "at": utcnow().isoformat(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "duration_s": args.duration,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+    RESULTS.mkdir(exist_ok=True)
+    (RESULTS / f"{args.scale}-latest.json").write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    baseline_path = BASELINES / f"{args.scale}.json"
+    if args.save_baseline:
+        BASELINES.mkdir(exist_ok=True)
+        if baseline_path.exists():
+            # keep entries for scenarios that were not part of this run
+            report["results"] = {**json.loads(baseline_path.read_text())["results"], **results}
+        baseline_path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"\nBaseline saved: {baseline_path}")
+        return 0
+
+    if not baseline_path.exists():
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline to create one")
+        return 0
+    regressions = compare(results, json.loads(baseline_path.read_text())["results"], args.tolerance)
+    if not regressions:
+        print(f"\nNo regressions against {baseline_path.name} (tolerance {args.tolerance:.0%})")
+        return 0
+    print(f"\nRegressions against {baseline_path.name} (tolerance {args.tolerance:.0%}):")
+    for r in regressions:
+        print(f"  {r['scenario']}: {r['metric']} {r['baseline']} -> {r['current']}")
+    return 1
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m bench.run", description="Y-Store load tests and benchmarks")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("seed", help="fill DB_NAME with synthetic data")
+    s.add_argument("--scale", choices=sorted(SCALES), default="small")
+    s.add_argument("--reseed", action="store_true", help="drop and re-create an existing bench data set")
+
+    r = sub.add_parser("run", help="run scenarios and compare with the baseline")
+    r.add_argument("--scale", choices=sorted(SCALES), default="small")
+    r.add_argument("--base-url", default=os.environ.get("BENCH_BASE_URL", "http://localhost:8001"))
+    r.add_argument("--scenario", action="append",
+                   help=f"repeatable; default all of: {', '.join(ALL_SCENARIOS)}")
+    r.add_argument("--duration", type=float, default=30.0, help="seconds per HTTP scenario")
+    r.add_argument("--concurrency", type=int, default=16, help="concurrent HTTP workers")
+    r.add_argument("--iterations", type=int, default=5, help="run_once() calls per engine")
+    r.add_argument("--ttn-orders", type=int, default=500, help="orders per bulk TTN job")
+    r.add_argument("--ttn-concurrency", type=int, default=8, help="bulk TTN workers")
+    r.add_argument("--np-latency-ms", type=float, default=150.0, help="NP stand-in latency per call")
+    r.add_argument("--images", type=int, default=200, help="uploads per image scenario")
+    r.add_argument("--image-concurrency", type=int, default=8, help="uploads in flight")
+    r.add_argument("--image-workers", type=int, default=4, help="image process pool size")
+    r.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    r.add_argument("--save-baseline", action="store_true")
+
+    args = p.parse_args(argv)
+    return asyncio.run(cmd_seed(args) if args.cmd == "seed" else cmd_run(args)) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,466 @@
+"""
+Benchmark scenarios
+
+HTTP scenarios drive a running API (uvicorn server:app pointed at the
+bench database) with `concurrency` workers for `duration` seconds; each
+call of a scenario is one operation. Engine scenarios import the
+background engines and time `iterations` calls of their run_once()
+against the same database, outside the job runtime (no leases). The
+engine.listing_* pair times the response encoding of one catalog page
+(LISTING_PAGE products, read once): the full-document path as served with
+response_model=List[Product] against the pre-serialized product cards.
+
+Outbound integrations are not exercised: the return / pickup engines run
+without an NP client, reconciliation uses the local Fondy stand-in and the
+bulk TTN scenario the local NP stand-in (with configurable latency). The
+image scenarios need no database.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from core.dates import utcnow
+from modules.orders.order_status import status_fields
+from modules.payments.providers.fondy.fondy_signature import build_signature
+
+from .stats import summarize
+
+SEARCH_TERMS = ["ноутбук", "смартфон", "Samsung", "Apple Pro", "монітор", "навушники", "Xiaomi Max",
+                "пилосос", "планшет", "Lenovo"]
+PREFIXES = ["но", "см", "Sa", "Ap", "мо", "Xi", "Le", "пл"]
+SEED_IMAGES = 7
+LISTING_PAGE = 50
+
+
+class Context:
+    """State shared by HTTP scenarios: tokens and ids read from the seeded data"""
+
+    def __init__(self, db, base_url: str, rnd: random.Random):
+        self.db = db
+        self.base_url = base_url.rstrip("/")
+        self.rnd = rnd
+        self.admin_headers: Dict[str, str] = {}
+        self.buyer_headers: List[Dict[str, str]] = []
+        self.product_ids: List[str] = []
+        self.category_ids: List[str] = []
+        self.fondy_password = os.environ.get("FONDY_MERCHANT_PASSWORD", "")
+        self.homepage_etag: Optional[str] = None
+
+    async def prepare(self, client: httpx.AsyncClient, buyers: int = 20):
+        """Register an admin and a pool of buyers through the API (untimed)"""
+        run = uuid.uuid4().hex[:8]
+        self.admin_headers = await self._register(client, f"bench-admin-{run}@bench.local", "admin")
+        self.buyer_headers = [
+            await self._register(client, f"bench-buyer-{run}-{i}@bench.local", "customer")
+            for i in range(buyers)
+        ]
+        self.product_ids = [
+            p["id"] async for p in self.db.products.find(
+                {"status": "published", "stock_level": {"$gte": 50}}, {"_id": 0, "id": 1}
+            ).limit(5000)
+        ]
+        self.category_ids = [c["id"] async for c in self.db.categories.find({}, {"_id": 0, "id": 1})]
+
+    async def _register(self, client: httpx.AsyncClient, email: str, role: str) -> Dict[str, str]:
+        r = await client.post(f"{self.base_url}/api/auth/register", json={
+            "email": email, "password": "bench-pass-123", "full_name": email.split("@")[0], "role": role,
+        })
+        r.raise_for_status()
+        return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _ok(r: httpx.Response):
+    if r.status_code >= 400:
+        raise RuntimeError(f"{r.request.method} {r.request.url.path} -> {r.status_code}")
+
+
+# ---------- HTTP scenarios ----------
+
+async def catalog_browse(client: httpx.AsyncClient, ctx: Context):
+    roll = ctx.rnd.random()
+    if roll < 0.2:
+        _ok(await client.get(f"{ctx.base_url}/api/categories"))
+    elif roll < 0.7:
+        params = {"limit": 24, "skip": ctx.rnd.randrange(0, 240, 24)}
+        if ctx.category_ids and ctx.rnd.random() < 0.6:
+            params["category_id"] = ctx.rnd.choice(ctx.category_ids)
+        _ok(await client.get(f"{ctx.base_url}/api/products", params=params))
+    else:
+        _ok(await client.get(f"{ctx.base_url}/api/products/{ctx.rnd.choice(ctx.product_ids)}"))
+
+
+async def homepage(client: httpx.AsyncClient, ctx: Context):
+    # half the visitors come back with the ETag they were given
+    headers = {"If-None-Match": ctx.homepage_etag} if ctx.homepage_etag and ctx.rnd.random() < 0.5 else {}
+    r = await client.get(f"{ctx.base_url}/api/homepage", headers=headers)
+    if r.status_code != 304:
+        _ok(r)
+        ctx.homepage_etag = r.headers.get("etag")
+
+
+async def search(client: httpx.AsyncClient, ctx: Context):
+    params = {"q": ctx.rnd.choice(SEARCH_TERMS), "limit": 20, "page": ctx.rnd.randint(1, 3)}
+    if ctx.rnd.random() < 0.3:
+        params["sort"] = ctx.rnd.choice(["price_asc", "price_desc", "newest", "popular"])
+    _ok(await client.get(f"{ctx.base_url}/api/v2/search", params=params))
+
+
+async def autocomplete(client: httpx.AsyncClient, ctx: Context):
+    q = ctx.rnd.choice(PREFIXES)
+    if ctx.rnd.random() < 0.5:
+        _ok(await client.get(f"{ctx.base_url}/api/v2/search/autocomplete", params={"q": q}))
+    else:
+        _ok(await client.get(f"{ctx.base_url}/api/products/search/suggestions", params={"q": q}))
+
+
+async def checkout_flow(client: httpx.AsyncClient, ctx: Context):
+    """cart -> order -> Fondy 'approved' webhook, as one operation"""
+    headers = ctx.rnd.choice(ctx.buyer_headers)
+    for pid in ctx.rnd.sample(ctx.product_ids, ctx.rnd.randint(1, 3)):
+        _ok(await client.post(f"{ctx.base_url}/api/cart/items",
+                              json={"product_id": pid, "quantity": 1}, headers=headers))
+    r = await client.post(f"{ctx.base_url}/api/v2/orders", headers={
+        **headers, "X-Idempotency-Key": uuid.uuid4().hex,
+    }, json={
+        "shipping": {"full_name": "Bench Buyer", "phone": f"+38050{ctx.rnd.randint(0, 9_999_999):07d}",
+                     "city": "Київ", "address": "вул. Тестова, 1", "np_department": "1"},
+        "payment_method": "card",
+    })
+    _ok(r)
+    order = r.json()
+    payload = {
+        "order_id": f"{order['id']}:ORDER_PAYMENT:{uuid.uuid4().hex}",
+        "order_status": "approved",
+        "amount": int(round(float(order.get("total", 0)) * 100)),
+        "currency": "UAH",
+        "payment_id": ctx.rnd.randint(10**8, 10**9),
+    }
+    payload["signature"] = build_signature(payload, ctx.fondy_password)
+    _ok(await client.post(f"{ctx.base_url}/api/v2/payments/webhook/fondy", json=payload))
+
+
+async def admin_dashboards(client: httpx.AsyncClient, ctx: Context):
+    today = utcnow().date()
+    month_ago = today - timedelta(days=30)
+    h = ctx.admin_headers
+    roll = ctx.rnd.random()
+    if roll < 0.25:
+        _ok(await client.get(f"{ctx.base_url}/api/v2/admin/ops/dashboard", headers=h,
+                             params={"from": month_ago.isoformat(), "to": today.isoformat()}))
+    elif roll < 0.5:
+        _ok(await client.get(f"{ctx.base_url}/api/v2/admin/analytics/ops-kpi", headers=h,
+                             params={"range": 30}))
+    elif roll < 0.75:
+        _ok(await client.get(f"{ctx.base_url}/api/admin/orders", headers=h, params={"limit": 50}))
+    else:
+        _ok(await client.get(f"{ctx.base_url}/api/admin/analytics/advanced/conversion-funnel", headers=h))
+
+
+HTTP_SCENARIOS: Dict[str, Callable[[httpx.AsyncClient, Context], Awaitable[None]]] = {
+    "catalog_browse": catalog_browse,
+    "homepage": homepage,
+    "search": search,
+    "autocomplete": autocomplete,
+    "checkout_flow": checkout_flow,
+    "admin_dashboards": admin_dashboards,
+}
+
+
+async def run_http(name: str, ctx: Context, client: httpx.AsyncClient,
+                   duration: float, concurrency: int, warmup: float = 2.0) -> dict:
+    """Closed-loop load: `concurrency` workers call the scenario back to back"""
+    fn = HTTP_SCENARIOS[name]
+    samples: List[float] = []
+    errors = 0
+    first_error: Optional[str] = None
+    record_from = time.perf_counter() + warmup
+    deadline = record_from + duration
+
+    async def worker():
+        nonlocal errors, first_error
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= deadline:
+                return
+            try:
+                await fn(client, ctx)
+            except Exception as e:
+                if t0 >= record_from:
+                    errors += 1
+                    first_error = first_error or str(e)
+                continue
+            if t0 >= record_from:
+                samples.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    out = summarize(samples, duration, errors)
+    if first_error:
+        out["first_error"] = first_error
+    return out
+
+
+# ---------- engine scenarios ----------
+
+async def _guard(db):
+    from modules.guard.guard_engine import GuardEngine
+    return GuardEngine(db).run_once
+
+
+async def _analytics_daily(db):
+    from modules.analytics_intel.daily_builder import DailyBuilder
+    b = DailyBuilder(db)
+    await b.ensure_indexes()
+    return b.run_once
+
+
+async def _analytics_rollup(db):
+    from modules.analytics.rollup import AnalyticsRollupJob
+    job = AnalyticsRollupJob(db)
+    await job.ensure_indexes()
+    return job.run_once
+
+
+async def _return_policy(db):
+    from modules.returns.policy_engine import ReturnPolicyEngine
+    engine = ReturnPolicyEngine(db)
+    return lambda: engine.run_once(dry_run=True)
+
+
+async def _returns(db):
+    from modules.returns.return_engine import ReturnEngine
+    return ReturnEngine(db).run_once
+
+
+async def _pickup_control(db):
+    from modules.pickup_control.pickup_engine import PickupControlEngine
+    return PickupControlEngine(db).run_once
+
+
+async def _payment_retry(db):
+    from modules.payments.retry.retry_service import PaymentRetryService
+    return PaymentRetryService(db).run_once
+
+
+async def _reconciliation(db):
+    from modules.payments.reconciliation_service import PaymentReconciliationService
+    svc = PaymentReconciliationService(db)
+    await svc.ensure_indexes()
+    return lambda: svc.run_once(hours_back=24 * 90, limit=2000)
+
+
+async def _seller_orders(db):
+    from modules.orders.seller_orders import SellerOrdersService
+    return SellerOrdersService(db).sync_recent
+
+
+async def _automation(db):
+    from modules.automation.automation_engine import AutomationEngine
+    engine = AutomationEngine(db)
+    await engine.init()
+    return engine.run_once
+
+
+async def _listing_page(db, projection: dict) -> List[dict]:
+    return await db.products.find({"status": "published"}, projection) \
+        .sort("created_at", -1).limit(LISTING_PAGE).to_list(LISTING_PAGE)
+
+
+async def _listing_full(db):
+    # the server's Product model; importing server builds ai_service, which needs a key or the stand-in
+    os.environ.setdefault("LLM_STANDIN", "1")
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    from server import Product
+    adapter = TypeAdapter(List[Product])
+    docs = await _listing_page(db, {"_id": 0})
+
+    async def run_once():
+        # what FastAPI does for response_model=List[Product], then JSONResponse
+        json.dumps(jsonable_encoder(adapter.validate_python(docs)), ensure_ascii=False, allow_nan=False,
+                   separators=(",", ":")).encode("utf-8")
+    return run_once
+
+
+async def _listing_cards(db):
+    from modules.products.cards import CARD_PROJECTION, CardsResponse, ProductCards
+    cards = ProductCards(db)
+    docs = await _listing_page(db, CARD_PROJECTION)
+    await cards.page(docs)  # builds cards the seed did not have
+    docs = await _listing_page(db, CARD_PROJECTION)
+
+    async def run_once():
+        CardsResponse(await cards.page(docs))
+    return run_once
+
+
+ENGINE_SCENARIOS: Dict[str, Callable] = {
+    "engine.guard": _guard,
+    "engine.analytics_daily": _analytics_daily,
+    "engine.analytics_rollup": _analytics_rollup,
+    "engine.return_policy": _return_policy,
+    "engine.returns": _returns,
+    "engine.pickup_control": _pickup_control,
+    "engine.payment_retry": _payment_retry,
+    "engine.reconciliation": _reconciliation,
+    "engine.seller_orders": _seller_orders,
+    "engine.automation": _automation,
+    "engine.listing_full": _listing_full,
+    "engine.listing_cards": _listing_cards,
+}
+
+
+async def run_engine(name: str, db, iterations: int) -> dict:
+    """Time `iterations` sequential run_once() calls (the first one includes any catch-up)"""
+    run_once = await ENGINE_SCENARIOS[name](db)
+    samples: List[float] = []
+    errors = 0
+    first_error: Optional[str] = None
+    started = time.perf_counter()
+    for _ in range(max(1, iterations)):
+        t0 = time.perf_counter()
+        try:
+            await run_once()
+        except Exception as e:
+            errors += 1
+            first_error = first_error or str(e)
+            continue
+        samples.append(time.perf_counter() - t0)
+    out = summarize(samples, time.perf_counter() - started, errors)
+    if first_error:
+        out["first_error"] = first_error
+    return out
+
+
+# ---------- bulk TTN ----------
+
+async def run_ttn_bulk(db, orders: int, concurrency: int, latency_ms: float) -> dict:
+    """
+    One bulk TTN job over `orders` PAID orders against the NP stand-in.
+    Samples are per-order create_ttn latencies, ops/s is TTNs per second.
+    The orders are put back to PAID afterwards so runs stay repeatable.
+    """
+    from modules.delivery.np.np_local import LocalNPStandIn
+    from modules.delivery.np.np_ttn_bulk import NPTTNBulkService
+    from modules.delivery.np.np_types import NPTTNBulkFilter, NPTTNBulkRequest
+
+    svc = NPTTNBulkService(db, client=LocalNPStandIn(latency_ms), concurrency=concurrency)
+    await svc.ensure_indexes()
+    job = await svc.create_job(
+        NPTTNBulkRequest(filter=NPTTNBulkFilter(statuses=["PAID"], limit=orders)), actor="bench"
+    )
+    started = time.perf_counter()
+    result = await svc.run(job["id"])
+    wall = time.perf_counter() - started
+
+    samples = [i["ms"] / 1000 async for i in db.ttn_bulk_items.find({"job_id": job["id"]}, {"_id": 0, "ms": 1})]
+    out = summarize(samples, wall, result.get("failed", 0))
+    out["label_pdfs"] = len(result.get("labels") or [])
+
+    ids = job["order_ids"]
+    await db.orders.update_many(
+        {"id": {"$in": ids}},
+        {"$set": {**status_fields(status="PAID"), "updated_at": utcnow()}, "$unset": {"shipment": ""}},
+    )
+    await db.shipment_events.delete_many({"provider": "NOVAPOSHTA", "event_id": {"$in": [f"order:{i}" for i in ids]}})
+    return out
+
+
+# ---------- image uploads ----------
+
+def _synthetic_images(n: int, seed: int) -> List[bytes]:
+    """Distinct camera-sized JPEGs (so nothing is deduplicated)"""
+    import io
+    from PIL import Image
+
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        w = rnd.choice((1200, 2400, 4000))
+        im = Image.effect_noise((w, w * 3 // 4), 30 + i % 50).convert("RGB")
+        buf = io.BytesIO()
+        im.save(buf, "JPEG", quality=90)
+        out.append(buf.getvalue())
+    return out
+
+
+class LoopLagProbe:
+    """Measures how late a 10 ms sleep wakes up, i.e. how long the loop was blocked"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - t0 - self.interval))
+
+    def __enter__(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def summary(self) -> dict:
+        s = summarize(self.lags, 1.0)
+        return {"loop_lag_p50_ms": s["p50_ms"], "loop_lag_p99_ms": s["p99_ms"], "loop_lag_max_ms": s["max_ms"]}
+
+
+async def run_image_upload(images: int, concurrency: int, workers: int, inline: bool = False) -> dict:
+    """
+    Bulk catalog import: `images` uploads through the image pipeline with
+    `concurrency` in flight, into a temp directory. ops/s is uploads per
+    second; loop_lag_* is event-loop blocking seen meanwhile. inline=True
+    runs process_image on the loop (the pre-pipeline behaviour) for comparison.
+    """
+    import shutil
+    import tempfile
+    from modules.media.image_pipeline import ImagePipeline, process_image
+
+    payloads = await asyncio.to_thread(_synthetic_images, images, SEED_IMAGES)
+    root = tempfile.mkdtemp(prefix="bench-images-")
+    pipeline = ImagePipeline(root, "/uploads", workers=workers)
+    if inline:
+        async def ingest(content: bytes):
+            process_image(content)
+            # a request handler yields between requests; let the probe see the stall
+            await asyncio.sleep(0)
+    else:
+        ingest = pipeline.ingest
+        # start the pool outside the measurement
+        await pipeline.ingest(payloads[0], "content")
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+    samples: List[float] = []
+    errors = 0
+
+    async def one(content: bytes):
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await ingest(content)
+            except Exception:
+                errors += 1
+                return
+            samples.append(time.perf_counter() - t0)
+
+    try:
+        with LoopLagProbe() as probe:
+            started = time.perf_counter()
+            await asyncio.gather(*(one(c) for c in payloads[1:]))
+            wall = time.perf_counter() - started
+    finally:
+        pipeline.shutdown()
+        shutil.rmtree(root, ignore_errors=True)
+    return {**summarize(samples, wall, errors), **probe.summary()}
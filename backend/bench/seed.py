@@ -0,0 +1,250 @@
+"""
+Synthetic data for the benchmark suite
+
+Deterministic (fixed random seed) products, buyers, orders, payments and
+raw events, written with insert_many in batches. The shape follows what
+the API and the background engines read: native datetimes, status_c /
+payment_status_c canonical copies, shipping.phone, buyer_id.
+
+Seeding only runs into an empty database or one previously seeded by the
+bench (bench_meta marker), never over real data.
+"""
+import asyncio
+import random
+import uuid
+from datetime import timedelta
+from typing import Callable, Dict, Iterator, List
+
+from core.dates import utcnow
+from modules.orders.order_status import OrderStatus, PaymentStatus, status_fields
+
+SCALES = {
+    # products, buyers, orders, events
+    "small": {"products": 2_000, "buyers": 1_000, "orders": 20_000, "events": 200_000},
+    "medium": {"products": 20_000, "buyers": 10_000, "orders": 200_000, "events": 2_000_000},
+    "full": {"products": 100_000, "buyers": 50_000, "orders": 1_000_000, "events": 10_000_000},
+}
+
+SEED = 20240601
+BATCH = 5_000
+WRITERS = 4
+ORDER_DAYS = 90
+EVENT_DAYS = 14
+
+SELLERS = [f"bench-seller-{i}" for i in range(50)]
+BRANDS = ["Apple", "Samsung", "Xiaomi", "Lenovo", "Asus", "Bosch", "Philips", "Sony", "LG", "Acer"]
+NOUNS = ["ноутбук", "смартфон", "монітор", "навушники", "пилосос", "чайник", "телевізор",
+         "клавіатура", "планшет", "холодильник", "кавоварка", "роутер"]
+ADJECTIVES = ["Pro", "Max", "Lite", "Ultra", "Mini", "Air", "Plus", "S", "X", "Neo"]
+CITIES = ["Київ", "Львів", "Одеса", "Харків", "Дніпро", "Запоріжжя", "Вінниця", "Полтава"]
+EVENTS = ["page_view", "product_view", "add_to_cart", "checkout_start", "order_created",
+          "payment_created", "payment_paid"]
+EVENT_WEIGHTS = [50, 25, 10, 6, 4, 3, 2]
+
+# order status mix (raw status, payment status, weight)
+ORDER_MIX = [
+    (OrderStatus.DELIVERED, PaymentStatus.PAID, 45),
+    (OrderStatus.SHIPPED, PaymentStatus.PAID, 12),
+    (OrderStatus.PROCESSING, PaymentStatus.PAID, 8),
+    (OrderStatus.PAID, PaymentStatus.PAID, 5),
+    (OrderStatus.AWAITING_PAYMENT, PaymentStatus.PENDING, 10),
+    (OrderStatus.NEW, None, 8),
+    (OrderStatus.CANCELED, None, 7),
+    ("RETURNED", PaymentStatus.PAID, 5),  # legacy raw status, canonical CANCELED
+]
+
+CATEGORIES = [
+    ("electronics", ["laptops", "computers", "monitors", "keyboards", "storage"]),
+    ("smartphones", ["mobile-phones", "tablets", "tvs", "audio"]),
+    ("appliances", ["washing", "refrigerators", "vacuums", "kitchen", "climate"]),
+    ("gaming", ["consoles", "games", "gaming-chairs"]),
+]
+
+
+def _categories() -> List[dict]:
+    now = utcnow().isoformat()
+    out = []
+    for parent, children in CATEGORIES:
+        out.append({"id": parent, "name": parent, "slug": parent, "parent_id": None, "created_at": now})
+        for c in children:
+            out.append({"id": c, "name": c, "slug": c, "parent_id": parent, "created_at": now})
+    return out
+
+
+def _leaf_categories() -> List[str]:
+    return [c for _, children in CATEGORIES for c in children]
+
+
+def _products(rnd: random.Random, n: int) -> Iterator[dict]:
+    now = utcnow()
+    leaves = _leaf_categories()
+    for i in range(n):
+        brand = rnd.choice(BRANDS)
+        title = f"{brand} {rnd.choice(NOUNS)} {rnd.choice(ADJECTIVES)} {rnd.randint(1, 999)}"
+        price = round(rnd.lognormvariate(7.5, 1.0), 2)
+        created = now - timedelta(days=rnd.randint(0, 365))
+        yield {
+            "id": f"bench-p-{i}",
+            "seller_id": rnd.choice(SELLERS),
+            "title": title,
+            "slug": f"bench-p-{i}",
+            "description": f"{title}. Синтетичний товар для навантажувальних тестів.",
+            "short_description": title,
+            "category_id": rnd.choice(leaves),
+            "brand": brand,
+            "price": price,
+            "compare_price": round(price * 1.15, 2) if rnd.random() < 0.3 else None,
+            "currency": "UAH",
+            "stock_level": rnd.randint(0, 200),
+            "images": [],
+            "status": "published",
+            "rating": round(rnd.uniform(3.0, 5.0), 1),
+            "reviews_count": rnd.randint(0, 300),
+            "views_count": rnd.randint(0, 50_000),
+            "is_bestseller": rnd.random() < 0.05,
+            "is_featured": rnd.random() < 0.05,
+            "created_at": created,
+            "updated_at": created,
+        }
+
+
+def _buyers(n: int) -> Iterator[dict]:
+    now = utcnow().isoformat()
+    for i in range(n):
+        yield {
+            "id": f"bench-u-{i}",
+            "email": f"bench-u-{i}@bench.local",
+            "full_name": f"Bench Buyer {i}",
+            "role": "customer",
+            "phone": f"+38067{i:07d}",
+            "created_at": now,
+        }
+
+
+def _orders(rnd: random.Random, n: int, products: int, buyers: int, payments: list) -> Iterator[dict]:
+    now = utcnow()
+    statuses = [(s, p) for s, p, _ in ORDER_MIX]
+    weights = [w for _, _, w in ORDER_MIX]
+    for i in range(n):
+        status, pay_status = rnd.choices(statuses, weights)[0]
+        buyer = rnd.randrange(buyers)
+        items, subtotal = [], 0.0
+        for _ in range(rnd.randint(1, 4)):
+            p = rnd.randrange(products)
+            qty = rnd.randint(1, 3)
+            price = round(rnd.lognormvariate(7.5, 1.0), 2)
+            subtotal += price * qty
+            items.append({"product_id": f"bench-p-{p}", "quantity": qty, "price": price,
+                          "name": f"bench product {p}", "seller_id": SELLERS[p % len(SELLERS)]})
+        # more recent days are denser, like real traffic
+        created = now - timedelta(days=ORDER_DAYS * rnd.random() ** 1.5, seconds=rnd.randint(0, 86_399))
+        order_id = f"bench-o-{i}"
+        doc = {
+            "id": order_id,
+            "user_id": f"bench-u-{buyer}",
+            "buyer_id": f"bench-u-{buyer}",
+            "items": items,
+            "shipping": {"full_name": f"Bench Buyer {buyer}", "phone": f"+38067{buyer:07d}",
+                         "city": rnd.choice(CITIES), "address": "вул. Тестова, 1",
+                         "np_department": str(rnd.randint(1, 300))},
+            "payment_method": "cash" if pay_status is None else "card",
+            "subtotal": round(subtotal, 2),
+            "shipping_cost": 0,
+            "total": round(subtotal, 2),
+            "total_amount": round(subtotal, 2),
+            "version": 1,
+            "status_history": [],
+            "created_at": created,
+            "updated_at": created,
+            **status_fields(status=status, payment_status=pay_status),
+        }
+        if status == OrderStatus.AWAITING_PAYMENT:
+            payments.append({
+                "id": f"bench-pay-{i}", "order_id": order_id, "purpose": "ORDER_PAYMENT",
+                "provider": "FONDY", "status": "PENDING", "amount": doc["total"], "currency": "UAH",
+                "created_at": created,
+            })
+        yield doc
+
+
+def _events(rnd: random.Random, n: int, products: int, buyers: int) -> Iterator[dict]:
+    now = utcnow()
+    span = EVENT_DAYS * 86_400
+    for _ in range(n):
+        buyer = rnd.randrange(buyers)
+        yield {
+            "event": rnd.choices(EVENTS, EVENT_WEIGHTS)[0],
+            "ts": now - timedelta(seconds=rnd.randint(0, span)),
+            "sid": f"bench-s-{buyer}-{rnd.randint(0, 20)}",
+            "user_id": f"bench-u-{buyer}",
+            "page": "/",
+            "product_id": f"bench-p-{rnd.randrange(products)}",
+            "props": {},
+        }
+
+
+async def _write(col, docs: Iterator[dict], total: int, progress: Callable[[str, int, int], None]):
+    """insert_many in BATCH chunks with up to WRITERS batches in flight"""
+    sem = asyncio.Semaphore(WRITERS)
+    done = 0
+    pending = []
+
+    async def one(batch: List[dict]):
+        nonlocal done
+        try:
+            await col.insert_many(batch, ordered=False)
+            done += len(batch)
+            progress(col.name, done, total)
+        finally:
+            sem.release()
+
+    batch = []
+    for d in docs:
+        batch.append(d)
+        if len(batch) >= BATCH:
+            await sem.acquire()
+            pending.append(asyncio.ensure_future(one(batch)))
+            batch = []
+    if batch:
+        await sem.acquire()
+        pending.append(asyncio.ensure_future(one(batch)))
+    await asyncio.gather(*pending)
+
+
+def _print_progress(name: str, done: int, total: int):
+    if done == total or done % (BATCH * 20) == 0:
+        print(f"  {name}: {done}/{total}")
+
+
+async def seed(db, scale: str = "small", reseed: bool = False,
+               progress: Callable[[str, int, int], None] = _print_progress) -> Dict[str, int]:
+    """Fill db with the synthetic data set; returns collection counts"""
+    sizes = SCALES[scale]
+    meta = await db.bench_meta.find_one({"_id": "seed"})
+    if meta and meta.get("scale") == scale and not reseed:
+        return meta["counts"]
+    if not meta and await db.products.estimated_document_count():
+        raise RuntimeError(f"{db.name} already holds data not seeded by the bench; use an empty database")
+
+    for name in ("categories", "products", "users", "orders", "payments", "events", "bench_meta"):
+        await db[name].drop()
+
+    rnd = random.Random(SEED)
+    payments: List[dict] = []
+    await db.categories.insert_many(_categories())
+    await _write(db.products, _products(rnd, sizes["products"]), sizes["products"], progress)
+    await _write(db.users, _buyers(sizes["buyers"]), sizes["buyers"], progress)
+    await _write(db.orders, _orders(rnd, sizes["orders"], sizes["products"], sizes["buyers"], payments),
+                 sizes["orders"], progress)
+    await _write(db.payments, iter(payments), len(payments), progress)
+    await _write(db.events, _events(rnd, sizes["events"], sizes["products"], sizes["buyers"]),
+                 sizes["events"], progress)
+
+    counts = {**sizes, "payments": len(payments)}
+    await db.bench_meta.replace_one(
+        {"_id": "seed"},
+        {"_id": "seed", "scale": scale, "seed": SEED, "counts": counts, "seeded_at": utcnow(),
+         "run_id": uuid.uuid4().hex},
+        upsert=True,
+    )
+    return counts
@@ -0,0 +1,55 @@
+"""
+Latency samples -> p50/p95/p99 and throughput, and baseline comparison
+"""
+import math
+from typing import Dict, List, Optional
+
+PERCENTILES = (50, 95, 99)
+# a scenario regresses when p95 grows or ops/s drops by more than this
+DEFAULT_TOLERANCE = 0.20
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    """Linear interpolation between closest ranks (numpy's default method)"""
+    if not sorted_samples:
+        return 0.0
+    k = (len(sorted_samples) - 1) * pct / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    if lo == hi:
+        return sorted_samples[lo]
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+def summarize(samples: List[float], wall_seconds: float, errors: int = 0) -> dict:
+    """samples are seconds per operation; latencies are reported in ms"""
+    s = sorted(samples)
+    out = {
+        "count": len(s),
+        "errors": errors,
+        "ops_s": round(len(s) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "mean_ms": round(sum(s) / len(s) * 1000, 2) if s else 0.0,
+        "max_ms": round(s[-1] * 1000, 2) if s else 0.0,
+    }
+    for p in PERCENTILES:
+        out[f"p{p}_ms"] = round(percentile(s, p) * 1000, 2)
+    return out
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[dict]:
+    """Scenarios whose p95 or ops/s moved past tolerance relative to the baseline"""
+    regressions = []
+    for name, cur in results.items():
+        base: Optional[dict] = baseline.get(name)
+        if not base or not cur.get("count"):
+            continue
+        if base.get("p95_ms") and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append({"scenario": name, "metric": "p95_ms",
+                                "baseline": base["p95_ms"], "current": cur["p95_ms"]})
+        if base.get("ops_s") and cur["ops_s"] < base["ops_s"] * (1 - tolerance):
+            regressions.append({"scenario": name, "metric": "ops_s",
+                                "baseline": base["ops_s"], "current": cur["ops_s"]})
+        if cur.get("errors") and not base.get("errors"):
+            regressions.append({"scenario": name, "metric": "errors",
+                                "baseline": 0, "current": cur["errors"]})
+    return regressions
@@ -1,6 +1,9 @@
 # Core module exports
+# metrics first: it registers the Mongo command listener before core.db creates a client
+from core import metrics  # noqa: F401
 from core.config import settings
 from core.db import db, init_db, close_db
+from core.dates import utcnow, as_datetime, date_range, day_bucket
 from core.security import (
     verify_password,
     get_password_hash,
@@ -39,6 +39,9 @@ class Settings(BaseSettings):
     FONDY_MERCHANT_PASSWORD: str = ""
     FONDY_CALLBACK_URL: str = ""
     FONDY_RETURN_URL: str = ""
+    # Status source for payment reconciliation: "local" (payment_confirmations
+    # stand-in) or "fondy" (Fondy status API)
+    RECONCILIATION_PROVIDER: str = "local"
     
     # Optional
     CLOUDINARY_URL: str = ""
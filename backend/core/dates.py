@@ -0,0 +1,96 @@
+"""
+Y-Store Marketplace - Date storage helpers
+
+Timestamps are stored as native BSON datetimes. Legacy documents written by
+older code paths carry ISO-8601 strings instead; until the background
+migration (modules/migrations) has converted every collection, range queries
+are issued in dual-read mode so both representations match.
+"""
+from datetime import datetime, date, timezone
+from typing import Any, Optional, Union
+
+DateLike = Union[datetime, date, str]
+
+# Flipped off by the datetime migration once all collections are converted
+_dual_read = True
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def set_dual_read(enabled: bool):
+    global _dual_read
+    _dual_read = bool(enabled)
+
+
+def is_dual_read() -> bool:
+    return _dual_read
+
+
+def as_datetime(value: Any) -> Optional[datetime]:
+    """Read a stored timestamp (native or legacy ISO string) as aware UTC datetime"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    if isinstance(value, str):
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    return None
+
+
+def as_iso(value: Any) -> Optional[str]:
+    """Legacy string form of a bound, used only while dual-read is on"""
+    if isinstance(value, str):
+        return value
+    dt = as_datetime(value)
+    return dt.isoformat() if dt else None
+
+
+def _bounds(convert, gte=None, gt=None, lt=None, lte=None) -> dict:
+    out = {}
+    for op, v in (("$gte", gte), ("$gt", gt), ("$lt", lt), ("$lte", lte)):
+        if v is not None:
+            out[op] = convert(v)
+    return out
+
+
+def date_range(
+    field: str,
+    gte: Optional[DateLike] = None,
+    lt: Optional[DateLike] = None,
+    lte: Optional[DateLike] = None,
+    gt: Optional[DateLike] = None,
+) -> dict:
+    """
+    Filter fragment for a timestamp window. Merge it into a query with **.
+
+    In dual-read mode the fragment is wrapped in $and so it can be merged
+    into queries that carry their own top-level $or.
+    """
+    native = {field: _bounds(as_datetime, gte, gt, lt, lte)}
+    if not _dual_read:
+        return native
+    legacy = {field: _bounds(as_iso, gte, gt, lt, lte)}
+    return {"$and": [{"$or": [native, legacy]}]}
+
+
+def to_date_expr(field_path: str) -> dict:
+    """Aggregation expression that reads native or legacy string timestamps"""
+    return {"$convert": {"input": field_path, "to": "date", "onError": None, "onNull": None}}
+
+
+def day_bucket(field_path: str, fmt: str = "%Y-%m-%d") -> dict:
+    """Aggregation expression for the UTC day of a timestamp, replacing $substr on strings"""
+    return {
+        "$dateToString": {
+            "format": fmt,
+            "date": {"$dateTrunc": {"date": to_date_expr(field_path), "unit": "day"}},
+        }
+    }
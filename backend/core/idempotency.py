@@ -0,0 +1,124 @@
+"""
+Y-Store Marketplace - Idempotency store
+
+Acquire-or-return over an idempotency collection:
+
+- acquire() is one atomic upsert ($setOnInsert): a new key is locked and
+  an existing record is returned by the same round trip
+- completed (DONE) records are kept in a bounded per-process LRU, so client
+  retries of a finished request are answered without a Mongo call; DONE
+  results never change, so a copy in one worker cannot go stale
+- idempotency_requests_total{scope, outcome} counts new keys, replays
+  served from memory / from the store, and pending (locked) keys
+
+The LRU is per scope and shared by every store instance of that scope
+(repositories are created per request in some modules).
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from core.dates import as_datetime, utcnow
+from core.metrics import metrics
+
+LRU_SIZE = 10_000
+LRU_TTL_SEC = 3600
+
+IDEMPOTENCY_REQUESTS = metrics.counter(
+    "idempotency_requests_total", "Idempotency key lookups by outcome (new, replay_memory, replay_store, pending)",
+    ["scope", "outcome"])
+
+
+class _LRU:
+    def __init__(self, size: int):
+        self.size = size
+        self._items: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        hit = self._items.get(key)
+        if hit is None:
+            return None
+        if hit[0] <= time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return hit[1]
+
+    def put(self, key: str, doc: dict, ttl_sec: float):
+        if ttl_sec <= 0:
+            return
+        self._items[key] = (time.monotonic() + ttl_sec, doc)
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def pop(self, key: str):
+        self._items.pop(key, None)
+
+
+_caches: Dict[str, _LRU] = {}
+
+
+class IdempotencyStore:
+    def __init__(self, scope: str, collection, key_filter: Callable[[str], dict],
+                 lru_size: int = LRU_SIZE, lru_ttl_sec: float = LRU_TTL_SEC):
+        self.scope = scope
+        self.col = collection
+        self.key_filter = key_filter
+        self.lru_ttl_sec = lru_ttl_sec
+        self.cache = _caches.setdefault(scope, _LRU(lru_size))
+
+    def _remember(self, key: str, doc: dict):
+        ttl = self.lru_ttl_sec
+        expires = as_datetime(doc.get("expires_at"))
+        if expires is not None:
+            ttl = min(ttl, (expires - utcnow()).total_seconds())
+        self.cache.put(key, doc, ttl)
+
+    async def acquire(self, key: str, fields: dict) -> Tuple[bool, Optional[dict]]:
+        """
+        Lock a new key with `fields`, or return the existing record.
+        Returns (True, None) for a new key, (False, record) otherwise.
+        """
+        doc = self.cache.get(key)
+        if doc is not None:
+            IDEMPOTENCY_REQUESTS.inc(scope=self.scope, outcome="replay_memory")
+            return False, doc
+        query = self.key_filter(key)
+        try:
+            doc = await self.col.find_one_and_update(
+                query,
+                {"$setOnInsert": {**query, **fields}},
+                upsert=True,
+                projection={"_id": 0},
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError:
+            # concurrent first use of the same key: the other upsert won
+            doc = await self.col.find_one(query, {"_id": 0})
+        if doc is None:
+            IDEMPOTENCY_REQUESTS.inc(scope=self.scope, outcome="new")
+            return True, None
+        if doc.get("status") == "DONE":
+            IDEMPOTENCY_REQUESTS.inc(scope=self.scope, outcome="replay_store")
+            self._remember(key, doc)
+        else:
+            IDEMPOTENCY_REQUESTS.inc(scope=self.scope, outcome="pending")
+        return False, doc
+
+    async def complete(self, key: str, status: str, result: Optional[dict], **fields):
+        """Store the outcome; DONE outcomes are answered from memory afterwards"""
+        update = {"status": status, "result": result, **fields}
+        if status == "DONE":
+            doc = await self.col.find_one_and_update(
+                self.key_filter(key), {"$set": update},
+                projection={"_id": 0}, return_document=ReturnDocument.AFTER,
+            )
+            if doc:
+                self._remember(key, doc)
+        else:
+            self.cache.pop(key)
+            await self.col.update_one(self.key_filter(key), {"$set": update})
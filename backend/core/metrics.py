@@ -0,0 +1,298 @@
+"""
+Y-Store Marketplace - In-process metrics
+
+Small Prometheus-compatible registry (text exposition on /metrics) plus the
+hooks that feed it:
+
+- MetricsMiddleware: per-route latency histogram; per-request Mongo command
+  count / time (X-Mongo-Commands, X-Mongo-Time-Ms response headers)
+- MongoCommandListener: pymongo command monitoring, registered globally on
+  import, so it must be imported before any MongoClient is created
+  (core/__init__ does this first)
+- outbound(service, operation): times calls to NP / Fondy / Telegram / LLM
+  etc., usable as `with` or `async with`
+- observe_job(): background job durations (called by the job runtime)
+
+Metrics are per process; each uvicorn worker exposes its own.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+
+from pymongo import monitoring
+from starlette.middleware.base import BaseHTTPMiddleware
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> str:
+        return f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n" + self._samples()
+
+    def _samples(self) -> str:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> str:
+        with self._lock:
+            items = list(self._values.items())
+        return "".join(f"{self.name}{_labels(self.labelnames, k)} {v}\n" for k, v in items)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def _samples(self) -> str:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = []
+        for key, row in items:
+            for i, b in enumerate(self.buckets):
+                le = _labels(self.labelnames, key, 'le="%s"' % b)
+                out.append(f"{self.name}_bucket{le} {row[i]}\n")
+            le = _labels(self.labelnames, key, 'le="+Inf"')
+            out.append(f"{self.name}_bucket{le} {row[-1]}\n")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {round(row[-2], 6)}\n")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {row[-1]}\n")
+        return "".join(out)
+
+    def summary(self) -> list:
+        """count / sum / mean per label set, largest sum first (for JSON views)"""
+        with self._lock:
+            items = [(k, v[-2], v[-1]) for k, v in self._values.items()]
+        rows = [
+            {**dict(zip(self.labelnames, k)), "count": n, "sum": round(s, 4),
+             "mean": round(s / n, 4) if n else 0.0}
+            for k, s, n in items
+        ]
+        return sorted(rows, key=lambda r: r["sum"], reverse=True)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def counter(self, name: str, help_: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help_, labelnames))
+
+    def gauge(self, name: str, help_: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._metrics.setdefault(name, Gauge(name, help_, labelnames))
+
+    def histogram(self, name: str, help_: str, labelnames: Iterable[str] = (),
+                  buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help_, labelnames, buckets))
+
+    def render(self) -> str:
+        return "".join(m.render() for m in self._metrics.values())
+
+
+metrics = Registry()
+
+HTTP_LATENCY = metrics.histogram(
+    "http_request_duration_seconds", "API request latency by route template",
+    ["method", "route", "status"])
+HTTP_MONGO_COMMANDS = metrics.histogram(
+    "http_request_mongo_commands", "Mongo commands issued per API request",
+    ["method", "route"], buckets=COUNT_BUCKETS)
+HTTP_MONGO_TIME = metrics.histogram(
+    "http_request_mongo_seconds", "Total Mongo command time per API request",
+    ["method", "route"])
+MONGO_LATENCY = metrics.histogram(
+    "mongo_command_duration_seconds", "Mongo command latency (pymongo command monitoring)",
+    ["command", "collection"])
+MONGO_FAILURES = metrics.counter(
+    "mongo_command_failures_total", "Failed Mongo commands", ["command", "collection"])
+OUTBOUND_LATENCY = metrics.histogram(
+    "outbound_request_duration_seconds", "Calls to external services (NP, Fondy, Telegram, LLM)",
+    ["service", "operation", "outcome"])
+JOB_DURATION = metrics.histogram(
+    "job_duration_seconds", "Background job run time", ["job", "outcome"],
+    buckets=(0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+
+
+# ---------- per-request Mongo accounting ----------
+
+class RequestStats:
+    __slots__ = ("mongo_commands", "mongo_seconds")
+
+    def __init__(self):
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+
+
+# Motor runs pymongo on executor threads with a copy of the caller's context,
+# so the listener sees the RequestStats object of the request that issued it
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+# Commands that are driver housekeeping rather than application queries
+_IGNORED_COMMANDS = {"isMaster", "ismaster", "hello", "ping", "saslStart", "saslContinue",
+                     "endSessions", "buildInfo"}
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        self._collections: Dict[Tuple, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event) -> Tuple:
+        return event.connection_id, event.request_id
+
+    def started(self, event):
+        if event.command_name in _IGNORED_COMMANDS:
+            return
+        name = "collection" if event.command_name == "getMore" else event.command_name
+        coll = event.command.get(name)
+        with self._lock:
+            self._collections[self._key(event)] = coll if isinstance(coll, str) else ""
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            coll = self._collections.pop(self._key(event), None)
+        if coll is None:
+            return
+        seconds = event.duration_micros / 1e6
+        MONGO_LATENCY.observe(seconds, command=event.command_name, collection=coll)
+        if failed:
+            MONGO_FAILURES.inc(command=event.command_name, collection=coll)
+        stats = current_request.get()
+        if stats is not None:
+            stats.mongo_commands += 1
+            stats.mongo_seconds += seconds
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+
+monitoring.register(MongoCommandListener())
+
+
+# ---------- outbound calls ----------
+
+class outbound:
+    """
+    Time a call to an external service:
+
+        async with outbound("novaposhta", "InternetDocument.save"):
+            ...
+    """
+
+    def __init__(self, service: str, operation: str = ""):
+        self.service = service
+        self.operation = operation
+        self._t0 = 0.0
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        OUTBOUND_LATENCY.observe(time.perf_counter() - self._t0, service=self.service,
+                                 operation=self.operation, outcome="error" if exc_type else "ok")
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def observe_job(job_id: str, seconds: float, failed: bool):
+    JOB_DURATION.observe(seconds, job=job_id, outcome="error" if failed else "ok")
+
+
+# ---------- middleware ----------
+
+def _route_template(request) -> str:
+    route = request.scope.get("route")
+    path = getattr(route, "path", None)
+    # unmatched paths are collapsed so scanners cannot blow up label cardinality
+    return path or "unmatched"
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            current_request.reset(token)
+            route = _route_template(request)
+            HTTP_LATENCY.observe(time.perf_counter() - t0, method=request.method,
+                                 route=route, status=str(status))
+            HTTP_MONGO_COMMANDS.observe(stats.mongo_commands, method=request.method, route=route)
+            HTTP_MONGO_TIME.observe(stats.mongo_seconds, method=request.method, route=route)
+        response.headers["X-Mongo-Commands"] = str(stats.mongo_commands)
+        response.headers["X-Mongo-Time-Ms"] = str(round(stats.mongo_seconds * 1000, 1))
+        return response
@@ -7,6 +7,8 @@ from datetime import datetime, timezone, timedelta
 from typing import List, Dict, Any, Optional
 import logging
 
+from core.dates import date_range, as_datetime
+
 logger = logging.getLogger(__name__)
 
 class CRMService:
@@ -34,7 +36,8 @@ class CRMService:
             # Last order date
             last_order_date = None
             if orders:
-                last_order_date = max(order.get("created_at") for order in orders if order.get("created_at"))
+                order_dates = [as_datetime(order.get("created_at")) for order in orders]
+                last_order_date = max((d for d in order_dates if d), default=None)
             
             # Days since last order
             days_since_last_order = None
@@ -151,8 +154,9 @@ class CRMService:
                 customer["avg_order_value"] = total_spent / total_orders if total_orders > 0 else 0
                 
                 # Days since last order
-                if customer.get("last_order"):
-                    customer["days_since_last_order"] = (now - customer["last_order"]).days
+                last_order = as_datetime(customer.get("last_order"))
+                if last_order:
+                    customer["days_since_last_order"] = (now - last_order).days
                 else:
                     customer["days_since_last_order"] = None
                 
@@ -240,16 +244,12 @@ class CRMService:
             })
             
             # Orders placed
-            orders_placed = await self.db.orders.count_documents({
-                "created_at": {"$gte": start_date}
-            })
+            orders_placed = await self.db.orders.count_documents(date_range("created_at", gte=start_date))
             
             # Active customers (placed orders)
             active_customers_pipeline = [
                 {
-                    "$match": {
-                        "created_at": {"$gte": start_date}
-                    }
+                    "$match": date_range("created_at", gte=start_date)
                 },
                 {
                     "$group": {
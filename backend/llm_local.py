@@ -0,0 +1,70 @@
+"""
+Local LLM stand-in - deterministic LLM double for tests and bulk runs
+
+Answers every AIService operation with well-formed output derived from the
+prompt (same prompt -> same answer), optionally after an artificial
+per-call latency (LLM_STANDIN_LATENCY_MS) so bulk generation can be
+benchmarked without network or cost. Selected with LLM_STANDIN=1.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+from typing import List
+
+_FIELD = re.compile(r"^\s*(?:\*\*)?(Product Title|Product Name|Товар|Title):?(?:\*\*)?:?\s*(.+)$", re.M)
+_IDS = re.compile(r"ID: ([^\s,|]+)")
+
+
+class LocalLLMStandIn:
+    """Same surface AIService uses from LlmChat: one prompt in, text out"""
+
+    model = ("local", "standin")
+
+    def __init__(self, latency_ms: float = None, fail_every: int = 0):
+        if latency_ms is None:
+            latency_ms = float(os.environ.get("LLM_STANDIN_LATENCY_MS", 0))
+        self.latency = latency_ms / 1000.0
+        # every Nth call raises like a provider error (0 = never)
+        self.fail_every = fail_every
+        self.calls = 0
+
+    @staticmethod
+    def _subject(prompt: str) -> str:
+        m = _FIELD.search(prompt)
+        return m.group(2).strip() if m else "product"
+
+    @staticmethod
+    def _keywords(subject: str) -> List[str]:
+        words = [w.lower() for w in re.findall(r"\w+", subject) if len(w) > 2]
+        return list(dict.fromkeys(words))[:5] or ["product"]
+
+    async def send(self, op: str, system: str, prompt: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls += 1
+        if self.fail_every and self.calls % self.fail_every == 0:
+            raise RuntimeError("LLM stand-in: simulated provider error")
+
+        subject = self._subject(prompt)
+        tag = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+        if op in ("generate_product_description", "describe"):
+            return json.dumps({
+                "description": f"{subject}: stand-in description {tag}.\n\nSecond paragraph for {subject}.",
+                "short_description": f"{subject} ({tag})"[:160],
+                "keywords": self._keywords(subject),
+            }, ensure_ascii=False)
+        if op == "seo":
+            return json.dumps({
+                "title": f"{subject} - buy online"[:60],
+                "metaDescription": f"{subject}: stand-in meta description {tag}"[:160],
+                "keywords": self._keywords(subject),
+            }, ensure_ascii=False)
+        if op in ("recommendations", "generate_recommendations"):
+            ids = list(dict.fromkeys(_IDS.findall(prompt)))[:3]
+            return json.dumps({"recommendations": [
+                {"productId": i, "product_id": i, "reason": "stand-in recommendation"} for i in ids
+            ]})
+        last = prompt.strip().splitlines()[-1] if prompt.strip() else ""
+        return f"Stand-in reply ({tag}): {last[:200]}"
@@ -4,6 +4,8 @@ A/B Report Service - Analytics by cohort
 from datetime import datetime, timedelta, timezone
 import logging
 
+from core.dates import date_range
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,7 +35,7 @@ class ABReportService:
 
         pipeline = [
             {"$match": {
-                "created_at": {"$gte": since},
+                **date_range("created_at", gte=since),
                 "ab.exp_id": exp_id
             }},
             {"$group": {
@@ -163,7 +165,7 @@ class ABReportService:
         
         for exp in experiments:
             orders_count = await self.orders.count_documents({
-                "created_at": {"$gte": since},
+                **date_range("created_at", gte=since),
                 "ab.exp_id": exp["id"]
             })
             summaries.append({
@@ -8,6 +8,9 @@ from datetime import datetime, timezone, timedelta
 
 from core.db import db
 from core.security import get_current_admin
+from core.dates import date_range, day_bucket
+from modules.products.catalog_cache import get_catalog_cache
+from modules.products.cards import WITHOUT_CARD
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -97,9 +100,9 @@ async def get_revenue_analytics(
     start_date = datetime.now(timezone.utc) - timedelta(days=days)
     
     pipeline = [
-        {"$match": {"created_at": {"$gte": start_date}}},
+        {"$match": date_range("created_at", gte=start_date)},
         {"$group": {
-            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+            "_id": day_bucket("$created_at"),
             "total": {"$sum": "$total"},
             "count": {"$sum": 1}
         }},
@@ -116,7 +119,7 @@ async def get_top_products(
     current_user: dict = Depends(get_current_admin)
 ):
     """Get top selling products"""
-    products = await db.products.find({}, {"_id": 0}).sort("sales_count", -1).limit(limit).to_list(limit)
+    products = await db.products.find({}, WITHOUT_CARD).sort("sales_count", -1).limit(limit).to_list(limit)
     return products
 
 
@@ -130,8 +133,9 @@ async def get_category_distribution(current_user: dict = Depends(get_current_adm
     result = await db.products.aggregate(pipeline).to_list(50)
     
     # Enrich with category names
+    catalog = await get_catalog_cache(db).get()
     for r in result:
-        cat = await db.categories.find_one({"id": r["_id"]}, {"name": 1})
+        cat = catalog.by_id.get(r["_id"])
         r["category_name"] = cat["name"] if cat else "Unknown"
     
     return result
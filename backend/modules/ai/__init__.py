@@ -0,0 +1 @@
+# AI Module - bulk content generation on top of ai_service
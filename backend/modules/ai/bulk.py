@@ -0,0 +1,342 @@
+"""
+Bulk AI content for a whole category
+
+A job walks the products of a category (and its subcategories) in _id order
+and asks ai_service for descriptions and/or SEO texts through a pool of
+`concurrency` calls:
+
+- outputs go through the ai_cache, so re-running a job over the same
+  products costs nothing unless `force` is set
+- per-product outcomes are written to ai_bulk_items page by page, together
+  with the job counters and the last _id reached in ai_bulk_jobs; a job that
+  failed, was canceled or whose process died first retries its failed
+  products, then resumes from that point and skips products it already has
+  items for (a retried item replaces the failed one)
+- with `apply` the texts are written to the products, otherwise they are only
+  kept in the items for review
+- `only_missing` skips products that already have the text
+
+Jobs run as tasks in the process that accepted them, like bulk TTN jobs.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Literal, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+from pymongo import ReplaceOne, ReturnDocument
+
+from ai_service import ai_service
+from core.dates import as_datetime, utcnow
+from modules.products.catalog_cache import get_catalog_cache
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = int(os.environ.get("AI_BULK_CONCURRENCY", 4))
+PAGE_SIZE = 50
+STALE_SEC = 300
+OUTCOMES = ("generated", "cached", "skipped", "failed")
+PRODUCT_FIELDS = {
+    "_id": 1, "id": 1, "title": 1, "category_id": 1, "specifications": 1,
+    "short_description": 1, "seo_title": 1,
+}
+
+# job_id -> running task (keeps a reference so the task is not collected)
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+class AIBulkRequest(BaseModel):
+    """Generate texts for every product of a category"""
+    category_id: str
+    include_subcategories: bool = True
+    tasks: List[Literal["description", "seo"]] = Field(default_factory=lambda: ["description"], min_length=1)
+    apply: bool = False
+    only_missing: bool = True
+    force: bool = False
+    concurrency: Optional[int] = Field(None, ge=1, le=16)
+    limit: Optional[int] = Field(None, ge=1, le=10000)
+
+
+def _features(product: dict) -> List[str]:
+    specs = product.get("specifications") or []
+    # admin editor stores [{title, description, image}], the v2 model a dict
+    pairs = specs.items() if isinstance(specs, dict) else \
+        ((s.get("title") or s.get("name"), s.get("description") or s.get("value"))
+         for s in specs if isinstance(s, dict))
+    return [f"{k}: {v}" if k else str(v) for k, v in pairs if v not in (None, "")][:15]
+
+
+def _missing(product: dict, task: str) -> bool:
+    if task == "description":
+        return not product.get("short_description")
+    return not product.get("seo_title")
+
+
+class AIBulkService:
+    def __init__(self, db, ai=None, concurrency: int = CONCURRENCY):
+        self.db = db
+        self.ai = ai or ai_service
+        self.concurrency = max(1, concurrency)
+        self.jobs = db["ai_bulk_jobs"]
+        self.items = db["ai_bulk_items"]
+        self.products = db["products"]
+
+    async def ensure_indexes(self):
+        await self.jobs.create_index("id", unique=True)
+        await self.jobs.create_index([("created_at", -1)])
+        await self.items.create_index([("job_id", 1), ("product_id", 1)], unique=True)
+        await self.ai.ensure_indexes()
+
+    # ---------- job setup ----------
+
+    async def create_job(self, req: AIBulkRequest, actor: str) -> dict:
+        snap = await get_catalog_cache(self.db).get()
+        if req.category_id not in snap.by_id:
+            raise HTTPException(status_code=404, detail="CATEGORY_NOT_FOUND")
+        category_ids = snap.descendants(req.category_id) if req.include_subcategories else [req.category_id]
+        total = await self.products.count_documents({"category_id": {"$in": category_ids}})
+        if req.limit:
+            total = min(total, req.limit)
+        if not total:
+            raise HTTPException(status_code=400, detail="NO_PRODUCTS")
+        now = utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "status": "QUEUED",
+            "actor": actor,
+            "category_id": req.category_id,
+            "category_ids": category_ids,
+            "options": req.model_dump(exclude={"category_id", "include_subcategories", "concurrency"}),
+            "concurrency": req.concurrency or self.concurrency,
+            "total": total,
+            "done": 0,
+            **{o: 0 for o in OUTCOMES},
+            "last_id": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.jobs.insert_one(dict(job))
+        job.pop("category_ids")
+        return job
+
+    def start(self, job_id: str) -> asyncio.Task:
+        """Run the job in the background of this process"""
+        task = asyncio.create_task(self.run(job_id))
+        _tasks[job_id] = task
+        task.add_done_callback(lambda _: _tasks.pop(job_id, None))
+        return task
+
+    # ---------- execution ----------
+
+    async def _one(self, job_id: str, product: dict, category: str, options: dict) -> dict:
+        t0 = time.perf_counter()
+        item = {"job_id": job_id, "product_id": product["id"], "title": product.get("title")}
+        tasks = [t for t in options["tasks"] if not options["only_missing"] or _missing(product, t)]
+        if not tasks:
+            item.update(outcome="skipped", ms=0.0, at=utcnow())
+            return item
+        title, features = product.get("title") or "", _features(product)
+        try:
+            outputs, hits, update = {}, [], {}
+            if "description" in tasks:
+                res, cached = await self.ai.describe(title, category, features, force=options["force"])
+                outputs["description"], hits = res, hits + [cached]
+                update.update(description=res.get("description"), short_description=res.get("short_description"))
+            if "seo" in tasks:
+                res, cached = await self.ai.seo(title, category, features, force=options["force"])
+                outputs["seo"], hits = res, hits + [cached]
+                update.update(seo_title=res.get("title"), seo_description=res.get("metaDescription"),
+                              seo_keywords=res.get("keywords") or [])
+            if options["apply"]:
+                update["updated_at"] = utcnow()
+                await self.products.update_one({"id": product["id"]}, {"$set": update})
+            item.update(outcome="cached" if all(hits) else "generated", outputs=outputs, applied=options["apply"])
+        except Exception as e:
+            logger.warning(f"AI bulk {job_id}: product {product['id']} failed: {e}")
+            item.update(outcome="failed", error=str(e))
+        item["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        item["at"] = utcnow()
+        return item
+
+    async def _page(self, job: dict, after) -> List[dict]:
+        q = {"category_id": {"$in": job["category_ids"]}}
+        if after is not None:
+            q["_id"] = {"$gt": after}
+        return await self.products.find(q, PRODUCT_FIELDS).sort("_id", 1).limit(PAGE_SIZE).to_list(PAGE_SIZE)
+
+    async def _record(self, job_id: str, results: List[dict], retried: int, last_id=None) -> Optional[dict]:
+        """Upsert item outcomes and move the job counters; `retried` results replace failed items"""
+        if results:
+            await self.items.bulk_write([
+                ReplaceOne({"job_id": job_id, "product_id": r["product_id"]}, r, upsert=True) for r in results
+            ], ordered=False)
+        inc = Counter(r["outcome"] for r in results)
+        inc["failed"] -= retried
+        update = {"heartbeat_at": utcnow(), "updated_at": utcnow()}
+        if last_id is not None:
+            update["last_id"] = last_id
+        return await self.jobs.find_one_and_update({"id": job_id}, {
+            "$inc": {"done": len(results) - retried, **inc},
+            "$set": update,
+        }, projection={"status": 1}, return_document=ReturnDocument.AFTER)
+
+    async def _canceled(self, job_id: str, state: Optional[dict]) -> bool:
+        if not state or state["status"] != "CANCELING":
+            return False
+        await self.jobs.update_one({"id": job_id}, {"$set": {
+            "status": "CANCELED", "finished_at": utcnow(), "updated_at": utcnow(),
+        }})
+        return True
+
+    async def run(self, job_id: str) -> dict:
+        """Process a QUEUED job from where it stopped; returns the job"""
+        now = utcnow()
+        job = await self.jobs.find_one_and_update(
+            {"id": job_id, "status": "QUEUED"},
+            {"$set": {"status": "RUNNING", "started_at": now, "heartbeat_at": now, "updated_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not job:
+            return await self.get(job_id)
+
+        started = time.monotonic()
+        options = job["options"]
+        limit = options.get("limit")
+        sem = asyncio.Semaphore(job["concurrency"])
+        snap = await get_catalog_cache(self.db).get()
+
+        async def bounded(product: dict) -> dict:
+            async with sem:
+                cat = snap.by_id.get(product.get("category_id")) or {}
+                return await self._one(job_id, product, cat.get("name") or "", options)
+
+        try:
+            await self.ensure_indexes()
+            failed: List[str] = []
+            if job.get("failed"):
+                # resumed: products that failed on pages before last_id are not walked again
+                failed = [d["product_id"] async for d in self.items.find(
+                    {"job_id": job_id, "outcome": "failed"}, {"_id": 0, "product_id": 1},
+                )]
+                for i in range(0, len(failed), PAGE_SIZE):
+                    products = await self.products.find(
+                        {"id": {"$in": failed[i:i + PAGE_SIZE]}}, PRODUCT_FIELDS,
+                    ).to_list(PAGE_SIZE)
+                    results = await asyncio.gather(*(bounded(p) for p in products))
+                    if await self._canceled(job_id, await self._record(job_id, results, len(results))):
+                        logger.info(f"AI bulk job {job_id} canceled while retrying failed products")
+                        return await self.get(job_id)
+            retried_ids = set(failed)
+            after, done = job.get("last_id"), job.get("done", 0)
+            while not limit or done < limit:
+                page = await self._page(job, after)
+                if not page:
+                    break
+                if limit:
+                    page = page[:limit - done]
+                prior = {d["product_id"]: d["outcome"] async for d in self.items.find(
+                    {"job_id": job_id, "product_id": {"$in": [p["id"] for p in page]}},
+                    {"_id": 0, "product_id": 1, "outcome": 1},
+                )}
+                # failed items are tried again (once per run); any other outcome is final for this job
+                todo = [p for p in page if p.get("id") and (
+                    p["id"] not in prior or (prior[p["id"]] == "failed" and p["id"] not in retried_ids))]
+                retried = sum(1 for p in todo if p["id"] in prior)
+                results = await asyncio.gather(*(bounded(p) for p in todo))
+                after = page[-1]["_id"]
+                done += len(todo) - retried
+                if await self._canceled(job_id, await self._record(job_id, results, retried, last_id=after)):
+                    logger.info(f"AI bulk job {job_id} canceled after {done} products")
+                    return await self.get(job_id)
+                if len(page) < PAGE_SIZE:
+                    break
+
+            seconds = time.monotonic() - started
+            await self.jobs.update_one({"id": job_id}, {"$set": {
+                "status": "DONE",
+                "duration_ms": round(seconds * 1000, 1),
+                "finished_at": utcnow(),
+                "updated_at": utcnow(),
+            }})
+        except Exception as e:
+            logger.exception(f"AI bulk job {job_id} failed: {e}")
+            await self.jobs.update_one({"id": job_id}, {"$set": {
+                "status": "FAILED", "error": str(e), "finished_at": utcnow(), "updated_at": utcnow(),
+            }})
+            return await self.get(job_id)
+
+        result = await self.get(job_id)
+        logger.info(f"AI bulk job {job_id}: {result['generated']} generated, {result['cached']} cached, "
+                    f"{result['skipped']} skipped, {result['failed']} failed in {result['duration_ms']} ms")
+        return result
+
+    # ---------- control ----------
+
+    async def resume(self, job_id: str) -> dict:
+        """Queue a failed, canceled or stale job again and start it here"""
+        job = await self.get(job_id, failed_limit=0)
+        if not job:
+            raise HTTPException(status_code=404, detail="JOB_NOT_FOUND")
+        if job["status"] not in ("FAILED", "CANCELED") and not job["stale"]:
+            raise HTTPException(status_code=409, detail=f"JOB_{job['status']}")
+        res = await self.jobs.update_one(
+            {"id": job_id, "status": job["status"], "updated_at": job["updated_at"]},
+            {"$set": {"status": "QUEUED", "updated_at": utcnow()}, "$unset": {"error": ""}},
+        )
+        if not res.modified_count:
+            raise HTTPException(status_code=409, detail="JOB_CHANGED")
+        self.start(job_id)
+        return await self.get(job_id, failed_limit=0)
+
+    async def cancel(self, job_id: str) -> dict:
+        """Queued jobs stop at once, running ones after the current page"""
+        now = utcnow()
+        job = await self.jobs.find_one_and_update(
+            {"id": job_id, "status": "QUEUED"},
+            {"$set": {"status": "CANCELED", "finished_at": now, "updated_at": now}},
+        )
+        if not job:
+            await self.jobs.update_one(
+                {"id": job_id, "status": "RUNNING"},
+                {"$set": {"status": "CANCELING", "updated_at": now}},
+            )
+        job = await self.get(job_id, failed_limit=0)
+        if not job:
+            raise HTTPException(status_code=404, detail="JOB_NOT_FOUND")
+        return job
+
+    # ---------- reads ----------
+
+    async def get(self, job_id: str, failed_limit: int = 200) -> Optional[dict]:
+        """Job with counters and the failed products"""
+        job = await self.jobs.find_one({"id": job_id}, {"_id": 0, "category_ids": 0, "last_id": 0})
+        if not job:
+            return None
+        heartbeat = as_datetime(job.get("heartbeat_at"))
+        job["stale"] = bool(
+            job["status"] in ("RUNNING", "CANCELING") and job_id not in _tasks and heartbeat
+            and (utcnow() - heartbeat).total_seconds() > STALE_SEC
+        )
+        job["failed_items"] = await self.items.find(
+            {"job_id": job_id, "outcome": "failed"}, {"_id": 0, "job_id": 0}
+        ).limit(failed_limit).to_list(failed_limit) if failed_limit else []
+        return job
+
+    async def list_jobs(self, limit: int = 20) -> List[dict]:
+        return await self.jobs.find({}, {"_id": 0, "category_ids": 0, "last_id": 0}) \
+            .sort("created_at", -1).limit(limit).to_list(limit)
+
+    async def list_items(self, job_id: str, outcome: Optional[str] = None, skip: int = 0,
+                         limit: int = 50) -> dict:
+        q = {"job_id": job_id}
+        if outcome:
+            q["outcome"] = outcome
+        items, total = await asyncio.gather(
+            self.items.find(q, {"_id": 0, "job_id": 0}).sort("at", 1).skip(skip).limit(limit).to_list(limit),
+            self.items.count_documents(q),
+        )
+        return {"items": items, "total": total}
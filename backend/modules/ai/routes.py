@@ -0,0 +1,85 @@
+"""
+AI Bulk Routes - category-wide description / SEO generation
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Literal, Optional
+
+from core.db import db
+from core.security import get_current_admin
+from .bulk import AIBulkRequest, AIBulkService
+
+router = APIRouter(prefix="/ai/bulk", tags=["AI Bulk"])
+
+
+@router.post("")
+async def create_ai_bulk_job(
+    body: AIBulkRequest,
+    wait: bool = Query(False, description="Run inline and return the result"),
+    admin: dict = Depends(get_current_admin),
+):
+    """
+    Generate descriptions and/or SEO texts for every product of a category.
+
+    - Bounded concurrency (default AI_BULK_CONCURRENCY)
+    - Outputs are cached by prompt; `force` regenerates
+    - `apply` writes the texts to the products, otherwise review them in /items
+    - Failed, canceled or stale jobs continue via POST /{job_id}/resume
+    """
+    service = AIBulkService(db)
+    await service.ensure_indexes()
+    job = await service.create_job(body, actor=f"admin:{admin.get('id')}")
+    if wait:
+        return await service.run(job["id"])
+    service.start(job["id"])
+    return job
+
+
+@router.get("")
+async def list_ai_bulk_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    admin: dict = Depends(get_current_admin),
+):
+    """Recent AI bulk jobs"""
+    return {"items": await AIBulkService(db).list_jobs(limit)}
+
+
+@router.get("/{job_id}")
+async def get_ai_bulk_job(
+    job_id: str,
+    admin: dict = Depends(get_current_admin),
+):
+    """AI bulk job: counters and failed products"""
+    job = await AIBulkService(db).get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="JOB_NOT_FOUND")
+    return job
+
+
+@router.get("/{job_id}/items")
+async def list_ai_bulk_items(
+    job_id: str,
+    outcome: Optional[Literal["generated", "cached", "skipped", "failed"]] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    admin: dict = Depends(get_current_admin),
+):
+    """Per-product outputs of a job"""
+    return await AIBulkService(db).list_items(job_id, outcome, skip, limit)
+
+
+@router.post("/{job_id}/resume")
+async def resume_ai_bulk_job(
+    job_id: str,
+    admin: dict = Depends(get_current_admin),
+):
+    """Continue a failed, canceled or stale job from the last product reached"""
+    return await AIBulkService(db).resume(job_id)
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_ai_bulk_job(
+    job_id: str,
+    admin: dict = Depends(get_current_admin),
+):
+    """Stop a job (running jobs finish the current page first)"""
+    return await AIBulkService(db).cancel(job_id)
@@ -6,6 +6,8 @@ from datetime import datetime, timezone, timedelta
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from .rollup import AnalyticsRollupJob, day_key, sum_by_key
+
 # Database connection
 MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.environ.get("DB_NAME", "ystore")
@@ -30,14 +32,22 @@ async def funnel_summary(days: int = 7):
     """
     since = datetime.now(timezone.utc) - timedelta(days=days)
     
-    # Count events by type
+    # Count events by type: daily rollups up to the job watermark ...
+    watermark = await AnalyticsRollupJob(db).get_watermark("events")
+    event_counts = {}
+    if watermark:
+        rows = await sum_by_key(db, "funnel", day_key(since), match={"key": {"$in": FUNNEL_STEPS}})
+        event_counts = {r["_id"]: int(r["n"]) for r in rows}
+    
+    # ... plus the raw tail the job has not folded in yet
+    tail_since = max(since, watermark) if watermark else since
     pipeline = [
-        {"$match": {"ts": {"$gte": since}, "event": {"$in": FUNNEL_STEPS}}},
+        {"$match": {"ts": {"$gt": tail_since}, "event": {"$in": FUNNEL_STEPS}}},
         {"$group": {"_id": "$event", "cnt": {"$sum": 1}}},
     ]
-    
     rows = await db.events.aggregate(pipeline).to_list(100)
-    event_counts = {r["_id"]: r["cnt"] for r in rows}
+    for r in rows:
+        event_counts[r["_id"]] = event_counts.get(r["_id"], 0) + r["cnt"]
     
     # Build ordered steps
     steps = [
@@ -0,0 +1,187 @@
+"""
+Analytics Ingest - buffered event writes
+
+Browser events are the highest-volume write in the system. Instead of an
+insert_one per request, endpoints hand documents to EventBuffer:
+- per-collection in-process queue, flushed when FLUSH_SIZE documents are
+  waiting or every FLUSH_INTERVAL_SEC, with insert_many(ordered=False)
+- backpressure: above HIGH_WATER the endpoint briefly waits for a flush;
+  when the queue is full (Mongo slow or down) new events are dropped
+- counters for queued / flushed / dropped events and flush timings
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = int(os.environ.get("ANALYTICS_FLUSH_SIZE", 500))
+FLUSH_INTERVAL_SEC = float(os.environ.get("ANALYTICS_FLUSH_INTERVAL_SEC", 1.0))
+MAX_QUEUE = int(os.environ.get("ANALYTICS_MAX_QUEUE", 20000))
+HIGH_WATER = int(MAX_QUEUE * 0.8)
+BACKPRESSURE_WAIT_SEC = 0.25
+MAX_RETRY_BACKOFF_SEC = 30.0
+MAX_BATCH_EVENTS = 100
+
+# collection -> (timeField, metaField) for the optional time-series layout
+TIMESERIES = {
+    "events": ("ts", "event"),
+    "analytics_events": ("ts", "event_type"),
+}
+
+
+class EventBuffer:
+    def __init__(self):
+        self.db = None
+        self.queues: Dict[str, deque] = {}
+        self.metrics = {
+            "queued": 0,
+            "flushed": 0,
+            "dropped": 0,
+            "insert_errors": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+        self._wake: Optional[asyncio.Event] = None
+        self._flushed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._backoff = 0.0
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def start(self, db):
+        """Bind database and start the flusher (idempotent)"""
+        self.db = db
+        if self._task and not self._task.done():
+            return
+        self._wake = asyncio.Event()
+        self._flushed = asyncio.Event()
+        self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write out whatever is still queued"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush_all()
+
+    async def offer(self, collection: str, docs: List[dict]) -> int:
+        """Queue documents; returns how many were accepted"""
+        if self.db is None:
+            raise RuntimeError("EventBuffer not started")
+        if not (self._task and not self._task.done()):
+            self.start(self.db)
+
+        if self.depth() + len(docs) > HIGH_WATER:
+            self._wake.set()
+            self._flushed.clear()
+            try:
+                await asyncio.wait_for(self._flushed.wait(), BACKPRESSURE_WAIT_SEC)
+            except asyncio.TimeoutError:
+                pass
+
+        room = max(0, MAX_QUEUE - self.depth())
+        accepted = docs[:room]
+        dropped = len(docs) - len(accepted)
+        if accepted:
+            self.queues.setdefault(collection, deque()).extend(accepted)
+            self.metrics["queued"] += len(accepted)
+        if dropped:
+            self.metrics["dropped"] += dropped
+        if self.depth() >= FLUSH_SIZE:
+            self._wake.set()
+        return len(accepted)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), FLUSH_INTERVAL_SEC + self._backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush_all()
+
+    async def flush_all(self):
+        for name, q in list(self.queues.items()):
+            while q:
+                batch = [q.popleft() for _ in range(min(FLUSH_SIZE, len(q)))]
+                if not await self._flush(name, batch):
+                    # Put the batch back (oldest first) if there is room, else drop it
+                    room = max(0, MAX_QUEUE - self.depth())
+                    keep = batch[:room]
+                    q.extendleft(reversed(keep))
+                    self.metrics["dropped"] += len(batch) - len(keep)
+                    break
+        if self._flushed:
+            self._flushed.set()
+
+    async def _flush(self, name: str, batch: List[dict]) -> bool:
+        started = time.monotonic()
+        try:
+            await self.db[name].insert_many(batch, ordered=False)
+            self.metrics["flushed"] += len(batch)
+        except BulkWriteError as e:
+            # ordered=False: everything except the failed documents was written
+            errors = len(e.details.get("writeErrors", []))
+            self.metrics["flushed"] += len(batch) - errors
+            self.metrics["insert_errors"] += errors
+        except Exception as e:
+            self.metrics["failed_flushes"] += 1
+            self._backoff = min(MAX_RETRY_BACKOFF_SEC, max(1.0, self._backoff * 2))
+            logger.warning(f"Analytics flush to {name} failed ({len(batch)} events): {e}")
+            return False
+
+        ms = (time.monotonic() - started) * 1000
+        self._backoff = 0.0
+        self.metrics["flushes"] += 1
+        self.metrics["last_flush_ms"] = round(ms, 2)
+        self.metrics["max_flush_ms"] = round(max(self.metrics["max_flush_ms"], ms), 2)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            **self.metrics,
+            "depth": self.depth(),
+            "by_collection": {k: len(q) for k, q in self.queues.items()},
+            "max_queue": MAX_QUEUE,
+            "flush_size": FLUSH_SIZE,
+            "flush_interval_sec": FLUSH_INTERVAL_SEC,
+            "running": bool(self._task and not self._task.done()),
+        }
+
+
+event_buffer = EventBuffer()
+
+
+async def ensure_event_collections(db):
+    """
+    Create analytics collections as time-series when ANALYTICS_TIMESERIES=1.
+    Only applies to collections that do not exist yet; existing ones keep
+    their layout.
+    """
+    if os.environ.get("ANALYTICS_TIMESERIES", "0") != "1":
+        return
+    existing = set(await db.list_collection_names())
+    for name, (time_field, meta_field) in TIMESERIES.items():
+        if name in existing:
+            continue
+        try:
+            await db.create_collection(
+                name,
+                timeseries={"timeField": time_field, "metaField": meta_field, "granularity": "seconds"},
+            )
+            logger.info(f"Created time-series collection {name}")
+        except Exception as e:
+            logger.warning(f"Time-series collection {name} not created: {e}")
@@ -0,0 +1,238 @@
+"""
+Analytics Rollup - incremental sessionization of raw events
+
+Admin analytics used to aggregate the raw event streams on every request.
+This job folds new events into small per-day aggregates instead:
+
+analytics_rollups  {kind, day, key} -> counters
+    page_views  key ""            n
+    visitor     key user_id       n
+    sessions    key ""            n, dur_n, dur_sum, bounced   (session_end)
+    page        key page_path     leaves, time_n, time_sum, time_min, time_max
+    cart        key product_id    n
+    flow        key "a → b"       n                             (page transitions)
+    funnel      key event         n                             (events collection)
+
+analytics_sessions keeps the last page per session so transitions that
+span two job runs are still counted.
+
+Progress is tracked per source collection as a (ts, _id) watermark in
+analytics_rollup_state. Events younger than LAG_SEC are left for the next
+run so late buffered writes are not skipped. Rollups are applied before
+the watermark moves (at-least-once).
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from core.dates import as_datetime, to_date_expr, utcnow
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+MAX_BATCHES_PER_RUN = 50
+LAG_SEC = 120
+SESSION_TTL_SEC = 2 * 86400
+
+SOURCES = {
+    "analytics_events": {
+        "_id": 1, "ts": 1, "event_type": 1, "user_id": 1, "session_id": 1, "page_path": 1,
+        "time_spent": 1, "product_id": 1, "session_duration": 1, "pages_viewed": 1,
+    },
+    "events": {"_id": 1, "ts": 1, "event": 1},
+}
+
+
+def day_key(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%d")
+
+
+def _num(v) -> Optional[float]:
+    return v if isinstance(v, (int, float)) and not isinstance(v, bool) else None
+
+
+class _Acc:
+    """In-memory increments for one batch, written with one bulk_write"""
+
+    def __init__(self):
+        self.rows: Dict[Tuple[str, str, str], dict] = {}
+
+    def _row(self, kind: str, day: str, key) -> dict:
+        k = (kind, day, "" if key is None else str(key))
+        if k not in self.rows:
+            self.rows[k] = {"inc": {}, "min": {}, "max": {}}
+        return self.rows[k]
+
+    def inc(self, kind: str, day: str, key, **fields):
+        row = self._row(kind, day, key)
+        for f, v in fields.items():
+            row["inc"][f] = row["inc"].get(f, 0) + v
+
+    def minmax(self, kind: str, day: str, key, field: str, value):
+        row = self._row(kind, day, key)
+        row["min"][field] = min(row["min"].get(field, value), value)
+        row["max"][field] = max(row["max"].get(field, value), value)
+
+    def ops(self) -> List[UpdateOne]:
+        out = []
+        for (kind, day, key), row in self.rows.items():
+            update = {"$inc": row["inc"]}
+            if row["min"]:
+                update["$min"] = {f"{f}_min": v for f, v in row["min"].items()}
+                update["$max"] = {f"{f}_max": v for f, v in row["max"].items()}
+            out.append(UpdateOne({"kind": kind, "day": day, "key": key}, update, upsert=True))
+        return out
+
+
+class AnalyticsRollupJob:
+    def __init__(self, db):
+        self.db = db
+        self.rollups = db["analytics_rollups"]
+        self.sessions = db["analytics_sessions"]
+        self.state = db["analytics_rollup_state"]
+
+    async def ensure_indexes(self):
+        await self.rollups.create_index([("kind", 1), ("day", 1), ("key", 1)], unique=True)
+        await self.sessions.create_index("session_id", unique=True)
+        await self.sessions.create_index("last_at", expireAfterSeconds=SESSION_TTL_SEC)
+        for source in SOURCES:
+            await self.db[source].create_index([("ts", 1), ("_id", 1)])
+
+    async def _backfill_ts(self):
+        """Legacy analytics_events carry only an ISO created_at; derive ts once"""
+        try:
+            await self.db.analytics_events.update_many(
+                {"ts": {"$exists": False}, "created_at": {"$type": "string"}},
+                [{"$set": {"ts": to_date_expr("$created_at")}}],
+            )
+        except Exception as e:
+            # time-series layouts reject measurement-field updates; they always have ts
+            logger.debug(f"analytics_events ts backfill skipped: {e}")
+
+    async def get_watermark(self, source: str) -> Optional[datetime]:
+        doc = await self.state.find_one({"_id": source}, {"ts": 1})
+        return as_datetime((doc or {}).get("ts"))
+
+    async def run_once(self) -> dict:
+        await self._backfill_ts()
+        return {source: await self._run_source(source) for source in SOURCES}
+
+    async def _run_source(self, source: str) -> dict:
+        st = await self.state.find_one({"_id": source}) or {}
+        wm_ts, wm_id = st.get("ts"), st.get("last_id")
+        upper = utcnow() - timedelta(seconds=LAG_SEC)
+
+        processed = batches = 0
+        while batches < MAX_BATCHES_PER_RUN:
+            q = {"ts": {"$lt": upper}}
+            if wm_ts is not None:
+                q = {"ts": {"$lt": upper}, "$or": [
+                    {"ts": {"$gt": wm_ts}},
+                    {"ts": wm_ts, "_id": {"$gt": wm_id}},
+                ]}
+            docs = await self.db[source].find(q, SOURCES[source]) \
+                .sort([("ts", 1), ("_id", 1)]).limit(BATCH_SIZE).to_list(BATCH_SIZE)
+            if not docs:
+                break
+
+            acc = _Acc()
+            if source == "events":
+                self._fold_funnel(docs, acc)
+            else:
+                await self._fold_site(docs, acc)
+            ops = acc.ops()
+            if ops:
+                await self.rollups.bulk_write(ops, ordered=False)
+
+            wm_ts, wm_id = docs[-1]["ts"], docs[-1]["_id"]
+            await self.state.update_one(
+                {"_id": source},
+                {"$set": {"ts": wm_ts, "last_id": wm_id, "updated_at": utcnow()},
+                 "$inc": {"processed": len(docs)}},
+                upsert=True,
+            )
+            processed += len(docs)
+            batches += 1
+            if len(docs) < BATCH_SIZE:
+                break
+
+        return {"processed": processed, "batches": batches, "watermark": wm_ts}
+
+    def _fold_funnel(self, docs: List[dict], acc: _Acc):
+        for d in docs:
+            ts = as_datetime(d.get("ts"))
+            if ts and d.get("event"):
+                acc.inc("funnel", day_key(ts), d["event"], n=1)
+
+    async def _fold_site(self, docs: List[dict], acc: _Acc):
+        sids = list({d["session_id"] for d in docs if d.get("event_type") == "page_view" and d.get("session_id")})
+        last_page = {}
+        if sids:
+            async for s in self.sessions.find({"session_id": {"$in": sids}}, {"_id": 0, "session_id": 1, "last_page": 1}):
+                last_page[s["session_id"]] = s.get("last_page")
+        touched = {}
+
+        for d in docs:
+            ts = as_datetime(d.get("ts"))
+            if not ts:
+                continue
+            day = day_key(ts)
+            et = d.get("event_type")
+
+            if et == "page_view":
+                acc.inc("page_views", day, "", n=1)
+                if d.get("user_id"):
+                    acc.inc("visitor", day, d["user_id"], n=1)
+                sid, page = d.get("session_id"), d.get("page_path")
+                if sid:
+                    prev = last_page.get(sid)
+                    if prev is not None and page is not None:
+                        acc.inc("flow", day, f"{prev} → {page}", n=1)
+                    last_page[sid] = page
+                    touched[sid] = ts
+
+            elif et == "session_end":
+                duration = _num(d.get("session_duration"))
+                pages = _num(d.get("pages_viewed"))
+                acc.inc(
+                    "sessions", day, "", n=1,
+                    dur_n=1 if duration is not None else 0,
+                    dur_sum=duration or 0,
+                    bounced=1 if pages is None or pages <= 1 else 0,
+                )
+
+            elif et == "page_leave" and d.get("page_path"):
+                acc.inc("page", day, d["page_path"], leaves=1)
+                spent = _num(d.get("time_spent"))
+                if spent is not None and spent > 0:
+                    acc.inc("page", day, d["page_path"], time_n=1, time_sum=spent)
+                    acc.minmax("page", day, d["page_path"], "time", spent)
+
+            elif et == "add_to_cart" and d.get("product_id"):
+                acc.inc("cart", day, d["product_id"], n=1)
+
+        if touched:
+            await self.sessions.bulk_write([
+                UpdateOne(
+                    {"session_id": sid},
+                    {"$set": {"last_page": last_page.get(sid), "last_at": ts}},
+                    upsert=True,
+                )
+                for sid, ts in touched.items()
+            ], ordered=False)
+
+
+async def sum_by_key(db, kind: str, since_day: Optional[str] = None, fields=("n",), match: Optional[dict] = None) -> List[dict]:
+    """Totals per key over a day range of one rollup kind"""
+    q = {"kind": kind, **(match or {})}
+    if since_day:
+        q["day"] = {"$gte": since_day}
+    group = {"_id": "$key"}
+    for f in fields:
+        group[f] = {"$sum": f"${f}"}
+    if "time_n" in fields:
+        group["time_min"] = {"$min": "$time_min"}
+        group["time_max"] = {"$max": "$time_max"}
+    return await db.analytics_rollups.aggregate([{"$match": q}, {"$group": group}]).to_list(None)
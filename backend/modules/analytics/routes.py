@@ -1,12 +1,16 @@
 """
 Analytics Routes - Event tracking and funnel endpoints
 """
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Depends, Request, HTTPException
 from datetime import datetime, timezone
 from typing import Optional
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from core.dates import date_range
+from core.security import get_current_admin
+from .ingest import event_buffer, MAX_BATCH_EVENTS
+
 router = APIRouter()
 
 # Database connection
@@ -16,6 +20,29 @@ client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 
 
+def _event_doc(payload: dict, req: Request) -> dict:
+    event_data = {
+        "event": str(payload.get("event", "unknown")),
+        "ts": datetime.now(timezone.utc),
+        "sid": str(payload.get("sid") or payload.get("session_id") or "anon"),
+        "user_id": payload.get("user_id"),
+        "phone": payload.get("phone"),
+        "page": payload.get("page") or payload.get("page_path"),
+        "ref": payload.get("ref") or payload.get("referrer"),
+        "ua": req.headers.get("user-agent"),
+        "ip": req.client.host if req.client else None,
+        "product_id": payload.get("product_id"),
+        "order_id": payload.get("order_id"),
+        "props": payload.get("props") or payload.get("metadata") or {},
+    }
+    
+    # Add extra fields from payload
+    for key in ["event_type", "page_title", "time_spent", "quantity", "price"]:
+        if key in payload:
+            event_data["props"][key] = payload[key]
+    return event_data
+
+
 @router.post("/api/v2/analytics/event")
 async def track_event(payload: dict, req: Request):
     """
@@ -24,33 +51,33 @@ async def track_event(payload: dict, req: Request):
             order_created, payment_created, payment_paid
     """
     try:
-        event_data = {
-            "event": str(payload.get("event", "unknown")),
-            "ts": datetime.now(timezone.utc),
-            "sid": str(payload.get("sid") or payload.get("session_id") or "anon"),
-            "user_id": payload.get("user_id"),
-            "phone": payload.get("phone"),
-            "page": payload.get("page") or payload.get("page_path"),
-            "ref": payload.get("ref") or payload.get("referrer"),
-            "ua": req.headers.get("user-agent"),
-            "ip": req.client.host if req.client else None,
-            "product_id": payload.get("product_id"),
-            "order_id": payload.get("order_id"),
-            "props": payload.get("props") or payload.get("metadata") or {},
-        }
-        
-        # Add extra fields from payload
-        for key in ["event_type", "page_title", "time_spent", "quantity", "price"]:
-            if key in payload:
-                event_data["props"][key] = payload[key]
-        
-        await db.events.insert_one(event_data)
-        return {"ok": True}
+        accepted = await event_buffer.offer("events", [_event_doc(payload, req)])
+        return {"ok": accepted == 1}
     except Exception as e:
         print(f"Analytics error: {e}")
         return {"ok": False, "error": str(e)}
 
 
+@router.post("/api/v2/analytics/events")
+async def track_events(payload: dict, req: Request):
+    """Track a batch of events: {"events": [...]} (max 100 per request)"""
+    events = payload.get("events") or []
+    if not isinstance(events, list) or len(events) > MAX_BATCH_EVENTS:
+        raise HTTPException(status_code=400, detail=f"events must be a list of up to {MAX_BATCH_EVENTS} items")
+    
+    docs = [_event_doc(e, req) for e in events if isinstance(e, dict)]
+    accepted = await event_buffer.offer("events", docs) if docs else 0
+    if docs and accepted == 0:
+        raise HTTPException(status_code=429, detail="Analytics queue full", headers={"Retry-After": "5"})
+    return {"ok": True, "accepted": accepted, "dropped": len(docs) - accepted}
+
+
+@router.get("/api/v2/analytics/ingest/stats")
+async def ingest_stats(current_user: dict = Depends(get_current_admin)):
+    """Event buffer counters: queued / flushed / dropped, depth, flush timings"""
+    return event_buffer.stats()
+
+
 @router.get("/api/v2/analytics/funnel")
 async def get_funnel(days: int = 7):
     """Get funnel analytics for specified days"""
@@ -97,13 +124,11 @@ async def admin_overview(days: int = 7):
     })
     
     # Get orders
-    orders = await db.orders.count_documents({
-        "created_at": {"$gte": since}
-    })
+    orders = await db.orders.count_documents(date_range("created_at", gte=since))
     
     # Get revenue
     revenue_pipeline = [
-        {"$match": {"created_at": {"$gte": since}, "payment_status": "paid"}},
+        {"$match": {**date_range("created_at", gte=since), "payment_status": "paid"}},
         {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
     ]
     revenue_result = await db.orders.aggregate(revenue_pipeline).to_list(1)
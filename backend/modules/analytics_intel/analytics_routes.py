@@ -6,6 +6,7 @@ from core.db import db
 from core.security import get_current_admin
 from modules.analytics_intel.analytics_engine import AnalyticsEngine
 from modules.analytics_intel.analytics_repo import AnalyticsRepo
+from modules.analytics_intel.daily_builder import BACKFILL_CONCURRENCY
 from datetime import datetime, timezone, timedelta
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
@@ -28,19 +29,13 @@ async def cohorts(months: int = 12, current_user: dict = Depends(get_current_adm
 
 @router.post("/daily/rebuild")
 async def rebuild_daily(body: dict, current_user: dict = Depends(get_current_admin)):
-    """Rebuild daily snapshots for N days"""
+    """Rebuild daily snapshots for N days (in parallel, `concurrency` days at a time)"""
     days = int(body.get("days", 30))
+    concurrency = int(body.get("concurrency", BACKFILL_CONCURRENCY))
     eng = AnalyticsEngine(db)
-    now = datetime.now(timezone.utc)
-    results = []
-    for i in range(days):
-        d = now - timedelta(days=i)
-        try:
-            result = await eng.build_daily(d)
-            results.append(result)
-        except Exception as e:
-            results.append({"day": d.date().isoformat(), "error": str(e)})
-    return {"ok": True, "rebuilt": len(results), "results": results[:5]}
+    results = await eng.backfill_daily(days, concurrency)
+    failed = [r for r in results if r.get("error")]
+    return {"ok": not failed, "rebuilt": len(results) - len(failed), "failed": failed[:5], "results": results[:5]}
 
 
 @router.get("/revenue-trend")
@@ -0,0 +1,306 @@
+"""
+O18: Incremental analytics_daily builder
+
+analytics_daily rows are maintained from order deltas instead of being
+re-aggregated per request:
+
+- every order's contribution to its day (orders, revenue, funnel counters)
+  is kept in analytics_order_facts; run_once() reads orders touched since
+  the watermark, diffs them against their facts and $inc's the day rows,
+  so late status changes land on the day the order was created
+- the first run rebuilds the last SEED_DAYS days (facts + rows); an order
+  without a fact on a day before the seed was counted by the row it sits in,
+  so its fact is recorded without moving that row
+- rebuild_day() recomputes one day from orders (facts + row); backfill()
+  runs it over many days with a concurrency limit
+- range() sums stored rows and adds the not-yet-applied delta of orders
+  changed since the watermark, so any range costs one indexed read of
+  range_days rows plus a small tail query
+
+Only one run_once() should run at a time (the analytics_daily_live job
+holds a lease); rebuild_day() may run next to it for past days.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+
+from core.dates import as_datetime, date_range, utcnow
+from modules.orders.order_status import (
+    OrderStatus, PAID_OR_BEYOND, PaymentStatus, canonical_payment_status, canonical_status,
+)
+
+logger = logging.getLogger(__name__)
+
+STATE_ID = "analytics_daily"
+BATCH = 500
+WATERMARK_OVERLAP = timedelta(seconds=30)
+BACKFILL_CONCURRENCY = 4
+SEED_DAYS = 90
+
+FUNNEL = ("paid", "awaiting_payment", "processing", "shipped", "delivered", "cancels", "returns")
+COUNTERS = ("orders", "revenue") + FUNNEL
+PROJECTION = {"_id": 0, "id": 1, "created_at": 1, "status": 1, "status_c": 1,
+              "payment_status": 1, "payment_status_c": 1, "total_amount": 1}
+
+_PAID = set(PAID_OR_BEYOND)
+_BY_STATUS = {
+    OrderStatus.AWAITING_PAYMENT.value: "awaiting_payment",
+    OrderStatus.PROCESSING.value: "processing",
+    OrderStatus.SHIPPED.value: "shipped",
+    OrderStatus.DELIVERED.value: "delivered",
+}
+
+
+def order_fact(order: dict) -> Optional[Tuple[str, Dict[str, float]]]:
+    """(day, counters) an order contributes to analytics_daily (same rules as build_daily)"""
+    created = as_datetime(order.get("created_at"))
+    if not order.get("id") or created is None:
+        return None
+    # the raw status wins: a writer that skipped status_fields leaves status_c stale
+    status_c = canonical_status(order.get("status")) or order.get("status_c")
+    payment_c = canonical_payment_status(order.get("payment_status")) or order.get("payment_status_c")
+    v = {k: 0 for k in COUNTERS}
+    v["orders"] = 1
+    if status_c in _PAID:
+        v["revenue"] = round(float(order.get("total_amount") or 0), 2)
+    if payment_c == PaymentStatus.PAID.value:
+        v["paid"] = 1
+    if status_c in _BY_STATUS:
+        v[_BY_STATUS[status_c]] = 1
+    if order.get("status") in ("cancelled", "CANCELLED"):
+        v["cancels"] = 1
+    if order.get("status") in ("returned", "RETURNED"):
+        v["returns"] = 1
+    return created.date().isoformat(), v
+
+
+def _add(into: Dict[str, float], v: Dict[str, float], sign: int = 1):
+    for k in COUNTERS:
+        into[k] = into.get(k, 0) + sign * v.get(k, 0)
+
+
+def _row_inc(delta: Dict[str, float]) -> dict:
+    inc = {}
+    for k in COUNTERS:
+        n = delta.get(k, 0)
+        if not n:
+            continue
+        field = f"funnel.{k}" if k in FUNNEL else k
+        inc[field] = round(n, 2) if k == "revenue" else int(n)
+    return inc
+
+
+class DailyBuilder:
+    def __init__(self, db):
+        self.db = db
+        self.orders = db["orders"]
+        self.daily = db["analytics_daily"]
+        self.facts = db["analytics_order_facts"]
+        self.users = db["users"]
+        self.state = db["analytics_state"]
+
+    async def ensure_indexes(self):
+        await self.daily.create_index("day", unique=True)
+        await self.facts.create_index("day")
+
+    # ---------- deltas ----------
+
+    async def _diff(self, orders: List[dict],
+                    seed_day: Optional[str] = None) -> Tuple[list, Dict[str, Dict[str, float]]]:
+        """Fact writes and per-day counter deltas for a batch of orders (days before seed_day see above)"""
+        facts = {}
+        for o in orders:
+            f = order_fact(o)
+            if f:
+                facts[o["id"]] = f
+        old = {
+            d["_id"]: d
+            async for d in self.facts.find({"_id": {"$in": list(facts)}})
+        } if facts else {}
+
+        ops, deltas = [], {}
+        for oid, (day, v) in facts.items():
+            prev = old.get(oid)
+            if prev and prev.get("day") == day and all(prev.get("v", {}).get(k, 0) == v[k] for k in COUNTERS):
+                continue
+            ops.append(ReplaceOne({"_id": oid}, {"_id": oid, "day": day, "v": v}, upsert=True))
+            if not prev and seed_day and day < seed_day:
+                # row was aggregated before facts existed and already counts this order
+                continue
+            if prev:
+                _add(deltas.setdefault(prev["day"], {}), prev.get("v") or {}, -1)
+            _add(deltas.setdefault(day, {}), v)
+        return ops, {d: x for d, x in deltas.items() if _row_inc(x)}
+
+    async def _apply_rows(self, deltas: Dict[str, Dict[str, float]]):
+        now = utcnow()
+        ops = []
+        for day, delta in deltas.items():
+            ops.append(UpdateOne(
+                {"day": day},
+                {"$inc": _row_inc(delta), "$set": {"updated_at": now},
+                 "$setOnInsert": {"created_at": now, "sla": {"avg_h": 0, "median_h": 0, "p95_h": 0}}},
+                upsert=True,
+            ))
+            ops.append(UpdateOne({"day": day}, [{"$set": {"aov": {"$cond": [
+                {"$gt": ["$orders", 0]}, {"$divide": ["$revenue", "$orders"]}, 0
+            ]}}}]))
+        if ops:
+            await self.daily.bulk_write(ops, ordered=True)
+
+    def _changed_since(self, since: datetime) -> dict:
+        return {"$or": [date_range("updated_at", gte=since), date_range("created_at", gte=since)]}
+
+    async def run_once(self, max_batches: int = 20) -> dict:
+        """Apply orders touched since the watermark to their day rows"""
+        st = await self.state.find_one({"_id": STATE_ID}) or {}
+        since = as_datetime(st.get("since"))
+        started = utcnow()
+
+        if since is None:
+            # first run: recent rows and their facts are built from scratch, then tailed
+            days = [started - timedelta(days=i) for i in range(1, SEED_DAYS)]
+            await self.backfill(days)
+            await self.rebuild_day(started, with_risk=True)
+            seed_day = days[-1].date().isoformat() if days else started.date().isoformat()
+            await self.state.update_one({"_id": STATE_ID}, {"$set": {
+                "since": started, "seed_day": seed_day, "updated_at": utcnow(),
+            }}, upsert=True)
+            return {"applied": 0, "days": SEED_DAYS, "seeded": True}
+
+        seed_day = st.get("seed_day")
+        if not seed_day:
+            # seeded before seed_day was kept: only that run's day had facts
+            seed_day = started.date().isoformat()
+            await self.state.update_one({"_id": STATE_ID}, {"$set": {"seed_day": seed_day}})
+
+        q = self._changed_since(since - WATERMARK_OVERLAP)
+        last_id = None
+        applied = batches = 0
+        days = set()
+        while batches < max_batches:
+            page_q = {**q, "_id": {"$gt": last_id}} if last_id is not None else q
+            docs = await self.orders.find(page_q, {**PROJECTION, "_id": 1}) \
+                .sort("_id", 1).limit(BATCH).to_list(BATCH)
+            if not docs:
+                break
+            ops, deltas = await self._diff(docs, seed_day)
+            if ops:
+                await self.facts.bulk_write(ops, ordered=False)
+                await self._apply_rows(deltas)
+            applied += len(ops)
+            days.update(deltas)
+            last_id = docs[-1]["_id"]
+            batches += 1
+            if len(docs) < BATCH:
+                last_id = None
+                break
+            await asyncio.sleep(0)
+
+        if last_id is None:
+            await self.state.update_one(
+                {"_id": STATE_ID}, {"$set": {"since": started, "updated_at": utcnow()}}, upsert=True
+            )
+        return {"applied": applied, "days": len(days), "complete": last_id is None}
+
+    async def live_delta(self) -> Dict[str, Dict[str, float]]:
+        """Per-day deltas of orders changed since the watermark, not yet in the rows"""
+        st = await self.state.find_one({"_id": STATE_ID}) or {}
+        since = as_datetime(st.get("since"))
+        if since is None:
+            return {}
+        docs = await self.orders.find(self._changed_since(since - WATERMARK_OVERLAP), PROJECTION) \
+            .to_list(None)
+        _, deltas = await self._diff(docs, st.get("seed_day"))
+        return deltas
+
+    # ---------- full rebuilds ----------
+
+    async def _risk_dist(self) -> dict:
+        risk_pipe = [
+            {"$match": {"risk.score": {"$exists": True}}},
+            {"$group": {"_id": "$risk.band", "cnt": {"$sum": 1}}},
+        ]
+        risk_rows = await self.users.aggregate(risk_pipe).to_list(10)
+        return {r["_id"]: int(r["cnt"]) for r in risk_rows if r.get("_id")}
+
+    async def rebuild_day(self, day: datetime, with_risk: bool = False) -> dict:
+        """Recompute one day's facts and row from orders"""
+        start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=1)
+        day_key = start.date().isoformat()
+
+        totals = {k: 0 for k in COUNTERS}
+        ops, seen = [], set()
+        async for o in self.orders.find(date_range("created_at", gte=start, lt=end), PROJECTION):
+            f = order_fact(o)
+            if not f or f[0] != day_key:
+                continue
+            _add(totals, f[1])
+            seen.add(o["id"])
+            ops.append(ReplaceOne({"_id": o["id"]}, {"_id": o["id"], "day": day_key, "v": f[1]}, upsert=True))
+        async for d in self.facts.find({"day": day_key}, {"_id": 1}):
+            if d["_id"] not in seen:
+                ops.append(DeleteOne({"_id": d["_id"]}))
+        if ops:
+            await self.facts.bulk_write(ops, ordered=False)
+
+        orders = int(totals["orders"])
+        revenue = round(float(totals["revenue"]), 2)
+        now = utcnow()
+        doc = {
+            "day": day_key,
+            "revenue": revenue,
+            "orders": orders,
+            "aov": (revenue / orders) if orders else 0.0,
+            "funnel": {k: int(totals[k]) for k in FUNNEL},
+            # Simple SLA calculation (placeholder)
+            "sla": {"avg_h": 0, "median_h": 0, "p95_h": 0},
+            "updated_at": now,
+        }
+        if with_risk:
+            # point-in-time snapshot, only meaningful for the day being closed
+            doc["risk_dist"] = await self._risk_dist()
+        await self.daily.update_one(
+            {"day": day_key}, {"$set": doc, "$setOnInsert": {"created_at": now}}, upsert=True
+        )
+        return {"day": day_key, "ok": True, "orders": orders}
+
+    async def backfill(self, days: Iterable[datetime], concurrency: int = BACKFILL_CONCURRENCY) -> List[dict]:
+        """Rebuild many days, at most `concurrency` at a time"""
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(d: datetime) -> dict:
+            async with sem:
+                try:
+                    return await self.rebuild_day(d)
+                except Exception as e:
+                    logger.error(f"Analytics backfill {d.date().isoformat()} failed: {e}")
+                    return {"day": d.date().isoformat(), "error": str(e)}
+
+        return list(await asyncio.gather(*(one(d) for d in days)))
+
+    # ---------- reads ----------
+
+    async def range(self, start_day: str, end_day: str) -> Tuple[List[dict], bool]:
+        """Stored rows in [start_day, end_day] with the live delta folded in; bool = any data"""
+        rows = await self.daily.find(
+            {"day": {"$gte": start_day, "$lte": end_day}}, {"_id": 0}
+        ).sort("day", 1).to_list(None)
+        by_day = {r["day"]: r for r in rows}
+
+        for day, delta in (await self.live_delta()).items():
+            if not (start_day <= day <= end_day):
+                continue
+            row = by_day.setdefault(day, {"day": day, "revenue": 0, "orders": 0, "funnel": {}})
+            row["revenue"] = round(float(row.get("revenue", 0)) + delta.get("revenue", 0), 2)
+            row["orders"] = int(row.get("orders", 0)) + int(delta.get("orders", 0))
+            funnel = dict(row.get("funnel") or {})
+            for k in FUNNEL:
+                funnel[k] = int(funnel.get(k, 0)) + int(delta.get(k, 0))
+            row["funnel"] = funnel
+
+        return [by_day[d] for d in sorted(by_day)], bool(by_day)
@@ -9,6 +9,7 @@ import logging
 from modules.bot.bot_settings_repo import BotSettingsRepo
 from modules.bot.bot_alerts_repo import BotAlertsRepo
 from .automation_repo import AutomationEventsRepo
+from core.dates import date_range
 
 logger = logging.getLogger(__name__)
 
@@ -242,7 +243,7 @@ class AutomationEngine:
         hour_ago = (now - timedelta(hours=1)).isoformat()
 
         pipeline = [
-            {"$match": {"created_at": {"$gte": hour_ago}, "status": "FAILED"}},
+            {"$match": {**date_range("created_at", gte=hour_ago), "status": "FAILED"}},
             {"$group": {"_id": "$channel", "count": {"$sum": 1}}},
         ]
         
@@ -127,6 +127,24 @@ class AlertsService:
             reply_markup=self._ttn_keyboard(order_id, ttn)
         )
 
+    async def alert_ttn_bulk_done(self, job: dict):
+        """Alert: bulk TTN job finished (one message instead of one per order)"""
+        text = (
+            f"📦 <b>Пакетне створення ТТН завершено</b>\n\n"
+            f"Замовлень: {job.get('total', 0)}\n"
+            f"✅ Створено: {job.get('created', 0)}\n"
+            f"♻️ Вже були: {job.get('existing', 0)}\n"
+            f"❌ Помилки: {job.get('failed', 0)}\n"
+            f"🖨 PDF етикеток: {len(job.get('labels') or [])}"
+        )
+
+        await self.alerts_repo.enqueue(
+            alert_type="ТТН_ПАКЕТ",
+            text=text,
+            dedupe_key=f"ttn:bulk:{job['id']}",
+            payload={"job_id": job["id"]},
+        )
+
     async def alert_delivery_delay(self, order_id: str, ttn: str, hours: float):
         """Alert: Delivery delayed"""
         text = (
@@ -17,6 +17,7 @@ ROOT_DIR = Path(__file__).parent.parent.parent
 load_dotenv(ROOT_DIR / '.env')
 
 # Import bot modules
+from core.dates import date_range
 from modules.bot.bot_settings_repo import BotSettingsRepo
 from modules.bot.bot_alerts_repo import BotAlertsRepo
 from modules.bot.bot_sessions_repo import BotSessionsRepo
@@ -460,11 +461,9 @@ async def menu_analytics(message: types.Message):
     # Fallback to real-time if no daily snapshot
     if not today_stats:
         # Calculate real-time
-        orders_today = await db["orders"].count_documents({
-            "created_at": {"$gte": today}
-        })
+        orders_today = await db["orders"].count_documents(date_range("created_at", gte=today))
         revenue_pipeline = [
-            {"$match": {"created_at": {"$gte": today}, "payment_status": {"$in": ["paid", "completed"]}}},
+            {"$match": {**date_range("created_at", gte=today), "payment_status": {"$in": ["paid", "completed"]}}},
             {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
         ]
         rev_result = await db["orders"].aggregate(revenue_pipeline).to_list(1)
@@ -4,6 +4,7 @@ O9: Telegram Sender - sends messages to Telegram via Bot API
 import httpx
 import logging
 from typing import Dict, Any, Optional
+from core.metrics import outbound
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +31,7 @@ class TelegramSender:
         if reply_markup:
             payload["reply_markup"] = reply_markup
         
-        async with httpx.AsyncClient(timeout=25) as client:
+        async with outbound("telegram", "sendMessage"), httpx.AsyncClient(timeout=25) as client:
             r = await client.post(f"{self.base}/sendMessage", json=payload)
             data = r.json()
             
@@ -57,7 +58,7 @@ class TelegramSender:
         if reply_markup:
             payload["reply_markup"] = reply_markup
         
-        async with httpx.AsyncClient(timeout=25) as client:
+        async with outbound("telegram", "editMessageText"), httpx.AsyncClient(timeout=25) as client:
             r = await client.post(f"{self.base}/editMessageText", json=payload)
             return r.json()
 
@@ -75,6 +76,6 @@ class TelegramSender:
         if text:
             payload["text"] = text
         
-        async with httpx.AsyncClient(timeout=10) as client:
+        async with outbound("telegram", "answerCallbackQuery"), httpx.AsyncClient(timeout=10) as client:
             r = await client.post(f"{self.base}/answerCallbackQuery", json=payload)
             return r.json()
@@ -175,7 +175,7 @@ class BroadcastWizard:
         customers = await self.customers.find(flt, {"_id": 0}).limit(5000).to_list(5000)
         
         # Enqueue notifications
-        now = datetime.now(timezone.utc).isoformat()
+        now = datetime.now(timezone.utc)
         inserted = 0
         
         for c in customers:
@@ -183,7 +183,7 @@ class BroadcastWizard:
             if not to:
                 continue
             
-            dedupe = f"BLAST:{now[:10]}:{segment}:{channel}:{to}"
+            dedupe = f"BLAST:{now.date().isoformat()}:{segment}:{channel}:{to}"
             
             doc = {
                 "id": str(uuid.uuid4()),
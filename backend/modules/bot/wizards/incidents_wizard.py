@@ -10,6 +10,7 @@ from ..bot_sessions_repo import BotSessionsRepo
 from ..bot_audit_repo import BotAuditRepo
 from ..bot_actions_service import BotActionsService
 from ..bot_keyboards import incident_actions_kb, cancel_kb
+from core.dates import date_range
 
 logger = logging.getLogger(__name__)
 
@@ -60,9 +61,9 @@ class IncidentsWizard:
             })
         
         # 2) Failed notifications (last hour)
-        hour_ago = (now - timedelta(hours=1)).isoformat()
+        hour_ago = now - timedelta(hours=1)
         failed = await self.notifs.find(
-            {"status": "FAILED", "created_at": {"$gte": hour_ago}},
+            {"status": "FAILED", **date_range("created_at", gte=hour_ago)},
             {"_id": 0, "id": 1, "channel": 1, "to": 1}
         ).sort("created_at", -1).limit(10).to_list(10)
         
@@ -8,6 +8,8 @@ from datetime import datetime, timezone
 
 from core.db import db
 from core.security import get_current_user
+from modules.growth.scheduler import arm_abandoned_cart, disarm_abandoned_cart
+from modules.products.cards import WITHOUT_CARD
 
 router = APIRouter(prefix="/cart", tags=["Cart"])
 
@@ -46,7 +48,7 @@ async def get_cart(current_user: dict = Depends(get_current_user)):
     total = 0
     
     for item in cart.get("items", []):
-        product = await db.products.find_one({"id": item["product_id"]}, {"_id": 0})
+        product = await db.products.find_one({"id": item["product_id"]}, WITHOUT_CARD)
         if product:
             items.append(CartItemResponse(
                 product_id=item["product_id"],
@@ -102,6 +104,7 @@ async def add_to_cart(
                     "$set": {"updated_at": datetime.now(timezone.utc)}
                 }
             )
+    await arm_abandoned_cart(db, user_id)
     
     return {"message": "Added to cart"}
 
@@ -148,4 +151,5 @@ async def clear_cart(current_user: dict = Depends(get_current_user)):
         {"user_id": current_user["id"]},
         {"$set": {"items": [], "updated_at": datetime.now(timezone.utc)}}
     )
+    await disarm_abandoned_cart(db, current_user["id"])
     return {"message": "Cart cleared"}
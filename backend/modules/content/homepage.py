@@ -0,0 +1,145 @@
+"""
+Homepage payload - every homepage block in one cached response
+
+- the blocks (slides, promotions, popular categories, offers, sections,
+  featured reviews, category tree) are loaded concurrently and serialized
+  once; hits are served from process memory with an ETag, so a returning
+  browser gets a 304 and a cached worker does no DB calls at all
+- admin writes to any block call invalidate_homepage(): the local copy is
+  dropped at once and a version in content_state is bumped for the other
+  workers, which look at it at most every VERSION_CHECK_SEC
+- MAX_AGE_SEC bounds staleness for changes that do not go through the admin
+  endpoints (e.g. a renamed product shown in a featured review)
+- a build in which a block failed is served but not cached
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+from core.dates import utcnow
+
+logger = logging.getLogger(__name__)
+
+VERSION_CHECK_SEC = 2.0
+MAX_AGE_SEC = 300
+STATE_ID = "homepage"
+
+Blocks = Dict[str, Callable[[], Awaitable[Any]]]
+
+
+class HomepagePayload:
+    __slots__ = ("body", "etag", "built_at")
+
+    def __init__(self, body: bytes, built_at: datetime):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.built_at = built_at
+
+
+async def assemble(blocks: Blocks) -> tuple:
+    """Run all block loaders concurrently; returns (payload dict, complete)"""
+    names = list(blocks)
+    results = await asyncio.gather(*(blocks[n]() for n in names), return_exceptions=True)
+    out, complete = {}, True
+    for name, res in zip(names, results):
+        if isinstance(res, BaseException):
+            logger.error(f"Homepage block {name} failed: {res}")
+            out[name] = []
+            complete = False
+        else:
+            out[name] = res
+    return out, complete
+
+
+def _serialize(data: dict) -> bytes:
+    # same encoding FastAPI's JSONResponse uses
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class HomepageCache:
+    def __init__(self, db):
+        self.state = db["content_state"]
+        self.payload: Optional[HomepagePayload] = None
+        self.version: Optional[int] = None
+        self.built_ts = 0.0
+        self.checked_ts = 0.0
+        # bumped by local invalidations so a build racing one is not kept
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def _stored_version(self) -> int:
+        doc = await self.state.find_one({"_id": STATE_ID}, {"version": 1})
+        return int((doc or {}).get("version") or 0)
+
+    async def invalidate(self):
+        """Drop the cached payload here and in every other worker"""
+        self.payload = None
+        self._generation += 1
+        await self.state.update_one(
+            {"_id": STATE_ID},
+            {"$inc": {"version": 1}, "$set": {"updated_at": utcnow()}},
+            upsert=True,
+        )
+
+    def _hit(self) -> bool:
+        now = time.monotonic()
+        return (self.payload is not None and now - self.built_ts < MAX_AGE_SEC
+                and now - self.checked_ts < VERSION_CHECK_SEC)
+
+    async def get(self, blocks: Blocks) -> HomepagePayload:
+        if self._hit():
+            return self.payload
+        async with self._lock:
+            if self._hit():
+                return self.payload
+            version = await self._stored_version()
+            self.checked_ts = time.monotonic()
+            if (self.payload is not None and version == self.version
+                    and self.checked_ts - self.built_ts < MAX_AGE_SEC):
+                return self.payload
+
+            generation = self._generation
+            started = time.monotonic()
+            data, complete = await assemble(blocks)
+            payload = HomepagePayload(_serialize(data), utcnow())
+            if complete and generation == self._generation:
+                self.payload, self.version, self.built_ts = payload, version, time.monotonic()
+            logger.info(f"Homepage built: {len(payload.body)} bytes in {time.monotonic() - started:.3f}s")
+            return payload
+
+
+def homepage_response(request: Request, payload: HomepagePayload) -> Response:
+    """Serve the payload honouring If-None-Match"""
+    # browsers revalidate every time; unchanged pages cost a 304 and no body
+    headers = {"ETag": payload.etag, "Cache-Control": "public, no-cache"}
+    inm = request.headers.get("if-none-match")
+    if inm and (payload.etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*"):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
+
+_cache: Optional[HomepageCache] = None
+
+
+def get_homepage_cache(db) -> HomepageCache:
+    global _cache
+    if _cache is None:
+        _cache = HomepageCache(db)
+    return _cache
+
+
+async def invalidate_homepage(db):
+    """Called from admin writes to any homepage block"""
+    try:
+        await get_homepage_cache(db).invalidate()
+    except Exception as e:
+        logger.warning(f"Homepage invalidation failed: {e}")
@@ -2,6 +2,7 @@
 import uuid
 from datetime import datetime, timezone
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from core.dates import utcnow as utcnow_dt
 
 def utcnow():
     return datetime.now(timezone.utc).isoformat()
@@ -46,7 +47,7 @@ class CRMActionsService:
             "payload": {"text": text},
             "status": "PENDING",
             "attempts": 0,
-            "created_at": utcnow()
+            "created_at": utcnow_dt()
         })
 
     async def queue_email(self, email: str, subject: str, body: str):
@@ -58,5 +59,5 @@ class CRMActionsService:
             "payload": {"subject": subject, "body": body},
             "status": "PENDING",
             "attempts": 0,
-            "created_at": utcnow()
+            "created_at": utcnow_dt()
         })
@@ -0,0 +1,31 @@
+"""
+Nova Poshta printable labels
+
+NP renders markings for many documents in one PDF when their numbers are
+passed comma-separated to the my.novaposhta.ua print endpoint. A batch of
+TTNs is split into chunks of PER_PDF so every URL stays printable (and
+within URL length limits); each chunk is one merged PDF.
+
+The print URL carries the API key, so only the chunks are stored; the URL
+is built when the PDF is fetched (the admin API proxies it).
+"""
+from typing import Dict, List
+
+PRINT_URL = "https://my.novaposhta.ua/orders/printMarking{size}/orders[]/{docs}/type/pdf/apiKey/{key}"
+PER_PDF = 100
+SIZES = ("85x85", "100x100")
+
+
+def label_batches(ttns: List[str], size: str = "100x100", per_pdf: int = PER_PDF) -> List[Dict]:
+    """[{ttns, size}] - one merged PDF per chunk of up to per_pdf TTNs"""
+    if size not in SIZES:
+        raise ValueError(f"UNSUPPORTED_LABEL_SIZE: {size}")
+    ttns = [t for t in dict.fromkeys(ttns) if t]
+    return [{"ttns": ttns[i:i + per_pdf], "size": size} for i in range(0, len(ttns), per_pdf)]
+
+
+def label_url(ttns: List[str], size: str, api_key: str) -> str:
+    """NP print URL for one chunk (secret: never store or return it)"""
+    if size not in SIZES:
+        raise ValueError(f"UNSUPPORTED_LABEL_SIZE: {size}")
+    return PRINT_URL.format(size=size, docs=",".join(ttns), key=api_key)
@@ -2,10 +2,12 @@
 Nova Poshta API Client - Low-level API wrapper
 """
 import httpx
-from typing import Dict, Any
+from typing import Dict, Any, List
 import logging
 
 from core.config import settings
+from core.metrics import outbound
+from modules.delivery.labels.np_labels import label_url
 
 logger = logging.getLogger(__name__)
 
@@ -40,9 +42,10 @@ class NPClient:
         logger.info(f"NP API Request: {model}.{method} with props: {list(props.keys())}")
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(NP_API_URL, json=payload)
-                data = response.json()
+            async with outbound("novaposhta", f"{model}.{method}"):
+                async with httpx.AsyncClient(timeout=30.0) as client:
+                    response = await client.post(NP_API_URL, json=payload)
+                    data = response.json()
             
             if not data.get("success"):
                 logger.warning(f"NP API error: {data.get('errors', [])} | warnings: {data.get('warnings', [])}")
@@ -76,6 +79,14 @@ class NPClient:
             "delete",
             {"DocumentRefs": document_ref}
         )
+    
+    async def fetch_labels(self, ttns: List[str], size: str = "100x100") -> bytes:
+        """One merged label PDF for many TTNs (the print URL holds the API key)"""
+        async with outbound("novaposhta", "printMarking"):
+            async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
+                response = await client.get(label_url(ttns, size, self.api_key))
+                response.raise_for_status()
+                return response.content
 
 
 # Singleton
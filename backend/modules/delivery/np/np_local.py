@@ -0,0 +1,67 @@
+"""
+Local Nova Poshta stand-in - NP client double for bulk TTN runs without NP
+
+Answers InternetDocument.save with a sequential 14-digit TTN and a flat
+cost, optionally after an artificial per-call latency (NP_STANDIN_LATENCY_MS)
+so the bulk worker pool can be benchmarked against realistic NP timings.
+Selected with NP_STANDIN=1 or passed explicitly to NPTTNService.
+"""
+import asyncio
+import itertools
+import os
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from modules.delivery.labels.np_labels import SIZES
+
+
+class LocalNPStandIn:
+    """Same surface as NPClient for the calls the TTN services make"""
+
+    def __init__(self, latency_ms: float = None, fail_every: int = 0):
+        if latency_ms is None:
+            latency_ms = float(os.environ.get("NP_STANDIN_LATENCY_MS", 0))
+        self.latency = latency_ms / 1000.0
+        # every Nth save fails like an NP validation error (0 = never)
+        self.fail_every = fail_every
+        self.api_key = "local"
+        self._seq = itertools.count(1)
+        self._base = 20450000000000 + int(time.time()) % 1_000_000 * 1_000
+
+    async def call(self, model: str, method: str, props: Dict[str, Any]) -> Dict[str, Any]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if (model, method) == ("InternetDocument", "save"):
+            n = next(self._seq)
+            if self.fail_every and n % self.fail_every == 0:
+                return {"success": False, "data": [], "errors": ["RecipientsPhone is invalid"]}
+            ttn = str(self._base + n)
+            return {"success": True, "errors": [], "data": [{
+                "Ref": f"local-{ttn}",
+                "IntDocNumber": ttn,
+                "CostOnSite": 70,
+                "EstimatedDeliveryDate": (date.today() + timedelta(days=2)).strftime("%d.%m.%Y"),
+            }]}
+        if (model, method) == ("TrackingDocument", "getStatusDocuments"):
+            ttn = props["Documents"][0]["DocumentNumber"]
+            return {"success": True, "data": [{"Number": ttn, "Status": "Створено", "StatusCode": "1"}]}
+        return {"success": True, "data": []}
+
+    async def create_internet_document(self, props: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.call("InternetDocument", "save", props)
+
+    async def get_tracking_status(self, ttn: str) -> Dict[str, Any]:
+        return await self.call("TrackingDocument", "getStatusDocuments", {"Documents": [{"DocumentNumber": ttn}]})
+
+    async def delete_internet_document(self, document_ref: str) -> Dict[str, Any]:
+        return await self.call("InternetDocument", "delete", {"DocumentRefs": document_ref})
+
+    async def fetch_labels(self, ttns: List[str], size: str = "100x100") -> bytes:
+        if size not in SIZES:
+            raise ValueError(f"UNSUPPORTED_LABEL_SIZE: {size}")
+        return b"%PDF-1.4\n% local stand-in labels: " + ",".join(ttns).encode() + b"\n%%EOF\n"
+
+
+# Shared instance so TTN numbers stay unique within the process
+np_standin = LocalNPStandIn()
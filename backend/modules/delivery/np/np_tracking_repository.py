@@ -3,6 +3,8 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from pymongo import ReturnDocument
 from datetime import datetime, timezone
 
+from modules.orders.order_status import status_fields
+
 def utcnow():
     return datetime.now(timezone.utc).isoformat()
 
@@ -45,7 +47,7 @@ class NPTrackingRepository:
         return await self.orders.find_one_and_update(
             {"id": order_id, "status": "SHIPPED"},
             {
-                "$set": {"status": "DELIVERED", "updated_at": now},
+                "$set": {**status_fields(status="DELIVERED"), "delivered_at": now, "updated_at": now},
                 "$inc": {"version": 1},
                 "$push": {
                     "status_history": {
@@ -2,6 +2,7 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from .np_client import np_client
 from .np_tracking_repository import NPTrackingRepository
+from modules.growth.scheduler import arm_review_request
 import logging
 
 logger = logging.getLogger(__name__)
@@ -53,6 +54,7 @@ class NPTrackingService:
                     if result:
                         delivered += 1
                         logger.info(f"Order {order['id']} auto-delivered (TTN: {ttn})")
+                        await arm_review_request(self.db, order["id"])
                         
                         # Emit event for notifications
                         from modules.ops.events.events_repo import EventsRepo
@@ -0,0 +1,274 @@
+"""
+Bulk TTN creation for warehouse shift starts
+
+A job takes explicit order ids or a filter and runs NPTTNService.create_ttn
+for every order through a pool of `concurrency` workers:
+
+- per-order idempotency is the single-order one (event "order:<id>" in
+  shipment_events plus the atomic shipment.ttn guard), so re-running a job
+  or a bot click racing it never creates a second TTN
+- per-order outcomes are written to ttn_bulk_items and the job counters in
+  ttn_bulk_jobs are bumped every FLUSH_EVERY results (or FLUSH_SEC);
+  progress() tails the job document for streaming
+- the finished job holds the TTN chunks of its merged label PDFs (one per
+  PER_PDF TTNs; the PDFs are proxied by label_pdf() since NP's print URL
+  carries the API key) and queues one summary Telegram alert instead of one
+  per order
+
+Jobs run as tasks in the process that accepted them. A job whose process
+died stops heartbeating and is reported as stale; starting a new job over
+the same orders is safe.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import Counter
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from core.dates import as_datetime, date_range, utcnow
+from modules.delivery.labels.np_labels import label_batches
+from .np_ttn_service import NPTTNService
+from .np_types import NPTTNBulkFilter, NPTTNBulkRequest, NPTTNCreateRequest
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = int(os.environ.get("NP_BULK_CONCURRENCY", 8))
+MAX_ORDERS = 5000
+FLUSH_EVERY = 25
+FLUSH_SEC = 1.0
+PROGRESS_SEC = 1.0
+STALE_SEC = 120
+OUTCOMES = ("created", "existing", "failed")
+# admin endpoint serving label_pdf() (see delivery/routes_v2.py)
+LABELS_PATH = "/api/v2/delivery/novaposhta/ttn/bulk/{job_id}/labels/{index}"
+
+# job_id -> running task (keeps a reference so the task is not collected)
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+def _error(e: HTTPException) -> dict:
+    detail = e.detail
+    if isinstance(detail, dict):
+        raw = detail.get("details") or {}
+        return {"error": detail.get("error") or str(detail), "details": (raw.get("errors") or [])[:5]}
+    return {"error": str(detail)}
+
+
+class NPTTNBulkService:
+    def __init__(self, db, client=None, concurrency: int = CONCURRENCY):
+        self.db = db
+        self.ttn = NPTTNService(db, client=client)
+        self.concurrency = max(1, concurrency)
+        self.jobs = db["ttn_bulk_jobs"]
+        self.items = db["ttn_bulk_items"]
+        self.orders = db["orders"]
+
+    async def ensure_indexes(self):
+        await self.jobs.create_index("id", unique=True)
+        await self.jobs.create_index([("created_at", -1)])
+        await self.items.create_index([("job_id", 1), ("order_id", 1)], unique=True)
+        # jobs finished before the PDFs were proxied stored NP URLs with the API key
+        await self.jobs.update_many({"labels.url": {"$exists": True}}, {"$unset": {"labels.$[].url": ""}})
+        await self.ttn.init()
+
+    # ---------- job setup ----------
+
+    async def resolve_orders(self, req: NPTTNBulkRequest) -> List[str]:
+        if req.order_ids:
+            return list(dict.fromkeys(req.order_ids))[:MAX_ORDERS]
+        f = req.filter or NPTTNBulkFilter()
+        q = {
+            # status_c for the index, raw status because create_ttn checks it
+            "status_c": {"$in": f.statuses},
+            "status": {"$in": f.statuses},
+            "shipment.ttn": {"$exists": False},
+        }
+        if f.created_from or f.created_to:
+            q.update(date_range("created_at", gte=f.created_from, lt=f.created_to))
+        if f.payment_method:
+            q["payment_method"] = f.payment_method
+        docs = await self.orders.find(q, {"_id": 0, "id": 1}).sort("created_at", 1) \
+            .limit(f.limit).to_list(f.limit)
+        return [d["id"] for d in docs]
+
+    async def create_job(self, req: NPTTNBulkRequest, actor: str) -> dict:
+        if req.order_ids and req.filter:
+            raise HTTPException(status_code=400, detail="ORDER_IDS_OR_FILTER")
+        order_ids = await self.resolve_orders(req)
+        if not order_ids:
+            raise HTTPException(status_code=400, detail="NO_ORDERS_TO_SHIP")
+        now = utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "status": "QUEUED",
+            "actor": actor,
+            "order_ids": order_ids,
+            "total": len(order_ids),
+            "done": 0,
+            **{o: 0 for o in OUTCOMES},
+            "concurrency": req.concurrency or self.concurrency,
+            "options": req.options.model_dump(exclude_none=True),
+            "label_size": req.label_size,
+            "labels": [],
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.jobs.insert_one(dict(job))
+        return job
+
+    def start(self, job_id: str) -> asyncio.Task:
+        """Run the job in the background of this process"""
+        task = asyncio.create_task(self.run(job_id))
+        _tasks[job_id] = task
+        task.add_done_callback(lambda _: _tasks.pop(job_id, None))
+        return task
+
+    # ---------- execution ----------
+
+    async def _one(self, job_id: str, order_id: str, options: dict) -> dict:
+        t0 = time.perf_counter()
+        item = {"job_id": job_id, "order_id": order_id}
+        try:
+            res = await self.ttn.create_ttn(NPTTNCreateRequest(order_id=order_id, **options), alert=False)
+            item.update(outcome="existing" if res.idempotent else "created", ttn=res.ttn, cost=res.cost)
+        except HTTPException as e:
+            item.update(outcome="failed", **_error(e))
+        except Exception as e:
+            logger.error(f"Bulk TTN {job_id}: order {order_id} failed: {e}")
+            item.update(outcome="failed", error=str(e))
+        item["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        item["at"] = utcnow()
+        return item
+
+    async def run(self, job_id: str) -> dict:
+        """Create TTNs for a QUEUED job; returns the consolidated result"""
+        now = utcnow()
+        job = await self.jobs.find_one_and_update(
+            {"id": job_id, "status": "QUEUED"},
+            {"$set": {"status": "RUNNING", "started_at": now, "heartbeat_at": now, "updated_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not job:
+            return await self.get(job_id)
+
+        started = time.monotonic()
+        try:
+            await self.ensure_indexes()
+            queue: asyncio.Queue = asyncio.Queue()
+            for oid in job["order_ids"]:
+                queue.put_nowait(oid)
+            pending: List[dict] = []
+            last_flush = time.monotonic()
+
+            async def flush(force: bool = False):
+                nonlocal pending, last_flush
+                if not pending:
+                    return
+                if not force and len(pending) < FLUSH_EVERY and time.monotonic() - last_flush < FLUSH_SEC:
+                    return
+                batch, pending = pending, []
+                last_flush = time.monotonic()
+                inc = Counter(i["outcome"] for i in batch)
+                await self.items.insert_many(batch, ordered=False)
+                await self.jobs.update_one({"id": job_id}, {
+                    "$inc": {"done": len(batch), **inc},
+                    "$set": {"heartbeat_at": utcnow(), "updated_at": utcnow()},
+                })
+
+            async def worker():
+                while True:
+                    try:
+                        oid = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    pending.append(await self._one(job_id, oid, job.get("options") or {}))
+                    await flush()
+
+            await asyncio.gather(*(worker() for _ in range(min(job["concurrency"], job["total"]))))
+            await flush(force=True)
+
+            ttns = [d["ttn"] async for d in self.items.find(
+                {"job_id": job_id, "ttn": {"$ne": None}}, {"_id": 0, "ttn": 1}
+            )]
+            seconds = time.monotonic() - started
+            done = await self.jobs.find_one_and_update({"id": job_id}, {"$set": {
+                "status": "DONE",
+                "labels": label_batches(ttns, job.get("label_size") or "100x100"),
+                "duration_ms": round(seconds * 1000, 1),
+                "ttn_per_sec": round(len(job["order_ids"]) / seconds, 2) if seconds else None,
+                "finished_at": utcnow(),
+                "updated_at": utcnow(),
+            }}, projection={"_id": 0, "order_ids": 0}, return_document=ReturnDocument.AFTER)
+        except Exception as e:
+            logger.exception(f"Bulk TTN job {job_id} failed: {e}")
+            await self.jobs.update_one({"id": job_id}, {"$set": {
+                "status": "FAILED", "error": str(e), "finished_at": utcnow(), "updated_at": utcnow(),
+            }})
+            return await self.get(job_id)
+
+        logger.info(f"Bulk TTN job {job_id}: {done['created']} created, {done['existing']} existing, "
+                    f"{done['failed']} failed in {done['duration_ms']} ms")
+        try:
+            from modules.bot.alerts_service import AlertsService
+            alerts = AlertsService(self.db)
+            await alerts.init()
+            await alerts.alert_ttn_bulk_done(done)
+        except Exception as e:
+            logger.error(f"Failed to send bulk TTN alert: {e}")
+        return await self.get(job_id)
+
+    # ---------- reads ----------
+
+    async def get(self, job_id: str, failed_limit: int = 200) -> Optional[dict]:
+        """Job with counters, labels and the failed orders"""
+        job = await self.jobs.find_one({"id": job_id}, {"_id": 0, "order_ids": 0})
+        if not job:
+            return None
+        heartbeat = as_datetime(job.get("heartbeat_at"))
+        job["stale"] = bool(
+            job["status"] == "RUNNING" and job_id not in _tasks and heartbeat
+            and (utcnow() - heartbeat).total_seconds() > STALE_SEC
+        )
+        job["labels"] = [
+            {**chunk, "url": LABELS_PATH.format(job_id=job_id, index=i)}
+            for i, chunk in enumerate(job.get("labels") or [])
+        ]
+        job["failed_items"] = await self.items.find(
+            {"job_id": job_id, "outcome": "failed"}, {"_id": 0, "job_id": 0}
+        ).limit(failed_limit).to_list(failed_limit)
+        return job
+
+    async def label_pdf(self, job_id: str, index: int) -> Optional[bytes]:
+        """Merged label PDF of one chunk, fetched from NP on demand"""
+        job = await self.jobs.find_one({"id": job_id}, {"_id": 0, "labels": 1, "label_size": 1}) or {}
+        chunks = job.get("labels") or []
+        if not 0 <= index < len(chunks):
+            return None
+        chunk = chunks[index]
+        size = chunk.get("size") or job.get("label_size") or "100x100"
+        return await self.ttn.client.fetch_labels(chunk["ttns"], size)
+
+    async def list_jobs(self, limit: int = 20) -> List[dict]:
+        return await self.jobs.find({}, {"_id": 0, "order_ids": 0, "labels": 0}) \
+            .sort("created_at", -1).limit(limit).to_list(limit)
+
+    async def progress(self, job_id: str) -> AsyncIterator[dict]:
+        """Counter snapshots while the job runs, then the consolidated result"""
+        fields = {"_id": 0, "id": 1, "status": 1, "total": 1, "done": 1, **{o: 1 for o in OUTCOMES}}
+        last = None
+        while True:
+            snap = await self.jobs.find_one({"id": job_id}, fields)
+            if not snap:
+                return
+            if snap["status"] not in ("QUEUED", "RUNNING"):
+                yield await self.get(job_id)
+                return
+            if snap != last:
+                yield snap
+                last = snap
+            await asyncio.sleep(PROGRESS_SEC)
@@ -7,6 +7,9 @@ from typing import Optional, Dict, Any
 from datetime import datetime, timezone
 import logging
 
+from core.idempotency import IdempotencyStore
+from modules.orders.order_status import status_fields
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,6 +25,9 @@ class NPTTNRepository:
         self.db = db
         self.orders = db["orders"]
         self.events = db["shipment_events"]  # Similar to payment_events
+        self.idem = IdempotencyStore(
+            "np_ttn", self.events, lambda key: {"provider": "NOVAPOSHTA", "event_id": key}
+        )
     
     async def ensure_indexes(self):
         """Create necessary indexes"""
@@ -50,23 +56,15 @@ class NPTTNRepository:
             {"inserted": False, "doc": existing} if already exists
         """
         doc = {
-            "provider": "NOVAPOSHTA",
-            "event_id": idem_key,
             "order_id": order_id,
             "status": "LOCKED",
             "created_at": utcnow(),
         }
-        
-        try:
-            await self.events.insert_one(doc)
-            return {"inserted": True, "doc": doc}
-        except Exception:
-            # Duplicate key - already exists
-            existing = await self.events.find_one(
-                {"provider": "NOVAPOSHTA", "event_id": idem_key},
-                {"_id": 0}
-            )
-            return {"inserted": False, "doc": existing}
+        # one upsert; finished keys are answered from memory
+        inserted, existing = await self.idem.acquire(idem_key, doc)
+        if inserted:
+            return {"inserted": True, "doc": {"provider": "NOVAPOSHTA", "event_id": idem_key, **doc}}
+        return {"inserted": False, "doc": existing}
     
     async def store_event_result(
         self, 
@@ -75,14 +73,7 @@ class NPTTNRepository:
         status: str
     ):
         """Store result of TTN operation"""
-        await self.events.update_one(
-            {"provider": "NOVAPOSHTA", "event_id": idem_key},
-            {"$set": {
-                "status": status, 
-                "result": result, 
-                "updated_at": utcnow()
-            }}
-        )
+        await self.idem.complete(idem_key, status, result, updated_at=utcnow())
     
     async def set_shipment_ttn_atomic(
         self,
@@ -121,7 +112,7 @@ class NPTTNRepository:
                 "shipment.estimated_delivery_date": estimated_delivery_date,
                 "shipment.raw": raw,
                 "shipment.created_at": now,
-                "status": "SHIPPED",
+                **status_fields(status="SHIPPED"),
                 "updated_at": now,
             },
             "$inc": {"version": 1},
@@ -174,7 +165,8 @@ class NPTTNRepository:
         # Auto-transition to DELIVERED if status indicates delivery
         delivered_codes = ["9", "10", "11"]  # NP status codes for delivered
         if status_code in delivered_codes:
-            update["$set"]["status"] = "DELIVERED"
+            update["$set"].update(status_fields(status="DELIVERED"))
+            update["$set"]["delivered_at"] = datetime.now(timezone.utc)
             update["$push"] = {
                 "status_history": {
                     "from": "SHIPPED",
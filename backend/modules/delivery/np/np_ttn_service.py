@@ -5,10 +5,14 @@ from typing import Dict, Any, Optional
 from fastapi import HTTPException
 from motor.motor_asyncio import AsyncIOMotorDatabase
 import logging
+import os
 
 from core.config import settings
+from core.dates import utcnow
+from modules.orders.order_status import status_fields
 from .np_client import np_client
 from .np_ttn_repository import NPTTNRepository
+from modules.growth.scheduler import arm_review_request
 from .np_types import NPTTNCreateRequest, NPTTNResponse, NPTrackingResponse
 
 logger = logging.getLogger(__name__)
@@ -17,10 +21,13 @@ logger = logging.getLogger(__name__)
 class NPTTNService:
     """Service for Nova Poshta TTN operations"""
     
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, client=None):
         self.db = db
         self.repo = NPTTNRepository(db)
-        self.client = np_client
+        if client is None and os.environ.get("NP_STANDIN") == "1":
+            from .np_local import np_standin
+            client = np_standin
+        self.client = client or np_client
     
     async def init(self):
         """Initialize indexes"""
@@ -109,7 +116,8 @@ class NPTTNService:
     async def create_ttn(
         self, 
         req: NPTTNCreateRequest, 
-        idempotency_key: Optional[str] = None
+        idempotency_key: Optional[str] = None,
+        alert: bool = True,
     ) -> NPTTNResponse:
         """
         Create TTN for order.
@@ -118,6 +126,9 @@ class NPTTNService:
         - Idempotent: same request returns same TTN
         - Atomic: only creates if order is PROCESSING
         - Auto-transition: PROCESSING -> SHIPPED on success
+        
+        alert=False skips the per-order Telegram alert (bulk jobs send
+        one summary instead).
         """
         idem_key = idempotency_key or f"order:{req.order_id}"
         
@@ -250,6 +261,8 @@ class NPTTNService:
             logger.error(f"Failed to record shipping cost: {e}")
         
         # O9: Send Telegram alert
+        if not alert:
+            return NPTTNResponse(**result, idempotent=False)
         try:
             from modules.bot.alerts_service import AlertsService
             alerts = AlertsService(self.db)
@@ -266,15 +279,13 @@ class NPTTNService:
     
     async def _transition_to_processing(self, order_id: str):
         """Auto-transition PAID -> PROCESSING"""
-        from datetime import datetime, timezone
-        
-        now = datetime.now(timezone.utc).isoformat()
+        now = utcnow()
         
         await self.db["orders"].update_one(
             {"id": order_id, "status": "PAID"},
             {
                 "$set": {
-                    "status": "PROCESSING",
+                    **status_fields(status="PROCESSING"),
                     "updated_at": now,
                 },
                 "$inc": {"version": 1},
@@ -322,10 +333,13 @@ class NPTTNService:
         """Fetch tracking and update order status"""
         tracking = await self.get_tracking_status(ttn)
         
-        return await self.repo.update_tracking_status(
+        doc = await self.repo.update_tracking_status(
             order_id=order_id,
             ttn=ttn,
             status=tracking.status,
             status_code=tracking.status_code,
             actual_delivery_date=tracking.actual_delivery_date,
         )
+        if doc and doc.get("status") == "DELIVERED":
+            await arm_review_request(self.db, order_id)
+        return doc
@@ -1,8 +1,9 @@
 """
 Nova Poshta TTN Types - Request/Response models
 """
-from pydantic import BaseModel
-from typing import Optional, Literal, Dict, Any
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Optional, Literal, Dict, Any, List
 
 
 class NPTTNCreateRequest(BaseModel):
@@ -19,6 +20,34 @@ class NPTTNCreateRequest(BaseModel):
     cod_amount: Optional[float] = None  # Cash on delivery amount
 
 
+class NPTTNOptions(BaseModel):
+    """Per-order overrides applied to every TTN of a bulk job"""
+    weight_kg: Optional[float] = None
+    seats_amount: Optional[int] = 1
+    declared_value: Optional[float] = None
+    description: Optional[str] = None
+    payer_type: Optional[Literal["Sender", "Recipient"]] = None
+    payment_method: Optional[Literal["Cash", "NonCash"]] = None
+
+
+class NPTTNBulkFilter(BaseModel):
+    """Orders to ship: paid / processing, without a TTN yet"""
+    statuses: List[Literal["PAID", "PROCESSING"]] = ["PAID", "PROCESSING"]
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    payment_method: Optional[str] = None
+    limit: int = Field(1500, ge=1, le=5000)
+
+
+class NPTTNBulkRequest(BaseModel):
+    """Bulk TTN job: explicit order ids or a filter (one of them)"""
+    order_ids: Optional[List[str]] = None
+    filter: Optional[NPTTNBulkFilter] = None
+    options: NPTTNOptions = NPTTNOptions()
+    concurrency: Optional[int] = Field(None, ge=1, le=32)
+    label_size: Literal["85x85", "100x100"] = "100x100"
+
+
 class NPTTNResponse(BaseModel):
     """Response from TTN creation"""
     ok: bool
@@ -1,14 +1,17 @@
 """
 Delivery V2 Routes - Nova Poshta TTN automation
 """
-from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
 from typing import Optional
+import json
 import logging
 
 from core.db import db
 from core.security import get_current_admin
-from .np.np_types import NPTTNCreateRequest, NPTTNResponse, NPTrackingResponse
+from .np.np_types import NPTTNBulkRequest, NPTTNCreateRequest, NPTTNResponse, NPTrackingResponse
 from .np.np_ttn_service import NPTTNService
+from .np.np_ttn_bulk import NPTTNBulkService
 from .np.np_sender_setup import np_sender_setup, SenderSetupRequest, SenderSetupResponse
 
 router = APIRouter(prefix="/delivery", tags=["Delivery V2"])
@@ -37,6 +40,87 @@ async def create_ttn_novaposhta(
     return await service.create_ttn(body, x_idempotency_key)
 
 
+@router.post("/novaposhta/ttn/bulk")
+async def create_ttn_bulk(
+    body: NPTTNBulkRequest,
+    wait: bool = Query(False, description="Run inline and return the consolidated result"),
+    admin: dict = Depends(get_current_admin),
+):
+    """
+    Create TTNs for many orders (explicit order_ids or a filter).
+    
+    - Bounded worker pool (concurrency, default NP_BULK_CONCURRENCY)
+    - Same per-order idempotency as the single TTN endpoint
+    - Progress: GET /novaposhta/ttn/bulk/{job_id}/progress (NDJSON stream)
+    - Result: counters, failed orders and merged label PDFs
+    """
+    service = NPTTNBulkService(db)
+    await service.ensure_indexes()
+    job = await service.create_job(body, actor=f"admin:{admin.get('id')}")
+    if wait:
+        return await service.run(job["id"])
+    service.start(job["id"])
+    job.pop("order_ids", None)
+    return job
+
+
+@router.get("/novaposhta/ttn/bulk")
+async def list_ttn_bulk_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    admin: dict = Depends(get_current_admin),
+):
+    """Recent bulk TTN jobs"""
+    return {"items": await NPTTNBulkService(db).list_jobs(limit)}
+
+
+@router.get("/novaposhta/ttn/bulk/{job_id}")
+async def get_ttn_bulk_job(
+    job_id: str,
+    admin: dict = Depends(get_current_admin),
+):
+    """Bulk TTN job: counters, failed orders, label PDFs when done"""
+    job = await NPTTNBulkService(db).get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="JOB_NOT_FOUND")
+    return job
+
+
+@router.get("/novaposhta/ttn/bulk/{job_id}/labels/{index}")
+async def get_ttn_bulk_labels(
+    job_id: str,
+    index: int,
+    admin: dict = Depends(get_current_admin),
+):
+    """Merged label PDF for one chunk of the job's TTNs (proxied from NP)"""
+    try:
+        pdf = await NPTTNBulkService(db).label_pdf(job_id, index)
+    except Exception as e:
+        logger.error(f"NP labels for bulk job {job_id}#{index} failed: {e}")
+        raise HTTPException(status_code=502, detail="NP_LABELS_UNAVAILABLE")
+    if pdf is None:
+        raise HTTPException(status_code=404, detail="LABELS_NOT_FOUND")
+    return Response(
+        content=pdf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'inline; filename="labels-{job_id}-{index}.pdf"'},
+    )
+
+
+@router.get("/novaposhta/ttn/bulk/{job_id}/progress")
+async def stream_ttn_bulk_progress(
+    job_id: str,
+    admin: dict = Depends(get_current_admin),
+):
+    """Progress snapshots as NDJSON until the job finishes; last line is the result"""
+    service = NPTTNBulkService(db)
+
+    async def lines():
+        async for snap in service.progress(job_id):
+            yield json.dumps(snap, default=str, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @router.get("/novaposhta/ttn/{ttn}/status", response_model=NPTrackingResponse)
 async def get_ttn_tracking_status(
     ttn: str,
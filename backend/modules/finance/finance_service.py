@@ -1,5 +1,6 @@
 # O5: Finance Service
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from core.dates import day_bucket
 
 class FinanceService:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -43,7 +44,7 @@ class FinanceService:
     async def daily(self, date_from: str, date_to: str):
         pipeline = [
             {"$match": {"created_at": {"$gte": date_from, "$lte": date_to}}},
-            {"$addFields": {"day": {"$substr": ["$created_at", 0, 10]}}},
+            {"$addFields": {"day": day_bucket("$created_at")}},
             {"$group": {
                 "_id": {"day": "$day", "dir": "$direction"},
                 "amount": {"$sum": "$amount"},
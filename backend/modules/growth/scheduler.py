@@ -4,19 +4,26 @@ Growth Automation Scheduler
 - Payment recovery
 - Post-purchase review requests
 - Telegram broadcasts
+
+Each nudge is a durable timer (modules/jobs/timers.py) armed when the
+cart / order changes state; handlers re-check the document when the
+timer fires.
 """
-import asyncio
 import logging
 from datetime import datetime, timezone, timedelta
-from typing import Optional
 import os
 
+from core.dates import as_datetime
+from modules.jobs.timers import schedule_timer, cancel_timers
+
 logger = logging.getLogger(__name__)
 
-# Global reference to scheduler task
-_scheduler_task: Optional[asyncio.Task] = None
 _db = None
 
+ABANDONED_CART_DELAY = timedelta(minutes=60)
+PAYMENT_RECOVERY_DELAY = timedelta(minutes=30)
+REVIEW_REQUEST_DELAY = timedelta(days=3)
+
 # Telegram Bot Token
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 
@@ -45,203 +52,179 @@ async def send_telegram_message(chat_id: str, text: str) -> bool:
         return False
 
 
-async def process_abandoned_carts():
-    """Process abandoned carts and send notifications"""
-    if _db is None:
+async def arm_abandoned_cart(db, user_id: str):
+    """Called on cart item changes: (re)start the abandonment countdown"""
+    if not user_id:
         return
-    
-    threshold = datetime.now(timezone.utc) - timedelta(minutes=60)
-    
-    # Find abandoned carts
-    carts = await _db.carts.find({
-        "updated_at": {"$lt": threshold},
-        "converted": {"$ne": True},
-        "items": {"$exists": True, "$ne": []},
-        "abandoned_notified": {"$ne": True}
-    }).to_list(50)
-    
-    processed = 0
-    for cart in carts:
-        phone = cart.get("phone") or cart.get("user_phone")
-        telegram_id = cart.get("telegram_id")
-        
-        if not phone and not telegram_id:
-            continue
-        
-        items_count = len(cart.get("items", []))
-        total = sum(
-            item.get("price", 0) * item.get("quantity", 1)
-            for item in cart.get("items", [])
-        )
-        
-        # Create notification record
-        notification = {
-            "type": "abandoned_cart",
-            "cart_id": str(cart.get("_id")),
-            "phone": phone,
-            "telegram_id": telegram_id,
-            "items_count": items_count,
-            "total_value": total,
-            "status": "pending",
-            "created_at": datetime.now(timezone.utc)
-        }
-        
-        await _db.notifications.insert_one(notification)
-        
-        # Send Telegram notification if available
-        if telegram_id:
-            message = f"""🛒 <b>Ви забули завершити покупку!</b>
+    await schedule_timer(
+        db, "abandoned_cart", user_id,
+        datetime.now(timezone.utc) + ABANDONED_CART_DELAY, reschedule=True,
+    )
+
+
+async def disarm_abandoned_cart(db, user_id: str):
+    """Called when the cart is emptied or checked out"""
+    if user_id:
+        await cancel_timers(db, user_id, kinds=["abandoned_cart"])
+
+
+async def arm_review_request(db, order_id: str):
+    """Called when an order is delivered"""
+    await schedule_timer(db, "review_request", order_id, datetime.now(timezone.utc) + REVIEW_REQUEST_DELAY)
+
+
+async def process_abandoned_cart(task: dict):
+    """Timer handler: notify about one abandoned cart"""
+    cart = await _db.carts.find_one({"user_id": task["ref"]})
+    if not cart or cart.get("converted") or not cart.get("items") or cart.get("abandoned_notified"):
+        return None
+
+    # Touched again since the timer was armed by a writer without the hook
+    updated_at = as_datetime(cart.get("updated_at"))
+    if updated_at and updated_at + ABANDONED_CART_DELAY > datetime.now(timezone.utc):
+        return updated_at + ABANDONED_CART_DELAY
+
+    phone = cart.get("phone") or cart.get("user_phone")
+    telegram_id = cart.get("telegram_id")
+
+    if not phone and not telegram_id:
+        return None
+
+    items_count = len(cart.get("items", []))
+    total = sum(
+        item.get("price", 0) * item.get("quantity", 1)
+        for item in cart.get("items", [])
+    )
+
+    # Create notification record
+    notification = {
+        "type": "abandoned_cart",
+        "cart_id": str(cart.get("_id")),
+        "phone": phone,
+        "telegram_id": telegram_id,
+        "items_count": items_count,
+        "total_value": total,
+        "status": "pending",
+        "created_at": datetime.now(timezone.utc)
+    }
+
+    await _db.notifications.insert_one(notification)
+
+    # Send Telegram notification if available
+    if telegram_id:
+        message = f"""🛒 <b>Ви забули завершити покупку!</b>
 
 У вашому кошику {items_count} товар(ів) на суму <b>{total:.0f} грн</b>.
 
 Оформіть замовлення зараз та не втратьте товар!
 
 👉 <a href="https://y-store.ua/cart">Перейти до кошика</a>"""
-            
-            sent = await send_telegram_message(telegram_id, message)
-            if sent:
-                await _db.notifications.update_one(
-                    {"_id": notification.get("_id")},
-                    {"$set": {"status": "sent", "sent_at": datetime.now(timezone.utc)}}
-                )
-        
-        # Mark cart as notified
-        await _db.carts.update_one(
-            {"_id": cart.get("_id")},
-            {"$set": {"abandoned_notified": True}}
-        )
-        
-        processed += 1
-    
-    if processed > 0:
-        logger.info(f"📧 Processed {processed} abandoned carts")
 
+        sent = await send_telegram_message(telegram_id, message)
+        if sent:
+            await _db.notifications.update_one(
+                {"_id": notification.get("_id")},
+                {"$set": {"status": "sent", "sent_at": datetime.now(timezone.utc)}}
+            )
 
-async def process_payment_recovery():
-    """Send payment recovery reminders"""
-    if _db is None:
-        return
-    
-    threshold = datetime.now(timezone.utc) - timedelta(minutes=30)
-    
-    # Find orders awaiting payment
-    orders = await _db.orders.find({
-        "status": {"$in": ["AWAITING_PAYMENT", "pending"]},
-        "payment_status": {"$in": ["pending", "awaiting"]},
-        "created_at": {"$lt": threshold},
-        "payment_recovery_sent": {"$ne": True}
-    }).to_list(30)
-    
-    processed = 0
-    for order in orders:
-        telegram_id = order.get("telegram_id") or order.get("user_telegram_id")
-        order_id = order.get("id") or str(order.get("_id"))
-        total = order.get("total_amount", 0)
-        
-        if not telegram_id:
-            continue
-        
-        message = f"""💳 <b>Очікуємо оплату замовлення #{order_id[:8]}</b>
+    # Mark cart as notified
+    await _db.carts.update_one(
+        {"_id": cart.get("_id")},
+        {"$set": {"abandoned_notified": True}}
+    )
+    logger.info(f"📧 Abandoned cart processed for {task['ref']}")
+    return None
+
+
+async def process_payment_recovery(task: dict):
+    """Timer handler: payment recovery reminder for one unpaid order"""
+    order = await _db.orders.find_one({"id": task["ref"]})
+    if not order:
+        return None
+    if (
+        order.get("status") not in ("AWAITING_PAYMENT", "pending")
+        or order.get("payment_status") not in ("pending", "awaiting")
+        or order.get("payment_recovery_sent")
+    ):
+        return None
+
+    telegram_id = order.get("telegram_id") or order.get("user_telegram_id")
+    order_id = order.get("id") or str(order.get("_id"))
+    total = order.get("total_amount", 0)
+
+    if not telegram_id:
+        return None
+
+    message = f"""💳 <b>Очікуємо оплату замовлення #{order_id[:8]}</b>
 
 Сума до сплати: <b>{total:.0f} грн</b>
 
 Оплатіть зараз, щоб ми відправили ваше замовлення сьогодні!
 
 👉 <a href="https://y-store.ua/payment/resume/{order_id}">Оплатити замовлення</a>"""
-        
-        sent = await send_telegram_message(telegram_id, message)
-        if sent:
-            await _db.orders.update_one(
-                {"_id": order.get("_id")},
-                {"$set": {"payment_recovery_sent": True}}
-            )
-            processed += 1
-    
-    if processed > 0:
-        logger.info(f"💳 Sent {processed} payment recovery reminders")
 
+    sent = await send_telegram_message(telegram_id, message)
+    if sent:
+        await _db.orders.update_one(
+            {"_id": order.get("_id")},
+            {"$set": {"payment_recovery_sent": True}}
+        )
+        logger.info(f"💳 Payment recovery reminder sent for {order_id}")
+    return None
 
-async def process_review_requests():
-    """Request reviews for delivered orders"""
-    if _db is None:
-        return
-    
-    threshold = datetime.now(timezone.utc) - timedelta(days=3)
-    
-    # Find delivered orders ready for review request
-    orders = await _db.orders.find({
-        "status": "DELIVERED",
-        "delivered_at": {"$lt": threshold},
-        "review_requested": {"$ne": True}
-    }).to_list(20)
-    
-    processed = 0
-    for order in orders:
-        telegram_id = order.get("telegram_id") or order.get("user_telegram_id")
-        order_id = order.get("id") or str(order.get("_id"))
-        
-        if not telegram_id:
-            continue
-        
-        message = f"""⭐ <b>Дякуємо за покупку!</b>
+
+async def process_review_request(task: dict):
+    """Timer handler: review request for one delivered order"""
+    order = await _db.orders.find_one({"id": task["ref"]})
+    if not order or order.get("status") != "DELIVERED" or order.get("review_requested"):
+        return None
+
+    telegram_id = order.get("telegram_id") or order.get("user_telegram_id")
+    order_id = order.get("id") or str(order.get("_id"))
+
+    if not telegram_id:
+        return None
+
+    message = f"""⭐ <b>Дякуємо за покупку!</b>
 
 Сподіваємось, вам сподобались товари з замовлення #{order_id[:8]}.
 
 Будемо вдячні за ваш відгук - це допоможе іншим покупцям!
 
 👉 <a href="https://y-store.ua/review/{order_id}">Залишити відгук</a>"""
-        
-        sent = await send_telegram_message(telegram_id, message)
-        if sent:
-            await _db.orders.update_one(
-                {"_id": order.get("_id")},
-                {"$set": {"review_requested": True}}
-            )
-            processed += 1
-    
-    if processed > 0:
-        logger.info(f"⭐ Sent {processed} review requests")
 
+    sent = await send_telegram_message(telegram_id, message)
+    if sent:
+        await _db.orders.update_one(
+            {"_id": order.get("_id")},
+            {"$set": {"review_requested": True}}
+        )
+        logger.info(f"⭐ Review request sent for {order_id}")
+    return None
 
-async def scheduler_loop():
-    """Main scheduler loop"""
-    logger.info("🚀 Growth scheduler started")
-    
-    while True:
-        try:
-            # Run tasks every 10 minutes
-            await process_abandoned_carts()
-            await asyncio.sleep(60)  # 1 min between tasks
-            
-            await process_payment_recovery()
-            await asyncio.sleep(60)
-            
-            await process_review_requests()
-            
-            # Wait before next cycle (10 minutes total)
-            await asyncio.sleep(480)  # 8 minutes
-            
-        except asyncio.CancelledError:
-            logger.info("Growth scheduler stopped")
-            break
-        except Exception as e:
-            logger.error(f"Growth scheduler error: {e}")
-            await asyncio.sleep(300)  # Wait 5 min on error
+
+GROWTH_TIMERS = {
+    "abandoned_cart": process_abandoned_cart,
+    "payment_recovery": process_payment_recovery,
+    "review_request": process_review_request,
+}
 
 
 def start_growth_scheduler(db):
-    """Start the growth automation scheduler"""
-    global _scheduler_task, _db
+    """Register the growth automation timer handlers"""
+    global _db
     _db = db
-    
-    loop = asyncio.get_event_loop()
-    _scheduler_task = loop.create_task(scheduler_loop())
-    logger.info("✅ Growth automation scheduler initialized")
+
+    from modules.jobs.timers import timer_queue
+
+    for kind, handler in GROWTH_TIMERS.items():
+        timer_queue.register(kind, handler)
+    logger.info("✅ Growth automation timers registered")
 
 
 def stop_growth_scheduler():
-    """Stop the growth automation scheduler"""
-    global _scheduler_task
-    if _scheduler_task:
-        _scheduler_task.cancel()
-        _scheduler_task = None
+    """Stop handling growth automation timers"""
+    from modules.jobs.timers import timer_queue
+
+    for kind in GROWTH_TIMERS:
+        timer_queue.handlers.pop(kind, None)
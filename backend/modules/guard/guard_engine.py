@@ -2,10 +2,13 @@
 O14: Guard Engine - Financial & Fraud Guard
 KPI alerts + anti-fraud detection
 """
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
 from modules.guard.guard_repo import GuardRepo
 from modules.bot.bot_alerts_repo import BotAlertsRepo
 from modules.bot.bot_settings_repo import BotSettingsRepo
+from core.dates import date_range
+from modules.orders.order_status import OrderStatus, PAID_OR_BEYOND
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,10 +18,6 @@ def utcnow():
     return datetime.now(timezone.utc)
 
 
-def iso(dt: datetime):
-    return dt.isoformat()
-
-
 def day_bounds(dt: datetime):
     start = dt.replace(hour=0, minute=0, second=0, microsecond=0)
     end = start + timedelta(days=1)
@@ -31,6 +30,8 @@ def pct_drop(today: float, yesterday: float) -> float:
     return (1.0 - (today / yesterday)) * 100.0
 
 
+SEEN_KEYS_MAX = 10_000
+
 DEFAULT_GUARD_CONFIG = {
     "enabled": True,
     "kpi": {
@@ -55,10 +56,24 @@ class GuardEngine:
         self.repo = GuardRepo(db)
         self.orders = db["orders"]
         self.customers = db["customers"]
+        self._seen: "OrderedDict[str, bool]" = OrderedDict()
+
+    async def _once(self, key: str, rule: str) -> bool:
+        """GuardRepo.once with a local memo, so hot callers skip repeated dedupe inserts"""
+        if key in self._seen:
+            return False
+        first = await self.repo.once(key, {"rule": rule, "key": key})
+        self._seen[key] = True
+        while len(self._seen) > SEEN_KEYS_MAX:
+            self._seen.popitem(last=False)
+        return first
+
+    async def config(self) -> dict:
+        st = await self.settings.get()
+        return st.get("guard") or DEFAULT_GUARD_CONFIG
 
     async def run_once(self):
-        st = await self.settings.get()
-        guard = st.get("guard") or DEFAULT_GUARD_CONFIG
+        guard = await self.config()
         if not guard.get("enabled", True):
             return {"ok": True, "skipped": True}
 
@@ -82,7 +97,6 @@ class GuardEngine:
         return {"ok": True}
 
     async def _kpi_revenue_drop(self, guard: dict):
-        drop_thr = float((guard.get("kpi") or {}).get("revenue_drop_pct", 25))
         now = utcnow()
         today_s, today_e = day_bounds(now)
         yday_s, yday_e = day_bounds(now - timedelta(days=1))
@@ -90,8 +104,8 @@ class GuardEngine:
         async def sum_revenue(s, e):
             pipeline = [
                 {"$match": {
-                    "created_at": {"$gte": iso(s), "$lt": iso(e)},
-                    "status": {"$in": ["paid", "processing", "shipped", "delivered", "PAID", "PROCESSING", "SHIPPED", "DELIVERED"]}
+                    **date_range("created_at", gte=s, lt=e),
+                    "status_c": {"$in": PAID_OR_BEYOND}
                 }},
                 {"$group": {"_id": None, "sum": {"$sum": "$total_amount"}}}
             ]
@@ -101,14 +115,19 @@ class GuardEngine:
         today = await sum_revenue(today_s, today_e)
         yday = await sum_revenue(yday_s, yday_e)
 
+        await self.fire_revenue_drop(guard, today, yday, today_s)
+
+    async def fire_revenue_drop(self, guard: dict, today: float, yday: float, day: datetime) -> bool:
+        """Open the revenue drop incident for `day` if the threshold is crossed (once per day)"""
+        drop_thr = float((guard.get("kpi") or {}).get("revenue_drop_pct", 25))
         drop = pct_drop(today, yday)
         if drop < drop_thr:
-            return
+            return False
 
-        key = f"KPI_REVENUE_DROP:{today_s.date().isoformat()}"
-        first = await self.repo.once(key, {"rule": "KPI_REVENUE_DROP", "key": key})
+        key = f"KPI_REVENUE_DROP:{day.date().isoformat()}"
+        first = await self._once(key, "KPI_REVENUE_DROP")
         if not first:
-            return
+            return False
 
         incident = {
             "key": key,
@@ -132,24 +151,29 @@ class GuardEngine:
             f"Key: <code>{key}</code>"
         )
         await self.alerts.enqueue("KPI_REVENUE_DROP", {"text": text}, key)
+        return True
 
     async def _kpi_awaiting_payment_spike(self, guard: dict):
-        thr = int((guard.get("kpi") or {}).get("awaiting_payment_daily", 15))
         now = utcnow()
         today_s, today_e = day_bounds(now)
 
         cnt = await self.orders.count_documents({
-            "created_at": {"$gte": iso(today_s), "$lt": iso(today_e)},
-            "status": {"$in": ["pending", "AWAITING_PAYMENT"]}
+            **date_range("created_at", gte=today_s, lt=today_e),
+            "status_c": OrderStatus.AWAITING_PAYMENT.value
         })
 
+        await self.fire_awaiting_spike(guard, cnt, today_s)
+
+    async def fire_awaiting_spike(self, guard: dict, cnt: int, day: datetime) -> bool:
+        """Open the unpaid-orders spike incident for `day` (once per day)"""
+        thr = int((guard.get("kpi") or {}).get("awaiting_payment_daily", 15))
         if cnt < thr:
-            return
+            return False
 
-        key = f"KPI_AWAITING_PAYMENT_SPIKE:{today_s.date().isoformat()}"
-        first = await self.repo.once(key, {"rule": "KPI_AWAITING_PAYMENT_SPIKE", "key": key})
+        key = f"KPI_AWAITING_PAYMENT_SPIKE:{day.date().isoformat()}"
+        first = await self._once(key, "KPI_AWAITING_PAYMENT_SPIKE")
         if not first:
-            return
+            return False
 
         incident = {
             "key": key,
@@ -172,6 +196,7 @@ class GuardEngine:
             f"Key: <code>{key}</code>"
         )
         await self.alerts.enqueue("KPI_AWAITING_PAYMENT_SPIKE", {"text": text}, key)
+        return True
 
     async def _fraud_burst_orders(self, guard: dict):
         cfg = guard.get("fraud") or {}
@@ -180,46 +205,54 @@ class GuardEngine:
         hour_ago = now - timedelta(hours=1)
 
         pipeline = [
-            {"$match": {"created_at": {"$gte": iso(hour_ago), "$lt": iso(now)}}},
+            {"$match": date_range("created_at", gte=hour_ago, lt=now)},
             {"$group": {"_id": "$buyer_id", "cnt": {"$sum": 1}, "orders": {"$push": "$id"}}},
             {"$match": {"cnt": {"$gte": thr}}}
         ]
         rows = await self.orders.aggregate(pipeline).to_list(20)
 
         for r in rows:
-            buyer_id = r["_id"]
-            if not buyer_id:
+            if not r["_id"]:
                 continue
+            await self.fire_burst(guard, r["_id"], int(r["cnt"]), r.get("orders") or [], now)
 
-            key = f"FRAUD_BURST_ORDERS:{buyer_id}:{now.strftime('%Y-%m-%dT%H')}"
-            first = await self.repo.once(key, {"rule": "FRAUD_BURST_ORDERS", "key": key})
-            if not first:
-                continue
+    async def fire_burst(self, guard: dict, buyer_id: str, cnt: int, orders: list, now: datetime) -> bool:
+        """Open the order-burst incident for a buyer (once per buyer per hour)"""
+        cfg = guard.get("fraud") or {}
+        thr = int(cfg.get("burst_orders_per_hour", 3))
+        if cnt < thr:
+            return False
+
+        key = f"FRAUD_BURST_ORDERS:{buyer_id}:{now.strftime('%Y-%m-%dT%H')}"
+        first = await self._once(key, "FRAUD_BURST_ORDERS")
+        if not first:
+            return False
+
+        incident = {
+            "key": key,
+            "type": "FRAUD_BURST_ORDERS",
+            "status": "OPEN",
+            "severity": "CRITICAL",
+            "title": "Suspicious Order Burst",
+            "description": f"User {buyer_id} created {cnt} orders in last hour (threshold {thr}).",
+            "entity": f"customer:{buyer_id}",
+            "payload": {"buyer_id": buyer_id, "count": cnt, "orders": orders, "threshold": thr},
+            "muted_until": None,
+            "resolved_at": None,
+        }
+        await self.repo.upsert_incident(incident)
 
-            incident = {
-                "key": key,
-                "type": "FRAUD_BURST_ORDERS",
-                "status": "OPEN",
-                "severity": "CRITICAL",
-                "title": "Suspicious Order Burst",
-                "description": f"User {buyer_id} created {int(r['cnt'])} orders in last hour (threshold {thr}).",
-                "entity": f"customer:{buyer_id}",
-                "payload": {"buyer_id": buyer_id, "count": int(r["cnt"]), "orders": r.get("orders") or [], "threshold": thr},
-                "muted_until": None,
-                "resolved_at": None,
-            }
-            await self.repo.upsert_incident(incident)
-
-            if cfg.get("auto_tag", True):
-                await self._tag_customer(buyer_id, "FRAUD_SUSPECT")
-
-            text = (
-                f"<b>Suspicious Order Burst</b>\n"
-                f"User: <code>{buyer_id}</code>\n"
-                f"Orders in 1h: <b>{int(r['cnt'])}</b> (threshold {thr})\n"
-                f"Key: <code>{key}</code>"
-            )
-            await self.alerts.enqueue("FRAUD_BURST_ORDERS", {"text": text}, key)
+        if cfg.get("auto_tag", True):
+            await self._tag_customer(buyer_id, "FRAUD_SUSPECT")
+
+        text = (
+            f"<b>Suspicious Order Burst</b>\n"
+            f"User: <code>{buyer_id}</code>\n"
+            f"Orders in 1h: <b>{cnt}</b> (threshold {thr})\n"
+            f"Key: <code>{key}</code>"
+        )
+        await self.alerts.enqueue("FRAUD_BURST_ORDERS", {"text": text}, key)
+        return True
 
     async def _tag_customer(self, user_id: str, tag: str):
         user = await self.db["users"].find_one({"id": user_id}, {"_id": 0})
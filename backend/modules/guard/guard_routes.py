@@ -23,6 +23,15 @@ async def list_incidents(current_user: dict = Depends(get_current_admin)):
     return {"items": items}
 
 
+@router.get("/stream")
+async def stream_status(current_user: dict = Depends(get_current_admin)):
+    """Streaming detector state on this process (holder, lag, window sizes)"""
+    from modules.guard import guard_stream
+    if guard_stream.guard_stream is None:
+        return {"running": False}
+    return guard_stream.guard_stream.snapshot()
+
+
 @router.get("/incident/{key}")
 async def get_incident(key: str, current_user: dict = Depends(get_current_admin)):
     """Get single incident"""
@@ -0,0 +1,367 @@
+"""
+O14: Guard Stream - sliding-window detection from order events
+
+Instead of re-aggregating `orders` every 10 minutes, one process tails order
+writes and keeps the guard windows in memory:
+
+    buyers   buyer_id -> [(created_at, order_id)] of the last hour
+    days     day -> {revenue, awaiting} for today and yesterday
+    orders   order_id -> (day, amount, paid, awaiting), today + yesterday only
+
+- events come from a change stream on `orders` (full document lookup); on a
+  standalone server without change streams it polls by updated_at /
+  created_at every POLL_SEC instead
+- every write is applied as a delta against the order's previous
+  contribution, so replays and status flips never double count
+- rules are checked right after each event and fire through GuardEngine,
+  keeping the GuardRepo incident / dedupe keys of the periodic run
+- window state, the resume token and the poll watermark are saved to
+  guard_stream_state every FLUSH_SEC, so a restart continues where it
+  stopped; without usable state the windows are seeded from orders once
+- only the holder of the "guard_stream" lease in job_locks consumes
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from core.dates import as_datetime, date_range, utcnow
+from modules.guard.guard_engine import GuardEngine, day_bounds
+from modules.jobs.runtime import job_runtime
+from modules.orders.order_status import OrderStatus, PAID_OR_BEYOND, canonical_status
+
+logger = logging.getLogger(__name__)
+
+LEASE_ID = "guard_stream"
+LEASE_SEC = 60
+STATE_ID = "orders"
+WINDOW = timedelta(hours=1)
+POLL_SEC = 3
+POLL_OVERLAP = timedelta(seconds=10)
+FLUSH_SEC = 10
+CONFIG_TTL_SEC = 60
+MAX_AWAIT_MS = 1000
+# Above this the per-order map is not saved; the next start re-seeds instead
+MAX_PERSISTED_ORDERS = 100_000
+
+FIELDS = ("id", "buyer_id", "status_c", "status", "total_amount", "created_at")
+PROJECTION = {f: 1 for f in FIELDS}
+
+_PAID = set(PAID_OR_BEYOND)
+
+
+class _LeaseLost(Exception):
+    pass
+
+
+class GuardStream:
+    def __init__(self, db):
+        self.db = db
+        self.orders = db["orders"]
+        self.state = db["guard_stream_state"]
+        self.engine = GuardEngine(db)
+
+        self.buyers: Dict[str, Deque[Tuple[datetime, str]]] = {}
+        self.days: Dict[str, Dict[str, float]] = {}
+        self.contrib: Dict[str, Tuple[str, float, bool, bool]] = {}
+        self.resume_token = None
+        self.watermark: Optional[datetime] = None
+
+        self.metrics = {"events": 0, "fired": 0, "mode": None, "holder": False,
+                        "last_event_at": None, "last_flush_at": None, "lag_ms": 0.0}
+        self._guard: Optional[dict] = None
+        self._guard_at = 0.0
+        self._flushed_at = 0.0
+        self._renewed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_event_loop().create_task(self._run())
+        logger.info("Guard stream started")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            if self.metrics["holder"]:
+                try:
+                    await self._flush()
+                except PyMongoError as e:
+                    logger.warning(f"Guard stream: state not saved on stop: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                if not await job_runtime.acquire_lease(LEASE_ID, LEASE_SEC):
+                    self.metrics["holder"] = False
+                    await asyncio.sleep(LEASE_SEC / 3)
+                    continue
+                self.metrics["holder"] = True
+                self._renewed_at = time.monotonic()
+                await self._load()
+                try:
+                    await self._tail_changes()
+                except OperationFailure as e:
+                    if e.code == 286:  # ChangeStreamHistoryLost: resume token fell off the oplog
+                        logger.warning("Guard stream: resume token expired, re-seeding")
+                        await self._seed()
+                        continue
+                    # standalone mongod / no oplog access
+                    logger.info(f"Guard stream: change stream unavailable ({e.code}), polling")
+                    await self._poll_loop()
+            except asyncio.CancelledError:
+                raise
+            except _LeaseLost:
+                logger.warning("Guard stream: lease lost, standing by")
+                self.metrics["holder"] = False
+            except Exception as e:
+                logger.error(f"Guard stream error: {e}")
+                await asyncio.sleep(POLL_SEC)
+
+    # ---------- state ----------
+
+    async def _load(self):
+        """Restore windows from guard_stream_state, or seed them from orders"""
+        self.buyers, self.days, self.contrib = {}, {}, {}
+        st = await self.state.find_one({"_id": STATE_ID})
+        today = day_bounds(utcnow())[0]
+        if st and not st.get("partial") and st.get("today") in (
+            today.date().isoformat(), (today - timedelta(days=1)).date().isoformat()
+        ):
+            for buyer_id, items in (st.get("buyers") or {}).items():
+                self.buyers[buyer_id] = deque((as_datetime(ts), oid) for ts, oid in items)
+            self.days = st.get("days") or {}
+            for oid, day, amount, paid, awaiting in st.get("orders") or []:
+                self.contrib[oid] = (day, amount, paid, awaiting)
+            self.resume_token = st.get("resume_token")
+            self.watermark = as_datetime(st.get("watermark"))
+            self._roll(utcnow())
+            logger.info(f"Guard stream: state restored ({len(self.contrib)} orders, {len(self.buyers)} buyers)")
+            return
+        await self._seed()
+
+    async def _seed(self):
+        started = utcnow()
+        since = day_bounds(started - timedelta(days=1))[0]
+        n = 0
+        async for doc in self.orders.find(date_range("created_at", gte=since), PROJECTION):
+            self._apply(doc, started)
+            n += 1
+        # change stream starts from "now"; polling catches up from the seed start
+        self.resume_token = None
+        self.watermark = started
+        await self._flush()
+        await self._evaluate_kpis()
+        logger.info(f"Guard stream: seeded from {n} orders")
+
+    async def _flush(self):
+        today = day_bounds(utcnow())[0].date().isoformat()
+        partial = len(self.contrib) > MAX_PERSISTED_ORDERS
+        doc = {
+            "today": today,
+            "days": self.days,
+            "buyers": {b: [[ts, oid] for ts, oid in q] for b, q in self.buyers.items() if q},
+            "orders": [] if partial else [[oid, *c] for oid, c in self.contrib.items()],
+            "partial": partial,
+            "resume_token": self.resume_token,
+            "watermark": self.watermark,
+            "updated_at": utcnow(),
+        }
+        await self.state.replace_one({"_id": STATE_ID}, doc, upsert=True)
+        self._flushed_at = time.monotonic()
+        self.metrics["last_flush_at"] = doc["updated_at"]
+
+    async def _tick(self):
+        """Keep the lease and flush state; called between events and when idle"""
+        mono = time.monotonic()
+        if mono - self._renewed_at >= LEASE_SEC / 3:
+            if not await job_runtime.acquire_lease(LEASE_ID, LEASE_SEC):
+                raise _LeaseLost()
+            self._renewed_at = mono
+        if mono - self._flushed_at >= FLUSH_SEC:
+            self._roll(utcnow())
+            await self._flush()
+
+    # ---------- sources ----------
+
+    async def _tail_changes(self):
+        pipeline = [
+            {"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}},
+            {"$project": {"operationType": 1, "clusterTime": 1,
+                          **{f"fullDocument.{f}": 1 for f in FIELDS}}},
+        ]
+        async with self.orders.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=self.resume_token,
+            max_await_time_ms=MAX_AWAIT_MS,
+        ) as stream:
+            self.metrics["mode"] = "change_stream"
+            while True:
+                change = await stream.try_next()
+                if change and change.get("fullDocument"):
+                    await self._on_order(change["fullDocument"])
+                self.resume_token = stream.resume_token
+                self.watermark = utcnow()
+                await self._tick()
+
+    async def _poll_loop(self):
+        self.metrics["mode"] = "poll"
+        while True:
+            started = utcnow()
+            since = (self.watermark or started) - POLL_OVERLAP
+            q = {"$or": [date_range("updated_at", gte=since), date_range("created_at", gte=since)]}
+            try:
+                async for doc in self.orders.find(q, PROJECTION):
+                    await self._on_order(doc)
+                self.watermark = started
+            except PyMongoError as e:
+                logger.warning(f"Guard stream poll failed: {e}")
+            await self._tick()
+            await asyncio.sleep(POLL_SEC)
+
+    # ---------- windows ----------
+
+    def _roll(self, now: datetime):
+        """Drop days before yesterday and buyer entries older than the window"""
+        keep = {day_bounds(now - timedelta(days=d))[0].date().isoformat() for d in (0, 1)}
+        for day in [d for d in self.days if d not in keep]:
+            del self.days[day]
+        for oid in [o for o, c in self.contrib.items() if c[0] not in keep]:
+            del self.contrib[oid]
+        cutoff = now - WINDOW
+        for buyer_id in list(self.buyers):
+            q = self.buyers[buyer_id]
+            while q and q[0][0] < cutoff:
+                q.popleft()
+            if not q:
+                del self.buyers[buyer_id]
+
+    def _apply(self, doc: dict, now: datetime) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Apply one order write to the windows.
+        Returns (buyer_id whose window grew, day whose KPIs changed).
+        """
+        oid = doc.get("id")
+        created = as_datetime(doc.get("created_at"))
+        if not oid or created is None:
+            return None, None
+
+        grown = None
+        buyer_id = doc.get("buyer_id")
+        if buyer_id and created >= now - WINDOW:
+            q = self.buyers.setdefault(buyer_id, deque())
+            if all(o != oid for _, o in q):
+                q.append((created, oid))
+                if len(q) > 1 and q[-2][0] > created:
+                    self.buyers[buyer_id] = deque(sorted(q))
+                grown = buyer_id
+
+        day = day_bounds(created)[0].date().isoformat()
+        if day < day_bounds(now - timedelta(days=1))[0].date().isoformat():
+            return grown, None
+
+        status = doc.get("status_c") or canonical_status(doc.get("status"))
+        amount = float(doc.get("total_amount") or 0)
+        new = (day, amount, status in _PAID, status == OrderStatus.AWAITING_PAYMENT.value)
+        old = self.contrib.get(oid)
+        if old == new:
+            return grown, None
+
+        for sign, c in ((-1, old), (1, new)):
+            if c is None:
+                continue
+            totals = self.days.setdefault(c[0], {"revenue": 0.0, "awaiting": 0})
+            if c[2]:
+                totals["revenue"] = round(totals["revenue"] + sign * c[1], 2)
+            if c[3]:
+                totals["awaiting"] += sign
+        if new[2] or new[3]:
+            self.contrib[oid] = new
+        else:
+            self.contrib.pop(oid, None)
+        return grown, day
+
+    async def _config(self) -> dict:
+        mono = time.monotonic()
+        if self._guard is None or mono - self._guard_at >= CONFIG_TTL_SEC:
+            self._guard = await self.engine.config()
+            self._guard_at = mono
+        return self._guard
+
+    async def _on_order(self, doc: dict):
+        now = utcnow()
+        buyer_id, day = self._apply(doc, now)
+        self.metrics["events"] += 1
+        self.metrics["last_event_at"] = now
+        created = as_datetime(doc.get("created_at"))
+        if created:
+            self.metrics["lag_ms"] = round(max(0.0, (now - created).total_seconds() * 1000), 1)
+
+        if buyer_id is None and day is None:
+            return
+        guard = await self._config()
+        if not guard.get("enabled", True):
+            return
+        if buyer_id is not None:
+            q = self.buyers[buyer_id]
+            cutoff = now - WINDOW
+            while q and q[0][0] < cutoff:
+                q.popleft()
+            if await self.engine.fire_burst(guard, buyer_id, len(q), [o for _, o in q], now):
+                self.metrics["fired"] += 1
+        if day == day_bounds(now)[0].date().isoformat():
+            await self._evaluate_kpis(guard)
+
+    async def _evaluate_kpis(self, guard: Optional[dict] = None):
+        guard = guard or await self._config()
+        if not guard.get("enabled", True):
+            return
+        today_s = day_bounds(utcnow())[0]
+        today = self.days.get(today_s.date().isoformat()) or {}
+        yday = self.days.get((today_s - timedelta(days=1)).date().isoformat()) or {}
+        fired = await self.engine.fire_revenue_drop(
+            guard, float(today.get("revenue", 0)), float(yday.get("revenue", 0)), today_s
+        )
+        fired += await self.engine.fire_awaiting_spike(guard, int(today.get("awaiting", 0)), today_s)
+        self.metrics["fired"] += fired
+
+    # ---------- reporting ----------
+
+    def snapshot(self) -> dict:
+        return {
+            **self.metrics,
+            "running": bool(self._task and not self._task.done()),
+            "days": self.days,
+            "tracked_orders": len(self.contrib),
+            "active_buyers": len(self.buyers),
+            "watermark": self.watermark,
+        }
+
+
+guard_stream: Optional[GuardStream] = None
+
+
+def start_guard_stream(db) -> GuardStream:
+    global guard_stream
+    if guard_stream is None:
+        guard_stream = GuardStream(db)
+    guard_stream.start()
+    return guard_stream
+
+
+async def stop_guard_stream():
+    if guard_stream is not None:
+        await guard_stream.stop()
@@ -1,46 +1,52 @@
 """
 Guard + Analytics Scheduler
-Runs guard engine and analytics daily snapshots
+Guard rules fire from the order stream (modules/guard/guard_stream.py); the
+periodic guard run stays as an hourly reconcile. analytics_daily rows are
+tailed every minute and the closed day is recomputed nightly
 """
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime, timezone, timedelta
 import logging
 
+from modules.jobs.runtime import job_runtime
+
 logger = logging.getLogger(__name__)
-scheduler = AsyncIOScheduler()
 
 
 def start_guard_scheduler(db):
-    """Start guard and analytics background jobs"""
+    """Register guard and analytics background jobs"""
     from modules.guard.guard_engine import GuardEngine
+    from modules.guard.guard_stream import start_guard_stream
     from modules.analytics_intel.analytics_engine import AnalyticsEngine
-    
+
     guard_engine = GuardEngine(db)
     analytics_engine = AnalyticsEngine(db)
-    
+
     async def guard_job():
-        """Run guard checks every 10 minutes"""
-        try:
-            result = await guard_engine.run_once()
-            logger.info(f"Guard engine completed: {result}")
-        except Exception as e:
-            logger.error(f"Guard engine failed: {e}")
-    
+        """Full guard checks every hour (catches anything the stream missed)"""
+        result = await guard_engine.run_once()
+        logger.info(f"Guard engine completed: {result}")
+
     async def analytics_daily_job():
         """Build daily analytics snapshot at 02:10 UTC"""
-        try:
-            now = datetime.now(timezone.utc)
-            yesterday = now - timedelta(days=1)
-            result = await analytics_engine.build_daily(yesterday)
-            logger.info(f"Analytics daily completed: {result}")
-        except Exception as e:
-            logger.error(f"Analytics daily failed: {e}")
-    
-    # Guard checks every 10 minutes
-    scheduler.add_job(guard_job, "interval", minutes=10, id="guard_engine", replace_existing=True)
-    
+        now = datetime.now(timezone.utc)
+        yesterday = now - timedelta(days=1)
+        result = await analytics_engine.build_daily(yesterday)
+        logger.info(f"Analytics daily completed: {result}")
+
+    # Streaming guard detector (one consumer cluster-wide) + hourly reconcile
+    start_guard_stream(db)
+    job_runtime.add(guard_job, "interval", hours=1, id="guard_engine")
+
+    async def analytics_live_job():
+        """Apply order changes to analytics_daily rows"""
+        result = await analytics_engine.builder.run_once()
+        if result.get("applied") or result.get("seeded"):
+            logger.info(f"Analytics daily live: {result}")
+
+    job_runtime.add(analytics_live_job, "interval", minutes=1, id="analytics_daily_live", lease_sec=120, jitter=5)
+
     # Daily analytics at 02:10 UTC
-    scheduler.add_job(analytics_daily_job, "cron", hour=2, minute=10, id="analytics_daily", replace_existing=True)
-    
-    scheduler.start()
-    logger.info("Guard + Analytics scheduler started")
+    job_runtime.add(analytics_daily_job, "cron", hour=2, minute=10, timezone="UTC",
+                    id="analytics_daily", lease_sec=1800, jitter=60)
+
+    logger.info("Guard + Analytics jobs registered: guard stream, guard reconcile (1h), analytics live (1min), analytics daily (02:10 UTC)")
@@ -0,0 +1,47 @@
+"""
+Jobs Routes - background job runtime status and manual triggers
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from core.db import db
+from core.security import get_current_admin
+from modules.jobs.runtime import job_runtime
+from modules.jobs.timers import timer_queue
+from modules.payments.webhook_inbox import webhook_inbox
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.get("")
+async def jobs_status(current_user: dict = Depends(get_current_admin)):
+    """Per-job counters of this process plus cluster-wide lease state"""
+    return await job_runtime.snapshot()
+
+
+@router.get("/timers")
+async def timers_status(current_user: dict = Depends(get_current_admin)):
+    """Timer dispatcher counters and open timers per kind"""
+    return await timer_queue.stats()
+
+
+@router.get("/webhooks")
+async def webhooks_status(current_user: dict = Depends(get_current_admin)):
+    """Payment webhook inbox: depth / oldest pending per source, worker counters"""
+    webhook_inbox.bind(db)
+    return await webhook_inbox.stats()
+
+
+@router.post("/webhooks/{item_id}/requeue")
+async def webhooks_requeue(item_id: str, current_user: dict = Depends(get_current_admin)):
+    """Queue a FAILED payment callback again"""
+    webhook_inbox.bind(db)
+    if not await webhook_inbox.requeue(item_id):
+        raise HTTPException(status_code=404, detail="No failed callback with this id")
+    return {"ok": True, "id": item_id}
+
+
+@router.post("/{job_id}/run")
+async def jobs_run_now(job_id: str, current_user: dict = Depends(get_current_admin)):
+    """Run a job now on this process (skipped if another holder has the lease)"""
+    if not job_runtime.run_now(job_id):
+        raise HTTPException(status_code=404, detail="Job not registered in this process")
+    return {"ok": True, "job_id": job_id}
@@ -0,0 +1,287 @@
+"""
+Job Runtime - one scheduler per process, one holder per job cluster-wide
+
+- every periodic job is registered here instead of in its own
+  AsyncIOScheduler; APScheduler runs one instance per job at a time
+  (max_instances=1, coalesce) and spreads start times with jitter
+- before a run the process takes a lease on the job in job_locks; the
+  lease is renewed while the job runs and, when it ends, kept until just
+  before this process's next tick of the job (minus the jitter), so the
+  ticks of the other N-1 uvicorn workers (or hosts) in the same period are
+  skipped and each job runs once per period cluster-wide. A crashed
+  holder's lease simply expires after lease_sec
+- run_now() may take over a finished run's hold (not a running one)
+- per-job counters: runs, lock skips, overlap skips, failures, duration
+  and start lag (actual start vs. scheduled time)
+
+JOBS_MODE decides where jobs run:
+    web     (default) inside web workers, deduplicated by the leases
+    worker  only in `python -m modules.jobs.worker`; web workers skip them
+    off     nowhere
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_SUBMITTED
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from core.dates import utcnow
+from core.metrics import observe_job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SEC = 300
+DEFAULT_JITTER_SEC = 15
+# the hold ends this long before the next tick, so clock skew between hosts
+# cannot push a period's only run past everybody's tick
+HOLD_MARGIN_SEC = 5
+
+
+def jobs_mode() -> str:
+    return os.environ.get("JOBS_MODE", "web").lower()
+
+
+def jobs_enabled(role: str) -> bool:
+    """Whether a process of this role ("web" or "worker") should run jobs"""
+    mode = jobs_mode()
+    if mode == "off":
+        return False
+    if mode == "worker":
+        return role == "worker"
+    return True
+
+
+class _JobStats:
+    __slots__ = ("runs", "failures", "skipped_locked", "skipped_overlap", "running",
+                 "last_started_at", "last_duration_ms", "max_duration_ms",
+                 "last_lag_ms", "max_lag_ms", "last_error")
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.skipped_locked = 0
+        self.skipped_overlap = 0
+        self.running = False
+        self.last_started_at = None
+        self.last_duration_ms = 0.0
+        self.max_duration_ms = 0.0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class JobRuntime:
+    def __init__(self):
+        self.db = None
+        self.scheduler = AsyncIOScheduler()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.stats: Dict[str, _JobStats] = {}
+        self.leases: Dict[str, int] = {}
+        self.jitters: Dict[str, int] = {}
+        self._forced: Set[str] = set()
+        self.scheduler.add_listener(self._on_submitted, EVENT_JOB_SUBMITTED)
+        self.scheduler.add_listener(self._on_max_instances, EVENT_JOB_MAX_INSTANCES)
+
+    @property
+    def locks(self):
+        return self.db["job_locks"]
+
+    def bind(self, db):
+        self.db = db
+
+    def add(
+        self,
+        func: Callable[[], Awaitable],
+        trigger: str,
+        id: str,
+        lease_sec: int = DEFAULT_LEASE_SEC,
+        jitter: Optional[int] = DEFAULT_JITTER_SEC,
+        **trigger_args,
+    ):
+        """Register a periodic job; takes the usual APScheduler trigger arguments"""
+        self.stats.setdefault(id, _JobStats())
+        self.leases[id] = lease_sec
+        self.jitters[id] = jitter or 0
+        self.scheduler.add_job(
+            self._run,
+            trigger,
+            args=[id, func],
+            id=id,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=60,
+            jitter=jitter,
+            **trigger_args,
+        )
+
+    def remove(self, id: str):
+        if self.scheduler.get_job(id):
+            self.scheduler.remove_job(id)
+
+    def run_now(self, id: str) -> bool:
+        """Trigger a registered job on this process (skipped only while another holder runs it)"""
+        job = self.scheduler.get_job(id)
+        if not job:
+            return False
+        self._forced.add(id)
+        job.modify(next_run_time=utcnow())
+        return True
+
+    def start(self):
+        if not self.scheduler.running:
+            self.scheduler.start()
+            logger.info(f"Job runtime started ({len(self.scheduler.get_jobs())} jobs, owner {self.owner})")
+
+    async def shutdown(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        if self.db is not None:
+            await self.locks.update_many(
+                {"owner": self.owner}, {"$set": {"locked_until": utcnow(), "owner": None}}
+            )
+
+    # ---------- leases ----------
+
+    async def acquire_lease(self, id: str, lease_sec: int) -> bool:
+        """Take or extend a lease for a long-running task outside the scheduler (e.g. a stream consumer)"""
+        self.leases.setdefault(id, lease_sec)
+        if self.db is None:
+            return False
+        return await self._acquire(id)
+
+    async def _acquire(self, id: str) -> bool:
+        now = utcnow()
+        free = [{"locked_until": {"$lte": now}}, {"owner": self.owner}]
+        if id in self._forced:
+            # manual trigger: a finished run's hold (owner None) does not block it
+            self._forced.discard(id)
+            free.append({"owner": None})
+        try:
+            await self.locks.find_one_and_update(
+                {"_id": id, "$or": free},
+                {"$set": {"owner": self.owner, "locked_until": now + timedelta(seconds=self.leases[id]),
+                          "acquired_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return True
+        except DuplicateKeyError:
+            # someone else holds an unexpired lease
+            return False
+
+    async def _renew(self, id: str):
+        lease = self.leases[id]
+        while True:
+            await asyncio.sleep(lease / 3)
+            res = await self.locks.update_one(
+                {"_id": id, "owner": self.owner},
+                {"$set": {"locked_until": utcnow() + timedelta(seconds=lease)}},
+            )
+            if not res.matched_count:
+                logger.warning(f"Job {id}: lease lost while running")
+                return
+
+    def _hold_until(self, id: str, now: datetime) -> datetime:
+        """End of a finished run's hold: just before this process's next tick of the job"""
+        job = self.scheduler.get_job(id)
+        nxt = job.next_run_time if job else None
+        if nxt is None:
+            return now
+        # next_run_time carries this process's jitter; others tick from (next - jitter)
+        return max(now, nxt - timedelta(seconds=self.jitters.get(id, 0) + HOLD_MARGIN_SEC))
+
+    async def _release(self, id: str, duration_ms: float, error: Optional[str]):
+        now = utcnow()
+        await self.locks.update_one(
+            {"_id": id, "owner": self.owner},
+            {"$set": {
+                "owner": None,
+                "locked_until": self._hold_until(id, now),
+                "last_owner": self.owner,
+                "last_finished_at": now,
+                "last_duration_ms": round(duration_ms, 1),
+                "last_status": "failed" if error else "ok",
+                "last_error": error,
+            }, "$inc": {"runs": 1, "failures": 1 if error else 0}},
+        )
+
+    # ---------- execution ----------
+
+    async def _run(self, id: str, func: Callable[[], Awaitable]):
+        st = self.stats[id]
+        if self.db is None or not await self._acquire(id):
+            st.skipped_locked += 1
+            return
+
+        st.running = True
+        st.last_started_at = utcnow()
+        renew = asyncio.ensure_future(self._renew(id))
+        started = time.monotonic()
+        error = None
+        try:
+            await func()
+        except Exception as e:
+            error = str(e)[:500]
+            st.failures += 1
+            logger.error(f"Job {id} failed: {e}")
+        finally:
+            renew.cancel()
+            ms = (time.monotonic() - started) * 1000
+            st.running = False
+            st.runs += 1
+            st.last_duration_ms = round(ms, 1)
+            st.max_duration_ms = round(max(st.max_duration_ms, ms), 1)
+            st.last_error = error
+            observe_job(id, ms / 1000, error is not None)
+            try:
+                await self._release(id, ms, error)
+            except Exception as e:
+                logger.warning(f"Job {id}: lease release failed: {e}")
+
+    def _on_submitted(self, event):
+        st = self.stats.get(event.job_id)
+        if st and event.scheduled_run_times:
+            lag = (utcnow() - event.scheduled_run_times[-1]).total_seconds() * 1000
+            st.last_lag_ms = round(max(0.0, lag), 1)
+            st.max_lag_ms = max(st.max_lag_ms, st.last_lag_ms)
+
+    def _on_max_instances(self, event):
+        st = self.stats.get(event.job_id)
+        if st:
+            st.skipped_overlap += 1
+
+    # ---------- reporting ----------
+
+    async def snapshot(self) -> dict:
+        local = {}
+        for job in self.scheduler.get_jobs():
+            local[job.id] = {
+                **self.stats.get(job.id, _JobStats()).as_dict(),
+                "next_run_at": job.next_run_time,
+                "lease_sec": self.leases.get(job.id),
+            }
+        cluster = []
+        if self.db is not None:
+            cluster = await self.locks.find({}).sort("_id", 1).to_list(500)
+        return {
+            "mode": jobs_mode(),
+            "owner": self.owner,
+            "running": self.scheduler.running,
+            "jobs": local,
+            "locks": cluster,
+        }
+
+
+job_runtime = JobRuntime()
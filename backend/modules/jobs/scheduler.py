@@ -1,113 +1,162 @@
 # O1+O2+O9+O11: Jobs Scheduler
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+# All periodic jobs register with the shared job runtime (Mongo leases,
+# one run per period cluster-wide); see modules/jobs/runtime.py
 import logging
 
+from modules.jobs.runtime import job_runtime
+from modules.jobs.timers import timer_queue
+
 logger = logging.getLogger(__name__)
 
-scheduler = AsyncIOScheduler()
 
 def start_jobs_scheduler(db):
-    """Start all background jobs"""
-    
+    """Register all background jobs and start the runtime"""
+    job_runtime.bind(db)
+
     # O1: Tracking sync every 15 minutes
     async def tracking_job():
-        try:
-            from modules.delivery.np.np_tracking_service import NPTrackingService
-            service = NPTrackingService(db)
-            result = await service.sync_all()
-            logger.info(f"Tracking job: {result}")
-        except Exception as e:
-            logger.error(f"Tracking job error: {e}")
+        from modules.delivery.np.np_tracking_service import NPTrackingService
+        service = NPTrackingService(db)
+        result = await service.sync_all()
+        logger.info(f"Tracking job: {result}")
 
-    scheduler.add_job(
-        tracking_job,
-        "interval",
-        minutes=15,
-        id="np_tracking_sync",
-        replace_existing=True
-    )
+    job_runtime.add(tracking_job, "interval", minutes=15, id="np_tracking_sync", lease_sec=900)
 
     # O2: Notifications worker every 30 seconds
     async def notifications_job():
-        try:
-            from modules.notifications.notifications_service import NotificationsService
-            service = NotificationsService(db)
-            await service.init()
-            result = await service.process_queue_once(100)
-            if result["processed"] > 0 or result["failed"] > 0:
-                logger.info(f"Notifications job: {result}")
-        except Exception as e:
-            logger.error(f"Notifications job error: {e}")
+        from modules.notifications.notifications_service import NotificationsService
+        service = NotificationsService(db)
+        await service.init()
+        result = await service.process_queue_once(100)
+        if result["processed"] > 0 or result["failed"] > 0:
+            logger.info(f"Notifications job: {result}")
 
-    scheduler.add_job(
-        notifications_job,
-        "interval",
-        seconds=30,
-        id="notifications_worker",
-        replace_existing=True
-    )
+    job_runtime.add(notifications_job, "interval", seconds=30, id="notifications_worker", lease_sec=120, jitter=3)
 
     # O9: Admin alerts worker every 15 seconds (for FastAPI process fallback)
     # Note: Main alerts processing is in bot process, this is backup
     async def alerts_fallback_job():
-        try:
-            import os
-            token = os.getenv("TELEGRAM_BOT_TOKEN")
-            if not token:
-                return
-            
-            from modules.bot.alerts_worker import AlertsWorker
-            worker = AlertsWorker(db, token)
-            await worker.init()
-            result = await worker.process_once()
-            if result.get("sent", 0) > 0:
-                logger.info(f"Alerts fallback job: {result}")
-        except Exception as e:
-            logger.error(f"Alerts fallback job error: {e}")
+        import os
+        token = os.getenv("TELEGRAM_BOT_TOKEN")
+        if not token:
+            return
+
+        from modules.bot.alerts_worker import AlertsWorker
+        worker = AlertsWorker(db, token)
+        await worker.init()
+        result = await worker.process_once()
+        if result.get("sent", 0) > 0:
+            logger.info(f"Alerts fallback job: {result}")
 
-    scheduler.add_job(
-        alerts_fallback_job,
-        "interval",
-        seconds=15,
-        id="alerts_fallback",
-        replace_existing=True
-    )
+    job_runtime.add(alerts_fallback_job, "interval", seconds=15, id="alerts_fallback", lease_sec=60, jitter=2)
 
     # O11: Automation engine every 10 minutes
     async def automation_job():
+        from modules.automation.automation_engine import AutomationEngine
+        engine = AutomationEngine(db)
+        await engine.init()
+        result = await engine.run_once()
+        if not result.get("skipped"):
+            logger.info(f"Automation job: {result}")
+
+    job_runtime.add(automation_job, "interval", minutes=10, id="automation_engine")
+
+    # Analytics rollups (sessions, pages, funnel) every 2 minutes
+    rollup_ready = {"indexes": False}
+
+    async def analytics_rollup_job():
+        from modules.analytics.rollup import AnalyticsRollupJob
+        job = AnalyticsRollupJob(db)
+        if not rollup_ready["indexes"]:
+            await job.ensure_indexes()
+            rollup_ready["indexes"] = True
+        result = await job.run_once()
+        if any(r["processed"] for r in result.values()):
+            logger.info(f"Analytics rollup job: {result}")
+
+    job_runtime.add(analytics_rollup_job, "interval", minutes=2, id="analytics_rollup")
+
+    # Seller sub-orders: catch order writes that did not sync inline
+    async def seller_orders_job():
+        from modules.orders.seller_orders import SellerOrdersService
+        result = await SellerOrdersService(db).sync_recent()
+        if result["synced"]:
+            logger.info(f"Seller orders job: {result}")
+
+    job_runtime.add(seller_orders_job, "interval", minutes=2, id="seller_orders_sync")
+
+    # Review rating counters: nightly rebuild from the reviews collection
+    # (also the backfill; trigger via POST /jobs/review_ratings_repair/run)
+    async def review_ratings_job():
+        from modules.reviews.rating_stats import RatingStats
+        result = await RatingStats(db).repair()
+        logger.info(f"Review ratings job: {result}")
+
+    job_runtime.add(review_ratings_job, "cron", hour=3, minute=30, id="review_ratings_repair", lease_sec=3600)
+
+    # Item-to-item recommendations from co-purchases / co-views every 6 hours
+    # (first build: POST /jobs/product_recommendations/run)
+    async def recommendations_job():
+        from modules.products.recommender import Recommender
+        result = await Recommender(db).rebuild()
+        logger.info(f"Recommendations job: {result}")
+
+    job_runtime.add(recommendations_job, "interval", hours=6, id="product_recommendations", lease_sec=3600)
+
+    # Product cards missing or built by an older CARD_VERSION (new deploys,
+    # products written outside the API)
+    async def product_cards_job():
+        from modules.products.cards import ProductCards
+        result = await ProductCards(db).backfill()
+        if result["updated"]:
+            logger.info(f"Product cards job: {result}")
+
+    job_runtime.add(product_cards_job, "interval", minutes=30, id="product_cards_backfill", lease_sec=1800)
+
+    # Native datetime storage: resumes from its checkpoints until DONE, then
+    # only syncs this process's dual-read flag
+    async def datetime_migration_job():
+        from modules.migrations.datetime_migration import run_datetime_migration
+        result = await run_datetime_migration(db)
+        if result:
+            logger.info(f"Datetime migration job: {result}")
+
+    job_runtime.add(datetime_migration_job, "interval", minutes=5, id="datetime_migration", lease_sec=600)
+
+    # Canonical status_c / payment_status_c for orders written before them
+    async def status_backfill_job():
+        from modules.migrations.status_backfill import StatusBackfill
+        result = await StatusBackfill(db).run()
+        if result["batches"]:
+            logger.info(f"Status backfill job: {result}")
+
+    job_runtime.add(status_backfill_job, "interval", minutes=5, id="status_canonical_backfill", lease_sec=600)
+
+    # Module schedulers register their jobs with the same runtime
+    registrations = [
+        ("modules.jobs.guard_scheduler", "start_guard_scheduler", {}),
+        ("modules.pickup_control.pickup_scheduler", "start_pickup_control_scheduler", {"np_service": None}),
+        ("modules.returns.return_scheduler", "start_return_scheduler", {}),
+        ("modules.returns.policy_scheduler", "start_policy_scheduler", {}),
+        ("modules.payments.retry.retry_scheduler", "start_payment_retry_scheduler", {}),
+        ("modules.payments.reconciliation_routes", "start_reconciliation_scheduler", {}),
+        ("modules.revenue.revenue_jobs", "start_revenue_jobs", {}),
+        ("modules.growth.scheduler", "start_growth_scheduler", {}),
+    ]
+    for module_name, fn_name, kwargs in registrations:
         try:
-            from modules.automation.automation_engine import AutomationEngine
-            engine = AutomationEngine(db)
-            await engine.init()
-            result = await engine.run_once()
-            if not result.get("skipped"):
-                logger.info(f"Automation job: {result}")
+            module = __import__(module_name, fromlist=[fn_name])
+            getattr(module, fn_name)(db, **kwargs)
         except Exception as e:
-            logger.error(f"Automation job error: {e}")
-
-    scheduler.add_job(
-        automation_job,
-        "interval",
-        minutes=10,
-        id="automation_engine",
-        replace_existing=True
-    )
-
-    scheduler.start()
-    logger.info("Jobs scheduler started: tracking (15min), notifications (30s), alerts (15s), automation (10min)")
-    
-    # O13-O18: Start Guard + Analytics scheduler
-    try:
-        from modules.jobs.guard_scheduler import start_guard_scheduler
-        start_guard_scheduler(db)
-        logger.info("Guard + Analytics scheduler started: guard (10min), analytics daily (02:10 UTC)")
-    except Exception as e:
-        logger.error(f"Guard scheduler failed to start: {e}")
+            logger.error(f"{module_name}.{fn_name} failed to register: {e}")
 
-    # O20: Start Pickup Control scheduler
+    job_runtime.start()
+    # Delayed tasks (reminders, auto-cancel, nudges) registered above
+    timer_queue.start(db)
+    # Payment callbacks queued by the webhook endpoints
     try:
-        from modules.pickup_control.pickup_scheduler import start_pickup_control_scheduler
-        start_pickup_control_scheduler(db, np_service=None)
-        logger.info("Pickup Control scheduler started (every 30 min)")
+        from modules.payments.webhook_inbox import start_webhook_inbox
+        start_webhook_inbox(db)
     except Exception as e:
-        logger.error(f"Pickup Control scheduler failed to start: {e}")
+        logger.error(f"Webhook inbox failed to start: {e}")
+    logger.info(f"Jobs scheduler started: {', '.join(sorted(job_runtime.leases))}")
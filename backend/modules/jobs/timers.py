@@ -0,0 +1,257 @@
+"""
+Timer Queue - durable delayed tasks
+
+Time-based follow-ups (payment reminders, auto-cancel, pickup reminders,
+abandoned carts, review requests) are stored as one document per future
+action in `timers` instead of being rediscovered by scanning every open
+order on each tick:
+
+    {_id: key, kind, ref, due_at, payload, status, attempts, ...}
+
+- schedule_timer() is called when an order / cart enters a state;
+  cancel_timers() when it leaves it. Keys make scheduling idempotent
+- the dispatcher claims due tasks atomically (PENDING -> RUNNING with a
+  lease), so several processes can dispatch side by side; it sleeps until
+  the next due_at (at most MAX_IDLE_SEC) and is woken early when this
+  process schedules an earlier task
+- handlers re-check the current state and may return a datetime to snooze
+  the task; failures are retried with backoff up to MAX_ATTEMPTS
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from core.dates import as_datetime, utcnow
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "timers"
+PENDING, RUNNING, DONE, CANCELLED, FAILED = "PENDING", "RUNNING", "DONE", "CANCELLED", "FAILED"
+
+CLAIM_LEASE_SEC = 300
+MAX_ATTEMPTS = 5
+RETRY_BASE_SEC = 60
+MAX_IDLE_SEC = 60
+MIN_SLEEP_SEC = 0.5
+DISPATCH_BATCH = 200
+KEEP_FINISHED_DAYS = 14
+
+Handler = Callable[[dict], Awaitable[Optional[datetime]]]
+
+
+async def schedule_timer(
+    db,
+    kind: str,
+    ref: str,
+    due_at: datetime,
+    key: Optional[str] = None,
+    payload: Optional[dict] = None,
+    reschedule: bool = False,
+) -> str:
+    """
+    Create a timer (idempotent per key). With reschedule=True a pending or
+    cancelled timer is moved to the new due_at; finished ones stay finished.
+    """
+    key = key or f"{kind}:{ref}"
+    now = utcnow()
+    fields = {"kind": kind, "ref": ref, "due_at": due_at, "payload": payload or {}}
+    try:
+        if reschedule:
+            await db[COLLECTION].update_one(
+                {"_id": key, "status": {"$in": [PENDING, CANCELLED]}},
+                {"$set": {**fields, "status": PENDING, "updated_at": now},
+                 "$setOnInsert": {"attempts": 0, "created_at": now}},
+                upsert=True,
+            )
+        else:
+            await db[COLLECTION].update_one(
+                {"_id": key},
+                {"$setOnInsert": {**fields, "status": PENDING, "attempts": 0, "created_at": now}},
+                upsert=True,
+            )
+    except DuplicateKeyError:
+        # already running / done / failed under this key
+        return key
+    timer_queue.notify(due_at)
+    return key
+
+
+async def cancel_timers(db, ref: str, kinds: Optional[Iterable[str]] = None) -> int:
+    """Cancel pending timers of a ref (e.g. order left AWAITING_PAYMENT)"""
+    q = {"ref": ref, "status": PENDING}
+    if kinds:
+        q["kind"] = {"$in": list(kinds)}
+    res = await db[COLLECTION].update_many(q, {"$set": {"status": CANCELLED, "finished_at": utcnow()}})
+    return res.modified_count
+
+
+class TimerQueue:
+    def __init__(self):
+        self.db = None
+        self.handlers: Dict[str, Handler] = {}
+        self.metrics = {"dispatched": 0, "done": 0, "snoozed": 0, "retried": 0, "failed": 0,
+                        "wakeups": 0, "last_batch_ms": 0.0}
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._next_due: Optional[datetime] = None
+
+    @property
+    def col(self):
+        return self.db[COLLECTION]
+
+    def register(self, kind: str, handler: Handler):
+        self.handlers[kind] = handler
+
+    async def ensure_indexes(self):
+        await self.col.create_index([("status", 1), ("due_at", 1)])
+        await self.col.create_index([("ref", 1), ("status", 1)])
+        await self.col.create_index("finished_at", expireAfterSeconds=KEEP_FINISHED_DAYS * 86400)
+
+    def notify(self, due_at: datetime):
+        """Wake the local dispatcher if a task is due before its planned wake-up"""
+        if self._wake is None:
+            return
+        if self._next_due is None or due_at < self._next_due:
+            self._wake.set()
+
+    def start(self, db):
+        """Bind database and start the dispatcher (idempotent)"""
+        self.db = db
+        if self._task and not self._task.done():
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_event_loop().create_task(self._run())
+        logger.info(f"Timer dispatcher started ({', '.join(sorted(self.handlers))})")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ---------- dispatch ----------
+
+    async def _run(self):
+        try:
+            await self.ensure_indexes()
+        except Exception as e:
+            logger.warning(f"Timer indexes not created: {e}")
+        while True:
+            delay = MAX_IDLE_SEC
+            try:
+                await self.run_due()
+                delay = await self._sleep_for()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Timer dispatcher error: {e}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self.metrics["wakeups"] += 1
+
+    async def _sleep_for(self) -> float:
+        nxt = await self.col.find_one(
+            {"status": PENDING, "kind": {"$in": list(self.handlers)}},
+            {"due_at": 1},
+            sort=[("due_at", 1)],
+        )
+        self._next_due = as_datetime((nxt or {}).get("due_at"))
+        if self._next_due is None:
+            return MAX_IDLE_SEC
+        wait = (self._next_due - utcnow()).total_seconds()
+        return max(MIN_SLEEP_SEC, min(MAX_IDLE_SEC, wait))
+
+    async def _reclaim_stale(self, now: datetime):
+        """Tasks whose dispatcher died mid-run go back to PENDING"""
+        await self.col.update_many(
+            {"status": RUNNING, "locked_until": {"$lt": now}},
+            {"$set": {"status": PENDING}},
+        )
+
+    async def _claim(self, now: datetime) -> Optional[dict]:
+        return await self.col.find_one_and_update(
+            {"status": PENDING, "due_at": {"$lte": now}, "kind": {"$in": list(self.handlers)}},
+            {"$set": {"status": RUNNING, "locked_until": now + timedelta(seconds=CLAIM_LEASE_SEC)},
+             "$inc": {"attempts": 1}},
+            sort=[("due_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def run_due(self, limit: int = DISPATCH_BATCH) -> dict:
+        """Run every task that is due now (up to limit)"""
+        if self.db is None or not self.handlers:
+            return {"dispatched": 0}
+        started = time.monotonic()
+        now = utcnow()
+        await self._reclaim_stale(now)
+
+        dispatched = 0
+        while dispatched < limit:
+            task = await self._claim(now)
+            if not task:
+                break
+            dispatched += 1
+            await self._dispatch(task)
+
+        self.metrics["dispatched"] += dispatched
+        if dispatched:
+            self.metrics["last_batch_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return {"dispatched": dispatched}
+
+    async def _dispatch(self, task: dict):
+        handler = self.handlers[task["kind"]]
+        now = utcnow()
+        try:
+            snooze_until = await handler(task)
+        except Exception as e:
+            attempts = int(task.get("attempts") or 1)
+            if attempts >= MAX_ATTEMPTS:
+                self.metrics["failed"] += 1
+                update = {"status": FAILED, "error": str(e)[:500], "finished_at": now}
+            else:
+                self.metrics["retried"] += 1
+                backoff = RETRY_BASE_SEC * (2 ** (attempts - 1))
+                update = {"status": PENDING, "error": str(e)[:500], "due_at": now + timedelta(seconds=backoff)}
+            logger.warning(f"Timer {task['_id']} failed (attempt {attempts}): {e}")
+            await self.col.update_one({"_id": task["_id"], "status": RUNNING}, {"$set": update})
+            return
+
+        if snooze_until:
+            self.metrics["snoozed"] += 1
+            update = {"status": PENDING, "due_at": snooze_until, "attempts": 0}
+        else:
+            self.metrics["done"] += 1
+            update = {"status": DONE, "finished_at": now}
+        # a concurrent cancel_timers() only matches PENDING, so RUNNING is still ours
+        await self.col.update_one({"_id": task["_id"], "status": RUNNING}, {"$set": update})
+
+    async def stats(self) -> dict:
+        by_status = {}
+        if self.db is not None:
+            rows = await self.col.aggregate([
+                {"$match": {"status": {"$in": [PENDING, RUNNING, FAILED]}}},
+                {"$group": {"_id": {"kind": "$kind", "status": "$status"}, "n": {"$sum": 1}}},
+            ]).to_list(None)
+            for r in rows:
+                by_status.setdefault(r["_id"]["kind"], {})[r["_id"]["status"]] = r["n"]
+        return {
+            **self.metrics,
+            "running": bool(self._task and not self._task.done()),
+            "next_due_at": self._next_due,
+            "handlers": sorted(self.handlers),
+            "open": by_status,
+        }
+
+
+timer_queue = TimerQueue()
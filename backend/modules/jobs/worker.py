@@ -0,0 +1,57 @@
+"""
+Dedicated jobs worker
+
+    JOBS_MODE=worker python -m modules.jobs.worker
+
+Runs every background job outside the web workers. Web processes started
+with JOBS_MODE=worker skip the scheduler; the Mongo leases still guard
+against two workers (or a web worker in JOBS_MODE=web) running the same job.
+"""
+import asyncio
+import logging
+import os
+import signal
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+load_dotenv(Path(__file__).resolve().parents[2] / ".env")
+
+from modules.jobs.runtime import job_runtime, jobs_enabled  # noqa: E402
+from modules.jobs.scheduler import start_jobs_scheduler  # noqa: E402
+from modules.jobs.timers import timer_queue  # noqa: E402
+from modules.guard.guard_stream import stop_guard_stream  # noqa: E402
+from modules.payments.webhook_inbox import webhook_inbox  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+logger = logging.getLogger("jobs.worker")
+
+
+async def main():
+    if not jobs_enabled("worker"):
+        logger.warning("JOBS_MODE=off, nothing to run")
+        return
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    start_jobs_scheduler(db)
+    logger.info(f"Jobs worker running as {job_runtime.owner}")
+    await stop.wait()
+
+    logger.info("Jobs worker stopping")
+    await timer_queue.stop()
+    await webhook_inbox.stop()
+    await stop_guard_stream()
+    await job_runtime.shutdown()
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1 @@
+# Media Module (kept import-free: image pipeline workers import this package)
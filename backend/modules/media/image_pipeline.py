@@ -0,0 +1,227 @@
+"""
+Image pipeline - uploads decoded and resized off the event loop
+
+- decoding / resizing / encoding runs in a process pool (IMAGE_WORKERS),
+  so a large photo never blocks request handling; hashing and file writes
+  go to threads
+- each upload becomes width-bucketed variants (thumb / card / full), each
+  as JPEG and WebP; sources are never upscaled
+- content-addressed: files live under <kind>/<hash[:2]>/<hash>/, an upload
+  whose bytes were seen before returns the stored manifest without any
+  processing, and identical uploads in flight are processed once
+- files are written to a temp name and renamed; manifest.json is written
+  last, so a manifest on disk always points at complete variants
+
+process_image() is the only code run in the workers and imports nothing
+from the app, which keeps spawned workers cheap.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# name -> target width (px)
+VARIANTS: Tuple[Tuple[str, int], ...] = (("thumb", 320), ("card", 640), ("full", 1600))
+FORMATS = (("jpeg", "jpg"), ("webp", "webp"))
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+MAX_PIXELS = 50_000_000
+MAX_BYTES = 25 * 1024 * 1024
+DEFAULT_SIZES = "(max-width: 640px) 100vw, 640px"
+KINDS = ("slides", "products", "content")
+
+UPLOAD_ROOT = Path(os.environ.get("UPLOAD_ROOT", "/app/frontend/public/uploads"))
+PUBLIC_PREFIX = os.environ.get("UPLOAD_PUBLIC_PREFIX", "/uploads")
+WORKERS = int(os.environ.get("IMAGE_WORKERS", min(4, os.cpu_count() or 1)))
+
+
+class ImageRejected(ValueError):
+    """Upload is not a decodable image within the limits"""
+
+
+# ---------- worker side ----------
+
+def process_image(content: bytes, variants=VARIANTS) -> dict:
+    """Decode, normalise and encode all variants; returns encoded bytes per variant/format"""
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    try:
+        image = Image.open(io.BytesIO(content))
+        image.load()
+    except Image.DecompressionBombError:
+        raise ImageRejected("IMAGE_TOO_LARGE")
+    except Exception as e:
+        raise ImageRejected(f"IMAGE_DECODE_FAILED: {e}")
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        # flatten transparency on white (JPEG has no alpha)
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.split()[-1])
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    src_w, src_h = image.size
+    out, widths_done = [], set()
+    # widest first, so each step resizes from the previous (smaller) image
+    current = image
+    for name, width in sorted(variants, key=lambda v: -v[1]):
+        w = min(width, src_w)
+        if w in widths_done:
+            continue
+        widths_done.add(w)
+        h = max(1, round(src_h * w / src_w))
+        if (w, h) != current.size:
+            current = current.resize((w, h), Image.LANCZOS)
+        for fmt, _ in FORMATS:
+            buf = io.BytesIO()
+            if fmt == "jpeg":
+                current.save(buf, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            else:
+                current.save(buf, "WEBP", quality=WEBP_QUALITY, method=4)
+            out.append({"name": name, "width": w, "height": h, "format": fmt, "data": buf.getvalue()})
+    return {"width": src_w, "height": src_h, "variants": out}
+
+
+# ---------- loop side ----------
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _read_manifest(path: Path) -> Optional[dict]:
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class ImagePipeline:
+    def __init__(self, root: Path = UPLOAD_ROOT, public_prefix: str = PUBLIC_PREFIX, workers: int = WORKERS):
+        self.root = Path(root)
+        self.public_prefix = public_prefix.rstrip("/")
+        self.workers = max(1, workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: workers never inherit the app's Mongo / scheduler threads
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _dir(self, kind: str, digest: str) -> Path:
+        return self.root / kind / digest[:2] / digest
+
+    def _url(self, kind: str, digest: str, filename: str) -> str:
+        return f"{self.public_prefix}/{kind}/{digest[:2]}/{digest}/{filename}"
+
+    def _manifest(self, kind: str, digest: str, processed: dict) -> dict:
+        variants: Dict[str, dict] = {}
+        srcset: Dict[str, List[str]] = {fmt: [] for fmt, _ in FORMATS}
+        ext = dict(FORMATS)
+        for v in processed["variants"]:
+            url = self._url(kind, digest, f"{v['name']}.{ext[v['format']]}")
+            entry = variants.setdefault(v["name"], {"width": v["width"], "height": v["height"]})
+            entry[v["format"]] = url
+            srcset[v["format"]].append(f"{url} {v['width']}w")
+        # buckets wider than a small source share the file of the source width
+        for name, width in VARIANTS:
+            if name not in variants:
+                w = min(width, processed["width"])
+                variants[name] = next(v for v in variants.values() if v["width"] == w)
+        full = variants["full"]
+        return {
+            "hash": digest,
+            "kind": kind,
+            "width": processed["width"],
+            "height": processed["height"],
+            "url": full["jpeg"],
+            "variants": variants,
+            "srcset": {fmt: ", ".join(sorted(s, key=lambda x: int(x.rsplit(" ", 1)[1][:-1])))
+                       for fmt, s in srcset.items()},
+            "sizes": DEFAULT_SIZES,
+        }
+
+    async def _process(self, kind: str, digest: str, content: bytes) -> dict:
+        loop = asyncio.get_running_loop()
+        processed = await loop.run_in_executor(self._executor(), process_image, content)
+        directory = self._dir(kind, digest)
+        ext = dict(FORMATS)
+
+        def write_all() -> dict:
+            for v in processed["variants"]:
+                _write_atomic(directory / f"{v['name']}.{ext[v['format']]}", v["data"])
+            manifest = self._manifest(kind, digest, processed)
+            _write_atomic(directory / "manifest.json", json.dumps(manifest).encode())
+            return manifest
+
+        return await asyncio.to_thread(write_all)
+
+    async def ingest(self, content: bytes, kind: str = "slides") -> dict:
+        """Store an upload; returns its srcset manifest (+ deduplicated flag)"""
+        if kind not in KINDS:
+            raise ImageRejected(f"UNSUPPORTED_KIND: {kind}")
+        if not content:
+            raise ImageRejected("EMPTY_UPLOAD")
+        if len(content) > MAX_BYTES:
+            raise ImageRejected("IMAGE_TOO_LARGE")
+
+        digest = (await asyncio.to_thread(hashlib.sha256, content)).hexdigest()[:32]
+        stored = await asyncio.to_thread(_read_manifest, self._dir(kind, digest) / "manifest.json")
+        if stored:
+            return {**stored, "deduplicated": True}
+
+        key = f"{kind}:{digest}"
+        fut = self._inflight.get(key)
+        if fut is not None:
+            return {**await asyncio.shield(fut), "deduplicated": True}
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            manifest = await self._process(kind, digest, content)
+            fut.set_result(manifest)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            # retrieved here so a failure with no waiters is not logged as unhandled
+            fut.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        return {**manifest, "deduplicated": False}
+
+
+image_pipeline = ImagePipeline()
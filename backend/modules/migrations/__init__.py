@@ -0,0 +1 @@
+# Migrations module - online storage migrations
@@ -0,0 +1,158 @@
+"""
+Datetime Migration - ISO string timestamps -> native BSON datetimes
+
+Resumable, batched background migration:
+- walks each collection in _id order, BATCH_SIZE documents at a time
+- converts string fields server-side with $convert (no per-document round trips)
+- checkpoints the last processed _id in schema_migrations after every batch
+- flips core.dates dual-read off once every collection is done
+- runs as the datetime_migration job (one holder cluster-wide); other
+  workers read the stored status at startup and keep dual-read on until then
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from core.dates import utcnow, set_dual_read, to_date_expr
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_ID = "datetime_v1"
+BATCH_SIZE = 500
+BATCH_PAUSE_SEC = 0.2
+
+# collection -> timestamp fields; "array.field" entries are converted inside arrays
+MIGRATION_FIELDS: Dict[str, List[str]] = {
+    "orders": [
+        "created_at",
+        "updated_at",
+        "paid_at",
+        "cancelled_at",
+        "payment.paid_at",
+        "status_history.at",
+    ],
+    "domain_events": ["created_at", "updated_at", "next_retry_at"],
+    "notification_queue": ["created_at", "updated_at", "next_retry_at"],
+}
+
+ARRAY_FIELDS = {"status_history"}
+
+
+def _field_update(field: str) -> tuple:
+    """(filter, pipeline update) converting one field for documents still holding strings"""
+    head, _, tail = field.partition(".")
+    if head in ARRAY_FIELDS and tail:
+        return (
+            {f"{head}.{tail}": {"$type": "string"}},
+            [{"$set": {head: {"$map": {
+                "input": f"${head}",
+                "in": {"$mergeObjects": ["$$this", {tail: {"$convert": {
+                    "input": f"$$this.{tail}", "to": "date",
+                    "onError": f"$$this.{tail}", "onNull": None,
+                }}}]},
+            }}}}],
+        )
+    return (
+        {field: {"$type": "string"}},
+        [{"$set": {field: {"$ifNull": [to_date_expr(f"${field}"), f"${field}"]}}}],
+    )
+
+
+class DateTimeMigration:
+    def __init__(self, db):
+        self.db = db
+        self.state = db["schema_migrations"]
+
+    async def get_state(self) -> dict:
+        doc = await self.state.find_one({"_id": MIGRATION_ID})
+        if not doc:
+            doc = {
+                "_id": MIGRATION_ID,
+                "status": "PENDING",
+                "collections": {
+                    name: {"last_id": None, "converted": 0, "done": False}
+                    for name in MIGRATION_FIELDS
+                },
+                "created_at": utcnow(),
+            }
+            await self.state.update_one({"_id": MIGRATION_ID}, {"$setOnInsert": doc}, upsert=True)
+        return doc
+
+    async def refresh_dual_read(self) -> bool:
+        """Sync process-wide dual-read flag with the stored migration status"""
+        doc = await self.state.find_one({"_id": MIGRATION_ID}, {"status": 1})
+        done = bool(doc and doc.get("status") == "DONE")
+        set_dual_read(not done)
+        return done
+
+    async def run_batch(self, name: str, last_id=None) -> dict:
+        """Convert one batch of one collection; returns new checkpoint"""
+        col = self.db[name]
+        q = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        ids = [d["_id"] async for d in col.find(q, {"_id": 1}).sort("_id", 1).limit(BATCH_SIZE)]
+        if not ids:
+            return {"last_id": last_id, "converted": 0, "done": True}
+
+        converted = 0
+        for field in MIGRATION_FIELDS[name]:
+            flt, pipeline = _field_update(field)
+            res = await col.update_many({"_id": {"$in": ids}, **flt}, pipeline)
+            converted += res.modified_count
+
+        return {"last_id": ids[-1], "converted": converted, "done": len(ids) < BATCH_SIZE}
+
+    async def run(self, max_batches: Optional[int] = None) -> dict:
+        """Run (or resume) the migration from stored checkpoints"""
+        st = await self.get_state()
+        await self.state.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {"status": "RUNNING", "started_at": utcnow()}}
+        )
+
+        batches = 0
+        for name in MIGRATION_FIELDS:
+            cp = (st.get("collections") or {}).get(name) or {}
+            if cp.get("done"):
+                continue
+            last_id = cp.get("last_id")
+            while True:
+                if max_batches is not None and batches >= max_batches:
+                    return {"ok": True, "status": "RUNNING", "batches": batches}
+                res = await self.run_batch(name, last_id)
+                last_id = res["last_id"]
+                batches += 1
+                await self.state.update_one(
+                    {"_id": MIGRATION_ID},
+                    {
+                        "$set": {
+                            f"collections.{name}.last_id": last_id,
+                            f"collections.{name}.done": res["done"],
+                            "updated_at": utcnow(),
+                        },
+                        "$inc": {f"collections.{name}.converted": res["converted"]},
+                    }
+                )
+                if res["done"]:
+                    break
+                await asyncio.sleep(BATCH_PAUSE_SEC)
+
+        await self.state.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {"status": "DONE", "finished_at": utcnow()}}
+        )
+        set_dual_read(False)
+        logger.info(f"Datetime migration finished after {batches} batches")
+        return {"ok": True, "status": "DONE", "batches": batches}
+
+    async def reset(self):
+        """Restart from scratch (e.g. after legacy writers were found and fixed)"""
+        await self.state.delete_one({"_id": MIGRATION_ID})
+        set_dual_read(True)
+
+
+async def run_datetime_migration(db) -> Optional[dict]:
+    """Job body: resume the migration unless it is DONE (then only sync dual-read)"""
+    mig = DateTimeMigration(db)
+    if await mig.refresh_dual_read():
+        return None
+    return await mig.run()
@@ -0,0 +1,63 @@
+"""
+Migration Routes - status and control of online storage migrations
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from core.db import db
+from core.dates import is_dual_read
+from core.security import get_current_admin
+from modules.jobs.runtime import job_runtime
+from modules.migrations.datetime_migration import DateTimeMigration
+from modules.migrations.status_backfill import MIGRATION_ID as STATUS_MIGRATION_ID, StatusBackfill
+
+router = APIRouter(prefix="/migrations", tags=["Migrations"])
+
+
+@router.get("/datetime")
+async def datetime_migration_status(current_user: dict = Depends(get_current_admin)):
+    """Datetime migration checkpoints and dual-read flag of this worker"""
+    st = await DateTimeMigration(db).get_state()
+    st.pop("_id", None)
+    for cp in (st.get("collections") or {}).values():
+        if cp.get("last_id") is not None:
+            cp["last_id"] = str(cp["last_id"])
+    return {"id": "datetime_v1", "dual_read": is_dual_read(), **st}
+
+
+@router.post("/datetime/start")
+async def datetime_migration_start(current_user: dict = Depends(get_current_admin)):
+    """Start or resume the datetime migration (runs as the datetime_migration job)"""
+    if not job_runtime.run_now("datetime_migration"):
+        raise HTTPException(status_code=404, detail="Job not registered in this process")
+    return {"ok": True, "job_id": "datetime_migration"}
+
+
+@router.post("/datetime/reset")
+async def datetime_migration_reset(current_user: dict = Depends(get_current_admin)):
+    """Drop checkpoints; next start re-scans all collections"""
+    await DateTimeMigration(db).reset()
+    return {"ok": True}
+
+
+@router.get("/status-canonical")
+async def status_backfill_status(current_user: dict = Depends(get_current_admin)):
+    """Canonical status backfill checkpoint"""
+    st = await StatusBackfill(db).get_state()
+    st.pop("_id", None)
+    if st.get("last_id") is not None:
+        st["last_id"] = str(st["last_id"])
+    return {"id": STATUS_MIGRATION_ID, **st}
+
+
+@router.post("/status-canonical/start")
+async def status_backfill_start(current_user: dict = Depends(get_current_admin)):
+    """Start or resume the canonical status backfill (runs as the status_canonical_backfill job)"""
+    if not job_runtime.run_now("status_canonical_backfill"):
+        raise HTTPException(status_code=404, detail="Job not registered in this process")
+    return {"ok": True, "job_id": "status_canonical_backfill"}
+
+
+@router.post("/status-canonical/reset")
+async def status_backfill_reset(current_user: dict = Depends(get_current_admin)):
+    """Drop checkpoint; next start re-scans all orders"""
+    await StatusBackfill(db).reset()
+    return {"ok": True}
@@ -0,0 +1,124 @@
+"""
+Status Backfill - canonical status_c / payment_status_c for existing orders
+
+Writers keep status_c / payment_status_c in sync (see order_status.status_fields);
+this one-off job fills them in for orders written before that:
+- walks orders in _id order, BATCH_SIZE documents at a time
+- maps legacy spellings in Python, applies one bulk_write per batch
+- checkpoints the last processed _id in schema_migrations
+- runs as the status_canonical_backfill job (one holder cluster-wide)
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from pymongo import UpdateOne
+
+from core.dates import utcnow
+from modules.orders.order_status import canonical_status, canonical_payment_status
+
+logger = logging.getLogger(__name__)
+
+# v2: re-scan after the Fondy paid path started writing status_c
+MIGRATION_ID = "status_canonical_v2"
+BATCH_SIZE = 1000
+BATCH_PAUSE_SEC = 0.1
+
+
+def canonical_fields(order: dict) -> dict:
+    """status_c / payment_status_c for one stored order"""
+    payment = order.get("payment") or {}
+    raw_payment = order.get("payment_status") or payment.get("status")
+    return {
+        "status_c": canonical_status(order.get("status")),
+        "payment_status_c": canonical_payment_status(raw_payment),
+    }
+
+
+class StatusBackfill:
+    def __init__(self, db):
+        self.db = db
+        self.orders = db["orders"]
+        self.state = db["schema_migrations"]
+
+    async def get_state(self) -> dict:
+        doc = await self.state.find_one({"_id": MIGRATION_ID})
+        if not doc:
+            doc = {
+                "_id": MIGRATION_ID,
+                "status": "PENDING",
+                "last_id": None,
+                "updated": 0,
+                "created_at": utcnow(),
+            }
+            await self.state.update_one({"_id": MIGRATION_ID}, {"$setOnInsert": doc}, upsert=True)
+        return doc
+
+    async def run_batch(self, last_id=None) -> dict:
+        q = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        proj = {"_id": 1, "status": 1, "payment_status": 1, "payment.status": 1, "status_c": 1, "payment_status_c": 1}
+        docs = await self.orders.find(q, proj).sort("_id", 1).limit(BATCH_SIZE).to_list(BATCH_SIZE)
+        if not docs:
+            return {"last_id": last_id, "updated": 0, "done": True}
+
+        ops = []
+        for d in docs:
+            fields = canonical_fields(d)
+            if d.get("status_c") != fields["status_c"] or d.get("payment_status_c") != fields["payment_status_c"]:
+                # skip orders whose raw status changed since the read; their
+                # writer already set status_c / payment_status_c
+                flt = {
+                    "_id": d["_id"],
+                    "status": d.get("status"),
+                    "payment_status": d.get("payment_status"),
+                    "payment.status": (d.get("payment") or {}).get("status"),
+                }
+                ops.append(UpdateOne(flt, {"$set": fields}))
+
+        updated = 0
+        if ops:
+            res = await self.orders.bulk_write(ops, ordered=False)
+            updated = res.modified_count
+
+        return {"last_id": docs[-1]["_id"], "updated": updated, "done": len(docs) < BATCH_SIZE}
+
+    async def run(self, max_batches: Optional[int] = None) -> dict:
+        """Run (or resume) the backfill from the stored checkpoint"""
+        st = await self.get_state()
+        if st.get("status") == "DONE":
+            return {"ok": True, "status": "DONE", "batches": 0}
+
+        await self.state.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {"status": "RUNNING", "started_at": utcnow()}}
+        )
+
+        last_id = st.get("last_id")
+        batches = 0
+        while True:
+            if max_batches is not None and batches >= max_batches:
+                return {"ok": True, "status": "RUNNING", "batches": batches}
+            res = await self.run_batch(last_id)
+            last_id = res["last_id"]
+            batches += 1
+            await self.state.update_one(
+                {"_id": MIGRATION_ID},
+                {
+                    "$set": {"last_id": last_id, "updated_at": utcnow()},
+                    "$inc": {"updated": res["updated"]},
+                }
+            )
+            if res["done"]:
+                break
+            await asyncio.sleep(BATCH_PAUSE_SEC)
+
+        await self.state.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {"status": "DONE", "finished_at": utcnow()}}
+        )
+        logger.info(f"Status backfill finished after {batches} batches")
+        return {"ok": True, "status": "DONE", "batches": batches}
+
+    async def reset(self):
+        """Re-scan all orders (e.g. after alias tables changed)"""
+        await self.state.delete_one({"_id": MIGRATION_ID})
@@ -1,10 +1,9 @@
 # O2: Notifications Repository
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from datetime import datetime, timezone
+from datetime import datetime
 import uuid
 
-def utcnow():
-    return datetime.now(timezone.utc).isoformat()
+from core.dates import utcnow, date_range
 
 class NotificationsRepo:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -44,7 +43,7 @@ class NotificationsRepo:
         cur = self.col.find({
             "$or": [
                 {"status": "PENDING"},
-                {"status": "FAILED", "next_retry_at": {"$lte": now}}
+                {"status": "FAILED", **date_range("next_retry_at", lte=now)}
             ]
         }).sort("created_at", 1).limit(limit)
         return [x async for x in cur]
@@ -55,7 +54,7 @@ class NotificationsRepo:
             {"$set": {"status": "SENT", "provider_meta": provider_meta, "updated_at": utcnow()}}
         )
 
-    async def mark_failed(self, id_: str, reason: str, attempts: int, next_retry_at: str):
+    async def mark_failed(self, id_: str, reason: str, attempts: int, next_retry_at: datetime):
         await self.col.update_one(
             {"id": id_},
             {"$set": {
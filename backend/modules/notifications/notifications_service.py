@@ -12,13 +12,10 @@ logger = logging.getLogger(__name__)
 def utcnow():
     return datetime.now(timezone.utc)
 
-def iso(dt):
-    return dt.isoformat()
-
-def backoff(attempts: int) -> str:
+def backoff(attempts: int) -> datetime:
     minutes = [1, 5, 15, 60, 240]
     m = minutes[min(attempts, len(minutes) - 1)]
-    return iso(utcnow() + timedelta(minutes=m))
+    return utcnow() + timedelta(minutes=m)
 
 class NotificationsService:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -2,6 +2,7 @@
 import httpx
 import logging
 from core.config import settings
+from core.metrics import outbound
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +21,7 @@ class TurboSMSProvider:
         headers = {"Authorization": f"Bearer {settings.TURBOSMS_TOKEN}"}
 
         try:
-            async with httpx.AsyncClient(timeout=20) as client:
+            async with outbound("turbosms", "send"), httpx.AsyncClient(timeout=20) as client:
                 r = await client.post(url, json=payload, headers=headers)
                 return {
                     "status_code": r.status_code,
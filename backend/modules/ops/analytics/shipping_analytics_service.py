@@ -1,5 +1,6 @@
 # O3: Shipping Analytics Service
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from core.dates import day_bucket
 
 class ShippingAnalyticsService:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -13,7 +14,7 @@ class ShippingAnalyticsService:
                 "shipment.created_at": {"$gte": date_from, "$lte": date_to}
             }},
             {"$addFields": {
-                "day": {"$substr": ["$shipment.created_at", 0, 10]},
+                "day": day_bucket("$shipment.created_at"),
                 "grand": {"$ifNull": ["$totals.grand", 0]},
                 "ship_cost": {"$ifNull": ["$shipment.cost", 0]},
             }},
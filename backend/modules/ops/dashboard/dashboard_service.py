@@ -3,6 +3,7 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from modules.finance.finance_service import FinanceService
 from modules.ops.analytics.shipping_analytics_service import ShippingAnalyticsService
 from modules.returns.return_analytics import ReturnAnalyticsService
+from core.dates import date_range
 
 class OpsDashboardService:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -42,7 +43,7 @@ class OpsDashboardService:
 
     async def notifications_stats(self, date_from: str, date_to: str):
         pipeline = [
-            {"$match": {"created_at": {"$gte": date_from, "$lte": date_to}}},
+            {"$match": date_range("created_at", gte=date_from, lte=date_to)},
             {"$group": {"_id": "$status", "count": {"$sum": 1}}},
         ]
         rows = await self.notifs.aggregate(pipeline).to_list(length=20)
@@ -55,7 +56,7 @@ class OpsDashboardService:
 
     async def orders_funnel(self, date_from: str, date_to: str):
         pipeline = [
-            {"$match": {"created_at": {"$gte": date_from, "$lte": date_to}}},
+            {"$match": date_range("created_at", gte=date_from, lte=date_to)},
             {"$group": {"_id": "$status", "count": {"$sum": 1}}},
         ]
         rows = await self.orders.aggregate(pipeline).to_list(length=50)
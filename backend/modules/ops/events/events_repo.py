@@ -1,13 +1,12 @@
 # O2: Events Repository (Outbox Pattern)
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from datetime import datetime, timezone
+from datetime import datetime
 import uuid
 import logging
 
-logger = logging.getLogger(__name__)
+from core.dates import utcnow, date_range
 
-def utcnow():
-    return datetime.now(timezone.utc).isoformat()
+logger = logging.getLogger(__name__)
 
 class EventsRepo:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -40,7 +39,7 @@ class EventsRepo:
         cur = self.col.find({
             "$or": [
                 {"status": "NEW"},
-                {"status": "FAILED", "next_retry_at": {"$lte": now}}
+                {"status": "FAILED", **date_range("next_retry_at", lte=now)}
             ]
         }).sort("created_at", 1).limit(limit)
         return [x async for x in cur]
@@ -57,7 +56,7 @@ class EventsRepo:
             {"$set": {"status": "DONE", "updated_at": utcnow()}}
         )
 
-    async def mark_failed(self, event_id: str, reason: str, attempts: int, next_retry_at: str):
+    async def mark_failed(self, event_id: str, reason: str, attempts: int, next_retry_at: datetime):
         await self.col.update_one(
             {"id": event_id},
             {"$set": {
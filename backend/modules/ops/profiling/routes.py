@@ -0,0 +1,75 @@
+"""
+Profiling Routes - Prometheus /metrics and admin hot-path views
+
+- GET /metrics: Prometheus text format for this process; requires the
+  METRICS_TOKEN Bearer token, or an admin JWT when METRICS_TOKEN is unset
+- GET  /profiler/hotspots: slowest routes and routes with the most Mongo
+  commands per request (N+1 candidates), slowest collections, outbound calls
+- POST /profiler/sample: sampling profile of the event loop; opt-in via
+  PROFILER_ENABLED=1
+"""
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from core.metrics import (
+    HTTP_LATENCY, HTTP_MONGO_COMMANDS, JOB_DURATION, MONGO_LATENCY, OUTBOUND_LATENCY, metrics,
+)
+from core.security import get_current_admin, get_current_user
+from .sampler import profiler_enabled, sampling_profiler
+
+metrics_router = APIRouter(tags=["Metrics"])
+router = APIRouter(prefix="/profiler", tags=["Profiler"])
+
+
+async def require_metrics_access(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
+):
+    """Scraper token when METRICS_TOKEN is set, otherwise an admin JWT; never open"""
+    if not credentials:
+        raise HTTPException(status_code=401, detail="Unauthorized", headers={"WWW-Authenticate": "Bearer"})
+    token = os.environ.get("METRICS_TOKEN")
+    if token:
+        if not hmac.compare_digest(credentials.credentials.encode(), token.encode()):
+            raise HTTPException(status_code=401, detail="Unauthorized", headers={"WWW-Authenticate": "Bearer"})
+        return
+    await get_current_admin(await get_current_user(credentials))
+
+
+@metrics_router.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/hotspots")
+async def hotspots(limit: int = Query(default=20, le=200), current_user: dict = Depends(get_current_admin)):
+    """Where request time goes on this process since start (sum / mean in seconds)"""
+    # mean of this histogram = Mongo commands per request: high values point at N+1 loops
+    by_commands = sorted(HTTP_MONGO_COMMANDS.summary(), key=lambda r: r["mean"], reverse=True)
+    return {
+        "routes_by_time": HTTP_LATENCY.summary()[:limit],
+        "routes_by_mongo_commands": by_commands[:limit],
+        "mongo_by_time": MONGO_LATENCY.summary()[:limit],
+        "outbound_by_time": OUTBOUND_LATENCY.summary()[:limit],
+        "jobs_by_time": JOB_DURATION.summary()[:limit],
+    }
+
+
+@router.post("/sample")
+async def sample(
+    seconds: float = Query(default=10, gt=0, le=60),
+    interval_ms: float = Query(default=5, ge=1, le=1000),
+    top: int = Query(default=30, le=200),
+    current_user: dict = Depends(get_current_admin),
+):
+    """Sample the event loop of the process serving this request"""
+    if not profiler_enabled():
+        raise HTTPException(status_code=403, detail="Profiler disabled (set PROFILER_ENABLED=1)")
+    try:
+        return await sampling_profiler.profile(seconds, interval_ms, top)
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="Another profile is running in this process")
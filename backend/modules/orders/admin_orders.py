@@ -0,0 +1,134 @@
+"""
+Admin Orders Query - paged, filterable order listing for admin views
+
+- keyset pagination on _id (newest first), so page cost does not grow
+  with the total number of orders; callers that pass neither limit nor
+  cursor keep the original unpaged listing (fetch_all)
+- customers and products for a whole page are fetched with one $in query
+  each instead of a find_one per order / line item
+- exports stream the same pages as a JSON array
+"""
+import json
+import re
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from core.dates import date_range
+from .order_status import canonical_status, canonical_payment_status
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+EXPORT_BATCH = 500
+# cap of the original unpaged /admin/orders listing
+LEGACY_LIMIT = 10000
+
+
+def build_filter(
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    buyer_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    q: Optional[str] = None,
+) -> dict:
+    """Mongo filter for admin order queries; statuses match any stored spelling"""
+    query = {}
+    if status:
+        query["status_c"] = canonical_status(status) or status
+    if payment_status:
+        query["payment_status_c"] = canonical_payment_status(payment_status) or payment_status
+    if buyer_id:
+        query["$or"] = [{"buyer_id": buyer_id}, {"user_id": buyer_id}]
+    if date_from or date_to:
+        query.update(date_range("created_at", gte=date_from, lt=date_to))
+    if q:
+        query["order_number"] = {"$regex": "^" + re.escape(q.strip()), "$options": "i"}
+    return query
+
+
+def _cursor_filter(query: dict, cursor: Optional[str]) -> dict:
+    if not cursor:
+        return query
+    try:
+        return {**query, "_id": {"$lt": ObjectId(cursor)}}
+    except (InvalidId, TypeError):
+        return query
+
+
+def _buyer_id(order: dict) -> Optional[str]:
+    return order.get("buyer_id") or order.get("user_id")
+
+
+async def enrich_orders(db, orders: List[dict]) -> List[dict]:
+    """Attach customer and product fields with one $in lookup per collection"""
+    buyer_ids = list({b for b in (_buyer_id(o) for o in orders) if b})
+    product_ids = list({
+        item.get("product_id")
+        for o in orders for item in (o.get("items") or [])
+        if item.get("product_id")
+    })
+
+    users = {}
+    if buyer_ids:
+        async for u in db.users.find({"id": {"$in": buyer_ids}}, {"_id": 0, "id": 1, "full_name": 1, "email": 1}):
+            users[u["id"]] = u
+    products = {}
+    if product_ids:
+        async for p in db.products.find(
+            {"id": {"$in": product_ids}},
+            {"_id": 0, "id": 1, "title": 1, "category_name": 1, "price": 1},
+        ):
+            products[p["id"]] = p
+
+    for order in orders:
+        customer = users.get(_buyer_id(order))
+        order["customer_name"] = customer.get("full_name", "N/A") if customer else "Unknown"
+        order["customer_email"] = customer.get("email", "N/A") if customer else "N/A"
+        for item in order.get("items") or []:
+            product = products.get(item.get("product_id"))
+            if product:
+                item["product_name"] = product.get("title", "Unknown Product")
+                item["category_name"] = product.get("category_name")
+                item["price"] = item.get("price", product.get("price", 0))
+    return orders
+
+
+async def fetch_page(db, query: dict, limit: int = DEFAULT_LIMIT, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """One page of orders (newest first) and the cursor for the next page"""
+    limit = max(1, min(limit, MAX_LIMIT))
+    docs = await db.orders.find(_cursor_filter(query, cursor)).sort("_id", -1).limit(limit).to_list(limit)
+    next_cursor = str(docs[-1]["_id"]) if len(docs) == limit else None
+    for d in docs:
+        d.pop("_id", None)
+    return docs, next_cursor
+
+
+async def fetch_all(db, query: dict) -> List[dict]:
+    """All matching orders in stored order, as /admin/orders returned them before paging"""
+    return await db.orders.find(query, {"_id": 0}).to_list(LEGACY_LIMIT)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def stream_export(db, query: dict) -> AsyncIterator[bytes]:
+    """JSON array of all matching orders, enriched page by page"""
+    yield b"["
+    first = True
+    cursor = None
+    while True:
+        page, cursor = await fetch_page(db, query, EXPORT_BATCH, cursor)
+        await enrich_orders(db, page)
+        for order in page:
+            chunk = json.dumps(order, default=_json_default, ensure_ascii=False)
+            yield (chunk if first else "," + chunk).encode("utf-8")
+            first = False
+        if not cursor:
+            break
+    yield b"]"
@@ -4,6 +4,12 @@ Order Idempotency - Utilities for idempotent operations
 import hashlib
 import json
 from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 def utcnow():
@@ -16,12 +22,26 @@ def make_idempotency_hash(key: str) -> str:
     return hashlib.sha256(key.encode("utf-8")).hexdigest()
 
 
-def stable_payload_hash(payload: dict) -> str:
-    """Create stable hash from payload (order-independent)"""
+def _legacy_payload_hash(payload: dict) -> str:
     raw = json.dumps(payload, sort_keys=True, separators=(",", ":"))
     return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
+def stable_payload_hash(payload: dict) -> str:
+    """Create stable hash from payload (order-independent)"""
+    if orjson is None:
+        return _legacy_payload_hash(payload)
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def payload_matches(stored_hash: Optional[str], payload: dict, payload_hash: str) -> bool:
+    """
+    Compare with the hash stored for the key. Keys locked before hashing
+    moved to orjson (non-ASCII is encoded differently) match the json hash.
+    """
+    return stored_hash == payload_hash or stored_hash == _legacy_payload_hash(payload)
+
+
 def ttl_expires(hours: int = 24) -> datetime:
     """Get expiration time for TTL"""
     return utcnow() + timedelta(hours=hours)
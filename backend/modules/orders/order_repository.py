@@ -4,10 +4,15 @@ Order Repository - Atomic database operations with optimistic locking
 from typing import Optional, Any, Dict
 from datetime import datetime, timezone
 from pymongo import ReturnDocument
+import logging
 
 from core.db import db
-from .order_status import OrderStatus
+from core.idempotency import IdempotencyStore
+from .order_status import OrderStatus, PaymentStatus, status_fields
 from .order_state_machine import can_transition
+from .seller_orders import SellerOrdersService
+
+logger = logging.getLogger(__name__)
 
 
 def utcnow():
@@ -20,6 +25,24 @@ class OrderRepository:
     def __init__(self):
         self.col = db["orders"]
         self.idem = db["idempotency_keys"]
+        # completed keys live for 24h (idem_store_result expires_hours)
+        self.idem_store = IdempotencyStore(
+            "orders", self.idem, lambda key_hash: {"key_hash": key_hash}, lru_ttl_sec=24 * 3600
+        )
+        self.sellers = SellerOrdersService(db)
+    
+    async def _project(self, doc: dict):
+        """Keep seller sub-orders / balances and payment timers in step with the order"""
+        try:
+            await self.sellers.sync_orders([doc])
+        except Exception as e:
+            logger.warning(f"Seller projection failed for {doc.get('id')}: {e}")
+        if doc.get("retry_timers") and doc.get("status") != OrderStatus.AWAITING_PAYMENT.value:
+            from modules.payments.retry.retry_service import disarm_payment_timers
+            try:
+                await disarm_payment_timers(db, doc["id"])
+            except Exception as e:
+                logger.warning(f"Payment timers not cancelled for {doc.get('id')}: {e}")
     
     async def ensure_indexes(self):
         """Create required indexes"""
@@ -28,6 +51,8 @@ class OrderRepository:
         await self.col.create_index("user_id")
         await self.col.create_index("status")
         await self.col.create_index("created_at")
+        await self.col.create_index([("status_c", 1), ("created_at", -1)])
+        await self.col.create_index([("payment_status_c", 1), ("created_at", -1)])
         
         # Idempotency indexes
         await self.idem.create_index("key_hash", unique=True)
@@ -79,12 +104,12 @@ class OrderRepository:
         if expected_version is not None:
             query["version"] = expected_version
         
-        now = utcnow().isoformat()
+        now = utcnow()
         
         update = {
             "$set": {
                 **patch,
-                "status": to_status.value,
+                **status_fields(status=to_status),
                 "updated_at": now,
             },
             "$inc": {"version": 1},
@@ -109,6 +134,7 @@ class OrderRepository:
         if not doc:
             raise ValueError("ORDER_CONFLICT")
         
+        await self._project(doc)
         return doc
     
     async def mark_paid_atomic(
@@ -157,11 +183,11 @@ class OrderRepository:
         if expected_version is not None:
             query["version"] = expected_version
         
-        now = utcnow().isoformat()
+        now = utcnow()
         
         update = {
             "$set": {
-                "status": OrderStatus.PAID.value,
+                **status_fields(status=OrderStatus.PAID, payment_status=PaymentStatus.PAID),
                 "updated_at": now,
                 "payment.provider": provider,
                 "payment.payment_id": payment_id,
@@ -193,6 +219,7 @@ class OrderRepository:
         if not doc:
             raise ValueError("ORDER_CONFLICT")
         
+        await self._project(doc)
         return doc
     
     async def idem_get_or_lock(
@@ -201,38 +228,32 @@ class OrderRepository:
         payload_hash: str
     ) -> Optional[dict]:
         """
-        Try to insert idempotency record.
-        If exists, return it (for duplicate detection).
+        Lock a new idempotency key (returns None) or return the existing
+        record (for duplicate detection); completed keys come from memory.
         """
         now = utcnow()
-        try:
-            await self.idem.insert_one({
-                "key_hash": key_hash,
-                "payload_hash": payload_hash,
-                "status": "LOCKED",
-                "result": None,
-                "created_at": now.isoformat(),
-                "expires_at": now,
-            })
-            return None
-        except Exception:
-            return await self.idem.find_one({"key_hash": key_hash}, {"_id": 0})
+        inserted, existing = await self.idem_store.acquire(key_hash, {
+            "payload_hash": payload_hash,
+            "status": "LOCKED",
+            "result": None,
+            "created_at": now.isoformat(),
+            "expires_at": now,
+        })
+        return None if inserted else existing
     
     async def idem_store_result(
         self, 
         key_hash: str, 
         result: dict, 
-        status: str = "DONE"
+        status: str = "DONE",
+        expires_hours: Optional[int] = None
     ):
-        """Store result for idempotency key"""
-        await self.idem.update_one(
-            {"key_hash": key_hash},
-            {"$set": {
-                "status": status, 
-                "result": result, 
-                "updated_at": utcnow().isoformat()
-            }}
-        )
+        """Store result for idempotency key (and its TTL, in the same write)"""
+        fields = {"updated_at": utcnow().isoformat()}
+        if expires_hours:
+            from .order_idempotency import ttl_expires
+            fields["expires_at"] = ttl_expires(expires_hours)
+        await self.idem_store.complete(key_hash, status, result, **fields)
     
     async def idem_set_expires(self, key_hash: str, hours: int = 24):
         """Set TTL for idempotency key"""
@@ -2,6 +2,7 @@
 Order Status Enum - Canonical statuses for marketplace orders
 """
 from enum import Enum
+from typing import Optional
 
 
 class OrderStatus(str, Enum):
@@ -13,3 +14,96 @@ class OrderStatus(str, Enum):
     DELIVERED = "DELIVERED"
     CANCELED = "CANCELED"
     REFUNDED = "REFUNDED"
+
+
+class PaymentStatus(str, Enum):
+    PENDING = "PENDING"
+    PAID = "PAID"
+    FAILED = "FAILED"
+    EXPIRED = "EXPIRED"
+    REFUNDED = "REFUNDED"
+
+
+# Legacy server.py / v1 statuses -> canonical OrderStatus
+_STATUS_ALIASES = {
+    "PENDING": OrderStatus.AWAITING_PAYMENT,
+    "PAYMENT_FROZEN": OrderStatus.AWAITING_PAYMENT,
+    "CONFIRMED": OrderStatus.PROCESSING,
+    "COMPLETED": OrderStatus.DELIVERED,
+    "CANCELLED": OrderStatus.CANCELED,
+    "CANCELLED_AUTO": OrderStatus.CANCELED,
+    "CANCELLED_RETURNED": OrderStatus.CANCELED,
+    "RETURNED": OrderStatus.CANCELED,
+    "PAYMENT_FAILED": OrderStatus.CANCELED,
+}
+
+_PAYMENT_ALIASES = {
+    "COMPLETED": PaymentStatus.PAID,
+    "SUCCESS": PaymentStatus.PAID,
+    "APPROVED": PaymentStatus.PAID,
+    "DECLINED": PaymentStatus.FAILED,
+    "PAYMENT_FAILED": PaymentStatus.FAILED,
+    "REVERSED": PaymentStatus.REFUNDED,
+    "CREATED": PaymentStatus.PENDING,
+    "AWAITING": PaymentStatus.PENDING,
+    "PROCESSING": PaymentStatus.PENDING,
+}
+
+# Canonical groups used by aggregations
+PAID_OR_BEYOND = [
+    OrderStatus.PAID.value,
+    OrderStatus.PROCESSING.value,
+    OrderStatus.SHIPPED.value,
+    OrderStatus.DELIVERED.value,
+]
+
+# Raw statuses folded into CANCELED that record an unpaid order, not a buyer
+# cancellation / return
+PAYMENT_FAILURE_STATUSES = ["CANCELLED_AUTO", "PAYMENT_FAILED"]
+
+
+def paid_filter() -> dict:
+    """Orders counted as paid: canonical status past payment or payment settled"""
+    return {"$or": [
+        {"status_c": {"$in": PAID_OR_BEYOND}},
+        {"payment_status_c": PaymentStatus.PAID.value},
+    ]}
+
+
+def canonical_status(raw) -> Optional[str]:
+    """Map any stored order status spelling to an OrderStatus value"""
+    if not raw:
+        return None
+    key = str(raw.value if isinstance(raw, Enum) else raw).strip().upper()
+    if key in OrderStatus.__members__:
+        return OrderStatus[key].value
+    alias = _STATUS_ALIASES.get(key)
+    return alias.value if alias else None
+
+
+def canonical_payment_status(raw) -> Optional[str]:
+    """Map any stored payment status spelling to a PaymentStatus value"""
+    if not raw:
+        return None
+    key = str(raw.value if isinstance(raw, Enum) else raw).strip().upper()
+    if key in PaymentStatus.__members__:
+        return PaymentStatus[key].value
+    alias = _PAYMENT_ALIASES.get(key)
+    return alias.value if alias else None
+
+
+def status_fields(status=None, payment_status=None) -> dict:
+    """
+    $set fragment writing raw status fields together with their
+    indexed canonical copies (status_c / payment_status_c).
+    """
+    out = {}
+    if status is not None:
+        raw = status.value if isinstance(status, Enum) else status
+        out["status"] = raw
+        out["status_c"] = canonical_status(raw)
+    if payment_status is not None:
+        raw = payment_status.value if isinstance(payment_status, Enum) else payment_status
+        out["payment_status"] = raw
+        out["payment_status_c"] = canonical_payment_status(raw)
+    return out
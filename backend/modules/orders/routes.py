@@ -2,7 +2,7 @@
 Orders Module - Production-ready order management with state machine
 Integrated with A/B testing for prepaid discount experiments
 """
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timezone
@@ -11,12 +11,14 @@ import logging
 
 from core.db import db
 from core.security import get_current_user, get_current_admin
-from .order_status import OrderStatus
+from .order_status import OrderStatus, status_fields
 from .order_state_machine import can_transition, get_allowed_transitions, is_cancellable
 from .order_repository import order_repository
-from .order_idempotency import make_idempotency_hash, stable_payload_hash
+from . import admin_orders
+from .order_idempotency import make_idempotency_hash, payload_matches, stable_payload_hash
 from modules.ab.ab_service import ABService
 from modules.payments.prepaid_discount import calc_prepaid_discount
+from modules.growth.scheduler import disarm_abandoned_cart
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 logger = logging.getLogger(__name__)
@@ -115,7 +117,7 @@ async def create_order(
         if existing:
             if existing.get("status") == "DONE" and existing.get("result"):
                 return OrderResponse(**existing["result"])
-            if existing.get("payload_hash") != payload_hash:
+            if not payload_matches(existing.get("payload_hash"), payload, payload_hash):
                 raise HTTPException(
                     status_code=422, 
                     detail="IDEMPOTENCY_PAYLOAD_MISMATCH"
@@ -207,7 +209,7 @@ async def create_order(
         "user_id": user_id,
         "items": [item.model_dump() for item in order_items],
         "shipping": data.shipping.model_dump(),
-        "status": initial_status.value,
+        **status_fields(status=initial_status),
         "version": 1,
         "payment_method": data.payment_method,
         "payment": None,
@@ -229,18 +231,19 @@ async def create_order(
     }
     
     await db.orders.insert_one(order_doc)
+    await order_repository.sellers.sync_order(order_doc["id"])
     
     # Clear cart
     await db.carts.update_one(
         {"user_id": user_id},
         {"$set": {"items": [], "updated_at": now}}
     )
+    await disarm_abandoned_cart(db, user_id)
     
     # Store idempotency result
     if x_idempotency_key:
         result_doc = {k: v for k, v in order_doc.items() if k != "_id"}
-        await order_repository.idem_store_result(key_hash, result_doc)
-        await order_repository.idem_set_expires(key_hash, hours=24)
+        await order_repository.idem_store_result(key_hash, result_doc, expires_hours=24)
     
     return OrderResponse(**order_doc)
 
@@ -334,30 +337,31 @@ async def cancel_order(
 
 @router.get("", response_model=List[OrderListResponse])
 async def get_all_orders(
+    response: Response,
     status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    user_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = admin_orders.DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_admin)
 ):
-    """Get all orders (admin only)"""
-    query = {}
-    if status:
-        query["status"] = status
-    
-    orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(500)
-    
-    # Enrich with user info
-    result = []
-    for o in orders:
-        user = await db.users.find_one(
-            {"id": o["user_id"]}, 
-            {"full_name": 1, "email": 1}
-        )
-        result.append(OrderListResponse(
+    """Get all orders (admin only), newest first; next page cursor in X-Next-Cursor"""
+    query = admin_orders.build_filter(status, payment_status, user_id, date_from, date_to)
+    orders, next_cursor = await admin_orders.fetch_page(db, query, limit, cursor)
+    await admin_orders.enrich_orders(db, orders)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    return [
+        OrderListResponse(
             **o,
-            user_name=user.get("full_name") if user else None,
-            user_email=user.get("email") if user else None
-        ))
-    
-    return result
+            user_name=o["customer_name"] if o["customer_name"] != "Unknown" else None,
+            user_email=o["customer_email"] if o["customer_email"] != "N/A" else None
+        )
+        for o in orders
+    ]
 
 
 @router.put("/{order_id}/status")
@@ -0,0 +1,287 @@
+"""
+Seller Orders - per-seller sub-order projection and balance ledger
+
+seller_orders     one document per (order_id, seller_id): the seller's items,
+                  subtotal and the order's status fields; indexed by
+                  (seller_id, created_at) for seller pages
+seller_ledger     append-only money movements per seller (unique ref)
+seller_balances   running totals per seller, updated together with the ledger
+
+sync_order() is called right after order writes; sync_recent() re-projects
+orders by updated_at so writers that do not call it are picked up too.
+Ledger flips are guarded by flags on the sub-order and payout documents, so
+repeated syncs (or a sync racing an admin action) never double-count.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from core.dates import as_datetime, date_range, utcnow
+from .order_status import PAID_OR_BEYOND, OrderStatus, PaymentStatus, canonical_status, canonical_payment_status
+
+logger = logging.getLogger(__name__)
+
+COMMISSION_RATE = 0.10
+SYNC_BATCH = 500
+STATE_ID = "seller_orders_sync"
+
+# Payout statuses that count against the balance
+PAYOUT_DEBIT_STATUSES = ("completed", "processing")
+
+
+def _payment_status(order: dict) -> Optional[str]:
+    return order.get("payment_status") or (order.get("payment") or {}).get("status")
+
+
+class SellerOrdersService:
+    def __init__(self, db):
+        self.db = db
+        self.col = db["seller_orders"]
+        self.ledger = db["seller_ledger"]
+        self.balances = db["seller_balances"]
+        self.state = db["schema_migrations"]
+
+    async def ensure_indexes(self):
+        await self.col.create_index([("order_id", 1), ("seller_id", 1)], unique=True)
+        await self.col.create_index([("seller_id", 1), ("created_at", -1)])
+        await self.col.create_index([("seller_id", 1), ("payment_status_c", 1)])
+        await self.ledger.create_index([("seller_id", 1), ("ref", 1)], unique=True)
+        await self.ledger.create_index([("seller_id", 1), ("created_at", -1)])
+        await self.db.orders.create_index("updated_at")
+
+    # ---------- projection ----------
+
+    async def _split_by_seller(self, orders: List[dict]) -> Dict[tuple, List[dict]]:
+        """(order_id, seller_id) -> items; v2 items without seller_id are resolved via products"""
+        missing = list({
+            item.get("product_id")
+            for o in orders for item in (o.get("items") or [])
+            if not item.get("seller_id") and item.get("product_id")
+        })
+        owners = {}
+        if missing:
+            async for p in self.db.products.find({"id": {"$in": missing}}, {"_id": 0, "id": 1, "seller_id": 1}):
+                owners[p["id"]] = p.get("seller_id")
+
+        parts: Dict[tuple, List[dict]] = {}
+        for o in orders:
+            for item in o.get("items") or []:
+                seller_id = item.get("seller_id") or owners.get(item.get("product_id"))
+                if seller_id:
+                    parts.setdefault((o["id"], seller_id), []).append(item)
+        return parts
+
+    async def sync_orders(self, orders: List[dict]) -> int:
+        """Upsert sub-orders for a batch of orders and apply ledger changes"""
+        orders = [o for o in orders if o.get("id")]
+        if not orders:
+            return 0
+        by_id = {o["id"]: o for o in orders}
+        parts = await self._split_by_seller(orders)
+
+        ops = []
+        now = utcnow()
+        for (order_id, seller_id), items in parts.items():
+            o = by_id[order_id]
+            subtotal = sum(float(i.get("price") or 0) * int(i.get("quantity") or 0) for i in items)
+            raw_payment = _payment_status(o)
+            ops.append(UpdateOne(
+                {"order_id": order_id, "seller_id": seller_id},
+                {
+                    "$set": {
+                        "order_number": o.get("order_number"),
+                        "buyer_id": o.get("buyer_id") or o.get("user_id"),
+                        "items": items,
+                        "item_count": len(items),
+                        "subtotal": round(subtotal, 2),
+                        "status": o.get("status"),
+                        # the raw status wins: status_c can lag behind writers that skipped it
+                        "status_c": canonical_status(o.get("status")) or o.get("status_c"),
+                        "payment_status": raw_payment,
+                        "payment_status_c": o.get("payment_status_c") or canonical_payment_status(raw_payment),
+                        "created_at": as_datetime(o.get("created_at")) or now,
+                        "synced_at": now,
+                    },
+                    "$setOnInsert": {"paid_counted": False, "earned": False, "ledger_seq": 0},
+                },
+                upsert=True,
+            ))
+        if ops:
+            await self.col.bulk_write(ops, ordered=False)
+
+        for order_id, seller_id in parts:
+            await self._apply_ledger(order_id, seller_id)
+        return len(ops)
+
+    async def sync_order(self, order_id: str):
+        """Re-project one order; never raises (called from request paths)"""
+        try:
+            order = await self.db.orders.find_one({"id": order_id}, {"_id": 0})
+            if order:
+                await self.sync_orders([order])
+        except Exception as e:
+            logger.warning(f"Seller orders sync failed for {order_id}: {e}")
+
+    # ---------- ledger ----------
+
+    async def _flip(self, sub: dict, flag: str, target: bool) -> Optional[dict]:
+        """Atomically flip a flag on the sub-order; returns the updated doc if this call flipped it"""
+        return await self.col.find_one_and_update(
+            {"_id": sub["_id"], flag: {"$ne": target}},
+            {"$set": {flag: target}, "$inc": {"ledger_seq": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _apply_ledger(self, order_id: str, seller_id: str):
+        sub = await self.col.find_one({"order_id": order_id, "seller_id": seller_id})
+        if not sub:
+            return
+        refunded = sub.get("payment_status_c") == PaymentStatus.REFUNDED.value
+        settled = sub.get("payment_status_c") == PaymentStatus.PAID.value
+        # same rule as order_status.paid_filter(): payment settled or order past payment
+        paid = not refunded and (settled or sub.get("status_c") in PAID_OR_BEYOND)
+        canceled = sub.get("status_c") == OrderStatus.CANCELED.value
+        counts_paid = paid and not canceled
+        # money is owed to the seller only once it was actually collected
+        # (a delivered COD order stays unearned until its payment is PAID)
+        earned = settled and sub.get("status_c") == OrderStatus.DELIVERED.value
+        amount = float(sub.get("subtotal") or 0)
+
+        if bool(sub.get("paid_counted")) != counts_paid:
+            flipped = await self._flip(sub, "paid_counted", counts_paid)
+            if flipped:
+                sign = 1 if counts_paid else -1
+                await self.balances.update_one(
+                    {"_id": seller_id},
+                    {"$inc": {"paid_revenue": sign * amount, "paid_items": sign * int(sub.get("item_count") or 0)},
+                     "$set": {"updated_at": utcnow()}},
+                    upsert=True,
+                )
+                sub = flipped
+
+        if bool(sub.get("earned")) != earned:
+            flipped = await self._flip(sub, "earned", earned)
+            if flipped:
+                sign = 1 if earned else -1
+                await self._post(
+                    seller_id,
+                    ref=f"order:{order_id}:{flipped['ledger_seq']}",
+                    type_="ORDER_EARNED" if earned else "ORDER_REVERSED",
+                    revenue=sign * amount,
+                    commission=sign * round(amount * COMMISSION_RATE, 2),
+                    order_id=order_id,
+                )
+
+    async def _post(self, seller_id: str, ref: str, type_: str, revenue: float = 0.0,
+                    commission: float = 0.0, paid: float = 0.0, **extra):
+        """Append a ledger entry and move the running balance (once per ref)"""
+        entry = {
+            "seller_id": seller_id,
+            "ref": ref,
+            "type": type_,
+            "revenue": round(revenue, 2),
+            "commission": round(commission, 2),
+            "paid": round(paid, 2),
+            "net": round(revenue - commission - paid, 2),
+            "created_at": utcnow(),
+            **extra,
+        }
+        try:
+            await self.ledger.insert_one(entry)
+        except DuplicateKeyError:
+            return
+        await self.balances.update_one(
+            {"_id": seller_id},
+            {"$inc": {"total_revenue": entry["revenue"], "commission": entry["commission"], "total_paid": entry["paid"]},
+             "$set": {"updated_at": utcnow()}},
+            upsert=True,
+        )
+
+    async def sync_payout(self, payout_id: str):
+        """Debit / credit back the balance when a payout enters or leaves a debit status"""
+        debit_statuses = list(PAYOUT_DEBIT_STATUSES)
+        for debit, q in ((True, {"status": {"$in": debit_statuses}, "ledger_debited": {"$ne": True}}),
+                         (False, {"status": {"$nin": debit_statuses}, "ledger_debited": True})):
+            # the flag flip decides which caller posts (admin action vs. backfill)
+            flipped = await self.db.payouts.find_one_and_update(
+                {"id": payout_id, **q},
+                {"$set": {"ledger_debited": debit}, "$inc": {"ledger_seq": 1}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER,
+            )
+            if not flipped:
+                continue
+            amount = float(flipped.get("amount") or 0)
+            await self._post(
+                flipped["seller_id"],
+                ref=f"payout:{payout_id}:{flipped['ledger_seq']}",
+                type_="PAYOUT" if debit else "PAYOUT_RETURNED",
+                paid=amount if debit else -amount,
+                payout_id=payout_id,
+            )
+
+    async def _backfill_payouts(self):
+        """Debit payouts that were processed before the ledger existed"""
+        q = {"status": {"$in": list(PAYOUT_DEBIT_STATUSES)}, "ledger_debited": {"$ne": True}}
+        async for p in self.db.payouts.find(q, {"_id": 0, "id": 1}):
+            await self.sync_payout(p["id"])
+
+    async def get_balance(self, seller_id: str) -> dict:
+        doc = await self.balances.find_one({"_id": seller_id}) or {}
+        return {
+            "total_revenue": float(doc.get("total_revenue") or 0),
+            "commission": float(doc.get("commission") or 0),
+            "total_paid": float(doc.get("total_paid") or 0),
+            "paid_revenue": float(doc.get("paid_revenue") or 0),
+            "paid_items": int(doc.get("paid_items") or 0),
+        }
+
+    # ---------- reads ----------
+
+    async def list_for_seller(self, seller_id: str, skip: int = 0, limit: int = 50) -> List[dict]:
+        return await self.col.find(
+            {"seller_id": seller_id},
+            {"_id": 0, "paid_counted": 0, "earned": 0, "ledger_seq": 0},
+        ).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+
+    # ---------- catch-up ----------
+
+    async def sync_recent(self, max_batches: int = 20) -> dict:
+        """Re-project orders updated since the stored watermark (plus an initial full pass)"""
+        st = await self.state.find_one({"_id": STATE_ID}) or {}
+        since = st.get("since")
+        last_id = st.get("last_id")
+        started = utcnow()
+
+        if since is None and last_id is None:
+            await self._backfill_payouts()
+
+        synced = batches = 0
+        while batches < max_batches:
+            q = date_range("updated_at", gte=since) if since else {}
+            if last_id is not None:
+                q = {**q, "_id": {"$gt": last_id}}
+            docs = await self.db.orders.find(q).sort("_id", 1).limit(SYNC_BATCH).to_list(SYNC_BATCH)
+            if not docs:
+                last_id = None
+                break
+            synced += await self.sync_orders(docs)
+            last_id = docs[-1]["_id"]
+            batches += 1
+            await self.state.update_one({"_id": STATE_ID}, {"$set": {"last_id": last_id}}, upsert=True)
+            if len(docs) < SYNC_BATCH:
+                last_id = None
+                break
+            await asyncio.sleep(0)
+
+        if last_id is None:
+            # pass complete: next run only looks at orders touched since this one started
+            await self.state.update_one(
+                {"_id": STATE_ID},
+                {"$set": {"since": started, "last_id": None, "updated_at": utcnow()}},
+                upsert=True,
+            )
+        return {"synced": synced, "batches": batches, "complete": last_id is None}
@@ -6,6 +6,9 @@ from datetime import datetime, timezone
 import uuid
 import os
 
+from modules.orders.order_status import status_fields
+from modules.payments.retry.retry_service import arm_payment_timers
+
 
 def now_iso():
     return datetime.now(timezone.utc).isoformat()
@@ -58,7 +61,9 @@ class DepositPaymentsService:
                 "description": f"Deposit for shipping (Order {order_id[:8]})",
             })
             payment_url = res.get("payment_url")
+            fondy_order_id = res.get("fondy_order_id")
         else:
+            fondy_order_id = None
             # Mock URL for development
             base_url = os.getenv("PUBLIC_BASE_URL", "http://localhost:3000")
             payment_url = f"{base_url}/payment/mock/{payment_id}"
@@ -73,6 +78,7 @@ class DepositPaymentsService:
             "currency": currency,
             "status": "CREATED",
             "payment_url": payment_url,
+            "fondy_order_id": fondy_order_id,
             "created_at": now_iso(),
         }
         await self.payments.insert_one(pay_doc)
@@ -81,13 +87,14 @@ class DepositPaymentsService:
         await self.orders.update_one(
             {"id": order_id},
             {"$set": {
-                "status": "AWAITING_PAYMENT",
+                **status_fields(status="AWAITING_PAYMENT"),
                 "deposit.required": True,
                 "deposit.amount": float(amount),
                 "deposit.paid": False,
                 "deposit.payment_id": payment_id
             }}
         )
+        await arm_payment_timers(self.db, order_id, order.get("created_at"))
 
         return {
             "ok": True,
@@ -130,7 +137,9 @@ class DepositPaymentsService:
                 "description": f"Payment for order {order_id[:8]}",
             })
             payment_url = res.get("payment_url")
+            fondy_order_id = res.get("fondy_order_id")
         else:
+            fondy_order_id = None
             base_url = os.getenv("PUBLIC_BASE_URL", "http://localhost:3000")
             payment_url = f"{base_url}/payment/mock/{payment_id}"
 
@@ -143,14 +152,16 @@ class DepositPaymentsService:
             "currency": currency,
             "status": "CREATED",
             "payment_url": payment_url,
+            "fondy_order_id": fondy_order_id,
             "created_at": now_iso(),
         }
         await self.payments.insert_one(pay_doc)
 
         await self.orders.update_one(
             {"id": order_id},
-            {"$set": {"status": "AWAITING_PAYMENT", "payment_id": payment_id}}
+            {"$set": {**status_fields(status="AWAITING_PAYMENT"), "payment_id": payment_id, "updated_at": datetime.now(timezone.utc)}}
         )
+        await arm_payment_timers(self.db, order_id, order.get("created_at"))
 
         return {
             "ok": True,
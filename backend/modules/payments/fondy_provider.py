@@ -7,6 +7,8 @@ import os
 import aiohttp
 import logging
 
+from core.metrics import outbound
+
 logger = logging.getLogger(__name__)
 
 FONDY_API_URL = "https://api.fondy.eu/api/checkout/url/"
@@ -100,7 +102,7 @@ class FondyProvider:
         order["signature"] = build_signature(order, self.password)
 
         try:
-            async with aiohttp.ClientSession() as session:
+            async with outbound("fondy", "checkout_url"), aiohttp.ClientSession() as session:
                 async with session.post(FONDY_API_URL, json={"request": order}, timeout=30) as resp:
                     js = await resp.json()
         except Exception as e:
@@ -138,7 +140,7 @@ class FondyProvider:
         order["signature"] = build_signature(order, self.password)
 
         try:
-            async with aiohttp.ClientSession() as session:
+            async with outbound("fondy", "status"), aiohttp.ClientSession() as session:
                 async with session.post(FONDY_STATUS_URL, json={"request": order}, timeout=30) as resp:
                     js = await resp.json()
         except Exception as e:
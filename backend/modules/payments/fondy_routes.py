@@ -4,7 +4,8 @@ Fondy Routes - Webhook endpoint
 from fastapi import APIRouter, Request
 import os
 from core.db import db
-from modules.payments.fondy_webhook import FondyWebhookHandler
+from modules.payments.fondy_webhook import FondyWebhookHandler, parse_fondy_order_id
+from modules.payments.webhook_inbox import ingest
 
 router = APIRouter(prefix="/api/v2/payments/webhook", tags=["Fondy Webhook"])
 
@@ -15,13 +16,17 @@ async def fondy_webhook(request: Request):
     Fondy callback webhook endpoint.
     
     Fondy sends payment status updates here.
-    Verifies signature, processes payment, updates order status.
+    Verifies signature and queues the callback; the webhook inbox worker
+    processes the payment and updates the order status.
     """
+    body = await request.body()
     payload = await request.json()
     password = os.getenv("FONDY_MERCHANT_PASSWORD", "")
     
     handler = FondyWebhookHandler(db, fondy_password=password)
-    return await handler.handle(payload)
+    order = await handler.verify(payload)
+    _, _, payment_id = parse_fondy_order_id(order["order_id"])
+    return await ingest(db, "fondy", payment_id, payload, body)
 
 
 @router.get("/fondy/health")
@@ -5,7 +5,11 @@ Signature verification, anti-replay, idempotency, audit logging
 from fastapi import HTTPException
 from datetime import datetime, timezone
 import logging
+from pymongo.errors import DuplicateKeyError
 
+from core.dates import utcnow
+from modules.orders.order_status import OrderStatus, PaymentStatus, status_fields
+from modules.orders.seller_orders import SellerOrdersService
 from modules.payments.fondy_provider import verify_signature
 
 logger = logging.getLogger(__name__)
@@ -63,7 +67,11 @@ class FondyWebhookHandler:
     - Idempotent status updates
     - Full audit logging
     - Separate handling for ORDER_PAYMENT vs SHIP_DEPOSIT
+
+    The endpoint runs verify() and queues the callback; the webhook inbox
+    worker runs apply().
     """
+    indexed = False
 
     def __init__(self, db, fondy_password: str):
         self.db = db
@@ -74,8 +82,12 @@ class FondyWebhookHandler:
         self.logs = db["fondy_logs"]
 
     async def ensure_indexes(self):
+        if FondyWebhookHandler.indexed:
+            return
         try:
             await self.events.create_index("dedupe_key", unique=True)
+            # anti-replay depends on this one; retried until it succeeds
+            FondyWebhookHandler.indexed = True
         except Exception:
             pass
         try:
@@ -85,10 +97,18 @@ class FondyWebhookHandler:
 
     async def handle(self, payload: dict) -> dict:
         """
-        Handle Fondy webhook callback.
+        Handle Fondy webhook callback inline (verify + apply).
         
         Returns dict with: ok, applied, duplicate, error
         """
+        await self.verify(payload)
+        return await self.apply(payload)
+
+    async def verify(self, payload: dict) -> dict:
+        """
+        Signature check and audit log; raises HTTPException for callbacks
+        that must not be applied. Returns the order part of the payload.
+        """
         await self.ensure_indexes()
 
         # Extract order data
@@ -117,6 +137,16 @@ class FondyWebhookHandler:
             logger.warning(f"Fondy webhook invalid signature: {order.get('order_id')}")
             raise HTTPException(401, "INVALID_SIGNATURE")
 
+        if not order.get("order_id"):
+            raise HTTPException(400, "NO_ORDER_ID")
+
+        return order
+
+    async def apply(self, payload: dict) -> dict:
+        """Dedupe and apply a verified callback (run by the webhook inbox worker)"""
+        await self.ensure_indexes()
+        order = payload.get("order") or payload
+
         # 3) Parse IDs
         fondy_order_id = order.get("order_id")
         order_status = order.get("order_status")
@@ -140,11 +170,21 @@ class FondyWebhookHandler:
                 "payment_id": payment_id,
                 "status": mapped_status
             })
-        except Exception:
+        except DuplicateKeyError:
             # Duplicate webhook - return OK but don't process
             logger.info(f"Fondy duplicate webhook: {fondy_order_id}")
             return {"ok": True, "duplicate": True}
 
+        try:
+            return await self._settle(order, order_id, purpose, payment_id, fondy_order_id, mapped_status)
+        except Exception:
+            # drop the marker so the inbox retry of this callback is not taken for a duplicate
+            await self.events.delete_one({"dedupe_key": dedupe_key})
+            raise
+
+    async def _settle(self, order: dict, order_id: str, purpose: str, payment_id: str,
+                      fondy_order_id: str, mapped_status: str) -> dict:
+        """Payment record and business effects of a deduped callback"""
         # 5) Update payment record
         pay = await self.payments.find_one({"id": payment_id}, {"_id": 0})
         
@@ -193,17 +233,19 @@ class FondyWebhookHandler:
     async def _handle_paid(self, order_id: str, purpose: str, payment_id: str, fondy_order_id: str) -> dict:
         """Handle successful payment"""
         
+        now = utcnow()
         if purpose == "SHIP_DEPOSIT":
             # Deposit paid - enable COD for this order
             result = await self.orders.update_one(
                 {"id": order_id},
                 {"$set": {
                     "deposit.paid": True,
-                    "deposit.paid_at": now_iso(),
-                    "status": "NEW",  # Ready for processing, COD now allowed
-                    "updated_at": now_iso()
+                    "deposit.paid_at": now,
+                    **status_fields(status=OrderStatus.NEW),  # Ready for processing, COD now allowed
+                    "updated_at": now
                 }}
             )
+            await SellerOrdersService(self.db).sync_order(order_id)
             logger.info(f"Deposit paid for order {order_id}")
             return {"ok": True, "applied": "DEPOSIT_PAID", "order_id": order_id}
 
@@ -211,14 +253,15 @@ class FondyWebhookHandler:
         result = await self.orders.update_one(
             {"id": order_id, "status": {"$in": ["AWAITING_PAYMENT", "NEW", "PAYMENT_FROZEN"]}},
             {"$set": {
-                "status": "PAID",
-                "paid_at": now_iso(),
+                **status_fields(status=OrderStatus.PAID, payment_status=PaymentStatus.PAID),
+                "paid_at": now,
                 "payment_id": payment_id,
-                "updated_at": now_iso()
+                "updated_at": now
             }}
         )
         
         if result.modified_count > 0:
+            await SellerOrdersService(self.db).sync_order(order_id)
             logger.info(f"Order paid: {order_id}")
             return {"ok": True, "applied": "ORDER_PAID", "order_id": order_id}
         else:
@@ -5,6 +5,9 @@ Metrics: webhook success, reconciliation, retry recovery, deposit conversion, pr
 from datetime import datetime, timezone, timedelta
 import logging
 
+from core.dates import date_range, day_bucket
+from modules.orders.order_status import PaymentStatus
+
 logger = logging.getLogger(__name__)
 
 
@@ -12,8 +15,8 @@ def utcnow():
     return datetime.now(timezone.utc)
 
 
-def since_iso(days: int) -> str:
-    return (utcnow() - timedelta(days=days)).isoformat()
+def since_dt(days: int) -> datetime:
+    return utcnow() - timedelta(days=days)
 
 
 class PaymentHealthService:
@@ -26,12 +29,12 @@ class PaymentHealthService:
 
     async def get_health(self, range_days: int = 7) -> dict:
         """Get payment health metrics for given range"""
-        since = since_iso(range_days)
+        since = since_dt(range_days)
 
         # 1. Base payment stats by status
         base_pipeline = [
-            {"$match": {"created_at": {"$gte": since}}},
-            {"$group": {"_id": "$payment_status", "count": {"$sum": 1}}}
+            {"$match": date_range("created_at", gte=since)},
+            {"$group": {"_id": "$payment_status_c", "count": {"$sum": 1}}}
         ]
         base_results = await self.orders.aggregate(base_pipeline).to_list(20)
 
@@ -41,11 +44,11 @@ class PaymentHealthService:
         for r in base_results:
             cnt = r.get("count", 0)
             total += cnt
-            status = (r.get("_id") or "").upper()
+            status = r.get("_id") or ""
             status_map[status] = cnt
-            if status in ("PAID", "COMPLETED"):
+            if status == "PAID":
                 paid += cnt
-            elif status in ("DECLINED", "FAILED"):
+            elif status == "FAILED":
                 declined += cnt
             elif status == "EXPIRED":
                 expired += cnt
@@ -53,44 +56,44 @@ class PaymentHealthService:
                 pending += cnt
 
         # 2. Webhook success rate
-        total_logs = await self.fondy_logs.count_documents({"created_at": {"$gte": since}})
+        total_logs = await self.fondy_logs.count_documents({"created_at": {"$gte": since.isoformat()}})
         valid_logs = await self.fondy_logs.count_documents({
-            "created_at": {"$gte": since},
+            "created_at": {"$gte": since.isoformat()},
             "signature_valid": True
         })
         webhook_rate = (valid_logs / total_logs) if total_logs > 0 else 1.0
 
         # 3. Reconciliation fixes
         recon_fixes = await self.orders.count_documents({
-            "updated_at": {"$gte": since},
+            **date_range("updated_at", gte=since),
             "payment_updated_by": "reconciliation"
         })
 
         # 4. Retry recovered
         retry_recovered = await self.orders.count_documents({
-            "paid_at": {"$gte": since},
+            **date_range("paid_at", gte=since),
             "retry.sent": True,
-            "payment_status": {"$in": ["paid", "PAID", "completed", "COMPLETED"]}
+            "payment_status_c": PaymentStatus.PAID.value
         })
         recovery_rate = (retry_recovered / total) if total > 0 else 0
 
         # 5. Deposit conversion
         deposit_total = await self.orders.count_documents({
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "payment_policy.mode": "SHIP_DEPOSIT"
         })
         deposit_converted = await self.orders.count_documents({
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "payment_policy.mode": "SHIP_DEPOSIT",
-            "payment_status": {"$in": ["paid", "PAID", "completed", "COMPLETED"]}
+            "payment_status_c": PaymentStatus.PAID.value
         })
         deposit_rate = (deposit_converted / deposit_total) if deposit_total > 0 else 0
 
         # 6. Avg payment time (minutes)
         time_pipeline = [
             {"$match": {
-                "paid_at": {"$gte": since},
-                "payment_status": {"$in": ["paid", "PAID", "completed", "COMPLETED"]}
+                **date_range("paid_at", gte=since),
+                "payment_status_c": PaymentStatus.PAID.value
             }},
             {"$project": {
                 "delta": {
@@ -110,20 +113,20 @@ class PaymentHealthService:
 
         # 7. Prepaid analytics
         prepaid_orders = await self.orders.count_documents({
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "payment_policy.mode": "FULL_PREPAID"
         })
         prepaid_paid = await self.orders.count_documents({
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "payment_policy.mode": "FULL_PREPAID",
-            "payment_status": {"$in": ["paid", "PAID", "completed", "COMPLETED"]}
+            "payment_status_c": PaymentStatus.PAID.value
         })
         prepaid_conversion = (prepaid_paid / prepaid_orders) if prepaid_orders > 0 else 0
 
         # 8. Discount analytics
         discount_pipeline = [
             {"$match": {
-                "created_at": {"$gte": since},
+                **date_range("created_at", gte=since),
                 "pricing.discount": {"$exists": True}
             }},
             {"$group": {
@@ -143,19 +146,19 @@ class PaymentHealthService:
 
         # 9. Daily trend (last 7 days)
         daily_pipeline = [
-            {"$match": {"created_at": {"$gte": since}}},
+            {"$match": date_range("created_at", gte=since)},
             {"$addFields": {
-                "date": {"$substr": ["$created_at", 0, 10]}
+                "date": day_bucket("$created_at")
             }},
             {"$group": {
                 "_id": "$date",
                 "total": {"$sum": 1},
                 "paid": {"$sum": {"$cond": [
-                    {"$in": ["$payment_status", ["paid", "PAID", "completed", "COMPLETED"]]},
+                    {"$eq": ["$payment_status_c", PaymentStatus.PAID.value]},
                     1, 0
                 ]}},
                 "revenue": {"$sum": {"$cond": [
-                    {"$in": ["$payment_status", ["paid", "PAID", "completed", "COMPLETED"]]},
+                    {"$eq": ["$payment_status_c", PaymentStatus.PAID.value]},
                     {"$ifNull": [{"$toDouble": "$totals.grand"}, {"$toDouble": "$total_amount"}]},
                     0
                 ]}}
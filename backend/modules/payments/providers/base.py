@@ -38,6 +38,18 @@ class PaymentProvider(ABC):
         """
         pass
     
+    def status_ref(self, payment: Dict[str, Any]) -> str:
+        """Identifier the provider knows a stored payment by (for get_payment_status)"""
+        return payment["id"]
+    
+    async def get_payment_status(self, payment_id: str) -> str:
+        """
+        Current status at the provider, normalized to
+        PAID / PENDING / FAILED / DECLINED / CANCELLED / EXPIRED / REFUNDED
+        (optional, implement in subclass)
+        """
+        raise NotImplementedError("Status query not implemented for this provider")
+    
     async def refund(self, order: Dict[str, Any], amount: float = None) -> Dict[str, Any]:
         """Refund payment (optional, implement in subclass)"""
         raise NotImplementedError("Refund not implemented for this provider")
@@ -1,3 +1,4 @@
 # Fondy provider package
 from .fondy_provider import FondyProvider
+from .fondy_local import LocalFondyStandIn
 from .fondy_signature import build_signature, verify_signature
@@ -0,0 +1,56 @@
+"""
+Local Fondy stand-in - provider double for reconciliation without Fondy
+
+Answers status queries from the payment_confirmations collection (a
+document there means the payment was confirmed), optionally with an
+artificial per-call latency so bounded-concurrency polling can be
+exercised locally. Also offers a bulk lookup used when available.
+"""
+import asyncio
+import os
+from typing import Dict, Any, List
+
+from ..base import PaymentProvider
+
+
+class LocalFondyStandIn(PaymentProvider):
+    """Status-only stand-in; checkout and webhooks stay with FondyProvider"""
+    
+    def __init__(self, db, latency_ms: float = None):
+        self.db = db
+        if latency_ms is None:
+            latency_ms = float(os.environ.get("FONDY_STANDIN_LATENCY_MS", 0))
+        self.latency = latency_ms / 1000.0
+    
+    @property
+    def name(self) -> str:
+        return "FONDY_LOCAL"
+    
+    async def create_payment(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError("Local stand-in does not create payments")
+    
+    def verify_webhook(self, raw_body: bytes, payload: Dict[str, Any]) -> bool:
+        raise NotImplementedError("Local stand-in does not receive webhooks")
+    
+    def parse_webhook(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError("Local stand-in does not receive webhooks")
+    
+    async def get_payment_status(self, payment_id: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        doc = await self.db["payment_confirmations"].find_one({"payment_id": payment_id}, {"_id": 0, "status": 1})
+        if not doc:
+            return "PENDING"
+        return doc.get("status") or "PAID"
+    
+    async def get_payment_statuses(self, payment_ids: List[str]) -> Dict[str, str]:
+        """One $in lookup for a whole page of payments"""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        out = {pid: "PENDING" for pid in payment_ids}
+        cursor = self.db["payment_confirmations"].find(
+            {"payment_id": {"$in": payment_ids}}, {"_id": 0, "payment_id": 1, "status": 1}
+        )
+        async for doc in cursor:
+            out[doc["payment_id"]] = doc.get("status") or "PAID"
+        return out
@@ -3,19 +3,35 @@ Fondy Payment Provider - Production-ready Fondy integration
 https://docs.fondy.eu/
 """
 import httpx
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from core.config import settings
+from core.metrics import outbound
 from ..base import PaymentProvider
 from .fondy_signature import build_signature, verify_signature
 
 
 FONDY_API_URL = "https://api.fondy.eu/api/checkout/url/"
+FONDY_STATUS_URL = "https://api.fondy.eu/api/status/order_id"
+
+# Fondy status values: approved, declined, processing, expired, reversed
+STATUS_MAP = {
+    "approved": "PAID",
+    "declined": "FAILED",
+    "processing": "PENDING",
+    "created": "PENDING",
+    "expired": "EXPIRED",
+    "reversed": "REFUNDED",
+}
 
 
 class FondyProvider(PaymentProvider):
     """Fondy payment provider implementation"""
     
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        # Optional shared client: keeps connections pooled for bulk status polling
+        self.client = client
+    
     @property
     def name(self) -> str:
         return "FONDY"
@@ -40,7 +56,7 @@ class FondyProvider(PaymentProvider):
         # Add signature
         payload["signature"] = build_signature(payload, settings.FONDY_MERCHANT_PASSWORD)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with outbound("fondy", "checkout_url"), httpx.AsyncClient(timeout=30.0) as client:
             response = await client.post(
                 FONDY_API_URL, 
                 json={"request": payload}
@@ -65,23 +81,46 @@ class FondyProvider(PaymentProvider):
     def parse_webhook(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """Parse Fondy webhook into normalized format"""
         
-        # Fondy status values: approved, declined, processing, expired, reversed
-        status_map = {
-            "approved": "PAID",
-            "declined": "FAILED",
-            "processing": "PENDING",
-            "expired": "EXPIRED",
-            "reversed": "REFUNDED",
-        }
-        
         fondy_status = payload.get("order_status", "").lower()
         
         return {
             "event_id": payload.get("payment_id"),
             "order_id": payload.get("order_id"),
-            "status": status_map.get(fondy_status, "UNKNOWN"),
+            "status": STATUS_MAP.get(fondy_status, "UNKNOWN"),
             "amount": float(payload.get("amount", 0)) / 100,  # From kopecks
             "currency": payload.get("currency", "UAH"),
             "payment_id": payload.get("payment_id"),
             "raw_status": fondy_status,
         }
+    
+    def status_ref(self, payment: Dict[str, Any]) -> str:
+        """
+        Fondy order_id of a stored payment: the one saved at creation /
+        by the webhook, else the {order_id}:{purpose}:{payment_id} form
+        modules/payments/fondy_provider registers payments under
+        """
+        if payment.get("fondy_order_id"):
+            return payment["fondy_order_id"]
+        purpose = payment.get("purpose") or "ORDER_PAYMENT"
+        return f"{payment['order_id']}:{purpose}:{payment['id']}"
+    
+    async def get_payment_status(self, payment_id: str) -> str:
+        """Query Fondy order status (payment_id is the Fondy order_id, see status_ref)"""
+        payload = {
+            "merchant_id": settings.FONDY_MERCHANT_ID,
+            "order_id": payment_id,
+        }
+        payload["signature"] = build_signature(payload, settings.FONDY_MERCHANT_PASSWORD)
+        
+        async with outbound("fondy", "status"):
+            if self.client is not None:
+                response = await self.client.post(FONDY_STATUS_URL, json={"request": payload})
+            else:
+                async with httpx.AsyncClient(timeout=30.0) as client:
+                    response = await client.post(FONDY_STATUS_URL, json={"request": payload})
+        response_data = response.json().get("response", {})
+        
+        if response_data.get("response_status") == "failure":
+            raise ValueError(f"FONDY_STATUS_FAILED: {response_data.get('error_message', 'Unknown error')}")
+        
+        return STATUS_MAP.get((response_data.get("order_status") or "").lower(), "PENDING")
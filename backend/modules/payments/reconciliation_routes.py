@@ -2,16 +2,15 @@
 D-Mode Step 6: Reconciliation Routes & Scheduler
 """
 from fastapi import APIRouter, Depends
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from core.db import db
 from core.security import get_current_admin
+from modules.jobs.runtime import job_runtime
 from modules.payments.reconciliation_service import PaymentReconciliationService
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v2/admin/payments/reconciliation", tags=["Payment Reconciliation"])
-recon_scheduler = AsyncIOScheduler()
 
 
 @router.post("/run")
@@ -39,17 +38,17 @@ async def reconciliation_logs(
 
 
 def start_reconciliation_scheduler(db_instance):
-    """Start reconciliation scheduler (every 10 min)"""
+    """Register reconciliation job (every 10 min)"""
     svc = PaymentReconciliationService(db_instance)
+    ready = {"indexes": False}
 
     async def job():
-        try:
-            result = await svc.run_once(hours_back=48, limit=200)
-            if result.get("fixed", 0) > 0:
-                logger.info(f"Reconciliation: {result}")
-        except Exception as e:
-            logger.error(f"Reconciliation error: {e}")
-
-    recon_scheduler.add_job(job, "interval", minutes=10, id="payment_reconciliation", replace_existing=True)
-    recon_scheduler.start()
-    logger.info("Payment reconciliation scheduler started (every 10 min)")
+        if not ready["indexes"]:
+            await svc.ensure_indexes()
+            ready["indexes"] = True
+        result = await svc.run_once(hours_back=48, limit=5000)
+        if result.get("fixed", 0) > 0:
+            logger.info(f"Reconciliation: {result}")
+
+    job_runtime.add(job, "interval", minutes=10, id="payment_reconciliation", lease_sec=900)
+    logger.info("Payment reconciliation job registered (every 10 min)")
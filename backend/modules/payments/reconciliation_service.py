@@ -1,110 +1,250 @@
 """
 D-Mode Step 6: Payment Reconciliation Service
 Fixes orders stuck in AWAITING_PAYMENT when payment was actually completed
+
+- pending payments are read in pages (PAGE_SIZE) ordered by _id
+- provider statuses are polled with bounded concurrency (CONCURRENCY), or
+  with one bulk call when the provider offers get_payment_statuses; the
+  provider is picked by settings.RECONCILIATION_PROVIDER (local stand-in
+  by default, "fondy" for the status API) and queried by status_ref()
+- payment updates go out as one bulk_write per page; full-payment orders
+  move through OrderRepository.atomic_transition (AWAITING_PAYMENT -> PAID)
+- the position inside the window is checkpointed in reconciliation_state,
+  so a run that hits its limit resumes where it stopped
 """
 from datetime import datetime, timezone, timedelta
+import asyncio
 import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from pymongo import UpdateOne
+
+from core.config import settings
+from core.dates import utcnow
+from modules.orders.order_repository import order_repository
+from modules.orders.order_status import OrderStatus, PaymentStatus, status_fields
+from modules.payments.providers.fondy import FondyProvider, LocalFondyStandIn
 
 logger = logging.getLogger(__name__)
 
+PAGE_SIZE = 500
+CONCURRENCY = int(os.environ.get("RECONCILIATION_CONCURRENCY", 20))
+STATE_ID = "payments"
+
+FAILED_STATUSES = {"FAILED", "DECLINED", "CANCELLED", "EXPIRED"}
+
 
 def now_iso():
     return datetime.now(timezone.utc).isoformat()
 
 
+_fondy: Optional[FondyProvider] = None
+
+
+def reconciliation_provider(db):
+    """Provider selected by RECONCILIATION_PROVIDER; the Fondy one shares a pooled client"""
+    global _fondy
+    if settings.RECONCILIATION_PROVIDER.lower() != "fondy":
+        return LocalFondyStandIn(db)
+    if _fondy is None:
+        _fondy = FondyProvider(client=httpx.AsyncClient(timeout=30.0))
+    return _fondy
+
+
 class PaymentReconciliationService:
     """
     Reconciliation engine: polls payment provider to fix stuck orders.
     Runs every 10 minutes to catch missed webhooks.
     """
 
-    def __init__(self, db, provider=None):
+    def __init__(self, db, provider=None, concurrency: int = CONCURRENCY):
         self.db = db
-        self.provider = provider
+        self.provider = provider or reconciliation_provider(db)
+        self.concurrency = max(1, concurrency)
         self.orders = db["orders"]
         self.payments = db["payments"]
         self.recon_logs = db["reconciliation_logs"]
+        self.state = db["reconciliation_state"]
 
-    async def run_once(self, hours_back: int = 48, limit: int = 200):
-        """
-        Scan pending payments and reconcile with provider status.
-        """
-        since = (datetime.now(timezone.utc) - timedelta(hours=hours_back)).isoformat()
+    async def ensure_indexes(self):
+        await self.payments.create_index([("status", 1), ("_id", 1)])
 
-        # Find unconfirmed payments
-        candidates = self.payments.find(
-            {
-                "status": {"$in": ["CREATED", "PENDING"]},
-                "created_at": {"$gte": since}
-            },
-            {"_id": 0}
-        ).limit(limit)
+    # ---------- provider polling ----------
 
-        scanned = 0
+    async def _poll(self, payments: List[dict]) -> Dict[str, object]:
+        """payment_id -> status string, or the exception raised for it"""
+        # provider reference -> our payment id
+        refs = {self.provider.status_ref(p): p["id"] for p in payments if p.get("id")}
+        bulk = getattr(self.provider, "get_payment_statuses", None)
+        if bulk is not None:
+            try:
+                found = await bulk(list(refs))
+                return {pid: found.get(ref) for ref, pid in refs.items()}
+            except Exception as e:
+                return {pid: e for pid in refs.values()}
+
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(ref: str, pid: str):
+            async with sem:
+                try:
+                    return pid, await self.provider.get_payment_status(ref)
+                except Exception as e:
+                    return pid, e
+
+        return dict(await asyncio.gather(*(one(ref, pid) for ref, pid in refs.items())))
+
+    # ---------- order side ----------
+
+    async def _mark_order_paid(self, order_id: str, reconciled_at: datetime) -> bool:
+        try:
+            await order_repository.atomic_transition(
+                order_id,
+                OrderStatus.PAID,
+                actor="reconciliation",
+                reason="PROVIDER_STATUS_PAID",
+                require_current=OrderStatus.AWAITING_PAYMENT,
+                patch={**status_fields(payment_status=PaymentStatus.PAID), "reconciled_at": reconciled_at},
+            )
+            return True
+        except ValueError as e:
+            # already moved on (webhook won the race), or not in a payable state
+            logger.info(f"Reconciliation: order {order_id} not transitioned ({e})")
+            return False
+
+    async def _apply(self, payments: List[dict], statuses: Dict[str, object]) -> dict:
+        # orders get native datetimes; payments / logs keep their ISO strings
+        now = utcnow()
+        reconciled_at = now.isoformat()
+        payment_ops, deposit_ops, deposit_orders, paid_orders, errors = [], [], [], [], []
         fixed = 0
-        errors = 0
-
-        async for p in candidates:
-            scanned += 1
-            payment_id = p.get("id")
-            order_id = p.get("order_id")
-            purpose = p.get("purpose", "ORDER_PAYMENT")
 
-            try:
-                # Get status from provider
-                if self.provider:
-                    status = await self.provider.get_payment_status(payment_id)
+        for p in payments:
+            payment_id, order_id = p.get("id"), p.get("order_id")
+            status = statuses.get(payment_id)
+            if isinstance(status, Exception):
+                errors.append({"payment_id": payment_id, "order_id": order_id,
+                               "error": str(status), "created_at": reconciled_at})
+                continue
+
+            if status == "PAID":
+                payment_ops.append(UpdateOne(
+                    {"id": payment_id, "status": {"$in": ["CREATED", "PENDING"]}},
+                    {"$set": {"status": "PAID", "paid_at": reconciled_at, "reconciled": True}},
+                ))
+                if p.get("purpose", "ORDER_PAYMENT") == "SHIP_DEPOSIT":
+                    deposit_ops.append(UpdateOne(
+                        {"id": order_id},
+                        {"$set": {
+                            "deposit.paid": True,
+                            "deposit.paid_at": now,
+                            **status_fields(status="NEW"),  # Deposit paid, COD now allowed
+                            "reconciled_at": now,
+                            "updated_at": now,
+                        }},
+                    ))
+                    deposit_orders.append(order_id)
                 else:
-                    # Mock: check if we have a manual confirmation
-                    manual = await self.db["payment_confirmations"].find_one({"payment_id": payment_id})
-                    status = "PAID" if manual else "PENDING"
-
-                if status == "PAID":
-                    # Update payment
-                    await self.payments.update_one(
-                        {"id": payment_id},
-                        {"$set": {"status": "PAID", "paid_at": now_iso(), "reconciled": True}}
-                    )
-
-                    # Update order based on purpose
-                    if purpose == "SHIP_DEPOSIT":
-                        await self.orders.update_one(
-                            {"id": order_id},
-                            {"$set": {
-                                "deposit.paid": True,
-                                "deposit.paid_at": now_iso(),
-                                "status": "NEW",  # Deposit paid, COD now allowed
-                                "reconciled_at": now_iso()
-                            }}
-                        )
-                    else:
-                        await self.orders.update_one(
-                            {"id": order_id, "status": "AWAITING_PAYMENT"},
-                            {"$set": {"status": "PAID", "reconciled_at": now_iso()}}
-                        )
-
-                    fixed += 1
-                    logger.info(f"Reconciled payment {payment_id} -> PAID")
-
-                elif status in ["FAILED", "DECLINED", "CANCELLED", "EXPIRED"]:
-                    await self.payments.update_one(
-                        {"id": payment_id},
-                        {"$set": {"status": status, "updated_at": now_iso()}}
-                    )
+                    paid_orders.append(order_id)
+                fixed += 1
+                logger.info(f"Reconciled payment {payment_id} -> PAID")
 
-            except Exception as e:
-                errors += 1
-                await self.recon_logs.insert_one({
-                    "payment_id": payment_id,
-                    "order_id": order_id,
-                    "error": str(e),
-                    "created_at": now_iso()
-                })
-                logger.error(f"Reconciliation error for {payment_id}: {e}")
+            elif status in FAILED_STATUSES:
+                payment_ops.append(UpdateOne(
+                    {"id": payment_id},
+                    {"$set": {"status": status, "updated_at": reconciled_at}},
+                ))
+
+        if payment_ops:
+            await self.payments.bulk_write(payment_ops, ordered=False)
+        if deposit_ops:
+            await self.orders.bulk_write(deposit_ops, ordered=False)
+            from modules.payments.retry.retry_service import disarm_payment_timers
+            for order_id in deposit_orders:
+                await disarm_payment_timers(self.db, order_id)
+
+        transitioned = 0
+        if paid_orders:
+            sem = asyncio.Semaphore(self.concurrency)
+
+            async def one(order_id: str) -> bool:
+                async with sem:
+                    return await self._mark_order_paid(order_id, now)
+
+            transitioned = sum(await asyncio.gather(*(one(o) for o in paid_orders if o)))
+
+        if errors:
+            await self.recon_logs.insert_many(errors, ordered=False)
+            for e in errors:
+                logger.error(f"Reconciliation error for {e['payment_id']}: {e['error']}")
+
+        return {"fixed": fixed, "transitioned": transitioned, "errors": len(errors)}
+
+    # ---------- run ----------
+
+    async def run_once(self, hours_back: int = 48, limit: int = 200):
+        """
+        Scan pending payments and reconcile with provider status.
+        Processes at most `limit` payments, continuing from the checkpoint.
+        """
+        started = time.monotonic()
+        since = datetime.now(timezone.utc) - timedelta(hours=hours_back)
+
+        st = await self.state.find_one({"_id": STATE_ID}) or {}
+        last_id = st.get("last_id") if st.get("hours_back") == hours_back else None
+
+        scanned = fixed = transitioned = errors = 0
+        complete = False
+        while scanned < limit:
+            q = {
+                "status": {"$in": ["CREATED", "PENDING"]},
+                # payments are not part of the datetime migration: writers store ISO strings
+                "created_at": {"$gte": since.isoformat()},
+            }
+            if last_id is not None:
+                q["_id"] = {"$gt": last_id}
+            size = min(PAGE_SIZE, limit - scanned)
+            page = await self.payments.find(q, {"order_id": 1, "id": 1, "purpose": 1, "fondy_order_id": 1}) \
+                .sort("_id", 1).limit(size).to_list(size)
+            if not page:
+                complete = True
+                break
+
+            statuses = await self._poll(page)
+            res = await self._apply(page, statuses)
+            scanned += len(page)
+            fixed += res["fixed"]
+            transitioned += res["transitioned"]
+            errors += res["errors"]
+
+            last_id = page[-1]["_id"]
+            await self.state.update_one(
+                {"_id": STATE_ID},
+                {"$set": {"last_id": last_id, "hours_back": hours_back, "updated_at": utcnow()}},
+                upsert=True,
+            )
+            if len(page) < size:
+                complete = True
+                break
+
+        if complete:
+            # window done: next run starts from the beginning of the window again
+            await self.state.update_one(
+                {"_id": STATE_ID},
+                {"$set": {"last_id": None, "last_complete_at": utcnow()}},
+                upsert=True,
+            )
 
         return {
             "ok": True,
             "scanned": scanned,
             "fixed": fixed,
-            "errors": errors
+            "transitioned": transitioned,
+            "errors": errors,
+            "complete": complete,
+            "provider": self.provider.name,
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
         }
@@ -6,6 +6,7 @@ from fastapi import APIRouter, Depends, Query
 from datetime import datetime, timezone, timedelta
 from core.db import db
 from core.security import get_current_admin
+from core.dates import date_range, as_datetime
 
 router = APIRouter(prefix="/api/v2/admin/payments/recovery", tags=["Payment Recovery Analytics"])
 
@@ -28,7 +29,7 @@ async def recovery_summary(
     # Orders that entered AWAITING_PAYMENT
     awaiting_created = await db["orders"].count_documents({
         "status": {"$in": ["AWAITING_PAYMENT", "PAID", "PROCESSING", "SHIPPED", "DELIVERED", "CANCELLED_AUTO"]},
-        "created_at": {"$gte": since},
+        **date_range("created_at", gte=since),
         "payment_policy.mode": {"$in": ["FULL_PREPAID", "SHIP_DEPOSIT"]}
     })
 
@@ -36,7 +37,7 @@ async def recovery_summary(
     paid_orders = [x async for x in db["orders"].find(
         {
             "status": {"$in": ["PAID", "PROCESSING", "SHIPPED", "DELIVERED"]},
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "payment_policy.mode": {"$in": ["FULL_PREPAID", "SHIP_DEPOSIT"]}
         },
         {"_id": 0, "id": 1, "created_at": 1, "totals": 1}
@@ -71,7 +72,7 @@ async def recovery_summary(
     auto_cancelled = await db["orders"].count_documents({
         "status": "CANCELLED_AUTO",
         "cancel_reason": "PAYMENT_TIMEOUT_24H",
-        "cancelled_at": {"$gte": since}
+        **date_range("cancelled_at", gte=since)
     })
 
     return {
@@ -97,7 +98,7 @@ async def recovery_trend(
     paid = [x async for x in db["orders"].find(
         {
             "status": {"$in": ["PAID", "PROCESSING", "SHIPPED", "DELIVERED"]},
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "payment_policy.mode": {"$in": ["FULL_PREPAID", "SHIP_DEPOSIT"]}
         },
         {"_id": 0, "id": 1, "created_at": 1, "totals": 1}
@@ -126,7 +127,8 @@ async def recovery_trend(
     bucket_r = {}
 
     for o in paid:
-        day = (o.get("created_at") or "")[:10]
+        created = as_datetime(o.get("created_at"))
+        day = created.date().isoformat() if created else ""
         if o["id"] in reminded:
             bucket_c[day] = bucket_c.get(day, 0) + 1
             bucket_r[day] = bucket_r.get(day, 0.0) + float((o.get("totals") or {}).get("grand") or 0)
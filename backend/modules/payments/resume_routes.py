@@ -7,6 +7,8 @@ from datetime import datetime, timezone
 import uuid
 import os
 from core.db import db
+from core.dates import utcnow
+from modules.orders.order_status import status_fields
 
 router = APIRouter(prefix="/api/v2/payments/resume", tags=["Payment Resume"])
 
@@ -145,7 +147,7 @@ async def freeze_order(order_id: str):
     """
     result = await db["orders"].update_one(
         {"id": order_id, "status": "AWAITING_PAYMENT"},
-        {"$set": {"status": "PAYMENT_FROZEN", "frozen_at": now_iso()}}
+        {"$set": {**status_fields(status="PAYMENT_FROZEN"), "frozen_at": utcnow(), "updated_at": utcnow()}}
     )
 
     if result.modified_count == 0:
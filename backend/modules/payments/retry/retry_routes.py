@@ -4,6 +4,7 @@ D-Mode: Payment Retry Routes
 from fastapi import APIRouter, Depends
 from core.db import db
 from core.security import get_current_admin
+from core.dates import date_range
 from modules.payments.retry.retry_service import PaymentRetryService
 
 router = APIRouter(prefix="/api/v2/admin/payments/retry", tags=["Payment Retry"])
@@ -26,7 +27,8 @@ async def retry_stats(admin: dict = Depends(get_current_admin)):
     
     since_24h = (datetime.now(timezone.utc) - timedelta(hours=24)).isoformat()
     
-    # Reminders sent
+    # Reminders sent (notifications_outbox keeps ISO-string created_at,
+    # it is not part of the datetime migration)
     sent = await db["notifications_outbox"].count_documents({
         "dedupe_key": {"$regex": r"^outbox:payretry:"},
         "created_at": {"$gte": since_24h}
@@ -36,7 +38,7 @@ async def retry_stats(admin: dict = Depends(get_current_admin)):
     cancelled = await db["orders"].count_documents({
         "status": "CANCELLED_AUTO",
         "cancel_reason": "PAYMENT_TIMEOUT_24H",
-        "cancelled_at": {"$gte": since_24h}
+        **date_range("cancelled_at", gte=since_24h)
     })
     
     return {
@@ -1,27 +1,25 @@
 """
 D-Mode: Payment Retry Scheduler
-Runs retry service every 5 minutes
+Reminder / auto-cancel stages run from the timer queue; a 5-minute job arms
+timers for unpaid orders that do not have them yet
 """
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from modules.payments.retry.retry_service import PaymentRetryService
+from modules.jobs.runtime import job_runtime
+from modules.jobs.timers import timer_queue
+from modules.payments.retry.retry_service import PaymentRetryService, TIMER_KIND
 import logging
 
 logger = logging.getLogger(__name__)
-retry_scheduler = AsyncIOScheduler()
 
 
 def start_payment_retry_scheduler(db):
-    """Start the payment retry scheduler"""
+    """Register the payment retry timer handler and arming job"""
     svc = PaymentRetryService(db)
+    timer_queue.register(TIMER_KIND, svc.handle_timer)
 
     async def job():
-        try:
-            result = await svc.run_once(limit=500)
-            if result.get("enqueued", 0) > 0 or result.get("cancelled", 0) > 0:
-                logger.info(f"Payment retry: {result}")
-        except Exception as e:
-            logger.error(f"Payment retry error: {e}")
+        result = await svc.run_once(limit=500)
+        if result.get("armed", 0) > 0:
+            logger.info(f"Payment retry: {result}")
 
-    retry_scheduler.add_job(job, "interval", minutes=5, id="payment_retry_flow", replace_existing=True)
-    retry_scheduler.start()
-    logger.info("Payment retry scheduler started (every 5 min)")
+    job_runtime.add(job, "interval", minutes=5, id="payment_retry_flow")
+    logger.info("Payment retry registered (timers + arming every 5 min)")
@@ -1,21 +1,40 @@
 """
 D-Mode Step 2: Payment Retry Service
 Auto-reminders for unpaid orders: 15min, 60min, 24h auto-cancel
+
+Each stage is a durable timer (modules/jobs/timers.py) armed when the order
+enters AWAITING_PAYMENT and cancelled when it leaves; run_once only arms
+timers for orders that got there through a writer without the hook.
 """
 from datetime import datetime, timezone, timedelta
 import os
 
+from core.dates import as_datetime, date_range, utcnow
+from modules.jobs.timers import schedule_timer, cancel_timers
+from modules.orders.order_status import OrderStatus, status_fields
+
+TIMER_KIND = "payretry"
+
+# stage -> delay after the order was created
+STAGES = {
+    "REMIND_15M": timedelta(minutes=15),
+    "REMIND_60M": timedelta(minutes=60),
+    "CANCEL_24H": timedelta(hours=24),
+}
+# stage is skipped once the next one is due (same windows as the old scan)
+STAGE_UNTIL = {
+    "REMIND_15M": timedelta(minutes=60),
+    "REMIND_60M": timedelta(hours=24),
+}
+
 
 def now_iso():
     return datetime.now(timezone.utc).isoformat()
 
 
-def minutes_since(iso_ts: str) -> int:
-    try:
-        dt = datetime.fromisoformat(iso_ts.replace("Z", "+00:00"))
-    except Exception:
-        dt = datetime.now(timezone.utc)
-    return int((datetime.now(timezone.utc) - dt).total_seconds() // 60)
+def minutes_since(ts) -> int:
+    dt = as_datetime(ts) or utcnow()
+    return int((utcnow() - dt).total_seconds() // 60)
 
 
 class PaymentRetryRepo:
@@ -34,6 +53,10 @@ class PaymentRetryRepo:
             await self.outbox.create_index("dedupe_key", unique=True)
         except Exception:
             pass
+        try:
+            await self.orders.create_index([("status_c", 1), ("retry_timers", 1), ("created_at", 1)])
+        except Exception:
+            pass
 
     async def mark_once(self, dedupe_key: str, payload: dict) -> bool:
         try:
@@ -46,14 +69,19 @@ class PaymentRetryRepo:
         except Exception:
             return False
 
-    async def find_awaiting_payment(self, since_iso: str, limit: int = 500):
+    async def find_unarmed(self, since, limit: int = 500):
+        """Awaiting-payment orders whose timers were never armed"""
         q = {
-            "status": "AWAITING_PAYMENT",
-            "created_at": {"$gte": since_iso},
+            "status_c": OrderStatus.AWAITING_PAYMENT.value,
+            "retry_timers": None,
+            **date_range("created_at", gte=since),
         }
-        cur = self.orders.find(q, {"_id": 0}).sort("created_at", 1).limit(limit)
+        cur = self.orders.find(q, {"_id": 0, "id": 1, "created_at": 1}).sort("created_at", 1).limit(limit)
         return [x async for x in cur]
 
+    async def get_order(self, order_id: str):
+        return await self.orders.find_one({"id": order_id}, {"_id": 0})
+
     async def enqueue_outbox(self, channel: str, to: str, text: str, dedupe_key: str, meta: dict):
         doc = {
             "status": "PENDING",
@@ -74,7 +102,7 @@ class PaymentRetryRepo:
     async def cancel_order(self, order_id: str, reason: str):
         await self.orders.update_one(
             {"id": order_id, "status": "AWAITING_PAYMENT"},
-            {"$set": {"status": "CANCELLED_AUTO", "cancel_reason": reason, "cancelled_at": now_iso()}}
+            {"$set": {**status_fields(status="CANCELLED_AUTO"), "cancel_reason": reason, "cancelled_at": utcnow(), "updated_at": utcnow()}}
         )
 
 
@@ -91,59 +119,58 @@ class PaymentRetryService:
         self.repo = PaymentRetryRepo(db)
 
     async def run_once(self, limit: int = 500):
+        """Arm timers for unpaid orders of the last 3 days that have none yet"""
         await self.repo.ensure_indexes()
 
-        # Scan orders from last 3 days
-        since = (datetime.now(timezone.utc) - timedelta(days=3)).isoformat()
-        orders = await self.repo.find_awaiting_payment(since, limit=limit)
+        since = utcnow() - timedelta(days=3)
+        orders = await self.repo.find_unarmed(since, limit=limit)
+        for o in orders:
+            await arm_payment_timers(self.db, o["id"], o.get("created_at"))
+
+        return {"ok": True, "armed": len(orders)}
+
+    async def handle_timer(self, task: dict):
+        """Timer handler for one reminder / auto-cancel stage"""
+        order_id = task["ref"]
+        stage = task["payload"].get("stage")
+        o = await self.repo.get_order(order_id)
+        if not o or o.get("status") != "AWAITING_PAYMENT":
+            return None
+
+        mins = minutes_since(o.get("created_at"))
+
+        if stage == "CANCEL_24H":
+            dedupe_key = f"payretry:{order_id}:CANCEL_24H"
+            if await self.repo.mark_once(dedupe_key, {"order_id": order_id, "mins": mins}):
+                await self.repo.cancel_order(order_id, reason="PAYMENT_TIMEOUT_24H")
+                await cancel_timers(self.db, order_id)
+            return None
+
+        # Stage window passed (e.g. timers armed late for an old order)
+        until = STAGE_UNTIL.get(stage)
+        if until is not None and mins >= until.total_seconds() // 60:
+            return None
+
+        # Get payment URL
+        pay = await self.db["payments"].find_one(
+            {"order_id": order_id, "status": {"$in": ["CREATED", "PENDING"]}},
+            {"_id": 0, "payment_url": 1, "purpose": 1}
+        )
+        pay_url = (pay or {}).get("payment_url")
 
-        enqueued = 0
-        cancelled = 0
+        # Skip if no payment URL
+        if not pay_url:
+            return None
 
-        for o in orders:
-            order_id = o.get("id")
-            created_at = o.get("created_at")
-            if not (order_id and created_at):
-                continue
-
-            mins = minutes_since(created_at)
-
-            # Get payment URL
-            pay = await self.db["payments"].find_one(
-                {"order_id": order_id, "status": {"$in": ["CREATED", "PENDING"]}},
-                {"_id": 0, "payment_url": 1, "purpose": 1}
-            )
-            pay_url = (pay or {}).get("payment_url")
-
-            # Get recipient info
-            rec = ((o.get("delivery") or {}).get("recipient") or {})
-            shipping = o.get("shipping") or {}
-            phone = rec.get("phone") or shipping.get("phone") or ""
-            email = rec.get("email") or shipping.get("email") or ""
-            tg = rec.get("telegram_chat_id")
-
-            # Skip if no payment URL
-            if not pay_url:
-                continue
-
-            # Stage: 15 minutes
-            if 15 <= mins < 60:
-                did = await self._enqueue_reminder(o, "REMIND_15M", tg, phone, email, pay_url)
-                enqueued += (1 if did else 0)
-
-            # Stage: 60 minutes
-            if 60 <= mins < 24 * 60:
-                did = await self._enqueue_reminder(o, "REMIND_60M", tg, phone, email, pay_url)
-                enqueued += (1 if did else 0)
-
-            # Stage: 24 hours - auto cancel
-            if mins >= 24 * 60:
-                dedupe_key = f"payretry:{order_id}:CANCEL_24H"
-                if await self.repo.mark_once(dedupe_key, {"order_id": order_id, "mins": mins}):
-                    await self.repo.cancel_order(order_id, reason="PAYMENT_TIMEOUT_24H")
-                    cancelled += 1
-
-        return {"ok": True, "scanned": len(orders), "enqueued": enqueued, "cancelled": cancelled}
+        # Get recipient info
+        rec = ((o.get("delivery") or {}).get("recipient") or {})
+        shipping = o.get("shipping") or {}
+        phone = rec.get("phone") or shipping.get("phone") or ""
+        email = rec.get("email") or shipping.get("email") or ""
+        tg = rec.get("telegram_chat_id")
+
+        await self._enqueue_reminder(o, stage, tg, phone, email, pay_url)
+        return None
 
     async def _enqueue_reminder(self, o: dict, stage: str, tg, phone: str, email: str, pay_url: str) -> bool:
         order_id = o["id"]
@@ -190,3 +217,24 @@ class PaymentRetryService:
             return await self.repo.enqueue_outbox("EMAIL", email, text, f"outbox:{dedupe_key}:email", meta)
 
         return False
+
+
+async def arm_payment_timers(db, order_id: str, created_at=None):
+    """
+    Called when an order enters AWAITING_PAYMENT: schedules the reminder and
+    auto-cancel stages plus the growth payment-recovery nudge.
+    """
+    base = as_datetime(created_at) or utcnow()
+    for stage, delay in STAGES.items():
+        await schedule_timer(
+            db, TIMER_KIND, order_id, base + delay,
+            key=f"{TIMER_KIND}:{order_id}:{stage}", payload={"stage": stage},
+        )
+    from modules.growth.scheduler import PAYMENT_RECOVERY_DELAY
+    await schedule_timer(db, "payment_recovery", order_id, base + PAYMENT_RECOVERY_DELAY)
+    await db["orders"].update_one({"id": order_id}, {"$set": {"retry_timers": True}})
+
+
+async def disarm_payment_timers(db, order_id: str):
+    """Called when an order leaves AWAITING_PAYMENT"""
+    await cancel_timers(db, order_id, kinds=[TIMER_KIND, "payment_recovery"])
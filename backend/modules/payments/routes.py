@@ -60,14 +60,14 @@ async def fondy_webhook(request: Request):
     """
     Handle Fondy payment webhook.
     - Verifies signature
-    - Processes payment idempotently
-    - Updates order status atomically
+    - Queues the callback; the webhook inbox worker processes the payment
+      idempotently and updates the order status atomically
     """
     try:
         raw_body = await request.body()
         payload = await request.json()
         
-        result = await payments_service.handle_webhook(raw_body, payload)
+        result = await payments_service.accept_webhook(raw_body, payload)
         
         return {"status": "ok", **result}
         
@@ -0,0 +1,57 @@
+"""
+RozetkaPay callbacks - order / transaction updates for a verified callback
+
+Run by the webhook inbox worker; the endpoint in server.py only verifies
+the signature and appends the callback.
+"""
+import logging
+from datetime import datetime, timezone
+
+from modules.orders.order_status import status_fields
+from modules.orders.seller_orders import SellerOrdersService
+
+logger = logging.getLogger(__name__)
+
+
+async def apply_rozetkapay_callback(db, payload: dict) -> dict:
+    external_id = payload.get("external_id")
+    payment_id = payload.get("id")
+    is_success = payload.get("is_success")
+    details = payload.get("details", {})
+    status = details.get("status")
+
+    logger.info(f"RozetkaPay callback for order {external_id}: status={status}, success={is_success}")
+
+    # Update order status
+    if external_id:
+        order = await db.orders.find_one({"order_number": external_id}, {"_id": 0, "id": 1})
+        if order:
+            new_status = "paid" if is_success else "payment_failed"
+            await db.orders.update_one(
+                {"order_number": external_id},
+                {
+                    "$set": {
+                        **status_fields(payment_status=new_status),
+                        "payment_session_id": payment_id,
+                        "updated_at": datetime.now(timezone.utc)
+                    }
+                }
+            )
+            await SellerOrdersService(db).sync_order(order["id"])
+            logger.info(f"Order {external_id} updated to status: {new_status}")
+
+    # Update payment transaction
+    await db.payment_transactions.update_one(
+        {"order_id": external_id},
+        {
+            "$set": {
+                "status": status,
+                "is_success": is_success,
+                "webhook_received": True,
+                "webhook_data": payload,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }
+        }
+    )
+
+    return {"status": "processed", "order_id": external_id}
@@ -6,9 +6,11 @@ from typing import Dict, Any
 from core.db import db
 from core.config import settings
 from modules.orders.order_repository import order_repository
-from modules.orders.order_status import OrderStatus
+from modules.orders.order_status import OrderStatus, PaymentStatus, status_fields
 from .payment_webhook_service import payment_webhook_service
+from .retry.retry_service import arm_payment_timers
 from .providers.fondy import FondyProvider
+from .webhook_inbox import ingest
 
 
 class PaymentsService:
@@ -38,7 +40,7 @@ class PaymentsService:
             {"id": order_id},
             {
                 "$set": {
-                    "status": OrderStatus.AWAITING_PAYMENT.value,
+                    **status_fields(status=OrderStatus.AWAITING_PAYMENT, payment_status=PaymentStatus.PENDING),
                     "payment.provider": self.provider.name,
                     "payment.provider_payment_id": result["provider_payment_id"],
                     "payment.checkout_url": result["checkout_url"],
@@ -46,6 +48,7 @@ class PaymentsService:
                 }
             }
         )
+        await arm_payment_timers(db, order_id, order.get("created_at"))
         
         return {
             "checkout_url": result["checkout_url"],
@@ -53,16 +56,23 @@ class PaymentsService:
             "order_id": order_id,
         }
     
-    async def handle_webhook(
+    async def accept_webhook(
         self, 
         raw_body: bytes, 
         payload: Dict[str, Any]
     ) -> Dict[str, Any]:
-        """Handle payment webhook"""
+        """Verify a payment webhook and queue it for process_webhook()"""
         
         # Verify signature
         self.provider.verify_webhook(raw_body, payload)
         
+        parsed = self.provider.parse_webhook(payload)
+        key = parsed.get("payment_id") or parsed.get("order_id")
+        return await ingest(db, "fondy_v2", key, payload, raw_body)
+    
+    async def process_webhook(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply a verified payment webhook (run by the webhook inbox worker)"""
+        
         # Parse webhook
         parsed = self.provider.parse_webhook(payload)
         
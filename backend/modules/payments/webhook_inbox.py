@@ -0,0 +1,367 @@
+"""
+Payment Webhook Inbox - ingest callbacks now, process them in the background
+
+Provider callbacks (Fondy, RozetkaPay) used to run verification, dedupe,
+order transition, ledger write and event emit inside the HTTP request, so a
+burst during a sale competed with storefront traffic and slow writes turned
+into provider timeouts and retries. Now:
+
+- the endpoint verifies the signature and appends the callback to
+  payment_webhook_inbox with one insert (_id = source + body hash, so a
+  provider retry of the same body is a no-op) and answers 200
+- the dispatcher (started with the jobs runtime) claims payment keys with a
+  lease in payment_webhook_locks and hands them to a pool of WORKERS tasks:
+  callbacks of one payment run one at a time in arrival order, different
+  payments run in parallel, also across processes
+- outcomes of a claimed group are written with one bulk_write; 4xx errors
+  raised by a handler (order not found, amount mismatch) are final, other
+  errors are retried with backoff and hold back the payment's later callbacks
+- payment_webhooks_total{source, outcome}, payment_webhook_lag_seconds
+  (receipt -> processed) and the queue depth / oldest pending age gauges;
+  stats() for the admin view
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from core.dates import as_datetime, utcnow
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "payment_webhook_inbox"
+LOCKS = "payment_webhook_locks"
+PENDING, DONE, FAILED = "PENDING", "DONE", "FAILED"
+
+WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 4))
+POLL_SEC = float(os.environ.get("WEBHOOK_POLL_SEC", 1.0))
+LEASE_SEC = 120
+GROUP_LIMIT = 50
+CLAIM_SCAN = 200
+MAX_ATTEMPTS = 8
+RETRY_BASE_SEC = 5
+RETRY_MAX_SEC = 600
+GAUGE_REFRESH_SEC = 15.0
+STOP_WAIT_SEC = 10.0
+KEEP_FINISHED_DAYS = 30
+
+Handler = Callable[[dict], Awaitable[Optional[dict]]]
+
+WEBHOOKS = metrics.counter(
+    "payment_webhooks_total",
+    "Payment callbacks by outcome (queued, duplicate, done, rejected, retried, failed)",
+    ["source", "outcome"])
+WEBHOOK_LAG = metrics.histogram(
+    "payment_webhook_lag_seconds", "Time from receipt to final outcome of a payment callback", ["source"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+QUEUE_DEPTH = metrics.gauge(
+    "payment_webhook_queue_depth", "Pending payment callbacks (dispatching processes only)", ["source"])
+QUEUE_OLDEST = metrics.gauge(
+    "payment_webhook_oldest_seconds", "Age of the oldest pending payment callback", ["source"])
+
+
+async def ingest(db, source: str, key: Optional[str], payload: dict, body: bytes) -> dict:
+    """
+    Append a verified callback. `key` is the payment it belongs to;
+    callbacks with the same key are processed in arrival order.
+    """
+    now = utcnow()
+    item_id = f"{source}:{hashlib.sha256(body).hexdigest()}"
+    try:
+        await db[COLLECTION].insert_one({
+            "_id": item_id,
+            "source": source,
+            "key": f"{source}:{key or item_id}",
+            "payload": payload,
+            "status": PENDING,
+            "attempts": 0,
+            "received_at": now,
+            "next_attempt_at": now,
+            # arrival order within a key (received_at has millisecond precision)
+            "seq": time.time_ns(),
+        })
+    except DuplicateKeyError:
+        WEBHOOKS.inc(source=source, outcome="duplicate")
+        return {"ok": True, "queued": False, "duplicate": True, "id": item_id}
+    WEBHOOKS.inc(source=source, outcome="queued")
+    webhook_inbox.notify()
+    return {"ok": True, "queued": True, "id": item_id}
+
+
+class WebhookInbox:
+    def __init__(self):
+        self.db = None
+        self.handlers: Dict[str, Handler] = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.metrics = {"groups": 0, "done": 0, "rejected": 0, "retried": 0, "failed": 0,
+                        "last_group_ms": 0.0}
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._active: Set[str] = set()
+        self._workers: Set[asyncio.Task] = set()
+        self._gauges_ts = 0.0
+
+    @property
+    def col(self):
+        return self.db[COLLECTION]
+
+    @property
+    def locks(self):
+        return self.db[LOCKS]
+
+    def register(self, source: str, handler: Handler):
+        self.handlers[source] = handler
+
+    async def ensure_indexes(self):
+        await self.col.create_index([("status", 1), ("seq", 1)])
+        await self.col.create_index([("key", 1), ("status", 1), ("seq", 1)])
+        await self.col.create_index("finished_at", expireAfterSeconds=KEEP_FINISHED_DAYS * 86400)
+
+    def notify(self):
+        """Wake the local dispatcher (callbacks ingested by this process)"""
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self, db):
+        """Bind database and start the dispatcher (idempotent)"""
+        self.db = db
+        if self._task and not self._task.done():
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_event_loop().create_task(self._run())
+        logger.info(f"Webhook inbox started ({', '.join(sorted(self.handlers))}, {WORKERS} workers)")
+
+    async def stop(self):
+        """Stop claiming; groups in flight get STOP_WAIT_SEC to finish"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._workers:
+            _, pending = await asyncio.wait(set(self._workers), timeout=STOP_WAIT_SEC)
+            for t in pending:
+                # unfinished callbacks stay PENDING and are picked up after the lease
+                t.cancel()
+
+    # ---------- dispatch ----------
+
+    async def _run(self):
+        try:
+            await self.ensure_indexes()
+        except Exception as e:
+            logger.warning(f"Webhook inbox indexes not created: {e}")
+        while True:
+            self._wake.clear()
+            free = WORKERS - len(self._active)
+            claimed = 0
+            try:
+                if free > 0:
+                    claimed = await self._claim(free)
+                if time.monotonic() - self._gauges_ts >= GAUGE_REFRESH_SEC:
+                    await self._refresh_gauges()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook inbox dispatcher error: {e}")
+            if free > 0 and claimed == free:
+                # every slot taken: more may be waiting
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), POLL_SEC)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _lock(self, key: str, now) -> bool:
+        try:
+            await self.locks.update_one(
+                {"_id": key, "locked_until": {"$lt": now}},
+                {"$set": {"owner": self.owner, "locked_until": now + timedelta(seconds=LEASE_SEC)}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # another worker holds this payment
+            return False
+
+    async def _claim(self, limit: int) -> int:
+        now = utcnow()
+        # a payment is due when its oldest pending callback is: later ones wait behind a backoff
+        rows = await self.col.aggregate([
+            {"$match": {"status": PENDING, "source": {"$in": list(self.handlers)}}},
+            {"$sort": {"seq": 1}},
+            {"$group": {"_id": "$key", "seq": {"$first": "$seq"}, "due": {"$first": "$next_attempt_at"}}},
+            {"$match": {"due": {"$lte": now}, "_id": {"$nin": list(self._active)}}},
+            {"$sort": {"seq": 1}},
+            {"$limit": CLAIM_SCAN},
+        ]).to_list(CLAIM_SCAN)
+        keys = [r["_id"] for r in rows]
+        claimed = 0
+        for key in keys:
+            if claimed >= limit:
+                break
+            if not await self._lock(key, now):
+                continue
+            self._active.add(key)
+            task = asyncio.get_event_loop().create_task(self._work(key))
+            self._workers.add(task)
+            task.add_done_callback(self._workers.discard)
+            claimed += 1
+        return claimed
+
+    async def _work(self, key: str):
+        started = time.monotonic()
+        settled = 0
+        try:
+            settled = await self.process_key(key)
+        except Exception as e:
+            logger.error(f"Webhook inbox group {key} failed: {e}")
+        finally:
+            self._active.discard(key)
+            try:
+                await self.locks.delete_one({"_id": key, "owner": self.owner})
+            except Exception as e:
+                logger.warning(f"Webhook inbox lock {key} not released: {e}")
+            self.metrics["groups"] += 1
+            self.metrics["last_group_ms"] = round((time.monotonic() - started) * 1000, 1)
+            if settled:
+                # later callbacks of this payment (or keys that waited for a slot) may be due now
+                self.notify()
+
+    async def process_key(self, key: str) -> int:
+        """Run the pending callbacks of one payment in order; returns how many were settled"""
+        items = await self.col.find({"key": key, "status": PENDING}).sort("seq", 1).to_list(GROUP_LIMIT)
+        ops, settled = [], 0
+        for item in items:
+            if as_datetime(item.get("next_attempt_at")) > utcnow():
+                # an earlier callback is backing off; later ones wait for it
+                break
+            update = await self._apply(item)
+            ops.append(UpdateOne({"_id": item["_id"], "status": PENDING},
+                                 {"$set": update, "$inc": {"attempts": 1}}))
+            if update["status"] == PENDING:
+                break
+            settled += 1
+        if ops:
+            await self.col.bulk_write(ops, ordered=False)
+        return settled
+
+    async def _apply(self, item: dict) -> dict:
+        source = item["source"]
+        handler = self.handlers[source]
+        attempts = int(item.get("attempts") or 0) + 1
+        try:
+            result = await handler(item["payload"])
+        except Exception as e:
+            now = utcnow()
+            final = isinstance(e, HTTPException) and e.status_code < 500
+            error = str(e.detail if isinstance(e, HTTPException) else e)[:500]
+            if not final and attempts < MAX_ATTEMPTS:
+                self.metrics["retried"] += 1
+                WEBHOOKS.inc(source=source, outcome="retried")
+                backoff = min(RETRY_MAX_SEC, RETRY_BASE_SEC * (2 ** (attempts - 1)))
+                logger.warning(f"Webhook {item['_id']} failed (attempt {attempts}): {error}")
+                return {"status": PENDING, "error": error, "next_attempt_at": now + timedelta(seconds=backoff)}
+            outcome = "rejected" if final else "failed"
+            self.metrics[outcome] += 1
+            WEBHOOKS.inc(source=source, outcome=outcome)
+            self._observe_lag(item, now)
+            logger.warning(f"Webhook {item['_id']} {outcome}: {error}")
+            return {"status": FAILED, "error": error, "finished_at": now}
+        now = utcnow()
+        self.metrics["done"] += 1
+        WEBHOOKS.inc(source=source, outcome="done")
+        self._observe_lag(item, now)
+        return {"status": DONE, "result": result, "error": None, "finished_at": now}
+
+    @staticmethod
+    def _observe_lag(item: dict, now):
+        received = as_datetime(item.get("received_at"))
+        if received is not None:
+            WEBHOOK_LAG.observe((now - received).total_seconds(), source=item["source"])
+
+    # ---------- visibility ----------
+
+    async def _pending_by_source(self) -> Dict[str, dict]:
+        rows = await self.col.aggregate([
+            {"$match": {"status": {"$in": [PENDING, FAILED]}}},
+            {"$group": {"_id": {"source": "$source", "status": "$status"}, "n": {"$sum": 1},
+                        "oldest": {"$min": "$received_at"}}},
+        ]).to_list(None)
+        now = utcnow()
+        out: Dict[str, dict] = {}
+        for r in rows:
+            row = out.setdefault(r["_id"]["source"], {"pending": 0, "failed": 0, "oldest_pending_sec": 0.0})
+            if r["_id"]["status"] == PENDING:
+                row["pending"] = r["n"]
+                oldest = as_datetime(r.get("oldest"))
+                row["oldest_pending_sec"] = round((now - oldest).total_seconds(), 1) if oldest else 0.0
+            else:
+                row["failed"] = r["n"]
+        return out
+
+    async def _refresh_gauges(self):
+        self._gauges_ts = time.monotonic()
+        by_source = await self._pending_by_source()
+        for source in set(self.handlers) | set(by_source):
+            row = by_source.get(source) or {}
+            QUEUE_DEPTH.set(row.get("pending", 0), source=source)
+            QUEUE_OLDEST.set(row.get("oldest_pending_sec", 0.0), source=source)
+
+    def bind(self, db):
+        """Processes that only ingest (JOBS_MODE=worker web workers) still serve stats / requeue"""
+        if self.db is None:
+            self.db = db
+
+    async def stats(self) -> dict:
+        return {
+            **self.metrics,
+            "running": bool(self._task and not self._task.done()),
+            "workers": WORKERS,
+            "active_keys": len(self._active),
+            "handlers": sorted(self.handlers),
+            "queue": await self._pending_by_source(),
+        }
+
+    async def requeue(self, item_id: str) -> bool:
+        """Put a FAILED callback back in the queue (after the cause was fixed)"""
+        res = await self.col.update_one(
+            {"_id": item_id, "status": FAILED},
+            {"$set": {"status": PENDING, "attempts": 0, "next_attempt_at": utcnow()},
+             "$unset": {"finished_at": "", "error": ""}},
+        )
+        if res.modified_count:
+            self.notify()
+        return bool(res.modified_count)
+
+
+webhook_inbox = WebhookInbox()
+
+
+def start_webhook_inbox(db):
+    """Register the per-source handlers and start the dispatcher"""
+    from .fondy_webhook import FondyWebhookHandler
+    from .rozetkapay_callbacks import apply_rozetkapay_callback
+    from .service import payments_service
+
+    fondy = FondyWebhookHandler(db, fondy_password=os.getenv("FONDY_MERCHANT_PASSWORD", ""))
+
+    async def rozetkapay(payload: dict) -> dict:
+        return await apply_rozetkapay_callback(db, payload)
+
+    webhook_inbox.register("fondy", fondy.apply)
+    webhook_inbox.register("fondy_v2", payments_service.process_webhook)
+    webhook_inbox.register("rozetkapay", rozetkapay)
+    webhook_inbox.start(db)
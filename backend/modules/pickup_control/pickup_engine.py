@@ -1,17 +1,24 @@
 """
 O20: Pickup Control Engine - Main processing logic
 NP tracking → state → policy → outbox/alerts
+
+Once a shipment has arrived, its reminder days are armed as durable
+timers (modules/jobs/timers.py); run_once then only looks at shipments
+that have not arrived yet.
 """
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, Optional
 import logging
 
+from core.dates import as_datetime
+from modules.jobs.timers import schedule_timer
+
 from modules.pickup_control.pickup_types import ShipmentState
 from modules.pickup_control.pickup_policy import (
     utcnow, parse_iso, iso,
     calc_storage_day1, calc_deadline_free,
     days_between, decide_reminder_level, make_decision, 
-    pickup_risk, get_free_storage_days
+    pickup_risk, get_free_storage_days, reminder_days
 )
 from modules.pickup_control.pickup_templates import (
     sms_pickup_template, email_pickup_template, admin_alert_pickup_risk
@@ -20,6 +27,11 @@ from modules.pickup_control.pickup_repo import PickupRepo
 
 logger = logging.getLogger(__name__)
 
+TIMER_KIND = "pickup_reminder"
+ACTIVE_STATUSES = {"shipped", "processing", "SHIPPED", "PROCESSING"}
+# 07:00 UTC = 09:00-10:00 Kyiv, the start of the allowed notification window
+REMINDER_HOUR_UTC = 7
+
 
 class PickupControlEngine:
     """
@@ -62,6 +74,12 @@ class PickupControlEngine:
                 logger.error(f"Error processing order {o.get('id')}: {e}")
                 errors.append({"order_id": o.get("id"), "error": str(e)})
 
+        # High-risk shipments already on timers are counted from their stored state
+        known = {x["order_id"] for x in high_risk}
+        for o in await self.repo.list_high_risk_armed():
+            if o.get("id") not in known:
+                high_risk.append(self._high_risk_entry(o, o.get("shipment") or {}))
+
         # Send admin alert if many high risk
         await self._maybe_admin_alert(high_risk, now)
 
@@ -127,16 +145,15 @@ class PickupControlEngine:
         }
         await self.repo.update_shipment_state(order_id, state)
 
+        # Arm the remaining reminder days as timers
+        if not shipment.get("reminderTimers"):
+            await self._arm_timers(order_id, storage_day1, point_type, now)
+
         # Track high risk
         if risk.risk == "HIGH":
-            result["high_risk"] = {
-                "order_id": order_id,
-                "ttn": ttn,
-                "phone": phone,
-                "days": days_at,
-                "deadline": iso(deadline_free),
-                "amount": float((order.get("totals") or {}).get("grand") or order.get("total_amount") or 0)
-            }
+            result["high_risk"] = self._high_risk_entry(
+                order, {"ttn": ttn, "daysAtPoint": days_at, "deadlineFreeAt": iso(deadline_free)}, phone
+            )
 
         # Check if should send reminder
         prefs = await self.repo.get_user_prefs(phone)
@@ -211,6 +228,47 @@ class PickupControlEngine:
 
         return result
 
+    def _high_risk_entry(self, order: Dict, shipment: Dict, phone: Optional[str] = None) -> Dict:
+        recipient = (order.get("delivery") or {}).get("recipient") or {}
+        return {
+            "order_id": order.get("id"),
+            "ttn": shipment.get("ttn"),
+            "phone": phone or recipient.get("phone") or order.get("buyer_phone"),
+            "days": shipment.get("daysAtPoint"),
+            "deadline": shipment.get("deadlineFreeAt"),
+            "amount": float((order.get("totals") or {}).get("grand") or order.get("total_amount") or 0)
+        }
+
+    async def _arm_timers(self, order_id: str, storage_day1: datetime, point_type: str, now: datetime):
+        """One timer per reminder day that is still ahead (or today)"""
+        storage_day1 = as_datetime(storage_day1)
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        for day in reminder_days(point_type):
+            due = storage_day1 + timedelta(days=day, hours=REMINDER_HOUR_UTC)
+            if due < today:
+                continue
+            await schedule_timer(
+                self.db, TIMER_KIND, order_id, max(due, now),
+                key=f"{TIMER_KIND}:{order_id}:{day}", payload={"day": day},
+            )
+        await self.repo.mark_timers_armed(order_id)
+
+    async def handle_timer(self, task: Dict) -> Optional[datetime]:
+        """Timer handler: refresh state and send the reminder due today"""
+        order = await self.db["orders"].find_one({"id": task["ref"]}, {"_id": 0})
+        if not order or order.get("status") not in ACTIVE_STATUSES:
+            return None
+        now = utcnow()
+        result = await self._process_order(order, now)
+        if result.get("sent"):
+            return None
+        # Outside the notification window: try again in an hour on the same day
+        retry_at = now + timedelta(hours=1)
+        due = as_datetime(task.get("due_at"))
+        if due and retry_at.date() == due.date() and retry_at.hour <= 18:
+            return retry_at
+        return None
+
     async def _maybe_admin_alert(self, high_risk: list, now: datetime):
         """Send admin alert if many high-risk shipments"""
         if not high_risk:
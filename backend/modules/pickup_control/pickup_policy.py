@@ -83,6 +83,15 @@ def decide_reminder_level(point_type: str, days_at: int) -> str:
     return None
 
 
+def reminder_days(point_type: str) -> list:
+    """Days at point on which decide_reminder_level() returns a level"""
+    if point_type == "BRANCH":
+        return [2, 5, 7]
+    if point_type == "LOCKER":
+        return [1, 3, 5]
+    return []
+
+
 def make_decision(
     ttn: str, 
     level: str, 
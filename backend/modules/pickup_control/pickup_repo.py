@@ -5,6 +5,8 @@ from datetime import datetime, timezone, timedelta
 from typing import List, Dict, Any, Optional
 import logging
 
+from core.dates import utcnow
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,19 +31,35 @@ class PickupRepo:
             await self.dedupe.create_index("key", unique=True)
             await self.orders.create_index("shipment.ttn")
             await self.orders.create_index("shipment.daysAtPoint")
+            await self.orders.create_index([("shipment.reminderTimers", 1), ("shipment.risk", 1)])
             await self.timeline.create_index([("phone", 1), ("ts", -1)])
         except Exception as e:
             logger.warning(f"Index creation warning: {e}")
 
     async def list_active_shipments(self, limit: int = 500) -> List[Dict]:
-        """Get orders with active shipments (shipped but not delivered)"""
+        """Get orders with active shipments (shipped but not delivered) whose reminders are not on timers yet"""
         q = {
             "shipment.ttn": {"$exists": True, "$ne": None},
-            "status": {"$in": ["shipped", "processing", "SHIPPED", "PROCESSING"]}
+            "status": {"$in": ["shipped", "processing", "SHIPPED", "PROCESSING"]},
+            "shipment.reminderTimers": {"$ne": True},
         }
         cur = self.orders.find(q, {"_id": 0}).sort("created_at", -1).limit(limit)
         return [x async for x in cur]
 
+    async def list_high_risk_armed(self, limit: int = 500) -> List[Dict]:
+        """HIGH-risk shipments handled by timers (state refreshed on reminder days)"""
+        q = {
+            "shipment.reminderTimers": True,
+            "shipment.risk": "HIGH",
+            "status": {"$in": ["shipped", "processing", "SHIPPED", "PROCESSING"]}
+        }
+        cur = self.orders.find(q, {"_id": 0, "id": 1, "shipment": 1, "delivery": 1, "buyer_phone": 1,
+                                   "totals": 1, "total_amount": 1}).limit(limit)
+        return [x async for x in cur]
+
+    async def mark_timers_armed(self, order_id: str):
+        await self.orders.update_one({"id": order_id}, {"$set": {"shipment.reminderTimers": True}})
+
     async def list_risk_shipments(self, min_days: int = 7, limit: int = 100) -> List[Dict]:
         """Get shipments at point for N+ days"""
         q = {
@@ -160,7 +178,7 @@ class PickupRepo:
             "status": "PENDING",
             "dedupe_key": dedupe_key,
             "meta": meta,
-            "created_at": utcnow_iso(),
+            "created_at": utcnow(),
         }
         try:
             await self.outbox.insert_one(doc)
@@ -182,7 +200,7 @@ class PickupRepo:
             "status": "PENDING",
             "dedupe_key": dedupe_key,
             "meta": meta,
-            "created_at": utcnow_iso(),
+            "created_at": utcnow(),
         }
         try:
             await self.outbox.insert_one(doc)
@@ -1,33 +1,25 @@
 """
 O20: Pickup Control Scheduler - Background job
 """
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import logging
 
+from modules.jobs.runtime import job_runtime
+from modules.jobs.timers import timer_queue
+
 logger = logging.getLogger(__name__)
-scheduler = AsyncIOScheduler()
 
 
 def start_pickup_control_scheduler(db, np_service=None):
-    """Start pickup control background job (every 30 minutes)"""
-    from modules.pickup_control.pickup_engine import PickupControlEngine
-    
+    """Register pickup control background job (every 30 minutes) and reminder timers"""
+    from modules.pickup_control.pickup_engine import PickupControlEngine, TIMER_KIND
+
     engine = PickupControlEngine(db, np_service=np_service)
+    timer_queue.register(TIMER_KIND, engine.handle_timer)
 
     async def job():
-        try:
-            result = await engine.run_once(limit=500)
-            if result.get("sent", 0) > 0 or result.get("high_risk_count", 0) > 0:
-                logger.info(f"Pickup control job: {result}")
-        except Exception as e:
-            logger.error(f"Pickup control job error: {e}")
+        result = await engine.run_once(limit=500)
+        if result.get("sent", 0) > 0 or result.get("high_risk_count", 0) > 0:
+            logger.info(f"Pickup control job: {result}")
 
-    scheduler.add_job(
-        job, 
-        "interval", 
-        minutes=30, 
-        id="pickup_control_engine", 
-        replace_existing=True
-    )
-    scheduler.start()
-    logger.info("Pickup control scheduler started (every 30 min)")
+    job_runtime.add(job, "interval", minutes=30, id="pickup_control_engine", lease_sec=900)
+    logger.info("Pickup control job registered (every 30 min)")
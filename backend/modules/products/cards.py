@@ -0,0 +1,171 @@
+"""
+Product cards - compact, pre-serialized listing entries
+
+- every product carries card_json: the fields a listing tile needs (id,
+  title, price, first image, rating, stock flag, category name, badges)
+  already encoded as JSON, plus card_v (CARD_VERSION it was built with)
+- product writes call refresh_cards(); category renames refresh the
+  category's products; the product_cards_backfill job builds cards that
+  are missing or from an older CARD_VERSION
+- listing endpoints read only id + card_json and join the strings into the
+  response body (CardsResponse): no model validation or per-field encoding
+  per request; products without a card yet are built on the fly
+- encoding uses orjson when it is installed, the json module otherwise
+"""
+import asyncio
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from fastapi.responses import Response
+from pymongo import UpdateOne
+
+from .catalog_cache import get_catalog_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+CARD_VERSION = 1
+BATCH_SIZE = 500
+BATCH_PAUSE_SEC = 0.05
+SOURCE_FIELDS = {
+    "_id": 0, "id": 1, "slug": 1, "title": 1, "name": 1, "price": 1, "compare_price": 1, "old_price": 1,
+    "currency": 1, "images": 1, "rating": 1, "reviews_count": 1, "stock_level": 1, "in_stock": 1,
+    "category_id": 1, "is_bestseller": 1, "is_featured": 1,
+}
+# what listing queries read instead of the whole document
+CARD_PROJECTION = {"_id": 0, "id": 1, "card_json": 1, "card_v": 1}
+# full documents returned as-is leave the card out
+WITHOUT_CARD = {"_id": 0, "card_json": 0, "card_v": 0}
+
+
+def dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def build_card(product: dict, category_name: Optional[str] = None) -> dict:
+    images = product.get("images") or []
+    stock = product.get("stock_level")
+    return {
+        "id": product["id"],
+        "slug": product.get("slug"),
+        # v2 products (modules/products) are named `name`
+        "title": product.get("title") or product.get("name"),
+        "price": product.get("price"),
+        "compare_price": product.get("compare_price") or product.get("old_price"),
+        "currency": product.get("currency"),
+        "image": images[0] if images else None,
+        "rating": product.get("rating") or 0,
+        "reviews_count": product.get("reviews_count") or 0,
+        "in_stock": bool(stock > 0) if stock is not None else bool(product.get("in_stock", True)),
+        "category_id": product.get("category_id"),
+        "category_name": category_name,
+        "is_bestseller": bool(product.get("is_bestseller")),
+        "is_featured": bool(product.get("is_featured")),
+    }
+
+
+class CardsResponse(Response):
+    """
+    JSON array assembled from pre-serialized card strings; with `key` the
+    array is wrapped in an object next to the (JSON-ready) `extra` fields
+    """
+    media_type = "application/json"
+
+    def __init__(self, cards: List[str], key: Optional[str] = None, extra: Optional[dict] = None, **kwargs):
+        self.key, self.extra = key, extra or {}
+        super().__init__(cards, **kwargs)
+
+    def render(self, content: List[str]) -> bytes:
+        body = "[" + ",".join(content) + "]"
+        if self.key is not None:
+            fields = [dumps(self.key) + ":" + body] + [dumps(k) + ":" + dumps(v) for k, v in self.extra.items()]
+            body = "{" + ",".join(fields) + "}"
+        return body.encode("utf-8")
+
+
+class ProductCards:
+    def __init__(self, db):
+        self.db = db
+        self.products = db["products"]
+
+    async def _encode(self, products: List[dict]) -> Dict[str, str]:
+        snap = await get_catalog_cache(self.db).get()
+        out = {}
+        for p in products:
+            cat = snap.by_id.get(p.get("category_id")) or {}
+            out[p["id"]] = dumps(build_card(p, cat.get("name")))
+        return out
+
+    async def _store(self, cards: Dict[str, str]):
+        if cards:
+            await self.products.bulk_write([
+                UpdateOne({"id": pid}, {"$set": {"card_json": card, "card_v": CARD_VERSION}})
+                for pid, card in cards.items()
+            ], ordered=False)
+
+    async def refresh(self, product_ids: Iterable[str]) -> Dict[str, str]:
+        """Rebuild the cards of these products; returns id -> card"""
+        ids = list(dict.fromkeys(p for p in product_ids if p))
+        cards: Dict[str, str] = {}
+        for i in range(0, len(ids), BATCH_SIZE):
+            chunk = ids[i:i + BATCH_SIZE]
+            products = await self.products.find({"id": {"$in": chunk}}, SOURCE_FIELDS).to_list(len(chunk))
+            built = await self._encode(products)
+            await self._store(built)
+            cards.update(built)
+        return cards
+
+    async def _scan(self, query: dict) -> int:
+        updated, last_id = 0, None
+        while True:
+            q = {**query, "_id": {"$gt": last_id}} if last_id is not None else query
+            batch = await self.products.find(q, {**SOURCE_FIELDS, "_id": 1}) \
+                .sort("_id", 1).limit(BATCH_SIZE).to_list(BATCH_SIZE)
+            if not batch:
+                return updated
+            last_id = batch[-1]["_id"]
+            cards = await self._encode([p for p in batch if p.get("id")])
+            await self._store(cards)
+            updated += len(cards)
+            if len(batch) < BATCH_SIZE:
+                return updated
+            await asyncio.sleep(BATCH_PAUSE_SEC)
+
+    async def refresh_category(self, category_id: str) -> int:
+        return await self._scan({"category_id": category_id})
+
+    async def backfill(self) -> dict:
+        """Cards for products that have none or an outdated one"""
+        updated = await self._scan({"card_v": {"$ne": CARD_VERSION}})
+        if updated:
+            logger.info(f"Product cards: {updated} built")
+        return {"updated": updated}
+
+    async def page(self, docs: List[dict]) -> List[str]:
+        """Cards for documents read with CARD_PROJECTION, in order"""
+        stale = [d["id"] for d in docs if d.get("card_v") != CARD_VERSION or not d.get("card_json")]
+        built = await self.refresh(stale) if stale else {}
+        return [built.get(d["id"]) or d["card_json"] for d in docs if d["id"] in built or d.get("card_json")]
+
+
+async def refresh_cards(db, product_ids: Iterable[str]):
+    """Called from product writes"""
+    try:
+        await ProductCards(db).refresh(product_ids)
+    except Exception as e:
+        logger.warning(f"Product card refresh failed: {e}")
+
+
+async def refresh_category_cards(db, category_id: str):
+    """Called when a category is renamed"""
+    try:
+        await ProductCards(db).refresh_category(category_id)
+    except Exception as e:
+        logger.warning(f"Product card refresh for category {category_id} failed: {e}")
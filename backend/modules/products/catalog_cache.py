@@ -0,0 +1,213 @@
+"""
+Catalog Dimensions - category tree, seller names and brands in process memory
+
+- one snapshot per process: categories with ancestor paths and product
+  counts, the category tree, seller display names and the brand list;
+  listings join names from it and subtree filters expand to the
+  descendant ids without extra queries
+- category writes call invalidate_catalog(): the local snapshot is dropped
+  at once and a version in catalog_state is bumped for the other workers,
+  which look at it at most every VERSION_CHECK_SEC
+- after REFRESH_SEC the snapshot is reloaded in the background while the
+  old one keeps serving (product counts, renamed sellers, new brands)
+- sellers missing from the snapshot are looked up in one query per
+  listing and kept until the next reload
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional
+
+from core.dates import as_datetime, utcnow
+
+logger = logging.getLogger(__name__)
+
+VERSION_CHECK_SEC = 5.0
+REFRESH_SEC = 300
+MAX_BRANDS = 500
+SELLER_ROLES = ["seller", "admin"]
+STATE_ID = "catalog"
+
+
+class CatalogSnapshot:
+    def __init__(self, categories: List[dict], counts: Dict[str, int], sellers: Dict[str, Optional[str]],
+                 brands: List[dict]):
+        self.by_id: Dict[str, dict] = {}
+        self.children: Dict[Optional[str], List[str]] = {}
+        for cat in categories:
+            if isinstance(cat.get("created_at"), str):
+                cat["created_at"] = as_datetime(cat["created_at"])
+            cat["product_count"] = counts.get(cat["id"], 0)
+            self.by_id[cat["id"]] = cat
+        for cat in categories:
+            parent = cat.get("parent_id")
+            # orphans (parent deleted) are shown as roots
+            self.children.setdefault(parent if parent in self.by_id else None, []).append(cat["id"])
+        for cat in categories:
+            cat["path"] = self._path(cat["id"])
+        self.categories = categories
+        self.sellers = sellers
+        self.brands = brands
+        self._trees: Dict[bool, List[dict]] = {}
+        self._descendants: Dict[str, List[str]] = {}
+
+    def _path(self, cat_id: str) -> List[str]:
+        """Ancestor ids from the root down to (and including) cat_id"""
+        path, seen = [], set()
+        while cat_id in self.by_id and cat_id not in seen:
+            seen.add(cat_id)
+            path.append(cat_id)
+            cat_id = self.by_id[cat_id].get("parent_id")
+        return path[::-1]
+
+    def tree(self, keep_empty: bool = False) -> List[dict]:
+        """Nested categories; keep_empty adds children=[] to leaves"""
+        if keep_empty not in self._trees:
+            def build(parent_id) -> List[dict]:
+                out = []
+                for cid in self.children.get(parent_id, []):
+                    node = dict(self.by_id[cid])
+                    kids = build(cid)
+                    if kids or keep_empty:
+                        node["children"] = kids
+                    out.append(node)
+                return out
+            self._trees[keep_empty] = build(None)
+        return self._trees[keep_empty]
+
+    def descendants(self, cat_id: str) -> List[str]:
+        """cat_id and every category below it"""
+        if cat_id not in self._descendants:
+            out, seen, stack = [], set(), [cat_id]
+            while stack:
+                cid = stack.pop()
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                out.append(cid)
+                stack.extend(self.children.get(cid, []))
+            self._descendants[cat_id] = out
+        return self._descendants[cat_id]
+
+
+class CatalogCache:
+    def __init__(self, db):
+        self.db = db
+        self.state = db["catalog_state"]
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self.version: Optional[int] = None
+        self.loaded_ts = 0.0
+        self.checked_ts = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._refresh: Optional[asyncio.Task] = None
+
+    async def _stored_version(self) -> int:
+        doc = await self.state.find_one({"_id": STATE_ID}, {"version": 1})
+        return int((doc or {}).get("version") or 0)
+
+    async def invalidate(self):
+        """Drop the snapshot here and in every other worker"""
+        self.snapshot = None
+        self._generation += 1
+        await self.state.update_one(
+            {"_id": STATE_ID},
+            {"$inc": {"version": 1}, "$set": {"updated_at": utcnow()}},
+            upsert=True,
+        )
+
+    async def _load(self, version: int):
+        generation = self._generation
+        started = time.monotonic()
+        categories, counts, sellers, brands = await asyncio.gather(
+            self.db.categories.find({}, {"_id": 0}).to_list(None),
+            self.db.products.aggregate([
+                {"$group": {"_id": "$category_id", "n": {"$sum": 1}}},
+            ]).to_list(None),
+            self.db.users.find(
+                {"role": {"$in": SELLER_ROLES}}, {"_id": 0, "id": 1, "full_name": 1}
+            ).to_list(None),
+            self.db.products.aggregate([
+                {"$match": {"brand": {"$nin": [None, ""]}}},
+                {"$group": {"_id": "$brand", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}},
+                {"$limit": MAX_BRANDS},
+            ]).to_list(MAX_BRANDS),
+        )
+        self.snapshot = CatalogSnapshot(
+            categories,
+            {c["_id"]: c["n"] for c in counts if c["_id"]},
+            {u["id"]: u.get("full_name") for u in sellers},
+            [{"name": b["_id"], "count": b["count"]} for b in brands],
+        )
+        # an invalidation during the load leaves the version unknown -> reload on next check
+        self.version = version if generation == self._generation else None
+        self.loaded_ts = time.monotonic()
+        logger.info(f"Catalog cache loaded: {len(categories)} categories, {len(sellers)} sellers, "
+                    f"{len(brands)} brands in {self.loaded_ts - started:.3f}s")
+
+    async def _reload(self):
+        try:
+            async with self._lock:
+                await self._load(await self._stored_version())
+        except Exception as e:
+            logger.error(f"Catalog cache refresh failed: {e}")
+
+    async def get(self) -> CatalogSnapshot:
+        """Current snapshot; loads it when missing or another worker invalidated it"""
+        now = time.monotonic()
+        if self.snapshot is None or now - self.checked_ts >= VERSION_CHECK_SEC:
+            async with self._lock:
+                if self.snapshot is None or time.monotonic() - self.checked_ts >= VERSION_CHECK_SEC:
+                    version = await self._stored_version()
+                    self.checked_ts = time.monotonic()
+                    if self.snapshot is None or version != self.version:
+                        await self._load(version)
+        if time.monotonic() - self.loaded_ts >= REFRESH_SEC and (self._refresh is None or self._refresh.done()):
+            self._refresh = asyncio.create_task(self._reload())
+        return self.snapshot
+
+    # ---------- joins ----------
+
+    async def seller_names(self, seller_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+        snap = await self.get()
+        ids = {s for s in seller_ids if s}
+        missing = [s for s in ids if s not in snap.sellers]
+        if missing:
+            users = await self.db.users.find(
+                {"id": {"$in": missing}}, {"_id": 0, "id": 1, "full_name": 1}
+            ).to_list(len(missing))
+            found = {u["id"]: u.get("full_name") for u in users}
+            for s in missing:
+                snap.sellers[s] = found.get(s)
+        return {s: snap.sellers.get(s) for s in ids}
+
+    async def enrich(self, products: List[dict]) -> List[dict]:
+        """Set category_name / seller_name on products in place"""
+        snap = await self.get()
+        sellers = await self.seller_names(p.get("seller_id") for p in products)
+        for p in products:
+            if p.get("category_id"):
+                cat = snap.by_id.get(p["category_id"])
+                p["category_name"] = cat["name"] if cat else None
+            if p.get("seller_id"):
+                p["seller_name"] = sellers.get(p["seller_id"])
+        return products
+
+
+_cache: Optional[CatalogCache] = None
+
+
+def get_catalog_cache(db) -> CatalogCache:
+    global _cache
+    if _cache is None:
+        _cache = CatalogCache(db)
+    return _cache
+
+
+async def invalidate_catalog(db):
+    """Called from category writes"""
+    try:
+        await get_catalog_cache(db).invalidate()
+    except Exception as e:
+        logger.warning(f"Catalog cache invalidation failed: {e}")
@@ -0,0 +1,268 @@
+"""
+Item-to-item recommendations - co-purchase / co-view neighbours built offline
+
+- rebuild() reads order baskets (ORDER_DAYS, canceled orders excluded) and
+  product_view sessions (VIEW_DAYS) and counts how often two products occur
+  together; a purchase counts PURCHASE_WEIGHT, a co-view VIEW_WEIGHT
+- similarity is cosine over those weighted counts, damped by
+  co / (co + SHRINK) so a single shared basket does not rank first
+- the top TOP_K neighbours of every published product, with popular
+  products overall and per category, are written to product_neighbors /
+  recommendation_state; the job runs every few hours
+- lookups are served from a process-local copy of that collection, reloaded
+  when the build version changes, so similar() does no I/O; products
+  without enough neighbours are filled from their category's popular
+  products, then from the global ones
+"""
+import asyncio
+import heapq
+import logging
+import math
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReplaceOne
+
+from core.dates import date_range, utcnow
+
+logger = logging.getLogger(__name__)
+
+ORDER_DAYS = 365
+VIEW_DAYS = 90
+TOP_K = 20
+POPULAR_SIZE = 50
+MAX_BASKET = 30
+PURCHASE_WEIGHT = 3.0
+VIEW_WEIGHT = 1.0
+SHRINK = 2.0
+WRITE_BATCH = 1000
+VERSION_CHECK_SEC = 30.0
+STATE_ID = "item_to_item"
+_PAIR = 1 << 32
+
+
+class CoOccurrence:
+    """Sparse symmetric co-occurrence counts over product ids"""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.weight: List[float] = []
+        # i * _PAIR + j (i < j) -> weighted count
+        self.pairs: Dict[int, float] = defaultdict(float)
+
+    def _code(self, product_id: str) -> int:
+        code = self.index.get(product_id)
+        if code is None:
+            code = self.index[product_id] = len(self.ids)
+            self.ids.append(product_id)
+            self.weight.append(0.0)
+        return code
+
+    def add(self, basket: Iterable[str], weight: float):
+        codes = sorted(self._code(p) for p in list(dict.fromkeys(p for p in basket if p))[:MAX_BASKET])
+        for c in codes:
+            self.weight[c] += weight
+        pairs = self.pairs
+        for n, i in enumerate(codes):
+            base = i * _PAIR
+            for j in codes[n + 1:]:
+                pairs[base + j] += weight
+
+    def neighbors(self, top_k: int = TOP_K, allowed: Optional[set] = None) -> Dict[str, List[Tuple[str, float]]]:
+        """product id -> [(neighbour id, score)] best first"""
+        keep = None if allowed is None else [p in allowed for p in self.ids]
+        cands: Dict[int, List[Tuple[float, int]]] = defaultdict(list)
+        w = self.weight
+        for key, co in self.pairs.items():
+            i, j = divmod(key, _PAIR)
+            score = co / math.sqrt(w[i] * w[j]) * (co / (co + SHRINK))
+            if keep is None or keep[j]:
+                cands[i].append((score, j))
+            if keep is None or keep[i]:
+                cands[j].append((score, i))
+        out = {}
+        for i, lst in cands.items():
+            if keep is not None and not keep[i]:
+                continue
+            best = heapq.nlargest(top_k, lst)
+            out[self.ids[i]] = [(self.ids[j], round(s, 6)) for s, j in best]
+        return out
+
+    def popular(self, allowed: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """(product id, weight) for every product seen, most popular first"""
+        codes = range(len(self.ids)) if allowed is None else \
+            [self.index[p] for p in allowed if p in self.index]
+        return sorted(((self.ids[c], self.weight[c]) for c in codes), key=lambda x: -x[1])
+
+
+async def build_counts(db, until: Optional[datetime] = None, order_days: int = ORDER_DAYS,
+                       view_days: int = VIEW_DAYS) -> CoOccurrence:
+    """Count co-purchases and co-views in the windows ending at `until`"""
+    until = until or utcnow()
+    co = CoOccurrence()
+    orders = views = 0
+    q = {"status_c": {"$ne": "CANCELED"},
+         **date_range("created_at", gte=until - timedelta(days=order_days), lt=until)}
+    async for order in db.orders.find(q, {"_id": 0, "items.product_id": 1}).batch_size(2000):
+        co.add((i.get("product_id") for i in order.get("items") or []), PURCHASE_WEIGHT)
+        orders += 1
+    pipeline = [
+        {"$match": {"event": "product_view", "product_id": {"$ne": None},
+                    "ts": {"$gte": until - timedelta(days=view_days), "$lt": until}}},
+        {"$group": {"_id": "$sid", "products": {"$addToSet": "$product_id"}}},
+    ]
+    async for session in db.events.aggregate(pipeline, allowDiskUse=True):
+        co.add(session["products"], VIEW_WEIGHT)
+        views += 1
+    logger.info(f"Recommendations: {orders} orders, {views} view sessions, "
+                f"{len(co.ids)} products, {len(co.pairs)} pairs")
+    return co
+
+
+class Recommender:
+    def __init__(self, db):
+        self.db = db
+        self.neighbors = db["product_neighbors"]
+        self.state = db["recommendation_state"]
+        # process-local copy: product id -> (category id, neighbour ids)
+        self.table: Dict[str, Tuple[Optional[str], List[str]]] = {}
+        self.popular: List[str] = []
+        self.popular_by_category: Dict[str, List[str]] = {}
+        self.version: Optional[int] = None
+        self.checked_ts = 0.0
+        self._lock = asyncio.Lock()
+        self._reload: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        await self.neighbors.create_index("product_id", unique=True)
+        await self.neighbors.create_index("version")
+
+    # ---------- offline build ----------
+
+    async def rebuild(self) -> dict:
+        started = time.monotonic()
+        co = await build_counts(self.db)
+        products = {p["id"]: p.get("category_id") for p in await self.db.products.find(
+            {"status": "published"}, {"_id": 0, "id": 1, "category_id": 1}
+        ).to_list(None)}
+        neighbors = co.neighbors(TOP_K, allowed=set(products))
+        ranked = co.popular(products)
+        popular = [p for p, _ in ranked[:POPULAR_SIZE]]
+        by_category: Dict[str, List[str]] = defaultdict(list)
+        for p, _ in ranked:
+            cat = products[p]
+            if cat and len(by_category[cat]) < POPULAR_SIZE:
+                by_category[cat].append(p)
+
+        state = await self.state.find_one({"_id": STATE_ID}, {"version": 1})
+        version = int((state or {}).get("version") or 0) + 1
+        ops, written = [], 0
+        for pid, cat in products.items():
+            near = neighbors.get(pid, [])
+            ops.append(ReplaceOne({"product_id": pid}, {
+                "product_id": pid,
+                "category_id": cat,
+                "neighbors": [n for n, _ in near],
+                "scores": [s for _, s in near],
+                "version": version,
+            }, upsert=True))
+            if len(ops) >= WRITE_BATCH:
+                await self.neighbors.bulk_write(ops, ordered=False)
+                written, ops = written + len(ops), []
+        if ops:
+            await self.neighbors.bulk_write(ops, ordered=False)
+            written += len(ops)
+        removed = await self.neighbors.delete_many({"version": {"$ne": version}})
+
+        stats = {
+            "products": written,
+            "with_neighbors": len(neighbors),
+            "pairs": len(co.pairs),
+            "removed": removed.deleted_count,
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+        }
+        await self.state.update_one({"_id": STATE_ID}, {"$set": {
+            "version": version,
+            "popular": popular,
+            "popular_by_category": dict(by_category),
+            "built_at": utcnow(),
+            "stats": stats,
+        }}, upsert=True)
+        logger.info(f"Recommendations built: {stats}")
+        return {"version": version, **stats}
+
+    # ---------- lookups ----------
+
+    async def _load(self):
+        state = await self.state.find_one({"_id": STATE_ID}) or {}
+        table = {}
+        async for d in self.neighbors.find({}, {"_id": 0, "product_id": 1, "category_id": 1, "neighbors": 1}) \
+                .batch_size(5000):
+            table[d["product_id"]] = (d.get("category_id"), d.get("neighbors") or [])
+        self.table = table
+        self.popular = state.get("popular") or []
+        self.popular_by_category = state.get("popular_by_category") or {}
+        self.version = state.get("version") or 0
+        logger.info(f"Recommendations loaded: version {self.version}, {len(table)} products")
+
+    async def _reload_in_background(self):
+        try:
+            async with self._lock:
+                await self._load()
+        except Exception as e:
+            logger.error(f"Recommendations reload failed: {e}")
+
+    async def refresh(self):
+        """Load on first use; pick up new builds at most every VERSION_CHECK_SEC"""
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_ts < VERSION_CHECK_SEC:
+            return
+        if self.version is None:
+            async with self._lock:
+                if self.version is None:
+                    await self._load()
+                    self.checked_ts = time.monotonic()
+            return
+        self.checked_ts = now
+        state = await self.state.find_one({"_id": STATE_ID}, {"version": 1})
+        if state and state.get("version") != self.version and (self._reload is None or self._reload.done()):
+            # the old table keeps serving while the new one loads
+            self._reload = asyncio.create_task(self._reload_in_background())
+
+    def similar(self, product_id: Optional[str], limit: int = 10,
+                exclude: Iterable[str] = ()) -> Tuple[List[str], str]:
+        """Neighbour ids, topped up with popular products; returns (ids, source)"""
+        seen = set(exclude)
+        if product_id:
+            seen.add(product_id)
+        out: List[str] = []
+
+        def take(ids: Iterable[str]):
+            for p in ids:
+                if len(out) >= limit:
+                    return
+                if p not in seen:
+                    seen.add(p)
+                    out.append(p)
+
+        category, near = self.table.get(product_id, (None, [])) if product_id else (None, [])
+        take(near)
+        source = "similar" if out else "popular"
+        if len(out) < limit and category:
+            take(self.popular_by_category.get(category, []))
+        if len(out) < limit:
+            take(self.popular)
+        return out, source
+
+
+_recommender: Optional[Recommender] = None
+
+
+def get_recommender(db) -> Recommender:
+    global _recommender
+    if _recommender is None:
+        _recommender = Recommender(db)
+    return _recommender
@@ -9,6 +9,9 @@ import re
 
 from core.db import db
 from core.security import get_current_user, get_current_seller, get_current_admin
+from modules.seo.sitemap_service import invalidate_sitemap
+from .catalog_cache import get_catalog_cache, invalidate_catalog
+from .cards import CARD_PROJECTION, CardsResponse, ProductCards, refresh_cards, refresh_category_cards
 from .models import (
     Category, CategoryCreate, CategoryUpdate,
     Product, ProductCreate, ProductUpdate, ProductListResponse
@@ -22,27 +25,9 @@ categories_router = APIRouter(prefix="/categories", tags=["Categories"])
 
 @categories_router.get("", response_model=List[Category])
 async def get_categories(tree: bool = False):
-    """Get all categories, optionally as tree structure"""
-    categories = await db.categories.find({}, {"_id": 0}).to_list(1000)
-    
-    # Add product counts
-    for cat in categories:
-        cat["product_count"] = await db.products.count_documents({"category_id": cat["id"]})
-    
-    if not tree:
-        return categories
-    
-    # Build tree structure
-    cat_map = {c["id"]: {**c, "children": []} for c in categories}
-    roots = []
-    
-    for cat in categories:
-        if cat.get("parent_id") and cat["parent_id"] in cat_map:
-            cat_map[cat["parent_id"]]["children"].append(cat_map[cat["id"]])
-        else:
-            roots.append(cat_map[cat["id"]])
-    
-    return roots
+    """Get all categories, optionally as tree structure (catalog cache)"""
+    catalog = await get_catalog_cache(db).get()
+    return catalog.tree(keep_empty=True) if tree else catalog.categories
 
 
 @categories_router.post("", response_model=Category)
@@ -59,6 +44,8 @@ async def create_category(
     }
     
     await db.categories.insert_one(cat_doc)
+    await invalidate_sitemap(db)
+    await invalidate_catalog(db)
     return Category(**cat_doc, product_count=0)
 
 
@@ -81,6 +68,10 @@ async def update_category(
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await invalidate_sitemap(db)
+    await invalidate_catalog(db)
+    if "name" in update_dict:
+        await refresh_category_cards(db, category_id)
     
     category = await db.categories.find_one({"id": category_id}, {"_id": 0})
     category["product_count"] = await db.products.count_documents({"category_id": category_id})
@@ -97,6 +88,8 @@ async def delete_category(
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await invalidate_sitemap(db)
+    await invalidate_catalog(db)
     
     return {"message": "Category deleted"}
 
@@ -112,15 +105,20 @@ async def get_products(
     max_price: Optional[float] = None,
     in_stock: Optional[bool] = None,
     is_bestseller: Optional[bool] = None,
+    include_subcategories: bool = False,
     sort_by: str = "created_at",
     sort_order: str = "desc",
+    view: str = Query("full", pattern="^(full|card)$"),
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100)
 ):
-    """Get products with filters and pagination"""
+    """Get products with filters and pagination (view=card: compact cards)"""
     query = {}
     
-    if category_id:
+    if category_id and include_subcategories:
+        catalog = await get_catalog_cache(db).get()
+        query["category_id"] = {"$in": catalog.descendants(category_id)}
+    elif category_id:
         query["category_id"] = category_id
     if seller_id:
         query["seller_id"] = seller_id
@@ -142,20 +140,19 @@ async def get_products(
     skip = (page - 1) * limit
     
     total = await db.products.count_documents(query)
-    products = await db.products.find(query, {"_id": 0})\
+    products = await db.products.find(query, CARD_PROJECTION if view == "card" else {"_id": 0})\
         .sort(sort_by, sort_dir)\
         .skip(skip)\
         .limit(limit)\
         .to_list(limit)
     
-    # Enrich with category and seller names
-    for p in products:
-        if p.get("category_id"):
-            cat = await db.categories.find_one({"id": p["category_id"]}, {"name": 1})
-            p["category_name"] = cat["name"] if cat else None
-        if p.get("seller_id"):
-            seller = await db.users.find_one({"id": p["seller_id"]}, {"full_name": 1})
-            p["seller_name"] = seller["full_name"] if seller else None
+    if view == "card":
+        return CardsResponse(await ProductCards(db).page(products), key="items", extra={
+            "total": total, "page": page, "pages": (total + limit - 1) // limit,
+        })
+    
+    # Category and seller names from the catalog cache
+    await get_catalog_cache(db).enrich(products)
     
     return ProductListResponse(
         items=products,
@@ -191,12 +188,7 @@ async def get_product(product_id: str):
     await db.products.update_one({"id": product_id}, {"$inc": {"views": 1}})
     
     # Add category and seller names
-    if product.get("category_id"):
-        cat = await db.categories.find_one({"id": product["category_id"]}, {"name": 1})
-        product["category_name"] = cat["name"] if cat else None
-    if product.get("seller_id"):
-        seller = await db.users.find_one({"id": product["seller_id"]}, {"full_name": 1})
-        product["seller_name"] = seller["full_name"] if seller else None
+    await get_catalog_cache(db).enrich([product])
     
     return Product(**product)
 
@@ -223,6 +215,8 @@ async def create_product(
     }
     
     await db.products.insert_one(product_doc)
+    await invalidate_sitemap(db)
+    await refresh_cards(db, [product_id])
     return Product(**product_doc)
 
 
@@ -246,6 +240,8 @@ async def update_product(
     update_dict["updated_at"] = datetime.now(timezone.utc)
     
     await db.products.update_one({"id": product_id}, {"$set": update_dict})
+    await invalidate_sitemap(db)
+    await refresh_cards(db, [product_id])
     
     updated = await db.products.find_one({"id": product_id}, {"_id": 0})
     return Product(**updated)
@@ -266,4 +262,5 @@ async def delete_product(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     await db.products.delete_one({"id": product_id})
+    await invalidate_sitemap(db)
     return {"message": "Product deleted"}
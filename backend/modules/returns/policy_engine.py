@@ -3,14 +3,31 @@ O20.5: Return Policy Engine - Main Engine
 Rule-based policy decisions with window metrics (30/60 days)
 """
 from datetime import datetime, timezone, timedelta
-from typing import List
+from typing import Dict, List, Optional, Tuple
 import logging
+import time
 
 from modules.returns.policy_types import PolicyDecision, PolicyRunResult
 from modules.returns.policy_repo import PolicyRepo
+from core.dates import date_range
 
 logger = logging.getLogger(__name__)
 
+RETURN_STAGES = ["RETURNING", "RETURNED"]
+COD_REFUSAL_REASONS = ["REFUSED", "NOT_PICKED_UP", "STORAGE_EXPIRED"]
+
+# Flags each action sets (dry-run diff shows current vs these)
+ACTION_PATCHES = {
+    "BLOCK_COD_CUSTOMER": {"cod_blocked": True},
+    "UNBLOCK_COD_CUSTOMER": {"cod_blocked": False},
+    "REQUIRE_PREPAID_CUSTOMER": {"require_prepaid": True},
+    "REQUIRE_PREPAID_CITY": {"require_prepaid": True},
+}
+
+
+def _ms(started: float) -> float:
+    return round((time.monotonic() - started) * 1000, 1)
+
 
 def since_iso(days: int) -> str:
     return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
@@ -38,126 +55,192 @@ class ReturnPolicyEngine:
         self.repo = PolicyRepo(db)
         self._scanned_cities = 0
 
-    async def run_once(self, limit_customers: int = 500) -> dict:
-        """Run policy engine once"""
+    async def run_once(self, limit_customers: Optional[int] = None, dry_run: bool = False) -> dict:
+        """
+        Run policy engine once.
+        Window metrics for every customer come from one grouped aggregation;
+        rules run in memory and decisions are written in bulk. With
+        dry_run=True nothing is written and the result carries a diff of
+        what would change.
+        """
+        started = time.monotonic()
+        timings = {}
         await self.repo.ensure_indexes()
-        
-        decisions: List[PolicyDecision] = []
-        
+
         # 1) Customer policies
-        customers = await self.repo.list_customers_with_orders(limit=limit_customers)
-        scanned_customers = len(customers)
-        
-        for c in customers:
-            phone = c.get("phone")
-            if not phone:
-                continue
-            
-            m = await self._customer_window_metrics(phone)
-            cod_ref_30 = m["cod_refusals_30d"]
-            ret_60 = m["returns_60d"]
-            
-            # Skip if no issues
-            if cod_ref_30 == 0 and ret_60 == 0:
-                continue
-            
-            # Current flags
-            policy = c.get("policy") or {}
-            cod_blocked = bool(policy.get("cod_blocked"))
-            require_prepaid = bool(policy.get("require_prepaid"))
-            
-            # Safety: skip VIP customers
-            segment = c.get("segment", "")
-            if segment == "VIP":
-                continue
-            
-            # Rule 1: COD refusals >= 2 → BLOCK_COD
-            if cod_ref_30 >= 2 and not cod_blocked:
-                decisions.append(self._decision_block_cod(
-                    phone, cod_ref_30, ret_60, "COD_REFUSALS_30D>=2"
-                ))
-            
-            # Rule 2: Returns 60d >= 2 → REQUIRE_PREPAID
-            if ret_60 >= 2 and not require_prepaid:
-                decisions.append(self._decision_require_prepaid_customer(
-                    phone, cod_ref_30, ret_60
-                ))
-            
-            # Rule 3: Returns 60d >= 3 → BLOCK_COD
-            if ret_60 >= 3 and not cod_blocked:
-                decisions.append(self._decision_block_cod(
-                    phone, cod_ref_30, ret_60, "RETURNS_60D>=3"
-                ))
-        
+        t = time.monotonic()
+        metrics = await self._window_metrics_all(limit=limit_customers)
+        timings["metrics_ms"] = _ms(t)
+
+        t = time.monotonic()
+        customers = await self.repo.get_customers_by_phone(list(metrics))
+        decisions: List[PolicyDecision] = []
+        for phone, m in metrics.items():
+            c = customers.get(phone) or {"phone": phone}
+            decisions.extend(self._customer_decisions(c, m["cod_refusals_30d"], m["returns_60d"]))
+        timings["customers_ms"] = _ms(t)
+
         # 2) City policies
+        t = time.monotonic()
         city_decisions = await self._city_policy_decisions()
         decisions.extend(city_decisions)
-        
-        # 3) Apply or queue for approval
+        timings["cities_ms"] = _ms(t)
+
         proposed = len(decisions)
-        applied = 0
-        approvals = 0
-        
-        for d in decisions:
-            # Idempotency check
-            if not await self.repo.mark_event_once(d.dedupe_key, d.model_dump()):
-                continue
-            
-            if d.requires_approval:
-                ok = await self.repo.enqueue_approval(d.model_dump())
-                if ok:
-                    approvals += 1
-                    await self._alert_approval_required(d)
-            else:
-                ok = await self.apply_decision(d)
-                if ok:
-                    applied += 1
-        
+        if dry_run:
+            t = time.monotonic()
+            diff = await self._diff(decisions, customers)
+            timings["diff_ms"] = _ms(t)
+            timings["total_ms"] = _ms(started)
+            result = PolicyRunResult(
+                ok=True,
+                dry_run=True,
+                scanned_customers=len(metrics),
+                scanned_cities=self._scanned_cities,
+                proposed=proposed,
+                diff=diff,
+                timings_ms=timings,
+            )
+            return result.model_dump()
+
+        # 3) Apply or queue for approval (idempotent per dedupe key)
+        t = time.monotonic()
+        fresh = await self.repo.mark_events_once([(d.dedupe_key, d.model_dump()) for d in decisions])
+        decisions = [d for d in decisions if d.dedupe_key in fresh]
+
+        to_approve = [d for d in decisions if d.requires_approval]
+        enqueued = await self.repo.enqueue_approvals([d.model_dump() for d in to_approve])
+        approved_now = [d for d in to_approve if d.dedupe_key in enqueued]
+        if approved_now:
+            await self.repo.enqueue_admin_alerts([self._approval_alert(d) for d in approved_now])
+
+        applied = await self.apply_decisions([d for d in decisions if not d.requires_approval])
+        timings["apply_ms"] = _ms(t)
+        timings["total_ms"] = _ms(started)
+
         result = PolicyRunResult(
             ok=True,
-            scanned_customers=scanned_customers,
+            scanned_customers=len(metrics),
             scanned_cities=self._scanned_cities,
             proposed=proposed,
             applied=applied,
-            approvals_enqueued=approvals
+            approvals_enqueued=len(approved_now),
+            timings_ms=timings,
         )
-        
+
         logger.info(f"Policy engine run: {result.model_dump()}")
         return result.model_dump()
 
+    def _customer_decisions(self, c: dict, cod_ref_30: int, ret_60: int) -> List[PolicyDecision]:
+        """Customer rules for one customer's window metrics"""
+        phone = c.get("phone")
+        # Skip if no issues
+        if not phone or (cod_ref_30 == 0 and ret_60 == 0):
+            return []
+
+        # Safety: skip VIP customers
+        if c.get("segment", "") == "VIP":
+            return []
+
+        # Current flags
+        policy = c.get("policy") or {}
+        cod_blocked = bool(policy.get("cod_blocked"))
+        require_prepaid = bool(policy.get("require_prepaid"))
+
+        out = []
+        # Rule 1: COD refusals >= 2 → BLOCK_COD
+        if cod_ref_30 >= 2 and not cod_blocked:
+            out.append(self._decision_block_cod(phone, cod_ref_30, ret_60, "COD_REFUSALS_30D>=2"))
+
+        # Rule 2: Returns 60d >= 2 → REQUIRE_PREPAID
+        if ret_60 >= 2 and not require_prepaid:
+            out.append(self._decision_require_prepaid_customer(phone, cod_ref_30, ret_60))
+
+        # Rule 3: Returns 60d >= 3 → BLOCK_COD
+        if ret_60 >= 3 and not cod_blocked:
+            out.append(self._decision_block_cod(phone, cod_ref_30, ret_60, "RETURNS_60D>=3"))
+        return out
+
+    async def _diff(self, decisions: List[PolicyDecision], customers: Dict[str, dict]) -> List[dict]:
+        """What a real run would change: current vs proposed flags, and whether the decision is new"""
+        seen = await self.repo.existing_event_keys([d.dedupe_key for d in decisions])
+        cities = {p["city"]: p for p in await self.repo.get_city_policies()}
+        out = []
+        for d in decisions:
+            if d.target_type == "CUSTOMER":
+                current = (customers.get(d.target_id) or {}).get("policy") or {}
+            else:
+                current = cities.get(d.target_id) or {}
+            patch = ACTION_PATCHES.get(d.action, {})
+            out.append({
+                "action": d.action,
+                "target_type": d.target_type,
+                "target_id": d.target_id,
+                "reason": d.reason,
+                "requires_approval": d.requires_approval,
+                "new": d.dedupe_key not in seen,
+                "current": {k: current.get(k) for k in patch},
+                "proposed": patch,
+                "meta": d.meta,
+            })
+        return out
+
+    async def apply_decisions(self, decisions: List[PolicyDecision], updated_by: str = "policy_engine") -> int:
+        """Apply many decisions with one bulk write per collection"""
+        if not decisions:
+            return 0
+        customer_patches, city_patches = [], []
+        for d in decisions:
+            patch = self._patch(d)
+            if patch is None:
+                continue
+            (customer_patches if d.target_type == "CUSTOMER" else city_patches).append((d.target_id, patch))
+        if customer_patches:
+            await self.repo.update_customer_policies(customer_patches, updated_by)
+        if city_patches:
+            await self.repo.update_city_policies(city_patches, updated_by)
+        return len(decisions)
+
     async def apply_decision(self, d: PolicyDecision, updated_by: str = "policy_engine") -> bool:
         """Apply a policy decision"""
+        patch = self._patch(d)
+        if patch is None:
+            return True
+        if d.target_type == "CITY":
+            await self.repo.update_city_policy(d.target_id, patch, updated_by)
+        else:
+            await self.repo.update_customer_policy(d.target_id, patch, updated_by)
+        return True
+
+    def _patch(self, d: PolicyDecision) -> Optional[dict]:
+        """$set patch a decision writes to its customer / city policy"""
         if d.action == "BLOCK_COD_CUSTOMER":
-            await self.repo.update_customer_policy(d.target_id, {
+            return {
                 "policy.cod_blocked": True,
                 "policy.block_reason": d.reason,
                 "segment": "BLOCK_COD"
-            }, updated_by)
-            return True
-        
+            }
+
         if d.action == "UNBLOCK_COD_CUSTOMER":
-            await self.repo.update_customer_policy(d.target_id, {
+            return {
                 "policy.cod_blocked": False,
                 "policy.block_reason": None
-            }, updated_by)
-            return True
-        
+            }
+
         if d.action == "REQUIRE_PREPAID_CUSTOMER":
-            await self.repo.update_customer_policy(d.target_id, {
+            return {
                 "policy.require_prepaid": True,
                 "policy.prepaid_reason": d.reason
-            }, updated_by)
-            return True
-        
+            }
+
         if d.action == "REQUIRE_PREPAID_CITY":
-            await self.repo.update_city_policy(d.target_id, {
+            return {
                 "require_prepaid": True,
                 "reason": d.reason,
                 "meta": d.meta
-            }, updated_by)
-            return True
-        
-        return True
+            }
+
+        return None
 
     # --- Decision constructors ---
     
@@ -187,6 +270,56 @@ class ReturnPolicyEngine:
 
     # --- Metrics ---
     
+    async def _window_metrics_all(self, limit: Optional[int] = None) -> Dict[str, dict]:
+        """
+        COD refusals (30d) and returns (60d) for every customer, in one
+        grouped aggregation. An order counts for each distinct phone it
+        carries (recipient, shipping, buyer). Only customers with at least
+        one refusal or return are returned.
+        """
+        # returns.* is not part of the datetime migration: return_repo stores ISO strings
+        since_30 = since_iso(30)
+        since_60 = since_iso(60)
+
+        pipeline = [
+            {"$match": {
+                "returns.updated_at": {"$gte": since_60},
+                "$or": [
+                    {"returns.stage": {"$in": RETURN_STAGES}},
+                    {"returns.reason": {"$in": COD_REFUSAL_REASONS}},
+                ],
+            }},
+            {"$project": {
+                "_id": 0,
+                "phones": {"$setUnion": [{"$filter": {
+                    "input": ["$delivery.recipient.phone", "$shipping.phone", "$buyer_phone"],
+                    "cond": {"$and": [{"$ne": ["$$this", None]}, {"$ne": ["$$this", ""]}]},
+                }}]},
+                "is_return": {"$in": [{"$ifNull": ["$returns.stage", None]}, RETURN_STAGES]},
+                "is_refusal": {"$and": [
+                    {"$in": [{"$ifNull": ["$returns.reason", None]}, COD_REFUSAL_REASONS]},
+                    {"$gte": ["$returns.updated_at", since_30]},
+                ]},
+            }},
+            {"$unwind": "$phones"},
+            {"$group": {
+                "_id": "$phones",
+                "returns_60d": {"$sum": {"$cond": ["$is_return", 1, 0]}},
+                "cod_refusals_30d": {"$sum": {"$cond": ["$is_refusal", 1, 0]}},
+            }},
+            {"$match": {"$or": [{"returns_60d": {"$gt": 0}}, {"cod_refusals_30d": {"$gt": 0}}]}},
+        ]
+        if limit:
+            pipeline.append({"$limit": int(limit)})
+
+        out = {}
+        async for r in self.db["orders"].aggregate(pipeline, allowDiskUse=True):
+            out[r["_id"]] = {
+                "returns_60d": int(r["returns_60d"]),
+                "cod_refusals_30d": int(r["cod_refusals_30d"]),
+            }
+        return out
+
     async def _customer_window_metrics(self, phone: str) -> dict:
         """Calculate customer metrics for policy windows"""
         since_30 = since_iso(30)
@@ -200,7 +333,7 @@ class ReturnPolicyEngine:
                 {"buyer_phone": phone}
             ],
             "returns.updated_at": {"$gte": since_60},
-            "returns.stage": {"$in": ["RETURNING", "RETURNED"]}
+            "returns.stage": {"$in": RETURN_STAGES}
         })
         
         # COD refusals in 30 days
@@ -211,7 +344,7 @@ class ReturnPolicyEngine:
                 {"buyer_phone": phone}
             ],
             "returns.updated_at": {"$gte": since_30},
-            "returns.reason": {"$in": ["REFUSED", "NOT_PICKED_UP", "STORAGE_EXPIRED"]}
+            "returns.reason": {"$in": COD_REFUSAL_REASONS}
         })
         
         return {
@@ -225,7 +358,7 @@ class ReturnPolicyEngine:
         
         # Total orders per city (30d)
         pipeline_total = [
-            {"$match": {"created_at": {"$gte": since_30}}},
+            {"$match": date_range("created_at", gte=since_30)},
             {"$group": {
                 "_id": {"$ifNull": ["$delivery.recipient.city", "$shipping.city"]},
                 "orders": {"$sum": 1}
@@ -289,8 +422,8 @@ class ReturnPolicyEngine:
 
     # --- Alerts ---
     
-    async def _alert_approval_required(self, d: PolicyDecision):
-        """Send Telegram alert for approval"""
+    def _approval_alert(self, d: PolicyDecision) -> Tuple[str, str, dict]:
+        """(dedupe_key, text, reply_markup) of the approval alert for a decision"""
         if d.target_type == "CUSTOMER":
             text = (
                 f"🛡️ <b>Policy: потрібне підтвердження</b>\n\n"
@@ -321,8 +454,4 @@ class ReturnPolicyEngine:
             ]
         }
         
-        await self.repo.enqueue_admin_alert(
-            f"policy_alert:{d.dedupe_key}",
-            text,
-            reply_markup
-        )
+        return f"policy_alert:{d.dedupe_key}", text, reply_markup
@@ -3,16 +3,27 @@ O20.5: Return Policy Engine - Repository
 Handles policy events, approval queue, customer/city policy updates
 """
 from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Set, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+CHUNK = 1000
+
+
 def now_iso():
     return datetime.now(timezone.utc).isoformat()
 
 
+def _chunks(items: list, size: int = CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
 class PolicyRepo:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
@@ -40,6 +51,19 @@ class PolicyRepo:
             pass
         await self.city_policies.create_index("city", unique=True)
         await self.policy_audit.create_index("created_at")
+        await self.orders.create_index("returns.updated_at", sparse=True)
+
+    async def _insert_once(self, col, docs: List[dict]) -> Set[str]:
+        """insert_many ignoring duplicate dedupe keys; returns the keys actually inserted"""
+        inserted = set()
+        for chunk in _chunks(docs):
+            failed = set()
+            try:
+                await col.insert_many(chunk, ordered=False)
+            except BulkWriteError as e:
+                failed = {err["index"] for err in e.details.get("writeErrors", [])}
+            inserted.update(d["dedupe_key"] for i, d in enumerate(chunk) if i not in failed)
+        return inserted
 
     async def mark_event_once(self, dedupe_key: str, payload: dict) -> bool:
         """Idempotent event marker"""
@@ -53,6 +77,24 @@ class PolicyRepo:
         except Exception:
             return False
 
+    async def mark_events_once(self, events: List[Tuple[str, dict]]) -> Set[str]:
+        """Bulk mark_event_once; returns the dedupe keys seen for the first time"""
+        now = now_iso()
+        docs, keys = [], set()
+        for key, payload in events:
+            if key in keys:
+                continue
+            keys.add(key)
+            docs.append({"dedupe_key": key, "payload": payload, "created_at": now})
+        return await self._insert_once(self.policy_events, docs)
+
+    async def existing_event_keys(self, keys: List[str]) -> Set[str]:
+        found = set()
+        for chunk in _chunks(list(set(keys))):
+            async for d in self.policy_events.find({"dedupe_key": {"$in": chunk}}, {"_id": 0, "dedupe_key": 1}):
+                found.add(d["dedupe_key"])
+        return found
+
     async def enqueue_approval(self, decision: dict) -> bool:
         """Add decision to approval queue"""
         dedupe_key = decision["dedupe_key"]
@@ -67,6 +109,14 @@ class PolicyRepo:
         except Exception:
             return False
 
+    async def enqueue_approvals(self, decisions: List[dict]) -> Set[str]:
+        """Bulk enqueue_approval; returns the dedupe keys that were queued"""
+        now = now_iso()
+        return await self._insert_once(self.actions_queue, [
+            {"dedupe_key": d["dedupe_key"], "status": "PENDING", "decision": d, "created_at": now}
+            for d in decisions
+        ])
+
     async def update_customer_policy(self, phone: str, patch: dict, updated_by: str = "system"):
         """Update customer policy flags"""
         patch["policy.updated_at"] = now_iso()
@@ -98,6 +148,32 @@ class PolicyRepo:
             "created_at": now_iso()
         })
 
+    async def _update_policies(self, col, key_field: str, audit_type: str,
+                               patches: List[Tuple[str, dict]], updated_by: str, prefix: str):
+        now = now_iso()
+        ops, audit = [], []
+        for target, patch in patches:
+            patch = {**patch, f"{prefix}updated_at": now, f"{prefix}updated_by": updated_by}
+            if key_field == "city":
+                patch["city"] = target
+            ops.append(UpdateOne({key_field: target}, {"$set": patch}, upsert=True))
+            audit.append({"type": audit_type, "target": target, "patch": patch,
+                          "updated_by": updated_by, "created_at": now})
+        for chunk in _chunks(ops):
+            await col.bulk_write(chunk, ordered=False)
+        for chunk in _chunks(audit):
+            await self.policy_audit.insert_many(chunk, ordered=False)
+
+    async def update_customer_policies(self, patches: List[Tuple[str, dict]], updated_by: str = "system"):
+        """Bulk update_customer_policy: [(phone, patch)]"""
+        await self._update_policies(self.customers, "phone", "CUSTOMER_POLICY_UPDATE",
+                                    patches, updated_by, "policy.")
+
+    async def update_city_policies(self, patches: List[Tuple[str, dict]], updated_by: str = "system"):
+        """Bulk update_city_policy: [(city, patch)]"""
+        await self._update_policies(self.city_policies, "city", "CITY_POLICY_UPDATE",
+                                    patches, updated_by, "")
+
     async def enqueue_admin_alert(self, dedupe_key: str, text: str, reply_markup: dict = None):
         """Queue Telegram alert for admin"""
         try:
@@ -111,6 +187,23 @@ class PolicyRepo:
         except Exception:
             return False
 
+    async def enqueue_admin_alerts(self, alerts: Iterable[Tuple[str, str, dict]]) -> int:
+        """Bulk enqueue_admin_alert: [(dedupe_key, text, reply_markup)]"""
+        now = now_iso()
+        return len(await self._insert_once(self.admin_alerts, [
+            {"status": "PENDING", "dedupe_key": key,
+             "payload": {"text": text, "reply_markup": markup}, "created_at": now}
+            for key, text, markup in alerts
+        ]))
+
+    async def get_customers_by_phone(self, phones: List[str]) -> Dict[str, dict]:
+        """Customer records for many phones (phone -> customer)"""
+        out = {}
+        for chunk in _chunks(phones):
+            async for c in self.customers.find({"phone": {"$in": chunk}}, {"_id": 0}):
+                out[c["phone"]] = c
+        return out
+
     async def list_customers_with_orders(self, limit: int = 500):
         """Get customers who have orders (for policy evaluation)"""
         pipeline = [
@@ -16,15 +16,17 @@ router = APIRouter(prefix="/policy", tags=["Return Policy"])
 
 @router.post("/run")
 async def run_policy_engine(
-    limit: int = Query(default=500, le=1000),
+    limit: Optional[int] = Query(default=None, ge=1),
+    dry_run: bool = Query(default=False),
     admin: dict = Depends(get_current_admin)
 ):
     """
     Manually trigger policy engine run.
     Scans customers/cities and generates policy decisions.
+    With dry_run=true nothing is written; the response lists the diff.
     """
     engine = ReturnPolicyEngine(db)
-    return await engine.run_once(limit_customers=limit)
+    return await engine.run_once(limit_customers=limit, dry_run=dry_run)
 
 
 @router.get("/pending")
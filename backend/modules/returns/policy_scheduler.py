@@ -2,27 +2,22 @@
 O20.5: Return Policy Engine - Scheduler
 Runs policy engine periodically
 """
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from modules.jobs.runtime import job_runtime
 from modules.returns.policy_engine import ReturnPolicyEngine
 import logging
 
 logger = logging.getLogger(__name__)
-policy_scheduler = AsyncIOScheduler()
 
 
 def start_policy_scheduler(db):
-    """Start the policy engine scheduler"""
+    """Register the policy engine job"""
     engine = ReturnPolicyEngine(db)
 
     async def job():
-        try:
-            result = await engine.run_once(limit_customers=500)
-            if result.get("proposed", 0) > 0:
-                logger.info(f"Policy engine: {result}")
-        except Exception as e:
-            logger.error(f"Policy engine error: {e}")
+        result = await engine.run_once()
+        if result.get("proposed", 0) > 0:
+            logger.info(f"Policy engine: {result}")
 
     # Run every 30 minutes
-    policy_scheduler.add_job(job, "interval", minutes=30, id="policy_engine", replace_existing=True)
-    policy_scheduler.start()
-    logger.info("Policy engine scheduler started (every 30 min)")
+    job_runtime.add(job, "interval", minutes=30, id="policy_engine", lease_sec=900)
+    logger.info("Policy engine job registered (every 30 min)")
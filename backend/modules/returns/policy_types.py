@@ -2,7 +2,7 @@
 O20.5: Return Policy Engine - Types
 Rule-based policy decisions for COD blocking, prepaid requirements
 """
-from typing import Literal, Optional, Dict, Any
+from typing import Literal, Optional, Dict, Any, List
 from pydantic import BaseModel
 
 PolicyAction = Literal[
@@ -34,6 +34,9 @@ class PolicyRunResult(BaseModel):
     proposed: int = 0
     applied: int = 0
     approvals_enqueued: int = 0
+    dry_run: bool = False
+    diff: List[Dict[str, Any]] = []
+    timings_ms: Dict[str, float] = {}
 
 
 class CustomerPolicy(BaseModel):
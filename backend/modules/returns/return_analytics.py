@@ -6,6 +6,8 @@ from datetime import datetime, timezone, timedelta
 from typing import Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from core.dates import date_range, day_bucket
+
 
 class ReturnAnalyticsService:
     """Analytics for return management KPIs"""
@@ -26,7 +28,7 @@ class ReturnAnalyticsService:
         since_30 = self._since(30)
 
         # Total orders in 30 days
-        total_30 = await self.orders.count_documents({"created_at": {"$gte": since_30}})
+        total_30 = await self.orders.count_documents(date_range("created_at", gte=since_30))
         
         # Returns by period
         returns_today = await self.orders.count_documents({
@@ -58,6 +60,7 @@ class ReturnAnalyticsService:
         losses_30 = 0
         async for l in self.ledger.find({
             "type": {"$in": ["SHIP_COST_OUT", "RETURN_COST_OUT"]},
+            # finance_ledger is not migrated: finance_repo stores ISO strings
             "created_at": {"$gte": since_30}
         }):
             losses_30 += float(l.get("amount", 0))
@@ -119,7 +122,7 @@ class ReturnAnalyticsService:
                 "returns.updated_at": {"$gte": since},
                 "returns.stage": {"$in": ["RETURNING", "RETURNED"]}
             }},
-            {"$addFields": {"day": {"$substr": ["$returns.updated_at", 0, 10]}}},
+            {"$addFields": {"day": day_bucket("$returns.updated_at")}},
             {"$group": {"_id": "$day", "count": {"$sum": 1}}},
             {"$sort": {"_id": 1}}
         ]
@@ -134,7 +137,7 @@ class ReturnAnalyticsService:
                 "type": {"$in": ["SHIP_COST_OUT", "RETURN_COST_OUT"]},
                 "created_at": {"$gte": since}
             }},
-            {"$addFields": {"day": {"$substr": ["$created_at", 0, 10]}}},
+            {"$addFields": {"day": day_bucket("$created_at")}},
             {"$group": {"_id": "$day", "amount": {"$sum": "$amount"}}},
             {"$sort": {"_id": 1}}
         ]
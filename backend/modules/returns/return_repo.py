@@ -6,6 +6,9 @@ from datetime import datetime, timezone
 from motor.motor_asyncio import AsyncIOMotorDatabase
 import logging
 
+from core.dates import date_range, utcnow
+from modules.orders.order_status import status_fields
+
 logger = logging.getLogger(__name__)
 
 
@@ -95,7 +98,7 @@ class ReturnRepo:
         """Transition order to new status"""
         await self.orders.update_one(
             {"id": order_id}, 
-            {"$set": {"status": new_status, "updated_at": now_iso()}}
+            {"$set": {**status_fields(status=new_status), "updated_at": utcnow()}}
         )
 
     async def add_ledger_once(self, order_id: str, type_: str, amount: float, ref: str, meta: dict) -> bool:
@@ -188,7 +191,7 @@ class ReturnRepo:
         since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
         
         # Total orders in period
-        total = await self.orders.count_documents({"created_at": {"$gte": since}})
+        total = await self.orders.count_documents(date_range("created_at", gte=since))
         
         # Returns in period
         returns = await self.orders.count_documents({
@@ -207,6 +210,7 @@ class ReturnRepo:
         pipeline = [
             {"$match": {
                 "type": {"$in": ["SHIP_COST_OUT", "RETURN_COST_OUT"]},
+                # finance_ledger is not migrated: finance_repo stores ISO strings
                 "created_at": {"$gte": since}
             }},
             {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
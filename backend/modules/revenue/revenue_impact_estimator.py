@@ -2,6 +2,8 @@
 Revenue Impact Estimator - Calculate expected cost vs uplift
 """
 from datetime import datetime, timedelta, timezone
+from core.dates import date_range
+from modules.orders.order_status import paid_filter
 from .revenue_settings import get_settings
 
 
@@ -20,30 +22,26 @@ class RevenueImpactEstimator:
 
     async def _base_window_stats(self, range_days: int) -> dict:
         """Get base statistics for impact calculation"""
-        since = (now() - timedelta(days=range_days)).isoformat()
-        paid_statuses = ["PAID", "PROCESSING", "SHIPPED", "DELIVERED", "paid", "completed"]
+        since = now() - timedelta(days=range_days)
 
         # Total orders
-        total = await self.orders.count_documents({"created_at": {"$gte": since}})
+        total = await self.orders.count_documents(date_range("created_at", gte=since))
 
         # FULL_PREPAID orders
         prepaid_total = await self.orders.count_documents({
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "payment_policy.mode": "FULL_PREPAID"
         })
 
         prepaid_paid = await self.orders.count_documents({
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "payment_policy.mode": "FULL_PREPAID",
-            "$or": [
-                {"status": {"$in": paid_statuses}},
-                {"payment_status": {"$in": paid_statuses}}
-            ]
+            **paid_filter()
         })
 
         # Avg order grand
         avg_pipeline = [
-            {"$match": {"created_at": {"$gte": since}}},
+            {"$match": date_range("created_at", gte=since)},
             {"$group": {"_id": None, "avg": {"$avg": {"$ifNull": ["$totals.grand", 0]}}}}
         ]
         avg_result = await self.orders.aggregate(avg_pipeline).to_list(1)
@@ -51,7 +49,7 @@ class RevenueImpactEstimator:
 
         # Avg grand for prepaid
         prepaid_avg_pipeline = [
-            {"$match": {"created_at": {"$gte": since}, "payment_policy.mode": "FULL_PREPAID"}},
+            {"$match": {**date_range("created_at", gte=since), "payment_policy.mode": "FULL_PREPAID"}},
             {"$group": {"_id": None, "avg": {"$avg": {"$ifNull": ["$totals.grand", 0]}}}}
         ]
         prepaid_avg_result = await self.orders.aggregate(prepaid_avg_pipeline).to_list(1)
@@ -59,7 +57,7 @@ class RevenueImpactEstimator:
 
         # Return rate
         returns = await self.orders.count_documents({
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "$or": [{"return.is_return": True}, {"status": {"$in": ["RETURNED", "CANCELLED_RETURNED"]}}]
         })
         return_rate = (returns / total) if total > 0 else 0.0
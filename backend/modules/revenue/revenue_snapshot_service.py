@@ -4,6 +4,9 @@ Revenue Snapshot Service - Captures key metrics for ROE analysis
 from datetime import datetime, timedelta, timezone
 import logging
 
+from core.dates import date_range
+from modules.orders.order_status import paid_filter
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,30 +24,27 @@ class RevenueSnapshotService:
 
     async def build_snapshot(self, range_days: int = 7) -> dict:
         """Build a comprehensive snapshot of revenue metrics"""
-        since = (now() - timedelta(days=range_days)).isoformat()
+        since = now() - timedelta(days=range_days)
+        since_iso = since.isoformat()
 
         # Total orders
-        orders_total = await self.orders.count_documents({"created_at": {"$gte": since}})
+        orders_total = await self.orders.count_documents(date_range("created_at", gte=since))
         
         # Paid orders
-        paid_statuses = ["PAID", "PROCESSING", "SHIPPED", "DELIVERED", "paid", "completed"]
         paid_total = await self.orders.count_documents({
-            "created_at": {"$gte": since},
-            "$or": [
-                {"status": {"$in": paid_statuses}},
-                {"payment_status": {"$in": paid_statuses}}
-            ]
+            **date_range("created_at", gte=since),
+            **paid_filter()
         })
 
         # Declined payments
         declined_total = await self.payments.count_documents({
-            "created_at": {"$gte": since},
+            "created_at": {"$gte": since_iso},
             "status": {"$in": ["DECLINED", "declined", "FAILED", "failed"]}
         }) if "payments" in await self.db.list_collection_names() else 0
 
         # Returns
         returns_total = await self.orders.count_documents({
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "$or": [
                 {"return.is_return": True},
                 {"status": {"$in": ["RETURNED", "CANCELLED_RETURNED"]}}
@@ -53,12 +53,9 @@ class RevenueSnapshotService:
 
         # Recovery (retry)
         retry_paid = await self.orders.count_documents({
-            "paid_at": {"$gte": since},
+            **date_range("paid_at", gte=since),
             "retry.sent": True,
-            "$or": [
-                {"status": {"$in": paid_statuses}},
-                {"payment_status": {"$in": paid_statuses}}
-            ]
+            **paid_filter()
         })
 
         # Rates
@@ -69,41 +66,35 @@ class RevenueSnapshotService:
 
         # Deposit conversion
         deposit_total = await self.orders.count_documents({
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "$or": [
                 {"deposit.required": True},
                 {"payment_policy.mode": "SHIP_DEPOSIT"}
             ]
         })
         deposit_paid = await self.orders.count_documents({
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "deposit.paid": True
         })
         deposit_conv = (deposit_paid / deposit_total) if deposit_total > 0 else 0
 
         # Prepaid metrics
         prepaid_total = await self.orders.count_documents({
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "payment_policy.mode": "FULL_PREPAID"
         })
         prepaid_paid = await self.orders.count_documents({
-            "created_at": {"$gte": since},
+            **date_range("created_at", gte=since),
             "payment_policy.mode": "FULL_PREPAID",
-            "$or": [
-                {"status": {"$in": paid_statuses}},
-                {"payment_status": {"$in": paid_statuses}}
-            ]
+            **paid_filter()
         })
         prepaid_conv = (prepaid_paid / prepaid_total) if prepaid_total > 0 else 0
 
         # Avg payment time
         time_pipeline = [
             {"$match": {
-                "paid_at": {"$gte": since},
-                "$or": [
-                    {"status": {"$in": paid_statuses}},
-                    {"payment_status": {"$in": paid_statuses}}
-                ]
+                **date_range("paid_at", gte=since),
+                **paid_filter()
             }},
             {"$project": {
                 "delta": {
@@ -124,7 +115,7 @@ class RevenueSnapshotService:
         # Discount stats
         discount_pipeline = [
             {"$match": {
-                "created_at": {"$gte": since},
+                **date_range("created_at", gte=since),
                 "pricing.discount.amount": {"$exists": True, "$gt": 0}
             }},
             {"$group": {
@@ -141,11 +132,8 @@ class RevenueSnapshotService:
         # Revenue
         revenue_pipeline = [
             {"$match": {
-                "created_at": {"$gte": since},
-                "$or": [
-                    {"status": {"$in": paid_statuses}},
-                    {"payment_status": {"$in": paid_statuses}}
-                ]
+                **date_range("created_at", gte=since),
+                **paid_filter()
             }},
             {"$group": {
                 "_id": None,
@@ -162,7 +150,7 @@ class RevenueSnapshotService:
         try:
             loss_pipeline = [
                 {"$match": {
-                    "ts": {"$gte": since},
+                    "ts": {"$gte": since_iso},
                     "type": {"$in": ["SHIP_COST_OUT", "RETURN_COST_OUT", "SALE_LOST"]}
                 }},
                 {"$group": {"_id": None, "sum": {"$sum": "$amount"}}}
@@ -0,0 +1,149 @@
+"""
+Review Rating Stats - per-product rating counters kept incrementally
+
+Each product carries
+    reviews_count   number of reviews
+    rating_sum      sum of their ratings
+    rating_hist     {"1": n, ..., "5": n}
+    rating          average, rounded to 0.1
+- a review write applies one $inc to the counters; the average is then set
+  only if the counters are still the ones that write produced, so with
+  concurrent writers the last one's average wins
+- counters that do not add up (products reviewed before this existed, or
+  drift) are rebuilt from the reviews of that product on the next write
+- repair() rebuilds all products in _id order, BATCH_SIZE at a time, and only
+  writes products whose stored values differ; it runs nightly as a job
+- product cards (rating, reviews_count) are rebuilt after each change
+"""
+import asyncio
+import logging
+from typing import Iterable, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from modules.products.cards import refresh_cards
+
+logger = logging.getLogger(__name__)
+
+STARS = ("1", "2", "3", "4", "5")
+BATCH_SIZE = 1000
+BATCH_PAUSE_SEC = 0.05
+FIELDS = {"_id": 0, "id": 1, "reviews_count": 1, "rating_sum": 1, "rating_hist": 1, "rating": 1}
+
+
+def average(count: int, total: int) -> float:
+    return round(total / count, 1) if count > 0 else 0
+
+
+def _consistent(doc: dict) -> bool:
+    count, total = doc.get("reviews_count") or 0, doc.get("rating_sum") or 0
+    hist = doc.get("rating_hist") or {}
+    return (count >= 0 and sum(hist.get(s, 0) for s in STARS) == count
+            and sum(int(s) * hist.get(s, 0) for s in STARS) == total)
+
+
+def _expected(stats: Optional[dict]) -> dict:
+    stats = stats or {}
+    count, total = stats.get("count", 0), stats.get("sum", 0)
+    return {
+        "reviews_count": count,
+        "rating_sum": total,
+        "rating_hist": {s: stats.get(s, 0) for s in STARS},
+        "rating": average(count, total),
+    }
+
+
+class RatingStats:
+    def __init__(self, db):
+        self.db = db
+        self.products = db["products"]
+        self.reviews = db["reviews"]
+
+    async def ensure_indexes(self):
+        await self.reviews.create_index("product_id")
+
+    async def apply(self, product_id: str, rating, delta: int = 1):
+        """Count one review in (delta=1) or out (delta=-1) of the product's stats"""
+        try:
+            stars = int(rating)
+        except (TypeError, ValueError):
+            stars = 0
+        if not 1 <= stars <= 5:
+            await self.repair([product_id])
+            return
+        doc = await self.products.find_one_and_update(
+            {"id": product_id},
+            {"$inc": {"reviews_count": delta, "rating_sum": delta * stars, f"rating_hist.{stars}": delta}},
+            projection=FIELDS,
+            return_document=ReturnDocument.AFTER,
+        )
+        if not doc:
+            return
+        if not _consistent(doc):
+            await self.repair([product_id])
+            return
+        await self.products.update_one(
+            {"id": product_id, "reviews_count": doc["reviews_count"], "rating_sum": doc["rating_sum"]},
+            {"$set": {"rating": average(doc["reviews_count"], doc["rating_sum"])}},
+        )
+        await refresh_cards(self.db, [product_id])
+
+    async def _aggregate(self, product_ids: List[str]) -> dict:
+        group = {"_id": "$product_id", "count": {"$sum": 1}, "sum": {"$sum": "$rating"}}
+        for s in STARS:
+            group[s] = {"$sum": {"$cond": [{"$eq": ["$rating", int(s)]}, 1, 0]}}
+        pipeline = [
+            {"$match": {"product_id": {"$in": product_ids}, "rating": {"$gte": 1, "$lte": 5}}},
+            {"$group": group},
+        ]
+        return {d["_id"]: d async for d in self.reviews.aggregate(pipeline)}
+
+    async def _repair_batch(self, products: List[dict]) -> int:
+        stats = await self._aggregate([p["id"] for p in products])
+        ops, changed = [], []
+        for p in products:
+            want = _expected(stats.get(p["id"]))
+            if any(p.get(k) != v for k, v in want.items()):
+                ops.append(UpdateOne({"id": p["id"]}, {"$set": want}))
+                changed.append(p["id"])
+        if not ops:
+            return 0
+        res = await self.products.bulk_write(ops, ordered=False)
+        await refresh_cards(self.db, changed)
+        return res.modified_count
+
+    async def repair(self, product_ids: Optional[Iterable[str]] = None) -> dict:
+        """Rebuild counters from the reviews collection (given products, or all)"""
+        if product_ids is not None:
+            products = await self.products.find({"id": {"$in": list(product_ids)}}, FIELDS).to_list(None)
+            return {"products": len(products), "updated": await self._repair_batch(products)}
+
+        scanned = updated = 0
+        last_id = None
+        while True:
+            q = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            batch = await self.products.find(q, {**FIELDS, "_id": 1}) \
+                .sort("_id", 1).limit(BATCH_SIZE).to_list(BATCH_SIZE)
+            if not batch:
+                break
+            last_id = batch[-1]["_id"]
+            scanned += len(batch)
+            updated += await self._repair_batch([p for p in batch if p.get("id")])
+            if len(batch) < BATCH_SIZE:
+                break
+            await asyncio.sleep(BATCH_PAUSE_SEC)
+        if updated:
+            logger.info(f"Rating repair: {updated} of {scanned} products corrected")
+        return {"products": scanned, "updated": updated}
+
+    async def get(self, product_id: str) -> Optional[dict]:
+        doc = await self.products.find_one({"id": product_id}, FIELDS)
+        if not doc:
+            return None
+        hist = doc.get("rating_hist") or {}
+        return {
+            "product_id": product_id,
+            "rating": doc.get("rating") or 0,
+            "reviews_count": doc.get("reviews_count") or 0,
+            "histogram": {s: hist.get(s, 0) for s in STARS},
+        }
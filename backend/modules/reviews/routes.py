@@ -9,6 +9,7 @@ import uuid
 
 from core.db import db
 from core.security import get_current_user, get_current_user_optional, get_current_admin
+from .rating_stats import RatingStats
 
 router = APIRouter(prefix="/reviews", tags=["Reviews"])
 
@@ -35,6 +36,24 @@ class ReviewWithProduct(Review):
     product_image: Optional[str] = None
 
 
+async def _with_products(reviews: List[dict]) -> List[ReviewWithProduct]:
+    """Attach product name / image with one products query for the whole page"""
+    ids = list({r["product_id"] for r in reviews})
+    products = await db.products.find(
+        {"id": {"$in": ids}}, {"_id": 0, "id": 1, "name": 1, "images": 1}
+    ).to_list(len(ids)) if ids else []
+    by_id = {p["id"]: p for p in products}
+    result = []
+    for r in reviews:
+        product = by_id.get(r["product_id"])
+        result.append(ReviewWithProduct(
+            **r,
+            product_name=product.get("name") if product else None,
+            product_image=product["images"][0] if product and product.get("images") else None
+        ))
+    return result
+
+
 @router.get("/product/{product_id}", response_model=List[Review])
 async def get_product_reviews(product_id: str):
     """Get reviews for a product"""
@@ -54,16 +73,7 @@ async def get_featured_reviews():
         {"_id": 0}
     ).limit(10).to_list(10)
     
-    result = []
-    for r in reviews:
-        product = await db.products.find_one({"id": r["product_id"]}, {"name": 1, "images": 1})
-        result.append(ReviewWithProduct(
-            **r,
-            product_name=product.get("name") if product else None,
-            product_image=product["images"][0] if product and product.get("images") else None
-        ))
-    
-    return result
+    return await _with_products(reviews)
 
 
 @router.get("/can-review/{product_id}")
@@ -133,14 +143,8 @@ async def create_review(
     
     await db.reviews.insert_one(review_doc)
     
-    # Update product rating
-    all_reviews = await db.reviews.find({"product_id": data.product_id}, {"rating": 1}).to_list(1000)
-    avg_rating = sum(r["rating"] for r in all_reviews) / len(all_reviews)
-    
-    await db.products.update_one(
-        {"id": data.product_id},
-        {"$set": {"rating": round(avg_rating, 1), "reviews_count": len(all_reviews)}}
-    )
+    # Update product rating counters
+    await RatingStats(db).apply(data.product_id, data.rating, 1)
     
     return Review(**review_doc)
 
@@ -159,23 +163,11 @@ async def delete_review(
     if current_user["role"] != "admin" and review["user_id"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    await db.reviews.delete_one({"id": review_id})
-    
-    # Update product rating
-    product_id = review["product_id"]
-    all_reviews = await db.reviews.find({"product_id": product_id}, {"rating": 1}).to_list(1000)
+    result = await db.reviews.delete_one({"id": review_id})
     
-    if all_reviews:
-        avg_rating = sum(r["rating"] for r in all_reviews) / len(all_reviews)
-        await db.products.update_one(
-            {"id": product_id},
-            {"$set": {"rating": round(avg_rating, 1), "reviews_count": len(all_reviews)}}
-        )
-    else:
-        await db.products.update_one(
-            {"id": product_id},
-            {"$set": {"rating": 0, "reviews_count": 0}}
-        )
+    # Only the request that actually removed the review uncounts it
+    if result.deleted_count:
+        await RatingStats(db).apply(review["product_id"], review.get("rating"), -1)
     
     return {"message": "Review deleted"}
 
@@ -186,16 +178,7 @@ async def get_all_reviews_admin(current_user: dict = Depends(get_current_admin))
     """Get all reviews (admin)"""
     reviews = await db.reviews.find({}, {"_id": 0}).sort("created_at", -1).to_list(500)
     
-    result = []
-    for r in reviews:
-        product = await db.products.find_one({"id": r["product_id"]}, {"name": 1, "images": 1})
-        result.append(ReviewWithProduct(
-            **r,
-            product_name=product.get("name") if product else None,
-            product_image=product["images"][0] if product and product.get("images") else None
-        ))
-    
-    return result
+    return await _with_products(reviews)
 
 
 @router.put("/{review_id}/featured")
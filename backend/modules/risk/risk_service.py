@@ -4,6 +4,8 @@ O16: Risk Service - Customer Risk Score Engine (0-100)
 from datetime import datetime, timezone, timedelta
 from modules.risk.risk_types import RiskResult
 from modules.risk.risk_config import DEFAULT_RISK_CONFIG
+from core.dates import date_range
+from modules.orders.order_status import PAYMENT_FAILURE_STATUSES, OrderStatus, PaymentStatus
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,10 +15,6 @@ def utcnow():
     return datetime.now(timezone.utc)
 
 
-def iso(dt: datetime):
-    return dt.isoformat()
-
-
 def clamp(x: float, a: float, b: float) -> float:
     return max(a, min(b, x))
 
@@ -49,7 +47,7 @@ class RiskService:
         # Count orders in last hour (burst detection)
         hour_ago = now - timedelta(hours=1)
         burst_cnt = await self.orders.count_documents({
-            "created_at": {"$gte": iso(hour_ago), "$lt": iso(now)},
+            **date_range("created_at", gte=hour_ago, lt=now),
             "buyer_id": user_id
         })
         c_burst = clamp((burst_cnt / 3.0) * w["burst_1h"], 0, caps["burst_1h"])
@@ -57,18 +55,20 @@ class RiskService:
         # Count cancelled/returned orders in 60d
         days_60_ago = now - timedelta(days=60)
         returns_cnt = await self.orders.count_documents({
-            "created_at": {"$gte": iso(days_60_ago)},
+            **date_range("created_at", gte=days_60_ago),
             "buyer_id": user_id,
-            "status": {"$in": ["returned", "RETURNED", "cancelled", "CANCELLED"]}
+            "status_c": OrderStatus.CANCELED.value,
+            # unpaid auto-cancels are scored once, under payment failures
+            "status": {"$nin": PAYMENT_FAILURE_STATUSES},
         })
         c_returns = clamp((returns_cnt / 2.0) * w["returns_60d"], 0, caps["returns_60d"])
 
         # Payment failures (simplified - count failed payment status)
         days_30_ago = now - timedelta(days=30)
         payment_fails = await self.orders.count_documents({
-            "created_at": {"$gte": iso(days_30_ago)},
+            **date_range("created_at", gte=days_30_ago),
             "buyer_id": user_id,
-            "payment_status": {"$in": ["failed", "FAILED"]}
+            "payment_status_c": PaymentStatus.FAILED.value
         })
         c_pay = clamp((payment_fails / 2.0) * w["payment_fails_30d"], 0, caps["payment_fails_30d"])
 
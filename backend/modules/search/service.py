@@ -266,7 +266,8 @@ class SearchService:
                 ]
                 mongo_query = simple_query
             
-            cursor = self.db.products.find(mongo_query).sort(sort_field).skip(skip).limit(limit)
+            cursor = self.db.products.find(mongo_query, {"card_json": 0, "card_v": 0}) \
+                .sort(sort_field).skip(skip).limit(limit)
             products = await cursor.to_list(limit)
             
             # Convert ObjectId
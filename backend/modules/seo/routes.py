@@ -1,12 +1,14 @@
 """
 SEO Routes - Sitemap, Robots.txt
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import Response
 from datetime import datetime
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from .sitemap_service import get_sitemap_service, file_response
+
 router = APIRouter()
 
 # Database connection
@@ -19,69 +21,19 @@ BASE_URL = "https://y-store.ua"
 
 
 @router.get("/sitemap.xml")
-async def sitemap():
-    """Generate sitemap.xml"""
-    
-    # Get active products
-    products = await db.products.find(
-        {"is_active": {"$ne": False}},
-        {"id": 1, "slug": 1, "updated_at": 1}
-    ).to_list(50000)
-    
-    # Get active categories
-    categories = await db.categories.find(
-        {"is_active": {"$ne": False}},
-        {"id": 1, "slug": 1}
-    ).to_list(500)
-    
-    xml = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-    
-    # Main pages
-    static_pages = [
-        ("/", "1.0", "daily"),
-        ("/products", "0.9", "daily"),
-        ("/promotions", "0.8", "daily"),
-        ("/contact", "0.5", "monthly"),
-        ("/delivery-payment", "0.5", "monthly"),
-        ("/exchange-return", "0.5", "monthly"),
-        ("/about", "0.5", "monthly"),
-    ]
-    
-    for page, priority, changefreq in static_pages:
-        xml += f"""  <url>
-    <loc>{BASE_URL}{page}</loc>
-    <changefreq>{changefreq}</changefreq>
-    <priority>{priority}</priority>
-  </url>\n"""
-    
-    # Category pages
-    for cat in categories:
-        slug = cat.get("slug") or cat.get("id")
-        xml += f"""  <url>
-    <loc>{BASE_URL}/products?category={slug}</loc>
-    <changefreq>daily</changefreq>
-    <priority>0.8</priority>
-  </url>\n"""
-    
-    # Product pages
-    for prod in products:
-        prod_id = prod.get("id") or str(prod.get("_id"))
-        updated = prod.get("updated_at")
-        lastmod = ""
-        if updated:
-            if hasattr(updated, "strftime"):
-                lastmod = f"\n    <lastmod>{updated.strftime('%Y-%m-%d')}</lastmod>"
-        
-        xml += f"""  <url>
-    <loc>{BASE_URL}/product/{prod_id}</loc>{lastmod}
-    <changefreq>weekly</changefreq>
-    <priority>0.7</priority>
-  </url>\n"""
-    
-    xml += '</urlset>'
-    
-    return Response(content=xml, media_type="application/xml")
+async def sitemap(request: Request):
+    """Sitemap index (cached; shards under /api/sitemaps/)"""
+    f = await get_sitemap_service(db).get("index")
+    return file_response(request, f)
+
+
+@router.get("/api/sitemaps/{name}")
+async def sitemap_shard(name: str, request: Request):
+    """Gzipped sitemap shard (pages.xml.gz, products-N.xml.gz)"""
+    f = await get_sitemap_service(db).get(name)
+    if not f or name == "index":
+        raise HTTPException(status_code=404, detail="Sitemap not found")
+    return file_response(request, f)
 
 
 @router.get("/robots.txt")
@@ -0,0 +1,211 @@
+"""
+Sitemap Service - cached, sharded sitemap generation
+
+- products are streamed from a cursor straight into gzip shards
+  (SHARD_SIZE URLs each) behind a small sitemap index
+- built files are kept in process memory with ETag / Last-Modified
+- product and category writes bump a version in seo_state; a cached build
+  is reused until the version changes, and rebuilt at most once per
+  MIN_REBUILD_SEC, so crawler traffic never turns into catalog scans
+"""
+import asyncio
+import gzip
+import hashlib
+import io
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+from xml.sax.saxutils import escape
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from core.dates import as_datetime, utcnow
+
+logger = logging.getLogger(__name__)
+
+SITE_URL = os.environ.get("SITE_URL", "https://y-store.ua").rstrip("/")
+SHARD_SIZE = 50000
+CURSOR_BATCH = 2000
+MIN_REBUILD_SEC = 300
+MAX_AGE_SEC = 6 * 3600
+
+STATE_ID = "sitemap"
+
+STATIC_PAGES = [
+    ("/", "1.0", "daily"),
+    ("/products", "0.9", "daily"),
+    ("/promotions", "0.8", "daily"),
+    ("/contact", "0.5", "monthly"),
+    ("/delivery-payment", "0.5", "monthly"),
+    ("/exchange-return", "0.5", "monthly"),
+    ("/about", "0.5", "monthly"),
+]
+
+URLSET_OPEN = b'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_CLOSE = b"</urlset>"
+
+
+class SitemapFile:
+    __slots__ = ("body", "etag", "last_modified", "media_type", "urls")
+
+    def __init__(self, body: bytes, media_type: str, built_at: datetime, urls: int = 0):
+        self.body = body
+        self.media_type = media_type
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.last_modified = built_at
+        self.urls = urls
+
+
+class _ShardWriter:
+    """Writes <url> entries straight into a gzip stream"""
+
+    def __init__(self):
+        self.buf = io.BytesIO()
+        self.gz = gzip.GzipFile(fileobj=self.buf, mode="wb", compresslevel=6, mtime=0)
+        self.gz.write(URLSET_OPEN)
+        self.count = 0
+
+    def add(self, loc: str, changefreq: str, priority: str, lastmod: Optional[datetime] = None):
+        parts = [f"  <url>\n    <loc>{escape(loc)}</loc>\n"]
+        if lastmod:
+            parts.append(f"    <lastmod>{lastmod.strftime('%Y-%m-%d')}</lastmod>\n")
+        parts.append(f"    <changefreq>{changefreq}</changefreq>\n    <priority>{priority}</priority>\n  </url>\n")
+        self.gz.write("".join(parts).encode("utf-8"))
+        self.count += 1
+
+    def close(self) -> bytes:
+        self.gz.write(URLSET_CLOSE)
+        self.gz.close()
+        return self.buf.getvalue()
+
+
+class SitemapService:
+    def __init__(self, db):
+        self.db = db
+        self.state = db["seo_state"]
+        self.files: Dict[str, SitemapFile] = {}
+        self.version: Optional[int] = None
+        self.built_ts = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _stored_version(self) -> int:
+        doc = await self.state.find_one({"_id": STATE_ID}, {"version": 1})
+        return int((doc or {}).get("version") or 0)
+
+    async def invalidate(self):
+        """Mark all cached sitemaps stale (every worker picks it up on next hit)"""
+        await self.state.update_one(
+            {"_id": STATE_ID},
+            {"$inc": {"version": 1}, "$set": {"updated_at": utcnow()}},
+            upsert=True,
+        )
+
+    def _fresh(self, version: int) -> bool:
+        if not self.files:
+            return False
+        age = time.monotonic() - self.built_ts
+        if age < MIN_REBUILD_SEC:
+            return True
+        return version == self.version and age < MAX_AGE_SEC
+
+    async def get(self, name: str) -> Optional[SitemapFile]:
+        version = await self._stored_version()
+        if not self._fresh(version):
+            async with self._lock:
+                if not self._fresh(version):
+                    await self._build(version)
+        return self.files.get(name)
+
+    async def _build(self, version: int):
+        started = time.monotonic()
+        built_at = utcnow()
+        files: Dict[str, SitemapFile] = {}
+
+        # Static + category pages
+        pages = _ShardWriter()
+        for page, priority, changefreq in STATIC_PAGES:
+            pages.add(f"{SITE_URL}{page}", changefreq, priority)
+        async for cat in self.db.categories.find(
+            {"is_active": {"$ne": False}}, {"_id": 0, "id": 1}
+        ).batch_size(CURSOR_BATCH):
+            if cat.get("id"):
+                pages.add(f"{SITE_URL}/products?category_id={cat['id']}", "daily", "0.8")
+        files["pages.xml.gz"] = SitemapFile(pages.close(), "application/gzip", built_at, pages.count)
+
+        # Product pages, SHARD_SIZE per file
+        shard_no = 0
+        shard: Optional[_ShardWriter] = None
+        cursor = self.db.products.find(
+            {"is_active": {"$ne": False}}, {"_id": 0, "id": 1, "updated_at": 1}
+        ).batch_size(CURSOR_BATCH)
+        async for prod in cursor:
+            if not prod.get("id"):
+                continue
+            if shard is None:
+                shard_no += 1
+                shard = _ShardWriter()
+            shard.add(f"{SITE_URL}/product/{prod['id']}", "weekly", "0.9", as_datetime(prod.get("updated_at")))
+            if shard.count >= SHARD_SIZE:
+                files[f"products-{shard_no}.xml.gz"] = SitemapFile(shard.close(), "application/gzip", built_at, shard.count)
+                shard = None
+        if shard is not None:
+            files[f"products-{shard_no}.xml.gz"] = SitemapFile(shard.close(), "application/gzip", built_at, shard.count)
+
+        # Index
+        lastmod = built_at.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for name in files:
+            lines.append(f"  <sitemap>\n    <loc>{SITE_URL}/api/sitemaps/{name}</loc>\n    <lastmod>{lastmod}</lastmod>\n  </sitemap>")
+        lines.append("</sitemapindex>")
+        files["index"] = SitemapFile("\n".join(lines).encode("utf-8"), "application/xml", built_at)
+
+        self.files = files
+        self.version = version
+        self.built_ts = time.monotonic()
+        urls = sum(f.urls for f in files.values())
+        logger.info(f"Sitemap built: {urls} urls, {len(files) - 1} files in {time.monotonic() - started:.2f}s")
+
+
+def file_response(request: Request, f: SitemapFile) -> Response:
+    """Serve a cached file honouring If-None-Match / If-Modified-Since"""
+    headers = {
+        "ETag": f.etag,
+        "Last-Modified": format_datetime(f.last_modified.astimezone(timezone.utc).replace(microsecond=0), usegmt=True),
+        "Cache-Control": "public, max-age=3600",
+    }
+    inm = request.headers.get("if-none-match")
+    if inm:
+        if f.etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    else:
+        ims = request.headers.get("if-modified-since")
+        if ims:
+            try:
+                if f.last_modified.replace(microsecond=0) <= parsedate_to_datetime(ims):
+                    return Response(status_code=304, headers=headers)
+            except (TypeError, ValueError):
+                pass
+    return Response(content=f.body, media_type=f.media_type, headers=headers)
+
+
+_service: Optional[SitemapService] = None
+
+
+def get_sitemap_service(db) -> SitemapService:
+    global _service
+    if _service is None:
+        _service = SitemapService(db)
+    return _service
+
+
+async def invalidate_sitemap(db):
+    """Called from product / category writes"""
+    try:
+        await get_sitemap_service(db).invalidate()
+    except Exception as e:
+        logger.warning(f"Sitemap invalidation failed: {e}")
@@ -8,6 +8,7 @@ import logging
 import requests
 from typing import Dict, List, Any, Optional
 from dotenv import load_dotenv
+from core.metrics import outbound
 
 load_dotenv()
 
@@ -46,12 +47,13 @@ class NovaPoshtaService:
                 "methodProperties": method_properties
             }
             
-            response = requests.post(
-                self.api_url,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=30
-            )
+            with outbound("novaposhta", f"{model_name}.{called_method}"):
+                response = requests.post(
+                    self.api_url,
+                    json=payload,
+                    headers={"Content-Type": "application/json"},
+                    timeout=30
+                )
             
             response.raise_for_status()
             result = response.json()
@@ -6,44 +6,25 @@ from datetime import datetime, timezone
 from typing import Dict, List, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from uuid import uuid4
+from pymongo import ReturnDocument
+
+from modules.orders.seller_orders import SellerOrdersService
+
+# ledger_debited / ledger_seq are SellerOrdersService bookkeeping
+PAYOUT_PROJECTION = {"_id": 0, "ledger_debited": 0, "ledger_seq": 0}
 
 class PayoutsService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
+        self.sellers = SellerOrdersService(db)
     
     async def calculate_seller_balance(self, seller_id: str) -> Dict[str, float]:
-        """Calculate seller's available balance"""
-        # Get all completed orders for this seller
-        pipeline = [
-            {"$unwind": "$items"},
-            {
-                "$match": {
-                    "items.seller_id": seller_id,
-                    "payment_status": "paid",
-                    "status": {"$in": ["delivered", "completed"]}
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "total_revenue": {"$sum": {"$multiply": ["$items.price", "$items.quantity"]}}
-                }
-            }
-        ]
+        """Calculate seller's available balance from the running ledger totals"""
+        balance = await self.sellers.get_balance(seller_id)
         
-        result = await self.db.orders.aggregate(pipeline).to_list(1)
-        total_revenue = result[0]["total_revenue"] if result else 0
-        
-        # Get total paid out amount
-        payouts = await self.db.payouts.find(
-            {"seller_id": seller_id, "status": {"$in": ["completed", "processing"]}},
-            {"_id": 0}
-        ).to_list(1000)
-        
-        total_paid = sum(p.get("amount", 0) for p in payouts)
-        
-        # Platform commission (10%)
-        commission = total_revenue * 0.10
+        total_revenue = balance["total_revenue"]
+        commission = balance["commission"]
+        total_paid = balance["total_paid"]
         available_balance = total_revenue - commission - total_paid
         
         return {
@@ -84,7 +65,7 @@ class PayoutsService:
         """Get all payouts for a seller"""
         payouts = await self.db.payouts.find(
             {"seller_id": seller_id},
-            {"_id": 0}
+            PAYOUT_PROJECTION
         ).sort([("created_at", -1)]).to_list(1000)
         
         return payouts
@@ -93,7 +74,7 @@ class PayoutsService:
         """Get all pending payouts (admin only)"""
         payouts = await self.db.payouts.find(
             {"status": "pending"},
-            {"_id": 0}
+            PAYOUT_PROJECTION
         ).sort([("created_at", -1)]).to_list(1000)
         
         # Enrich with seller info
@@ -110,7 +91,7 @@ class PayoutsService:
     
     async def process_payout(self, payout_id: str, admin_id: str, status: str = "completed") -> Dict:
         """Process a payout request (admin only)"""
-        result = await self.db.payouts.update_one(
+        before = await self.db.payouts.find_one_and_update(
             {"id": payout_id},
             {
                 "$set": {
@@ -119,13 +100,18 @@ class PayoutsService:
                     "processed_by": admin_id,
                     "updated_at": datetime.now(timezone.utc).isoformat()
                 }
-            }
+            },
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count == 0:
+        if not before:
             raise ValueError("Payout not found")
         
-        payout = await self.db.payouts.find_one({"id": payout_id}, {"_id": 0})
+        # Debit / credit back the seller ledger
+        await self.sellers.sync_payout(payout_id)
+        
+        payout = await self.db.payouts.find_one({"id": payout_id}, PAYOUT_PROJECTION)
         return payout
 
 payouts_service = None
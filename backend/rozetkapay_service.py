@@ -11,6 +11,7 @@ import requests
 from typing import Dict, Any, Optional
 from datetime import datetime
 from dotenv import load_dotenv
+from core.metrics import outbound
 
 # Load environment variables from .env file
 load_dotenv()
@@ -89,12 +90,13 @@ class RozetkaPayService:
             logger.info(f"Creating payment for order {external_id}")
             logger.info(f"Payload: {payload}")
             
-            response = requests.post(
-                f"{self.api_url}/api/payments/v1/new",
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
+            with outbound("rozetkapay", "payments.new"):
+                response = requests.post(
+                    f"{self.api_url}/api/payments/v1/new",
+                    json=payload,
+                    headers=headers,
+                    timeout=30
+                )
             
             logger.info(f"Response status: {response.status_code}")
             response.raise_for_status()
@@ -160,11 +162,12 @@ class RozetkaPayService:
         try:
             headers = self._get_auth_headers()
             
-            response = requests.get(
-                f"{self.api_url}/api/payments/v1/info/{payment_id}",
-                headers=headers,
-                timeout=30
-            )
+            with outbound("rozetkapay", "payments.info"):
+                response = requests.get(
+                    f"{self.api_url}/api/payments/v1/info/{payment_id}",
+                    headers=headers,
+                    timeout=30
+                )
             
             response.raise_for_status()
             result = response.json()
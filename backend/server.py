@@ -1,19 +1,40 @@
 from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, Request, BackgroundTasks, UploadFile, File
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 import asyncio
+# before any other local import: registers the Mongo command listener ahead of client creation
+from core.metrics import MetricsMiddleware
 from crm_service import CRMService
+from modules.orders.order_status import status_fields
+from modules.orders import admin_orders
+from modules.orders.seller_orders import SellerOrdersService
+from modules.seo.sitemap_service import get_sitemap_service, file_response, invalidate_sitemap
+from modules.content.homepage import get_homepage_cache, homepage_response, invalidate_homepage
+from modules.reviews.rating_stats import RatingStats
+from modules.products.catalog_cache import get_catalog_cache, invalidate_catalog
+from modules.products.recommender import Recommender, get_recommender
+from modules.products.cards import (
+    CARD_PROJECTION, WITHOUT_CARD, CardsResponse, ProductCards, refresh_cards, refresh_category_cards,
+)
+from modules.analytics.ingest import event_buffer, ensure_event_collections, MAX_BATCH_EVENTS
+from modules.jobs.runtime import job_runtime, jobs_enabled
+from modules.jobs.timers import timer_queue
+from modules.guard.guard_stream import stop_guard_stream
+from modules.media.image_pipeline import ImageRejected, image_pipeline
+from modules.growth.scheduler import arm_abandoned_cart, disarm_abandoned_cart
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -23,6 +44,11 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# AI outputs are cached in db.ai_cache (see ai_service.py)
+from ai_service import ai_service
+ai_service.bind(db)
+seller_orders_svc = SellerOrdersService(db)
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
@@ -842,28 +868,18 @@ async def get_categories(tree: bool = False):
     """
     Get all categories. If tree=true, returns nested structure.
     Otherwise returns flat list.
+    Served from the catalog cache (see modules/products/catalog_cache.py);
+    each category carries product_count and path (ancestor ids, root first).
     """
-    categories = await db.categories.find({}, {"_id": 0}).to_list(1000)
-    for cat in categories:
-        if isinstance(cat.get("created_at"), str):
-            cat["created_at"] = datetime.fromisoformat(cat["created_at"])
-    
-    if not tree:
-        return categories
-    
-    # Build tree structure
-    def build_tree(parent_id=None):
-        result = []
-        for cat in categories:
-            if cat.get("parent_id") == parent_id:
-                cat_copy = dict(cat)
-                children = build_tree(cat["id"])
-                if children:
-                    cat_copy["children"] = children
-                result.append(cat_copy)
-        return result
-    
-    return build_tree(None)
+    catalog = await get_catalog_cache(db).get()
+    return catalog.tree() if tree else catalog.categories
+
+@api_router.get("/brands")
+async def get_brands():
+    """
+    Brands of catalog products with product counts (catalog cache)
+    """
+    return (await get_catalog_cache(db).get()).brands
 
 @api_router.post("/categories", response_model=Category)
 async def create_category(
@@ -874,6 +890,9 @@ async def create_category(
     cat_doc = category.model_dump()
     cat_doc["created_at"] = cat_doc["created_at"].isoformat()
     await db.categories.insert_one(cat_doc)
+    await invalidate_sitemap(db)
+    await invalidate_homepage(db)
+    await invalidate_catalog(db)
     return category
 
 @api_router.put("/categories/{category_id}", response_model=Category)
@@ -894,6 +913,11 @@ async def update_category(
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await invalidate_sitemap(db)
+    await invalidate_homepage(db)
+    await invalidate_catalog(db)
+    # cards carry the category name
+    await refresh_category_cards(db, category_id)
     
     # Return updated category
     updated_category = await db.categories.find_one({"id": category_id}, {"_id": 0})
@@ -911,6 +935,9 @@ async def delete_category(
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await invalidate_sitemap(db)
+    await invalidate_homepage(db)
+    await invalidate_catalog(db)
     
     return {"message": "Category deleted successfully"}
 
@@ -924,13 +951,23 @@ async def get_products(
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     sort_by: Optional[str] = None,
+    include_subcategories: bool = False,
+    view: str = "full",
     skip: int = 0,
     limit: int = 50
 ):
+    """
+    view=card returns compact product cards (see modules/products/cards.py)
+    instead of full product documents
+    """
     query = {"status": "published"}
+    cards = view == "card"
     
     # Build filter query
-    if category_id:
+    if category_id and include_subcategories:
+        catalog = await get_catalog_cache(db).get()
+        query["category_id"] = {"$in": catalog.descendants(category_id)}
+    elif category_id:
         query["category_id"] = category_id
     if seller_id:
         query["seller_id"] = seller_id
@@ -945,7 +982,7 @@ async def get_products(
     if search:
         query["$text"] = {"$search": search}
         # Add text score for sorting by relevance
-        projection = {"_id": 0, "score": {"$meta": "textScore"}}
+        projection = {**(CARD_PROJECTION if cards else {"_id": 0}), "score": {"$meta": "textScore"}}
         
         # Default sort by relevance when searching
         sort_field = [("score", {"$meta": "textScore"})]
@@ -981,12 +1018,11 @@ async def get_products(
         elif sort_by == "rating":
             sort_field = [("rating", -1), ("reviews_count", -1)]
         
-        products = await db.products.find(query, {"_id": 0}).sort(sort_field).skip(skip).limit(limit).to_list(limit)
-    for prod in products:
-        if isinstance(prod.get("created_at"), str):
-            prod["created_at"] = datetime.fromisoformat(prod["created_at"])
-        if isinstance(prod.get("updated_at"), str):
-            prod["updated_at"] = datetime.fromisoformat(prod["updated_at"])
+        products = await db.products.find(query, CARD_PROJECTION if cards else WITHOUT_CARD) \
+            .sort(sort_field).skip(skip).limit(limit).to_list(limit)
+    if cards:
+        return CardsResponse(await ProductCards(db).page(products))
+    # response_model validation reads legacy ISO strings and native datetimes alike
     return products
 
 @api_router.get("/products/search/suggestions")
@@ -1062,10 +1098,11 @@ async def search_stats(search: str):
     category_results = await db.products.aggregate(category_pipeline).to_list(10)
     
     # Enrich with category names
+    catalog = await get_catalog_cache(db).get()
     categories = []
     for cat in category_results:
         if cat["_id"]:
-            category = await db.categories.find_one({"id": cat["_id"]}, {"_id": 0, "name": 1})
+            category = catalog.by_id.get(cat["_id"])
             if category:
                 categories.append({
                     "id": cat["_id"],
@@ -1082,7 +1119,7 @@ async def search_stats(search: str):
 
 @api_router.get("/products/{product_id}", response_model=Product)
 async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    product = await db.products.find_one({"id": product_id}, WITHOUT_CARD)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     if isinstance(product.get("created_at"), str):
@@ -1113,6 +1150,8 @@ async def create_product(
     prod_doc["updated_at"] = prod_doc["updated_at"].isoformat()
     
     await db.products.insert_one(prod_doc)
+    await invalidate_sitemap(db)
+    await refresh_cards(db, [product.id])
     return product
 
 # Seed products for testing (no auth required)
@@ -1164,7 +1203,7 @@ async def seed_products():
         }
     ]
     
-    created = 0
+    created = []
     for prod_data in sample_products:
         # Check if product already exists
         existing = await db.products.find_one({"title": prod_data["title"]})
@@ -1179,9 +1218,12 @@ async def seed_products():
         prod_data["updated_at"] = datetime.now(timezone.utc).isoformat()
         
         await db.products.insert_one(prod_data)
-        created += 1
+        created.append(prod_data["id"])
     
-    return {"message": f"Seeded {created} products", "total": len(sample_products)}
+    if created:
+        await invalidate_sitemap(db)
+        await refresh_cards(db, created)
+    return {"message": f"Seeded {len(created)} products", "total": len(sample_products)}
 
 @api_router.patch("/products/{product_id}", response_model=Product)
 async def update_product(
@@ -1189,7 +1231,7 @@ async def update_product(
     update_data: ProductUpdate,
     current_user: User = Depends(get_current_seller)
 ):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    product = await db.products.find_one({"id": product_id}, WITHOUT_CARD)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -1200,8 +1242,10 @@ async def update_product(
     if update_dict:
         update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
         await db.products.update_one({"id": product_id}, {"$set": update_dict})
+        await invalidate_sitemap(db)
+        await refresh_cards(db, [product_id])
     
-    updated_product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    updated_product = await db.products.find_one({"id": product_id}, WITHOUT_CARD)
     if isinstance(updated_product.get("created_at"), str):
         updated_product["created_at"] = datetime.fromisoformat(updated_product["created_at"])
     if isinstance(updated_product.get("updated_at"), str):
@@ -1221,6 +1265,7 @@ async def delete_product(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     await db.products.delete_one({"id": product_id})
+    await invalidate_sitemap(db)
     return {"message": "Product deleted successfully"}
 
 # ============= REVIEWS ENDPOINTS =============
@@ -1279,16 +1324,21 @@ async def create_review(
     review_doc["created_at"] = review_doc["created_at"].isoformat()
     await db.reviews.insert_one(review_doc)
     
-    # Update product rating
-    all_reviews = await db.reviews.find({"product_id": review_data.product_id}).to_list(1000)
-    avg_rating = sum(r["rating"] for r in all_reviews) / len(all_reviews)
-    await db.products.update_one(
-        {"id": review_data.product_id},
-        {"$set": {"rating": round(avg_rating, 1), "reviews_count": len(all_reviews)}}
-    )
+    # Update product rating counters
+    await RatingStats(db).apply(review_data.product_id, review_data.rating, 1)
     
     return review
 
+@api_router.get("/products/{product_id}/rating")
+async def get_product_rating(product_id: str):
+    """
+    Average rating, review count and star histogram of a product
+    """
+    stats = await RatingStats(db).get(product_id)
+    if not stats:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return stats
+
 # ============= CART ENDPOINTS =============
 
 @api_router.get("/cart", response_model=Cart)
@@ -1313,7 +1363,7 @@ async def add_to_cart(
     item: AddToCartRequest,
     current_user: User = Depends(get_current_user)
 ):
-    product = await db.products.find_one({"id": item.product_id}, {"_id": 0})
+    product = await db.products.find_one({"id": item.product_id}, WITHOUT_CARD)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -1348,6 +1398,7 @@ async def add_to_cart(
         {"$set": cart},
         upsert=True
     )
+    await arm_abandoned_cart(db, current_user.id)
     
     return {"message": "Item added to cart", "cart": cart}
 
@@ -1375,6 +1426,7 @@ async def clear_cart(current_user: User = Depends(get_current_user)):
         {"user_id": current_user.id},
         {"$set": {"items": [], "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    await disarm_abandoned_cart(db, current_user.id)
     return {"message": "Cart cleared"}
 
 # ============= CHECKOUT & ORDERS =============
@@ -1395,7 +1447,7 @@ async def create_checkout_session(
     
     order_items = []
     for item in cart["items"]:
-        product = await db.products.find_one({"id": item["product_id"]}, {"_id": 0})
+        product = await db.products.find_one({"id": item["product_id"]}, WITHOUT_CARD)
         if product:
             order_items.append(OrderItem(
                 product_id=item["product_id"],
@@ -1416,9 +1468,9 @@ async def create_checkout_session(
     )
     
     order_doc = order.model_dump()
-    order_doc["created_at"] = order_doc["created_at"].isoformat()
-    order_doc["updated_at"] = order_doc["updated_at"].isoformat()
+    order_doc.update(status_fields(status=order.status, payment_status=order.payment_status))
     await db.orders.insert_one(order_doc)
+    await seller_orders_svc.sync_order(order.id)
     
     stripe_api_key = os.environ.get('STRIPE_API_KEY')
     host_url = str(request.base_url).rstrip('/')
@@ -1488,12 +1540,12 @@ async def get_checkout_status(session_id: str):
             await db.orders.update_one(
                 {"id": payment["order_id"]},
                 {"$set": {
-                    "payment_status": "paid",
-                    "status": "processing",
+                    **status_fields(status="processing", payment_status="paid"),
                     "payment_method": "stripe",
-                    "updated_at": datetime.now(timezone.utc).isoformat()
+                    "updated_at": datetime.now(timezone.utc)
                 }}
             )
+            await seller_orders_svc.sync_order(payment["order_id"])
             
             order = await db.orders.find_one({"id": payment["order_id"]})
             if order:
@@ -1501,6 +1553,7 @@ async def get_checkout_status(session_id: str):
                     {"user_id": order["buyer_id"]},
                     {"$set": {"items": [], "updated_at": datetime.now(timezone.utc).isoformat()}}
                 )
+                await disarm_abandoned_cart(db, order["buyer_id"])
     
     return status
 
@@ -1547,15 +1600,16 @@ async def create_order(
         
         # Save to database
         order_doc = order.model_dump()
-        order_doc["created_at"] = order_doc["created_at"].isoformat()
-        order_doc["updated_at"] = order_doc["updated_at"].isoformat()
+        order_doc.update(status_fields(status=order.status, payment_status=order.payment_status))
         await db.orders.insert_one(order_doc)
+        await seller_orders_svc.sync_order(order.id)
         
         # Clear cart after successful order creation
         await db.carts.update_one(
             {"user_id": current_user.id},
             {"$set": {"items": []}}
         )
+        await disarm_abandoned_cart(db, current_user.id)
         
         # Send email notifications
         try:
@@ -1578,7 +1632,7 @@ async def create_order(
             
             # Enrich items with product names
             for item in order.items:
-                product = await db.products.find_one({"id": item.get("product_id")}, {"_id": 0})
+                product = await db.products.find_one({"id": item.get("product_id")}, WITHOUT_CARD)
                 email_order_data["items"].append({
                     "product_name": product.get("title", "Unknown") if product else "Unknown",
                     "quantity": item.get("quantity", 0),
@@ -1609,58 +1663,65 @@ async def get_orders(current_user: User = Depends(get_current_user)):
         query = {}
     
     orders = await db.orders.find(query, {"_id": 0}).to_list(1000)
-    for order in orders:
-        if isinstance(order.get("created_at"), str):
-            order["created_at"] = datetime.fromisoformat(order["created_at"])
-        if isinstance(order.get("updated_at"), str):
-            order["updated_at"] = datetime.fromisoformat(order["updated_at"])
     return orders
 
 @api_router.get("/admin/orders")
-async def get_admin_orders(current_user: User = Depends(get_current_admin)):
+async def get_admin_orders(
+    response: Response,
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    buyer_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    q: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_admin)
+):
     """
-    Get all orders with detailed information for admin analytics
+    Orders with customer and product details for admin analytics.
+    Without ?limit= / ?cursor=: all matching orders in stored order, as before.
+    With them: newest first, paged (next page cursor in X-Next-Cursor header).
     """
     try:
-        # Get all orders
-        orders = await db.orders.find({}, {"_id": 0}).to_list(10000)
-        
-        # Enrich with customer information
-        for order in orders:
-            # Get customer info
-            customer = await db.users.find_one({"id": order.get("buyer_id")}, {"_id": 0})
-            if customer:
-                order["customer_name"] = customer.get("full_name", "N/A")
-                order["customer_email"] = customer.get("email", "N/A")
-            else:
-                order["customer_name"] = "Unknown"
-                order["customer_email"] = "N/A"
-            
-            # Enrich items with product details
-            for item in order.get("items", []):
-                product = await db.products.find_one({"id": item.get("product_id")}, {"_id": 0})
-                if product:
-                    item["product_name"] = product.get("title", "Unknown Product")
-                    item["category_name"] = product.get("category_name")
-                    item["price"] = item.get("price", product.get("price", 0))
-            
-            # Handle datetime serialization
-            if isinstance(order.get("created_at"), str):
-                order["created_at"] = order["created_at"]
-            elif hasattr(order.get("created_at"), 'isoformat'):
-                order["created_at"] = order["created_at"].isoformat()
-                
-            if isinstance(order.get("updated_at"), str):
-                order["updated_at"] = order["updated_at"]
-            elif hasattr(order.get("updated_at"), 'isoformat'):
-                order["updated_at"] = order["updated_at"].isoformat()
-        
+        query = admin_orders.build_filter(status, payment_status, buyer_id, date_from, date_to, q)
+        next_cursor = None
+        if limit is None and cursor is None:
+            orders = await admin_orders.fetch_all(db, query)
+        else:
+            orders, next_cursor = await admin_orders.fetch_page(
+                db, query, limit or admin_orders.DEFAULT_LIMIT, cursor
+            )
+        await admin_orders.enrich_orders(db, orders)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         return orders
     except Exception as e:
         logger.error(f"Error fetching admin orders: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@api_router.get("/admin/orders/export")
+async def export_admin_orders(
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    buyer_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    q: Optional[str] = None,
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    Stream all matching orders as a JSON array (enriched page by page)
+    """
+    query = admin_orders.build_filter(status, payment_status, buyer_id, date_from, date_to, q)
+    return StreamingResponse(
+        admin_orders.stream_export(db, query),
+        media_type="application/json",
+        headers={"Content-Disposition": "attachment; filename=orders.json"},
+    )
+
+
 # ============= ADMIN REVIEWS MANAGEMENT =============
 
 @api_router.get("/admin/reviews", response_model=List[ReviewWithProduct])
@@ -1670,16 +1731,23 @@ async def get_all_reviews_admin(current_user: User = Depends(get_current_admin))
     """
     try:
         reviews = await db.reviews.find({}, {"_id": 0}).to_list(10000)
+        if not reviews:
+            return []
+        
+        # One lookup per collection instead of two per review
+        product_ids = list({r.get("product_id") for r in reviews})
+        user_ids = list({r.get("user_id") for r in reviews})
+        products, users = await asyncio.gather(
+            db.products.find({"id": {"$in": product_ids}}, {"_id": 0, "id": 1, "title": 1}).to_list(len(product_ids)),
+            db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "email": 1}).to_list(len(user_ids)),
+        )
+        titles = {p["id"]: p.get("title", "Unknown Product") for p in products}
+        emails = {u["id"]: u.get("email", "N/A") for u in users}
         
         enriched_reviews = []
         for review in reviews:
-            # Get product info
-            product = await db.products.find_one({"id": review.get("product_id")}, {"_id": 0})
-            product_name = product.get("title", "Unknown Product") if product else "Unknown Product"
-            
-            # Get user info
-            user = await db.users.find_one({"id": review.get("user_id")}, {"_id": 0})
-            user_email = user.get("email", "N/A") if user else "N/A"
+            product_name = titles.get(review.get("product_id"), "Unknown Product")
+            user_email = emails.get(review.get("user_id"), "N/A")
             
             # Parse created_at
             created_at = review.get("created_at")
@@ -1716,10 +1784,12 @@ async def delete_review_admin(
     """
     Delete a review (admin only)
     """
-    result = await db.reviews.delete_one({"id": review_id})
+    review = await db.reviews.find_one_and_delete({"id": review_id}, {"_id": 0, "product_id": 1, "rating": 1})
     
-    if result.deleted_count == 0:
+    if not review:
         raise HTTPException(status_code=404, detail="Review not found")
+    await RatingStats(db).apply(review["product_id"], review.get("rating"), -1)
+    await invalidate_homepage(db)
     
     return {"message": "Review deleted successfully"}
 
@@ -1747,6 +1817,7 @@ async def toggle_review_featured(
     
     if result.modified_count == 0:
         raise HTTPException(status_code=400, detail="Failed to update review")
+    await invalidate_homepage(db)
     
     return {
         "message": "Review featured status updated",
@@ -1764,16 +1835,23 @@ async def get_featured_reviews():
             {"featured": True},
             {"_id": 0}
         ).sort("created_at", -1).limit(5).to_list(5)
+        if not reviews:
+            return []
+        
+        # One lookup per collection instead of two per review
+        product_ids = list({r.get("product_id") for r in reviews})
+        user_ids = list({r.get("user_id") for r in reviews})
+        products, users = await asyncio.gather(
+            db.products.find({"id": {"$in": product_ids}}, {"_id": 0, "id": 1, "title": 1}).to_list(len(product_ids)),
+            db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "email": 1}).to_list(len(user_ids)),
+        )
+        titles = {p["id"]: p.get("title", "Unknown Product") for p in products}
+        emails = {u["id"]: u.get("email", "N/A") for u in users}
         
         enriched_reviews = []
         for review in reviews:
-            # Get product info
-            product = await db.products.find_one({"id": review.get("product_id")}, {"_id": 0})
-            product_name = product.get("title", "Unknown Product") if product else "Unknown Product"
-            
-            # Get user info
-            user = await db.users.find_one({"id": review.get("user_id")}, {"_id": 0})
-            user_email = user.get("email", "N/A") if user else "N/A"
+            product_name = titles.get(review.get("product_id"), "Unknown Product")
+            user_email = emails.get(review.get("user_id"), "N/A")
             
             # Parse created_at
             created_at = review.get("created_at")
@@ -1853,7 +1931,7 @@ async def get_order(order_id: str, current_user: User = Depends(get_current_user
 
 @api_router.get("/seller/products", response_model=List[Product])
 async def get_seller_products(current_user: User = Depends(get_current_seller)):
-    products = await db.products.find({"seller_id": current_user.id}, {"_id": 0}).to_list(1000)
+    products = await db.products.find({"seller_id": current_user.id}, WITHOUT_CARD).to_list(1000)
     for prod in products:
         if isinstance(prod.get("created_at"), str):
             prod["created_at"] = datetime.fromisoformat(prod["created_at"])
@@ -1862,40 +1940,28 @@ async def get_seller_products(current_user: User = Depends(get_current_seller)):
     return products
 
 @api_router.get("/seller/orders", response_model=List[Order])
-async def get_seller_orders(current_user: User = Depends(get_current_seller)):
-    orders = await db.orders.find({}, {"_id": 0}).to_list(1000)
-    seller_orders = []
-    
-    for order in orders:
-        if any(item["seller_id"] == current_user.id for item in order.get("items", [])):
-            if isinstance(order.get("created_at"), str):
-                order["created_at"] = datetime.fromisoformat(order["created_at"])
-            if isinstance(order.get("updated_at"), str):
-                order["updated_at"] = datetime.fromisoformat(order["updated_at"])
-            seller_orders.append(order)
-    
-    return seller_orders
+async def get_seller_orders(
+    skip: int = 0,
+    limit: int = 50,
+    current_user: User = Depends(get_current_seller)
+):
+    # One page of the seller's sub-orders, then the orders themselves in one $in
+    limit = max(1, min(limit, 200))
+    subs = await seller_orders_svc.list_for_seller(current_user.id, skip, limit)
+    order_ids = [s["order_id"] for s in subs]
+    orders = await db.orders.find({"id": {"$in": order_ids}}, {"_id": 0}).to_list(len(order_ids))
+    by_id = {o["id"]: o for o in orders}
+    return [by_id[oid] for oid in order_ids if oid in by_id]
 
 @api_router.get("/seller/stats")
 async def get_seller_stats(current_user: User = Depends(get_current_seller)):
-    products = await db.products.find({"seller_id": current_user.id}).to_list(1000)
-    orders = await db.orders.find({}).to_list(1000)
-    
-    total_products = len(products)
-    total_revenue = 0.0
-    total_orders = 0
-    
-    for order in orders:
-        if order.get("payment_status") == "paid":
-            for item in order.get("items", []):
-                if item["seller_id"] == current_user.id:
-                    total_revenue += item["price"] * item["quantity"]
-                    total_orders += 1
+    total_products = await db.products.count_documents({"seller_id": current_user.id})
+    balance = await seller_orders_svc.get_balance(current_user.id)
     
     return {
         "total_products": total_products,
-        "total_revenue": total_revenue,
-        "total_orders": total_orders
+        "total_revenue": round(balance["paid_revenue"], 2),
+        "total_orders": balance["paid_items"]
     }
 
 # ============= AI ENDPOINTS =============
@@ -1903,56 +1969,23 @@ async def get_seller_stats(current_user: User = Depends(get_current_seller)):
 @api_router.post("/ai/generate-description", response_model=AIDescriptionResponse)
 async def generate_product_description(
     request: AIDescriptionRequest,
+    force: bool = False,
     current_user: User = Depends(get_current_seller)
 ):
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
-    
-    api_key = os.environ.get('EMERGENT_LLM_KEY')
-    chat = LlmChat(
-        api_key=api_key,
-        session_id=f"product-desc-{str(uuid.uuid4())}",
-        system_message="You are a professional product description writer for an e-commerce marketplace. Create engaging, SEO-friendly product descriptions."
-    )
-    
-    chat.with_model("openai", "gpt-4o")
-    
-    features_text = "\n".join(request.key_features) if request.key_features else "No specific features provided"
-    
-    prompt = f"""Create a product description for:
-
-Product Title: {request.product_title}
-Category: {request.category}
-Key Features:
-{features_text}
-
-Provide:
-1. A detailed product description (2-3 paragraphs, 150-200 words)
-2. A short description (1 sentence, max 160 characters)
-
-Format your response as JSON with keys: "description" and "short_description"""
-    
-    user_message = UserMessage(text=prompt)
-    response = await chat.send_message(user_message)
-    
+    """
+    Product description (cached per title / category / features; force=true regenerates)
+    """
     try:
-        import json
-        response_text = response.strip()
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0].strip()
-        
-        result = json.loads(response_text)
-        return AIDescriptionResponse(
-            description=result.get("description", response),
-            short_description=result.get("short_description", request.product_title)
-        )
-    except:
-        lines = response.split("\n\n")
-        return AIDescriptionResponse(
-            description=response if len(lines) < 2 else "\n\n".join(lines[:-1]),
-            short_description=lines[-1] if len(lines) > 1 else request.product_title[:160]
+        result, _ = await ai_service.describe(
+            request.product_title, request.category, request.key_features, force=force
         )
+    except ValueError:
+        # unparseable replies are not cached, so a retry asks the model again
+        raise HTTPException(status_code=502, detail="AI_RESPONSE_UNPARSEABLE")
+    return AIDescriptionResponse(
+        description=result.get("description", ""),
+        short_description=result.get("short_description", request.product_title[:160])
+    )
 
 # ============= ADDITIONAL AI ENDPOINTS (SECURE PROXY) =============
 
@@ -1973,54 +2006,10 @@ async def generate_ai_recommendations(request: AIRecommendationsRequest):
     Generate AI product recommendations (SECURE - Backend only)
     """
     try:
-        from emergentintegrations.llm.chat import LlmChat, UserMessage
-        
-        api_key = os.environ.get('EMERGENT_LLM_KEY')
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"recommendations-{str(uuid.uuid4())}",
-            system_message="You are an AI assistant for e-commerce, specializing in personalized product recommendations. Analyze products and suggest the most relevant options."
+        result, _ = await ai_service.recommend(
+            request.product_name, request.category, request.price, request.available_products
         )
         
-        chat.with_model("openai", "gpt-4o")
-        
-        products_context = "\n".join([
-            f"ID: {p.get('id')}, Title: {p.get('title')}, Category: {p.get('category', 'N/A')}, Price: ${p.get('price', 0)}"
-            for p in request.available_products[:20]
-        ])
-        
-        prompt = f"""User is viewing product:
-Title: {request.product_name}
-Category: {request.category}
-Price: ${request.price}
-
-Available products for recommendation:
-{products_context}
-
-Task: Select 3-5 most suitable products for recommendation and explain why.
-
-Respond in JSON format:
-{{
-  "recommendations": [
-    {{
-      "productId": "product id",
-      "reason": "short reason (1 sentence)"
-    }}
-  ]
-}}"""
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        
-        import json
-        response_text = response.strip()
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0].strip()
-        
-        result = json.loads(response_text)
-        
         return AIRecommendationsResponse(
             success=True,
             recommendations=result.get("recommendations", [])
@@ -2048,10 +2037,6 @@ async def ai_chatbot(request: AIChatRequest):
     AI Chatbot for customer support (SECURE - Backend only)
     """
     try:
-        from emergentintegrations.llm.chat import LlmChat, UserMessage
-        
-        api_key = os.environ.get('EMERGENT_LLM_KEY')
-        
         system_context = f"""You are a friendly AI assistant for a Ukrainian marketplace.
 
 Your capabilities:
@@ -2070,14 +2055,6 @@ Rules:
 {f"Cart items: {request.context.get('cartItems')}" if request.context.get('cartItems') else ''}
 {f"User name: {request.context.get('userName')}" if request.context.get('userName') else ''}"""
         
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"chat-{str(uuid.uuid4())}",
-            system_message=system_context
-        )
-        
-        chat.with_model("openai", "gpt-4o")
-        
         last_user_message = None
         for msg in request.messages:
             if msg.get('role') == 'user':
@@ -2090,8 +2067,7 @@ Rules:
                 error="Invalid request"
             )
         
-        user_message = UserMessage(text=last_user_message)
-        response = await chat.send_message(user_message)
+        response, _ = await ai_service.chat(system_context, last_user_message)
         
         return AIChatResponse(
             success=True,
@@ -2120,49 +2096,15 @@ class AISEOResponse(BaseModel):
 @api_router.post("/ai/seo", response_model=AISEOResponse)
 async def generate_seo(
     request: AISEORequest,
+    force: bool = False,
     current_user: User = Depends(get_current_seller)
 ):
     """
     Generate SEO-optimized title and meta description (SECURE - Backend only)
+    Cached per name / category / features; force=true regenerates
     """
     try:
-        from emergentintegrations.llm.chat import LlmChat, UserMessage
-        
-        api_key = os.environ.get('EMERGENT_LLM_KEY')
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"seo-{str(uuid.uuid4())}",
-            system_message="You are an SEO specialist. Create optimized titles and descriptions for products."
-        )
-        
-        chat.with_model("openai", "gpt-4o")
-        
-        features_text = ", ".join(request.features) if request.features else "No specific features"
-        
-        prompt = f"""Create SEO-optimized texts for product:
-
-Product Name: {request.product_name}
-Category: {request.category}
-Features: {features_text}
-
-Respond in JSON format:
-{{
-  "title": "SEO title (up to 60 characters)",
-  "metaDescription": "Meta description (up to 160 characters)",
-  "keywords": ["keyword1", "keyword2"]
-}}"""
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
-        
-        import json
-        response_text = response.strip()
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0].strip()
-        
-        result = json.loads(response_text)
+        result, _ = await ai_service.seo(request.product_name, request.category, request.features, force=force)
         
         return AISEOResponse(
             success=True,
@@ -2281,22 +2223,38 @@ class AnalyticsEvent(BaseModel):
     current_page: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = {}
 
+def _analytics_event_doc(event: AnalyticsEvent) -> dict:
+    now = datetime.now(timezone.utc)
+    event_doc = event.model_dump()
+    event_doc["created_at"] = now.isoformat()
+    event_doc["ts"] = now
+    return event_doc
+
 @api_router.post("/analytics/event")
 async def track_analytics_event(event: AnalyticsEvent):
     """
     Track user analytics event (page views, time spent, interactions)
     """
     try:
-        event_doc = event.model_dump()
-        event_doc["created_at"] = datetime.now(timezone.utc).isoformat()
-        
-        await db.analytics_events.insert_one(event_doc)
-        
-        return {"success": True}
+        accepted = await event_buffer.offer("analytics_events", [_analytics_event_doc(event)])
+        return {"success": accepted == 1}
     except Exception as e:
         logger.error(f"Error tracking analytics event: {str(e)}")
         return {"success": False, "error": str(e)}
 
+@api_router.post("/analytics/events")
+async def track_analytics_events(events: List[AnalyticsEvent]):
+    """
+    Track a batch of analytics events (max 100 per request)
+    """
+    if len(events) > MAX_BATCH_EVENTS:
+        raise HTTPException(status_code=400, detail=f"Up to {MAX_BATCH_EVENTS} events per request")
+    docs = [_analytics_event_doc(e) for e in events]
+    accepted = await event_buffer.offer("analytics_events", docs) if docs else 0
+    if docs and accepted == 0:
+        raise HTTPException(status_code=429, detail="Analytics queue full", headers={"Retry-After": "5"})
+    return {"success": True, "accepted": accepted, "dropped": len(docs) - accepted}
+
 # ============= CONTACT & SUPPORT =============
 
 @api_router.post("/contact/callback")
@@ -2358,7 +2316,6 @@ async def get_order_status_distribution(current_user: User = Depends(get_current
 
 # ============= AI FEATURES =============
 
-from ai_service import ai_service
 from email_service import email_service
 
 class AIGenerateDescriptionRequest(BaseModel):
@@ -2490,69 +2447,32 @@ async def get_product_recommendations(
     limit: int = 5
 ):
     """
-    Get AI-powered product recommendations
-    Based on user history and current product
-    """
-    try:
-        # Get user history (for now, use empty list - can be enhanced later)
-        user_history = []
-        
-        # TODO: Get from user session/cookies if available
-        if False:  # Placeholder for future auth integration
-            # Get user's order history
-            orders = await db.orders.find(
-                {"buyer_id": current_user.id},
-                {"_id": 0}
-            ).limit(20).to_list(20)
-            
-            # Extract products from orders
-            for order in orders:
-                for item in order.get('items', []):
-                    user_history.append({
-                        'title': item.get('title'),
-                        'category': 'Electronics',  # Default category
-                        'id': item.get('product_id')
-                    })
-        
-        # Get current product if provided
-        current_product = None
-        if product_id:
-            product = await db.products.find_one({"id": product_id}, {"_id": 0})
-            if product:
-                current_product = {
-                    'id': product['id'],
-                    'title': product['name'],
-                    'category': product.get('category', 'General')
-                }
-        
-        # Get available products
-        available_products = await db.products.find(
-            {"status": "published"},
-            {"_id": 0, "id": 1, "name": 1, "category": 1, "price": 1}
-        ).limit(50).to_list(50)
-        
-        # Format for AI
-        available_for_ai = [
-            {
-                'id': p['id'],
-                'title': p['name'],
-                'category': p.get('category', 'General'),
-                'price': p.get('price', 0)
-            }
-            for p in available_products
-        ]
-        
-        result = await ai_service.generate_recommendations(
-            user_history=user_history,
-            current_product=current_product,
-            available_products=available_for_ai,
-            limit=limit
-        )
-        
-        return result
-    except Exception as e:
-        logger.error(f"Error in get_product_recommendations: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    Products bought / viewed together with product_id
+    (item-to-item neighbours built offline, popular products as fallback)
+    """
+    limit = max(1, min(limit, 20))
+    fields = {"_id": 0, "id": 1, "title": 1, "slug": 1, "price": 1, "compare_price": 1, "images": 1,
+              "rating": 1, "reviews_count": 1, "category_id": 1}
+    recommender = get_recommender(db)
+    await recommender.refresh()
+    ids, source = recommender.similar(product_id, limit)
+    if ids:
+        docs = await db.products.find(
+            {"id": {"$in": ids}, "status": "published"}, fields
+        ).to_list(len(ids))
+        by_id = {p["id"]: p for p in docs}
+        products = [by_id[i] for i in ids if i in by_id]
+    else:
+        # nothing built yet
+        source = "top_rated"
+        products = await db.products.find({"status": "published"}, fields) \
+            .sort([("reviews_count", -1), ("rating", -1)]).limit(limit).to_list(limit)
+    return {
+        "success": True,
+        "source": source,
+        "data": {"recommendations": [{"product_id": p["id"], "reason": source} for p in products]},
+        "products": products
+    }
 
 # ============= NOVA POSHTA INTEGRATION =============
 
@@ -2585,6 +2505,7 @@ async def get_novaposhta_warehouses(city_ref: str, number: Optional[str] = None)
 # ============= ROZETKAPAY PAYMENT INTEGRATION =============
 
 from rozetkapay_service import rozetkapay_service
+from modules.payments.webhook_inbox import ingest as webhook_ingest, webhook_inbox
 
 class RozetkaPayCreatePaymentRequest(BaseModel):
     external_id: str
@@ -2676,7 +2597,8 @@ async def create_rozetkapay_payment(
 @api_router.post("/payment/rozetkapay/webhook")
 async def rozetkapay_webhook(request: Request):
     """
-    Handle payment webhooks from RozetkaPay
+    Handle payment webhooks from RozetkaPay: verify and queue the callback;
+    the webhook inbox worker applies it (modules/payments/rozetkapay_callbacks)
     """
     try:
         # Get raw body and signature
@@ -2684,8 +2606,6 @@ async def rozetkapay_webhook(request: Request):
         body_str = body.decode('utf-8')
         signature = request.headers.get('X-ROZETKAPAY-SIGNATURE', '')
         
-        logger.info(f"Received webhook from RozetkaPay")
-        
         # Verify signature
         if not rozetkapay_service.verify_webhook_signature(body_str, signature):
             logger.warning("Invalid webhook signature")
@@ -2694,48 +2614,13 @@ async def rozetkapay_webhook(request: Request):
         # Parse payload
         import json
         payload = json.loads(body_str)
-        
-        # Extract payment details
         external_id = payload.get("external_id")
-        payment_id = payload.get("id")
-        is_success = payload.get("is_success")
-        details = payload.get("details", {})
-        status = details.get("status")
         
-        logger.info(f"Webhook for order {external_id}: status={status}, success={is_success}")
+        # Callbacks of one payment are applied in arrival order
+        queued = await webhook_ingest(db, "rozetkapay", payload.get("id") or external_id, payload, body)
+        logger.info(f"RozetkaPay webhook for order {external_id} queued: {queued['id']}")
         
-        # Update order status
-        if external_id:
-            order = await db.orders.find_one({"order_number": external_id})
-            if order:
-                new_status = "paid" if is_success else "payment_failed"
-                await db.orders.update_one(
-                    {"order_number": external_id},
-                    {
-                        "$set": {
-                            "payment_status": new_status,
-                            "payment_session_id": payment_id,
-                            "updated_at": datetime.now(timezone.utc).isoformat()
-                        }
-                    }
-                )
-                logger.info(f"Order {external_id} updated to status: {new_status}")
-        
-        # Update payment transaction
-        await db.payment_transactions.update_one(
-            {"order_id": external_id},
-            {
-                "$set": {
-                    "status": status,
-                    "is_success": is_success,
-                    "webhook_received": True,
-                    "webhook_data": payload,
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }
-            }
-        )
-        
-        return {"status": "processed", "order_id": external_id}
+        return {"status": "queued" if queued["queued"] else "duplicate", "order_id": external_id}
     
     except HTTPException:
         raise
@@ -2763,63 +2648,35 @@ async def get_payment_info(
 @api_router.post("/upload/image")
 async def upload_image(
     file: UploadFile = File(...),
+    kind: str = "slides",
     current_user: User = Depends(get_current_admin)
 ):
     """
     Upload image for slides or other purposes (admin only)
-    Accepts any image format and converts to JPEG for universal compatibility
+    Any image format; stored as thumb / card / full variants in JPEG and WebP.
+    Decoding and resizing run in the image process pool; identical uploads
+    are deduplicated by content hash. `url` is the full-size JPEG, `srcset`
+    the responsive manifest.
     """
+    # Validate file type
+    if not (file.content_type or "").startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+
     try:
-        from PIL import Image
-        import io
-        
-        # Validate file type
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Read file content
         content = await file.read()
-        
-        # Open image with Pillow
-        image = Image.open(io.BytesIO(content))
-        
-        # Convert to RGB if necessary (for JPEG compatibility)
-        if image.mode in ('RGBA', 'LA', 'P'):
-            # Create white background for transparency
-            background = Image.new('RGB', image.size, (255, 255, 255))
-            if image.mode == 'P':
-                image = image.convert('RGBA')
-            background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-            image = background
-        elif image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Generate unique filename (always use .jpg)
-        unique_filename = f"{uuid.uuid4()}.jpg"
-        
-        # Save file to public uploads folder
-        upload_dir = Path("/app/frontend/public/uploads/slides")
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        
-        file_path = upload_dir / unique_filename
-        
-        # Save optimized JPEG
-        image.save(file_path, 'JPEG', quality=85, optimize=True)
-        
-        # Return public URL
-        public_url = f"/uploads/slides/{unique_filename}"
-        
-        return {
-            "url": public_url,
-            "filename": unique_filename,
-            "original_filename": file.filename
-        }
-    except HTTPException:
-        raise
+        manifest = await image_pipeline.ingest(content, kind)
+    except ImageRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error uploading image: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to upload image: {str(e)}")
 
+    return {
+        **manifest,
+        "filename": manifest["url"].split("/", 2)[-1],
+        "original_filename": file.filename,
+    }
+
 # ============= HERO SLIDES MANAGEMENT =============
 
 @api_router.get("/slides", response_model=List[HeroSlide])
@@ -2852,6 +2709,7 @@ async def create_slide(
     slide_dict["updated_at"] = datetime.now(timezone.utc)
     
     await db.hero_slides.insert_one(slide_dict)
+    await invalidate_homepage(db)
     return HeroSlide(**slide_dict)
 
 @api_router.put("/admin/slides/{slide_id}", response_model=HeroSlide)
@@ -2874,6 +2732,7 @@ async def update_slide(
         {"id": slide_id},
         {"$set": update_data}
     )
+    await invalidate_homepage(db)
     
     updated_slide = await db.hero_slides.find_one({"id": slide_id})
     return HeroSlide(**updated_slide)
@@ -2889,6 +2748,7 @@ async def delete_slide(
     result = await db.hero_slides.delete_one({"id": slide_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Slide not found")
+    await invalidate_homepage(db)
     
     return {"message": "Slide deleted successfully"}
 
@@ -3119,11 +2979,12 @@ async def update_order_status(
     
     result = await db.orders.update_one(
         {"id": order_id},
-        {"$set": {"status": status, "updated_at": datetime.now(timezone.utc)}}
+        {"$set": {**status_fields(status=status), "updated_at": datetime.now(timezone.utc)}}
     )
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Order not found")
+    await seller_orders_svc.sync_order(order_id)
     
     # Create note about status change
     order = await db.orders.find_one({"id": order_id}, {"_id": 0})
@@ -3176,6 +3037,7 @@ async def toggle_product_bestseller(
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    await refresh_cards(db, [product_id])
     
     return {"success": True, "product_id": product_id, "is_bestseller": is_bestseller}
 
@@ -3224,6 +3086,7 @@ async def create_promotion(
     promotion_dict["updated_at"] = datetime.now(timezone.utc)
     
     await db.promotions.insert_one(promotion_dict)
+    await invalidate_homepage(db)
     return Promotion(**promotion_dict)
 
 @api_router.put("/admin/promotions/{promotion_id}", response_model=Promotion)
@@ -3245,6 +3108,7 @@ async def update_promotion(
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Promotion not found")
+    await invalidate_homepage(db)
     
     updated_promotion = await db.promotions.find_one({"id": promotion_id}, {"_id": 0})
     return Promotion(**updated_promotion)
@@ -3260,6 +3124,7 @@ async def delete_promotion(
     result = await db.promotions.delete_one({"id": promotion_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Promotion not found")
+    await invalidate_homepage(db)
     
     return {"message": "Promotion deleted successfully"}
 
@@ -3278,6 +3143,7 @@ async def create_popular_category(
     category_dict["created_at"] = datetime.now(timezone.utc)
     
     await db.popular_categories.insert_one(category_dict)
+    await invalidate_homepage(db)
     
     # Return the created category without _id
     created_category = await db.popular_categories.find_one({"id": category_dict["id"]}, {"_id": 0})
@@ -3307,7 +3173,7 @@ async def get_actual_offer(offer_id: str):
     if offer.get("product_ids"):
         products = await db.products.find(
             {"id": {"$in": offer["product_ids"]}},
-            {"_id": 0}
+            WITHOUT_CARD
         ).to_list(100)
         offer["products"] = products
     else:
@@ -3336,6 +3202,7 @@ async def create_actual_offer(
     offer_dict["created_at"] = datetime.now(timezone.utc)
     
     await db.actual_offers.insert_one(offer_dict)
+    await invalidate_homepage(db)
     return ActualOffer(**offer_dict)
 
 @api_router.put("/admin/actual-offers/{offer_id}", response_model=ActualOffer)
@@ -3356,6 +3223,7 @@ async def update_actual_offer(
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Offer not found")
+    await invalidate_homepage(db)
     
     updated_offer = await db.actual_offers.find_one({"id": offer_id}, {"_id": 0})
     return ActualOffer(**updated_offer)
@@ -3371,6 +3239,7 @@ async def delete_actual_offer(
     result = await db.actual_offers.delete_one({"id": offer_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Offer not found")
+    await invalidate_homepage(db)
     
     return {"message": "Actual offer deleted successfully"}
 
@@ -3394,6 +3263,7 @@ async def update_popular_category(
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await invalidate_homepage(db)
     
     updated_category = await db.popular_categories.find_one({"id": category_id}, {"_id": 0})
     return PopularCategory(**updated_category)
@@ -3409,6 +3279,7 @@ async def delete_popular_category(
     result = await db.popular_categories.delete_one({"id": category_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    await invalidate_homepage(db)
     
     return {"message": "Popular category deleted successfully"}
 
@@ -3426,20 +3297,27 @@ async def get_custom_sections():
     return [CustomSection(**section) for section in sections]
 
 @api_router.get("/custom-sections/{slug}")
-async def get_custom_section_by_slug(slug: str):
+async def get_custom_section_by_slug(slug: str, view: str = "full"):
     """
     Get a specific custom section by slug
+    (view=card: compact product cards instead of full products)
     """
     section = await db.custom_sections.find_one({"slug": slug, "active": True}, {"_id": 0})
     if not section:
         raise HTTPException(status_code=404, detail="Section not found")
     
     # Получаем товары для этого раздела
+    if view == "card":
+        docs = await db.products.find(
+            {"id": {"$in": section.get("product_ids") or []}}, CARD_PROJECTION
+        ).to_list(100)
+        return CardsResponse(await ProductCards(db).page(docs), key="products",
+                             extra={"section": jsonable_encoder(CustomSection(**section))})
     products = []
     if section.get("product_ids"):
         products = await db.products.find(
             {"id": {"$in": section["product_ids"]}},
-            {"_id": 0}
+            WITHOUT_CARD
         ).to_list(100)
     
     return {
@@ -3474,6 +3352,7 @@ async def create_custom_section(
     section_dict["updated_at"] = datetime.now(timezone.utc)
     
     await db.custom_sections.insert_one(section_dict)
+    await invalidate_homepage(db)
     return CustomSection(**section_dict)
 
 @api_router.put("/admin/custom-sections/{section_id}", response_model=CustomSection)
@@ -3504,6 +3383,7 @@ async def update_custom_section(
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Section not found")
+    await invalidate_homepage(db)
     
     updated_section = await db.custom_sections.find_one({"id": section_id}, {"_id": 0})
     return CustomSection(**updated_section)
@@ -3519,6 +3399,7 @@ async def delete_custom_section(
     result = await db.custom_sections.delete_one({"id": section_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Section not found")
+    await invalidate_homepage(db)
     
     return {"message": "Custom section deleted successfully"}
 
@@ -3544,6 +3425,7 @@ async def add_product_to_section(
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Section not found or product already in section")
+    await invalidate_homepage(db)
     
     return {"message": "Product added to section successfully"}
 
@@ -3563,64 +3445,50 @@ async def remove_product_from_section(
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Section not found")
+    await invalidate_homepage(db)
     
     return {"message": "Product removed from section successfully"}
 
 
+# ============= HOMEPAGE =============
+
+async def _homepage_slides():
+    return TypeAdapter(List[HeroSlide]).validate_python(await get_active_slides())
+
+HOMEPAGE_BLOCKS = {
+    "slides": _homepage_slides,
+    "promotions": get_promotions,
+    "popular_categories": get_popular_categories,
+    "actual_offers": get_actual_offers,
+    "custom_sections": get_custom_sections,
+    "featured_reviews": get_featured_reviews,
+    "categories": lambda: get_categories(tree=True),
+}
+
+@api_router.get("/homepage", response_class=Response)
+async def get_homepage(request: Request):
+    """
+    All homepage blocks in one response (cached, see modules/content/homepage.py).
+    Each block has the same shape as its own endpoint (/slides, /promotions, ...).
+    """
+    payload = await get_homepage_cache(db).get(HOMEPAGE_BLOCKS)
+    return homepage_response(request, payload)
+
+
 # ============= SEO ENDPOINTS FOR GOOGLE ADS =============
 from fastapi.responses import Response
 
 @api_router.get("/sitemap.xml", response_class=Response)
-async def get_sitemap():
+async def get_sitemap(request: Request):
     """
-    Generate XML sitemap for SEO and Google Ads optimization
+    Sitemap index for SEO and Google Ads optimization (cached, see modules/seo/sitemap_service.py)
     """
     try:
-        # Get all products and categories
-        products = await db.products.find({}, {"_id": 0, "id": 1, "updated_at": 1}).to_list(1000)
-        categories = await db.categories.find({}, {"_id": 0, "id": 1, "updated_at": 1}).to_list(1000)
-        
-        site_url = os.environ.get('SITE_URL', 'https://ystore.ua')
-        
-        # Build sitemap XML
-        xml_content = '<?xml version="1.0" encoding="UTF-8"?>\n'
-        xml_content += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-        
-        # Homepage
-        xml_content += '  <url>\n'
-        xml_content += f'    <loc>{site_url}/</loc>\n'
-        xml_content += '    <changefreq>daily</changefreq>\n'
-        xml_content += '    <priority>1.0</priority>\n'
-        xml_content += '  </url>\n'
-        
-        # Categories
-        for category in categories:
-            xml_content += '  <url>\n'
-            xml_content += f'    <loc>{site_url}/products?category_id={category["id"]}</loc>\n'
-            xml_content += '    <changefreq>weekly</changefreq>\n'
-            xml_content += '    <priority>0.8</priority>\n'
-            xml_content += '  </url>\n'
-        
-        # Products
-        for product in products:
-            last_mod = product.get('updated_at', datetime.now(timezone.utc))
-            if isinstance(last_mod, str):
-                last_mod = datetime.fromisoformat(last_mod.replace('Z', '+00:00'))
-            
-            xml_content += '  <url>\n'
-            xml_content += f'    <loc>{site_url}/product/{product["id"]}</loc>\n'
-            xml_content += f'    <lastmod>{last_mod.strftime("%Y-%m-%d")}</lastmod>\n'
-            xml_content += '    <changefreq>weekly</changefreq>\n'
-            xml_content += '    <priority>0.9</priority>\n'
-            xml_content += '  </url>\n'
-        
-        xml_content += '</urlset>'
-        
-        return Response(content=xml_content, media_type="application/xml")
-    
+        f = await get_sitemap_service(db).get("index")
     except Exception as e:
         logging.error(f"Error generating sitemap: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate sitemap")
+    return file_response(request, f)
 
 
 @api_router.get("/robots.txt", response_class=Response)
@@ -3734,6 +3602,23 @@ from modules.ab.ab_simulator_routes import router as ab_sim_router
 app.include_router(ab_router, prefix="/api/v2/admin", tags=["A/B Tests"])
 app.include_router(ab_sim_router, prefix="/api/v2/admin/ab", tags=["A/B Simulation"])
 
+# Storage migrations (native datetimes)
+from modules.migrations.migration_routes import router as migrations_router
+app.include_router(migrations_router, prefix="/api/v2/admin", tags=["Migrations"])
+
+# Background job runtime status
+from modules.jobs.routes import router as jobs_router
+app.include_router(jobs_router, prefix="/api/v2/admin", tags=["Jobs"])
+
+# Category-wide AI descriptions / SEO (cached, resumable)
+from modules.ai.routes import router as ai_bulk_router
+app.include_router(ai_bulk_router, prefix="/api/v2/admin", tags=["AI Bulk"])
+
+# Metrics (/metrics) and admin profiler
+from modules.ops.profiling.routes import metrics_router, router as profiler_router
+app.include_router(metrics_router)
+app.include_router(profiler_router, prefix="/api/v2/admin", tags=["Profiler"])
+
 # Analytics Module (DIL - Data Intelligence Layer)
 from modules.analytics.routes import router as analytics_router
 app.include_router(analytics_router, tags=["Analytics"])
@@ -3754,6 +3639,9 @@ app.include_router(search_router, tags=["Search V2"])
 from modules.security.middleware import SecurityMiddleware
 app.add_middleware(SecurityMiddleware)
 
+# Route latency / per-request Mongo accounting (wraps SecurityMiddleware, so throttled requests are timed too)
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -3773,6 +3661,10 @@ async def startup_init():
     """Initialize database indexes for production-ready modules"""
     logger.info("🚀 Initializing production-ready indexes...")
     
+    # Analytics: optional time-series layout, buffered ingestion
+    await ensure_event_collections(db)
+    event_buffer.start(db)
+    
     # Analytics indexes
     await db.events.create_index("event")
     await db.events.create_index("ts")
@@ -3831,6 +3723,8 @@ async def startup_init():
     await db.orders.create_index([("phone", 1), ("created_at", -1)])
     await db.orders.create_index([("status", 1), ("payment_status", 1)])
     await db.orders.create_index([("user_id", 1), ("status", 1)])
+    await db.orders.create_index([("status_c", 1), ("created_at", -1)])
+    await db.orders.create_index([("payment_status_c", 1), ("created_at", -1)])
     
     # Growth: Abandoned cart indexes
     await db.carts.create_index([("updated_at", 1), ("converted", 1)])
@@ -3842,23 +3736,46 @@ async def startup_init():
     
     logger.info("✅ Production indexes created")
     
-    # O1+O2: Start background jobs scheduler
+    # Native datetime storage: sync this worker's dual-read flag; the
+    # migration itself runs as the leased datetime_migration job
     try:
-        from modules.jobs.scheduler import start_jobs_scheduler
-        start_jobs_scheduler(db)
-        logger.info("✅ Background jobs scheduler started")
+        from modules.migrations.datetime_migration import DateTimeMigration
+        await DateTimeMigration(db).refresh_dual_read()
+        logger.info("✅ Datetime migration checked")
     except Exception as e:
-        logger.error(f"Failed to start jobs scheduler: {e}")
+        logger.error(f"Datetime migration check failed: {e}")
     
-    # Start Growth Automation scheduler
-    try:
-        from modules.growth.scheduler import start_growth_scheduler
-        start_growth_scheduler(db)
-        logger.info("✅ Growth automation scheduler started")
-    except Exception as e:
-        logger.warning(f"Growth scheduler not started: {e}")
+    # Seller sub-order projection + balance ledger
+    await seller_orders_svc.ensure_indexes()
+    
+    # Review rating counters are rebuilt per product from reviews.product_id
+    await RatingStats(db).ensure_indexes()
+    
+    # AI output cache (TTL on expires_at)
+    await ai_service.ensure_indexes()
+    
+    # Item-to-item recommendations (built by the product_recommendations job)
+    await Recommender(db).ensure_indexes()
+    
+    # O1+O2: Background jobs (incl. growth automation); JOBS_MODE=worker moves
+    # them to `python -m modules.jobs.worker`
+    if jobs_enabled("web"):
+        try:
+            from modules.jobs.scheduler import start_jobs_scheduler
+            start_jobs_scheduler(db)
+            logger.info("✅ Background jobs scheduler started")
+        except Exception as e:
+            logger.error(f"Failed to start jobs scheduler: {e}")
+    else:
+        logger.info("Background jobs disabled in web workers (JOBS_MODE)")
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await event_buffer.stop()
+    await timer_queue.stop()
+    await webhook_inbox.stop()
+    await stop_guard_stream()
+    await job_runtime.shutdown()
+    image_pipeline.shutdown()
     client.close()
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# unit tests import backend modules directly (the HTTP tests only need REACT_APP_BACKEND_URL)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,112 @@
+"""
+Admin orders listing
+Tests: statuses filter on canonical fields; unpaged reads keep stored order;
+keyset pages run newest first and hand out a cursor only for full pages;
+enrichment does one $in lookup per collection
+"""
+import asyncio
+
+from bson import ObjectId
+
+from modules.orders import admin_orders
+
+
+def _oid(n):
+    return ObjectId(format(n, "024x"))
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def sort(self, field, direction):
+        self.rows.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.rows = self.rows[:n]
+        return self
+
+    async def to_list(self, n):
+        return self.rows[:n]
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for r in self.rows:
+            yield r
+
+
+class _Collection:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.queries = []
+
+    def find(self, q, projection=None):
+        self.queries.append(q)
+        rows = []
+        for d in self.docs:
+            if "_id" in q and not d["_id"] < q["_id"]["$lt"]:
+                continue
+            if "id" in q and d["id"] not in q["id"]["$in"]:
+                continue
+            row = dict(d)
+            if projection and projection.get("_id") == 0:
+                row.pop("_id", None)
+            rows.append(row)
+        return _Cursor(rows)
+
+
+class _Db:
+    def __init__(self, orders=(), users=(), products=()):
+        self.orders = _Collection(orders)
+        self.users = _Collection(users)
+        self.products = _Collection(products)
+
+
+def _orders(n):
+    # inserted oldest first, like the orders collection
+    return [{"_id": _oid(i), "id": f"o{i}", "buyer_id": "u1", "items": [{"product_id": "p1"}]}
+            for i in range(1, n + 1)]
+
+
+class TestBuildFilter:
+    def test_statuses_use_canonical_fields(self):
+        q = admin_orders.build_filter(status="cancelled", payment_status="approved")
+        assert q == {"status_c": "CANCELED", "payment_status_c": "PAID"}
+
+
+class TestFetch:
+    def test_fetch_all_keeps_stored_order(self):
+        db = _Db(_orders(3))
+        orders = asyncio.run(admin_orders.fetch_all(db, {}))
+        assert [o["id"] for o in orders] == ["o1", "o2", "o3"]
+        assert "_id" not in orders[0]
+
+    def test_pages_newest_first_with_cursor(self):
+        db = _Db(_orders(5))
+        page, cursor = asyncio.run(admin_orders.fetch_page(db, {}, 2))
+        assert [o["id"] for o in page] == ["o5", "o4"]
+        page, cursor = asyncio.run(admin_orders.fetch_page(db, {}, 2, cursor))
+        assert [o["id"] for o in page] == ["o3", "o2"]
+        page, cursor = asyncio.run(admin_orders.fetch_page(db, {}, 2, cursor))
+        assert [o["id"] for o in page] == ["o1"] and cursor is None
+
+    def test_bad_cursor_starts_over(self):
+        db = _Db(_orders(2))
+        page, _ = asyncio.run(admin_orders.fetch_page(db, {}, 10, "not-an-id"))
+        assert len(page) == 2
+
+
+class TestEnrich:
+    def test_one_lookup_per_collection(self):
+        db = _Db(users=[{"id": "u1", "full_name": "Ann", "email": "a@x"}],
+                 products=[{"id": "p1", "title": "Lamp", "price": 10}])
+        orders = [{"buyer_id": "u1", "items": [{"product_id": "p1"}]},
+                  {"user_id": "u1", "items": [{"product_id": "p1", "price": 8}]}]
+        asyncio.run(admin_orders.enrich_orders(db, orders))
+        assert len(db.users.queries) == 1 and len(db.products.queries) == 1
+        assert orders[1]["customer_name"] == "Ann"
+        assert [o["items"][0]["price"] for o in orders] == [10, 8]
+        assert orders[0]["items"][0]["product_name"] == "Lamp"
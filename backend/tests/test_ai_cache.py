@@ -0,0 +1,249 @@
+"""
+AI output cache and bulk generation
+Tests: complete() serves stored outputs until they expire or force is set,
+shares identical in-flight calls and never caches unparseable JSON; a bulk
+job records every product once, reuses cached texts on a re-run, skips
+products that already have them and retries failures on resume
+"""
+import asyncio
+import os
+from datetime import timedelta
+
+import pytest
+
+# the module-level AIService needs a key or the stand-in
+os.environ.setdefault("LLM_STANDIN", "1")
+
+from ai_service import AIService  # noqa: E402
+from core.dates import utcnow  # noqa: E402
+from llm_local import LocalLLMStandIn  # noqa: E402
+from modules.ai import bulk  # noqa: E402
+from modules.ai.bulk import AIBulkService  # noqa: E402
+from modules.products.catalog_cache import CatalogSnapshot  # noqa: E402
+
+
+def _match(doc, q):
+    for k, v in q.items():
+        value = doc.get(k)
+        if isinstance(v, dict):
+            if "$in" in v and value not in v["$in"]:
+                return False
+            if "$gt" in v and not (value is not None and value > v["$gt"]):
+                return False
+        elif value != v:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def sort(self, field, direction):
+        self.rows.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def skip(self, n):
+        self.rows = self.rows[n:]
+        return self
+
+    def limit(self, n):
+        self.rows = self.rows[:n] if n else self.rows
+        return self
+
+    async def to_list(self, n):
+        return self.rows
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for r in self.rows:
+            yield r
+
+
+class _Result:
+    modified_count = 1
+
+
+class _Collection:
+    def __init__(self, docs=()):
+        self.docs = [dict(d) for d in docs]
+        self.updates = []
+
+    def find(self, q, projection=None):
+        return _Cursor([dict(d) for d in self.docs if _match(d, q)])
+
+    async def find_one(self, q, projection=None):
+        return next((dict(d) for d in self.docs if _match(d, q)), None)
+
+    async def find_one_and_update(self, q, update, projection=None, return_document=None):
+        doc = next((d for d in self.docs if _match(d, q)), None)
+        if doc is None:
+            return None
+        doc.update(update.get("$set", {}))
+        for k, n in update.get("$inc", {}).items():
+            doc[k] = doc.get(k, 0) + n
+        return dict(doc)
+
+    async def update_one(self, q, update, upsert=False):
+        self.updates.append((q, update))
+        await self.find_one_and_update(q, update)
+        return _Result()
+
+    async def replace_one(self, q, doc, upsert=False):
+        self.docs = [d for d in self.docs if not _match(d, q)] + [{**q, **doc}]
+
+    async def bulk_write(self, ops, ordered=True):
+        for flt, doc in ops:
+            await self.replace_one(flt, doc)
+
+    async def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+    async def create_index(self, *a, **k):
+        pass
+
+    async def count_documents(self, q):
+        return len([d for d in self.docs if _match(d, q)])
+
+
+class _Db(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+def _service(fail_every=0):
+    svc = AIService()
+    svc.standin = LocalLLMStandIn(latency_ms=0, fail_every=fail_every)
+    db = _Db(ai_cache=_Collection())
+    svc.bind(db)
+    return svc, db
+
+
+class TestComplete:
+    def test_cached_until_forced(self):
+        svc, db = _service()
+        out, cached = asyncio.run(svc.describe("Lamp", "Lighting"))
+        assert cached is False and "Lamp" in out["description"]
+        again, cached = asyncio.run(svc.describe("Lamp", "Lighting"))
+        assert cached is True and again == out
+        _, cached = asyncio.run(svc.describe("Lamp", "Lighting", force=True))
+        assert cached is False
+        assert svc.standin.calls == 2 and len(db.ai_cache.docs) == 1
+
+    def test_expired_entry_not_served(self):
+        svc, db = _service()
+        asyncio.run(svc.chat("system", "hello"))
+        assert "expires_at" in db.ai_cache.docs[0]
+        db.ai_cache.docs[0]["expires_at"] = utcnow() - timedelta(seconds=1)
+        _, cached = asyncio.run(svc.chat("system", "hello"))
+        assert cached is False and svc.standin.calls == 2
+
+    def test_generated_texts_do_not_expire(self):
+        svc, db = _service()
+        asyncio.run(svc.describe("Lamp", "Lighting"))
+        assert "expires_at" not in db.ai_cache.docs[0]
+
+    def test_concurrent_calls_share_request(self):
+        svc, _ = _service()
+        svc.standin.latency = 0.01
+
+        async def both():
+            return await asyncio.gather(svc.chat("s", "hi"), svc.chat("s", "hi"))
+
+        (a, a_cached), (b, b_cached) = asyncio.run(both())
+        assert a == b and sorted([a_cached, b_cached]) == [False, True]
+        assert svc.standin.calls == 1
+
+    def test_unparseable_json_not_cached(self):
+        svc, db = _service()
+        with pytest.raises(ValueError):
+            asyncio.run(svc.complete("chat", "s", "hi", parse_json=True))
+        assert db.ai_cache.docs == []
+
+
+class _AI:
+    """describe/seo double; titles in `failing` raise until cleared"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.seen = {}
+
+    async def ensure_indexes(self):
+        pass
+
+    async def describe(self, title, category, features, force=False):
+        if title in self.failing:
+            raise RuntimeError("provider error")
+        cached = title in self.seen and not force
+        self.seen[title] = True
+        return {"description": f"{title} in {category}", "short_description": title}, cached
+
+    async def seo(self, title, category, features, force=False):
+        return {"title": title, "metaDescription": title, "keywords": []}, False
+
+
+class _Catalog:
+    def __init__(self):
+        self.snap = CatalogSnapshot([{"id": "c1", "name": "Lamps", "parent_id": None}], {}, {}, [])
+
+    async def get(self):
+        return self.snap
+
+
+@pytest.fixture(autouse=True)
+def fake_ops(monkeypatch):
+    monkeypatch.setattr(bulk, "ReplaceOne", lambda flt, doc, upsert=False: (flt, doc))
+    monkeypatch.setattr(bulk, "get_catalog_cache", lambda db: _Catalog())
+    monkeypatch.setattr(bulk, "PAGE_SIZE", 2)
+
+
+def _job(job_id="j1", **options):
+    return {"id": job_id, "status": "QUEUED", "category_ids": ["c1"], "concurrency": 2,
+            "options": {"tasks": ["description"], "apply": False, "only_missing": True, "force": False,
+                        "limit": None, **options},
+            "total": 5, "done": 0, "generated": 0, "cached": 0, "skipped": 0, "failed": 0, "last_id": None}
+
+
+def _bulk(jobs, ai, products=None):
+    products = products or [{"_id": i, "id": f"p{i}", "title": f"T{i}", "category_id": "c1"} for i in range(1, 6)]
+    db = _Db(ai_bulk_jobs=_Collection(jobs), ai_bulk_items=_Collection(), products=_Collection(products))
+    return AIBulkService(db, ai=ai), db
+
+
+class TestBulkJob:
+    def test_runs_every_product_once(self):
+        svc, db = _bulk([_job()], _AI())
+        job = asyncio.run(svc.run("j1"))
+        assert job["status"] == "DONE"
+        assert (job["done"], job["generated"], job["failed"]) == (5, 5, 0)
+        assert sorted(i["product_id"] for i in db.ai_bulk_items.docs) == ["p1", "p2", "p3", "p4", "p5"]
+        assert db.products.updates == []  # apply=False: texts kept for review only
+
+    def test_rerun_uses_cache_and_skips_filled(self):
+        ai = _AI()
+        products = [{"_id": 1, "id": "p1", "title": "T1", "category_id": "c1"},
+                    {"_id": 2, "id": "p2", "title": "T2", "category_id": "c1", "short_description": "done"}]
+        svc, db = _bulk([_job("j1"), _job("j2", apply=True)], ai, products)
+        asyncio.run(svc.run("j1"))
+        job = asyncio.run(svc.run("j2"))
+        assert (job["cached"], job["skipped"], job["generated"]) == (1, 1, 0)
+        assert db.products.updates[0][0] == {"id": "p1"}
+
+    def test_failed_products_retried_on_resume(self):
+        ai = _AI(failing={"T2"})
+        svc, db = _bulk([_job()], ai)
+        job = asyncio.run(svc.run("j1"))
+        assert job["failed"] == 1 and job["failed_items"][0]["product_id"] == "p2"
+
+        ai.failing.clear()
+        db.ai_bulk_jobs.docs[0]["status"] = "QUEUED"
+        job = asyncio.run(svc.run("j1"))
+        assert (job["done"], job["generated"], job["failed"]) == (5, 5, 0)
+        assert len(db.ai_bulk_items.docs) == 5
+
+    def test_limit(self):
+        svc, db = _bulk([_job(limit=3)], _AI())
+        job = asyncio.run(svc.run("j1"))
+        assert job["done"] == 3 and len(db.ai_bulk_items.docs) == 3
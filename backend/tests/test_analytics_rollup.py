@@ -0,0 +1,158 @@
+"""
+Analytics rollups
+Tests: site events fold into per-day counters (page flows continue across
+runs through analytics_sessions); the (ts, _id) watermark skips processed
+and too-recent events
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from modules.analytics import rollup
+from modules.analytics.rollup import AnalyticsRollupJob, _Acc
+
+
+@pytest.fixture(autouse=True)
+def plain_ops(monkeypatch):
+    monkeypatch.setattr(rollup, "UpdateOne", lambda flt, upd, upsert=False: (flt, upd))
+
+
+DAY = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def sort(self, keys):
+        self.rows.sort(key=lambda d: (d["ts"], d["_id"]))
+        return self
+
+    def limit(self, n):
+        self.rows = self.rows[:n]
+        return self
+
+    async def to_list(self, n):
+        return self.rows
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for r in self.rows:
+            yield r
+
+
+def _match(d, q):
+    for k, v in q.items():
+        if k == "$or":
+            if not any(_match(d, alt) for alt in v):
+                return False
+        elif k == "session_id" and isinstance(v, dict):
+            if d.get(k) not in v["$in"]:
+                return False
+        elif isinstance(v, dict):
+            if "$lt" in v and not d[k] < v["$lt"]:
+                return False
+            if "$gt" in v and not d[k] > v["$gt"]:
+                return False
+        elif d.get(k) != v:
+            return False
+    return True
+
+
+class _Collection:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.ops = []
+
+    def find(self, q, projection=None):
+        return _Cursor([dict(d) for d in self.docs if _match(d, q)])
+
+    async def find_one(self, q, projection=None):
+        return next((dict(d) for d in self.docs if d.get("_id") == q.get("_id")), None)
+
+    async def update_one(self, q, update, upsert=False):
+        doc = next((d for d in self.docs if d.get("_id") == q["_id"]), None)
+        if doc is None:
+            doc = {"_id": q["_id"]}
+            self.docs.append(doc)
+        doc.update(update.get("$set", {}))
+
+    async def bulk_write(self, ops, ordered=True):
+        self.ops.extend(ops)
+        for flt, upd in ops:
+            if "session_id" in flt:
+                self.docs = [d for d in self.docs if d.get("session_id") != flt["session_id"]]
+                self.docs.append({**flt, **upd["$set"]})
+
+
+class _Db(dict):
+    def __missing__(self, name):
+        self[name] = _Collection()
+        return self[name]
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+def _incs(col):
+    out = {}
+    for flt, upd in col.ops:
+        key = (flt["kind"], flt["day"], flt["key"])
+        for f, v in upd["$inc"].items():
+            out[(*key, f)] = out.get((*key, f), 0) + v
+    return out
+
+
+class TestAcc:
+    def test_merges_increments_and_minmax(self):
+        acc = _Acc()
+        acc.inc("page", "2026-03-01", "/a", leaves=1)
+        acc.inc("page", "2026-03-01", "/a", leaves=1, time_n=1)
+        acc.minmax("page", "2026-03-01", "/a", "time", 5)
+        acc.minmax("page", "2026-03-01", "/a", "time", 2)
+        (flt, upd), = acc.ops()
+        assert flt == {"kind": "page", "day": "2026-03-01", "key": "/a"}
+        assert upd == {"$inc": {"leaves": 2, "time_n": 1}, "$min": {"time_min": 2}, "$max": {"time_max": 5}}
+
+
+class TestFoldSite:
+    def test_counters_and_cross_run_flow(self):
+        db = _Db(analytics_sessions=_Collection([{"session_id": "s1", "last_page": "/home"}]))
+        docs = [
+            {"ts": DAY, "event_type": "page_view", "session_id": "s1", "page_path": "/cat", "user_id": "u1"},
+            {"ts": DAY, "event_type": "page_view", "session_id": "s1", "page_path": "/p1"},
+            {"ts": DAY, "event_type": "session_end", "session_duration": 30, "pages_viewed": 1},
+            {"ts": DAY, "event_type": "page_leave", "page_path": "/p1", "time_spent": 12},
+            {"ts": DAY, "event_type": "add_to_cart", "product_id": "p1"},
+        ]
+        acc = _Acc()
+        asyncio.run(AnalyticsRollupJob(db)._fold_site(docs, acc))
+        db.analytics_rollups.ops = acc.ops()
+        incs = _incs(db.analytics_rollups)
+        day = "2026-03-01"
+        assert incs[("page_views", day, "", "n")] == 2
+        assert incs[("visitor", day, "u1", "n")] == 1
+        assert incs[("flow", day, "/home → /cat", "n")] == 1
+        assert incs[("flow", day, "/cat → /p1", "n")] == 1
+        assert incs[("sessions", day, "", "bounced")] == 1
+        assert incs[("page", day, "/p1", "time_sum")] == 12
+        assert incs[("cart", day, "p1", "n")] == 1
+        assert db.analytics_sessions.docs[0]["last_page"] == "/p1"
+
+
+class TestWatermark:
+    def test_processes_each_event_once_and_skips_recent(self):
+        now = datetime.now(timezone.utc)
+        events = [
+            {"_id": 1, "ts": now - timedelta(hours=2), "event": "view_product"},
+            {"_id": 2, "ts": now - timedelta(hours=1), "event": "add_to_cart"},
+            {"_id": 3, "ts": now, "event": "checkout"},  # inside LAG_SEC
+        ]
+        db = _Db(events=_Collection(events))
+        job = AnalyticsRollupJob(db)
+        assert asyncio.run(job._run_source("events"))["processed"] == 2
+        assert asyncio.run(job._run_source("events"))["processed"] == 0
+        assert {k[2] for k in _incs(db.analytics_rollups)} == {"view_product", "add_to_cart"}
@@ -0,0 +1,81 @@
+"""
+Benchmark suite
+Tests: percentiles interpolate like numpy; summaries report ms and ops/s;
+baseline comparison flags p95, throughput and new errors past tolerance;
+the seeded data set is deterministic and never written over real data
+"""
+import asyncio
+import random
+
+import pytest
+
+from bench import seed as bench_seed
+from bench.stats import compare, percentile, summarize
+
+
+class TestStats:
+    def test_percentile_interpolates(self):
+        s = [1.0, 2.0, 3.0, 4.0]
+        assert percentile(s, 50) == 2.5
+        assert percentile(s, 0) == 1.0 and percentile(s, 100) == 4.0
+        assert percentile([], 95) == 0.0
+
+    def test_summarize(self):
+        out = summarize([0.002, 0.001, 0.003, 0.004], wall_seconds=2.0, errors=1)
+        assert out["count"] == 4 and out["errors"] == 1
+        assert out["ops_s"] == 2.0
+        assert out["p50_ms"] == 2.5 and out["max_ms"] == 4.0 and out["mean_ms"] == 2.5
+
+    def test_summarize_empty(self):
+        out = summarize([], wall_seconds=0)
+        assert out["ops_s"] == 0.0 and out["p95_ms"] == 0.0
+
+
+class TestCompare:
+    BASE = {"catalog": {"count": 10, "p95_ms": 10.0, "ops_s": 100.0, "errors": 0}}
+
+    def test_within_tolerance(self):
+        cur = {"catalog": {"count": 10, "p95_ms": 11.9, "ops_s": 81.0, "errors": 0}}
+        assert compare(cur, self.BASE) == []
+
+    def test_regressions(self):
+        cur = {"catalog": {"count": 10, "p95_ms": 12.5, "ops_s": 70.0, "errors": 2}}
+        assert [r["metric"] for r in compare(cur, self.BASE)] == ["p95_ms", "ops_s", "errors"]
+
+    def test_new_or_empty_scenarios_skipped(self):
+        cur = {"other": {"count": 10, "p95_ms": 99.0, "ops_s": 1.0},
+               "catalog": {"count": 0, "p95_ms": 0.0, "ops_s": 0.0}}
+        assert compare(cur, self.BASE) == []
+
+
+class _Collection:
+    def __init__(self, count=0):
+        self.count = count
+
+    async def find_one(self, q):
+        return None
+
+    async def estimated_document_count(self):
+        return self.count
+
+
+class _Db(dict):
+    name = "prod"
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+class TestSeed:
+    def test_deterministic(self):
+        def orders():
+            payments = []
+            docs = list(bench_seed._orders(random.Random(bench_seed.SEED), 50, 20, 10, payments))
+            return [(d["id"], d["buyer_id"], d["total"], d["status_c"]) for d in docs], len(payments)
+
+        assert orders() == orders()
+
+    def test_refuses_foreign_data(self):
+        db = _Db(bench_meta=_Collection(), products=_Collection(count=5))
+        with pytest.raises(RuntimeError):
+            asyncio.run(bench_seed.seed(db))
@@ -0,0 +1,135 @@
+"""
+Catalog dimension cache
+Tests: the snapshot carries counts, ancestor paths and a tree with orphans
+as roots; subtree expansion; listings join names with one lookup for
+unknown sellers; the snapshot is reused until the shared version changes
+"""
+import asyncio
+
+import pytest
+
+from modules.products import catalog_cache
+from modules.products.catalog_cache import CatalogCache, CatalogSnapshot
+
+
+def _categories():
+    return [
+        {"id": "el", "name": "Electronics", "parent_id": None, "created_at": "2026-01-01T00:00:00+00:00"},
+        {"id": "lap", "name": "Laptops", "parent_id": "el"},
+        {"id": "gam", "name": "Gaming laptops", "parent_id": "lap"},
+        {"id": "orph", "name": "Orphan", "parent_id": "deleted"},
+    ]
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def to_list(self, n):
+        return list(self.rows)
+
+
+class _Collection:
+    def __init__(self, docs=(), pipelines=None):
+        self.docs = list(docs)
+        self.pipelines = pipelines or []
+        self.finds = []
+
+    def find(self, q, projection=None):
+        self.finds.append(q)
+        if "id" in q:
+            return _Cursor([d for d in self.docs if d["id"] in q["id"]["$in"]])
+        if "role" in q:
+            return _Cursor([d for d in self.docs if d.get("role") in q["role"]["$in"]])
+        return _Cursor(self.docs)
+
+    def aggregate(self, pipeline):
+        # counts pipeline first, brands pipeline second
+        return _Cursor(self.pipelines[0 if "$group" in pipeline[0] else 1])
+
+
+class _State:
+    def __init__(self):
+        self.version = 0
+
+    async def find_one(self, q, projection=None):
+        return {"version": self.version}
+
+    async def update_one(self, q, update, upsert=False):
+        self.version += update["$inc"]["version"]
+
+
+class _Db(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+def _db():
+    return _Db(
+        catalog_state=_State(),
+        categories=_Collection(_categories()),
+        products=_Collection(pipelines=[[{"_id": "gam", "n": 3}, {"_id": None, "n": 9}],
+                                        [{"_id": "Asus", "count": 3}]]),
+        users=_Collection([{"id": "s1", "full_name": "Shop", "role": "seller"},
+                           {"id": "s2", "full_name": "Late shop", "role": "customer"}]),
+    )
+
+
+@pytest.fixture
+def no_version_window(monkeypatch):
+    monkeypatch.setattr(catalog_cache, "VERSION_CHECK_SEC", 0)
+
+
+class TestSnapshot:
+    def test_paths_counts_and_tree(self):
+        snap = CatalogSnapshot(_categories(), {"gam": 3}, {}, [])
+        assert snap.by_id["gam"]["path"] == ["el", "lap", "gam"]
+        assert snap.by_id["gam"]["product_count"] == 3 and snap.by_id["el"]["product_count"] == 0
+        assert [c["id"] for c in snap.tree()] == ["el", "orph"]
+        assert "children" not in snap.tree()[1]
+        assert snap.tree(keep_empty=True)[1]["children"] == []
+        assert snap.tree()[0]["children"][0]["children"][0]["id"] == "gam"
+
+    def test_descendants(self):
+        snap = CatalogSnapshot(_categories(), {}, {}, [])
+        assert sorted(snap.descendants("el")) == ["el", "gam", "lap"]
+        assert snap.descendants("gam") == ["gam"]
+        assert snap.descendants("missing") == ["missing"]
+
+
+class TestCache:
+    def test_enrich_joins_names(self):
+        db = _db()
+        cache = CatalogCache(db)
+        products = [{"category_id": "gam", "seller_id": "s1"},
+                    {"category_id": "gone", "seller_id": "s2"}]
+        asyncio.run(cache.enrich(products))
+        assert products[0] == {"category_id": "gam", "seller_id": "s1",
+                               "category_name": "Gaming laptops", "seller_name": "Shop"}
+        assert products[1]["category_name"] is None and products[1]["seller_name"] == "Late shop"
+        # snapshot load + one $in lookup for the seller it did not know
+        assert db.users.finds[1] == {"id": {"$in": ["s2"]}}
+
+        asyncio.run(cache.enrich([{"seller_id": "s2"}]))
+        assert len(db.users.finds) == 2
+
+    def test_brands(self):
+        snap = asyncio.run(CatalogCache(_db()).get())
+        assert snap.brands == [{"name": "Asus", "count": 3}]
+
+    def test_reloaded_on_version_change(self, no_version_window):
+        db = _db()
+        cache = CatalogCache(db)
+        first = asyncio.run(cache.get())
+        assert asyncio.run(cache.get()) is first
+
+        db.catalog_state.version += 1  # a category write in another worker
+        assert asyncio.run(cache.get()) is not first
+
+    def test_invalidate_drops_snapshot(self):
+        db = _db()
+        cache = CatalogCache(db)
+        first = asyncio.run(cache.get())
+        asyncio.run(cache.invalidate())
+        assert db.catalog_state.version == 1
+        assert asyncio.run(cache.get()) is not first
@@ -0,0 +1,143 @@
+"""
+Incremental analytics_daily builder
+Tests: per-order facts (canonical status fallback), fact diffs -> day deltas,
+seeding of recent days on the first run
+"""
+import asyncio
+from datetime import datetime, timezone
+
+from modules.analytics_intel.daily_builder import SEED_DAYS, STATE_ID, DailyBuilder, order_fact
+
+CREATED = datetime(2025, 3, 1, 10, 30, tzinfo=timezone.utc)
+
+
+def _order(**kw):
+    return {"id": "o1", "created_at": CREATED, "total_amount": 100.0, **kw}
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for d in self.docs:
+            yield d
+
+
+class _Facts:
+    def __init__(self, docs):
+        self.docs = {d["_id"]: d for d in docs}
+
+    def find(self, q):
+        return _Cursor([self.docs[i] for i in q["_id"]["$in"] if i in self.docs])
+
+
+class _DB(dict):
+    def __missing__(self, name):
+        return None
+
+
+def _builder(facts=()):
+    db = _DB(analytics_order_facts=_Facts(list(facts)))
+    return DailyBuilder(db)
+
+
+class TestOrderFact:
+    """Counters an order contributes to its creation day"""
+
+    def test_paid_order(self):
+        day, v = order_fact(_order(status="PAID", status_c="PAID", payment_status_c="PAID"))
+        assert day == "2025-03-01"
+        assert v["orders"] == 1 and v["revenue"] == 100.0 and v["paid"] == 1
+
+    def test_legacy_string_created_at(self):
+        day, _ = order_fact(_order(created_at="2025-03-01T23:59:00+00:00", status="NEW"))
+        assert day == "2025-03-01"
+
+    def test_raw_status_wins_over_stale_status_c(self):
+        # a writer set status without status_fields: status_c still says AWAITING_PAYMENT
+        day, v = order_fact(_order(status="shipped", status_c="AWAITING_PAYMENT"))
+        assert v["revenue"] == 100.0
+        assert v["shipped"] == 1 and v["awaiting_payment"] == 0
+
+    def test_status_c_used_when_raw_unknown(self):
+        _, v = order_fact(_order(status="custom", status_c="PROCESSING"))
+        assert v["processing"] == 1 and v["revenue"] == 100.0
+
+    def test_raw_payment_status_wins(self):
+        _, v = order_fact(_order(status="NEW", payment_status="paid", payment_status_c="PENDING"))
+        assert v["paid"] == 1
+
+    def test_cancels_and_returns(self):
+        assert order_fact(_order(status="cancelled"))[1]["cancels"] == 1
+        _, v = order_fact(_order(status="returned", status_c="DELIVERED"))
+        assert v["returns"] == 1 and v["revenue"] == 0 and v["delivered"] == 0
+
+    def test_skips_orders_without_id_or_date(self):
+        assert order_fact({"created_at": CREATED}) is None
+        assert order_fact({"id": "o1", "created_at": "garbage"}) is None
+
+
+class TestDiff:
+    """Only changed facts are written; deltas move counters between states"""
+
+    def test_new_order(self):
+        ops, deltas = asyncio.run(_builder()._diff([_order(status="PAID")]))
+        assert len(ops) == 1
+        assert list(deltas) == ["2025-03-01"]
+        assert deltas["2025-03-01"]["orders"] == 1 and deltas["2025-03-01"]["revenue"] == 100.0
+
+    def test_unchanged_fact_is_skipped(self):
+        day, v = order_fact(_order(status="PAID"))
+        ops, deltas = asyncio.run(_builder([{"_id": "o1", "day": day, "v": v}])._diff([_order(status="PAID")]))
+        assert ops == [] and deltas == {}
+
+    def test_status_change_moves_counters(self):
+        day, v = order_fact(_order(status="AWAITING_PAYMENT"))
+        builder = _builder([{"_id": "o1", "day": day, "v": v}])
+        ops, deltas = asyncio.run(builder._diff([_order(status="PAID")]))
+        assert len(ops) == 1
+        d = deltas["2025-03-01"]
+        assert d["orders"] == 0 and d["revenue"] == 100.0 and d["awaiting_payment"] == -1
+
+    def test_missing_fact_before_seed_is_already_counted(self):
+        # order from before the builder existed: its row counted it, it has no fact
+        ops, deltas = asyncio.run(_builder()._diff([_order(status="PAID")], seed_day="2025-03-02"))
+        assert len(ops) == 1 and deltas == {}
+
+    def test_missing_fact_from_seed_on_is_new(self):
+        ops, deltas = asyncio.run(_builder()._diff([_order(status="PAID")], seed_day="2025-03-01"))
+        assert len(ops) == 1 and deltas["2025-03-01"]["orders"] == 1
+
+
+class _State:
+    def __init__(self, doc=None):
+        self.doc = doc
+
+    async def find_one(self, q):
+        return self.doc
+
+    async def update_one(self, q, update, upsert=False):
+        self.doc = {**(self.doc or {"_id": q["_id"]}), **update["$set"]}
+
+
+class TestFirstRun:
+    """The first run seeds facts and rows for the recent days, not only today"""
+
+    def test_seeds_recent_days(self):
+        builder = _builder()
+        builder.state = _State()
+        rebuilt = []
+
+        async def rebuild_day(day, with_risk=False):
+            rebuilt.append(day.date().isoformat())
+            return {"day": day.date().isoformat(), "ok": True}
+
+        builder.rebuild_day = rebuild_day
+        res = asyncio.run(builder.run_once())
+        assert res["seeded"] and len(set(rebuilt)) == SEED_DAYS
+        assert builder.state.doc["_id"] == STATE_ID
+        assert builder.state.doc["seed_day"] == min(rebuilt)
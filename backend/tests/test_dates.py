@@ -0,0 +1,70 @@
+"""
+Date storage helpers
+Tests: legacy string / native reads, dual-read range fragments
+"""
+from datetime import date, datetime, timezone
+
+import pytest
+
+from core import dates
+from core.dates import as_datetime, date_range
+
+
+@pytest.fixture
+def dual_read():
+    prev = dates.is_dual_read()
+    yield dates.set_dual_read
+    dates.set_dual_read(prev)
+
+
+class TestAsDatetime:
+    """Stored timestamps read back as aware UTC datetimes"""
+
+    def test_naive_and_aware(self):
+        naive = datetime(2025, 3, 1, 12, 0)
+        assert as_datetime(naive) == datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+        aware = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+        assert as_datetime(aware) is aware
+
+    def test_legacy_strings(self):
+        assert as_datetime("2025-03-01T12:00:00Z") == datetime(2025, 3, 1, 12, tzinfo=timezone.utc)
+        assert as_datetime("2025-03-01T12:00:00") == datetime(2025, 3, 1, 12, tzinfo=timezone.utc)
+        assert as_datetime(date(2025, 3, 1)) == datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+    def test_empty_and_garbage(self):
+        assert as_datetime(None) is None
+        assert as_datetime("") is None
+        assert as_datetime("not a date") is None
+        assert as_datetime(42) is None
+
+
+class TestDateRange:
+    """Range fragments match native and, while dual-read is on, legacy strings"""
+
+    def test_native_only(self, dual_read):
+        dual_read(False)
+        start = datetime(2025, 3, 1, tzinfo=timezone.utc)
+        assert date_range("created_at", gte=start) == {"created_at": {"$gte": start}}
+
+    def test_dual_read_adds_string_bounds(self, dual_read):
+        dual_read(True)
+        start = datetime(2025, 3, 1, tzinfo=timezone.utc)
+        end = datetime(2025, 3, 2, tzinfo=timezone.utc)
+        q = date_range("created_at", gte=start, lt=end)
+        assert q == {"$and": [{"$or": [
+            {"created_at": {"$gte": start, "$lt": end}},
+            {"created_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}},
+        ]}]}
+
+    def test_string_bound_is_parsed_for_native(self, dual_read):
+        dual_read(True)
+        q = date_range("paid_at", lte="2025-03-01T00:00:00+00:00")
+        native, legacy = q["$and"][0]["$or"]
+        assert native == {"paid_at": {"$lte": datetime(2025, 3, 1, tzinfo=timezone.utc)}}
+        assert legacy == {"paid_at": {"$lte": "2025-03-01T00:00:00+00:00"}}
+
+    def test_merges_with_top_level_or(self, dual_read):
+        dual_read(True)
+        q = {"$or": [{"a": 1}, {"b": 1}],
+             **date_range("created_at", gte=datetime(2025, 3, 1, tzinfo=timezone.utc))}
+        assert "$or" in q and "$and" in q
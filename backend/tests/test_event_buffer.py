@@ -0,0 +1,95 @@
+"""
+Buffered analytics ingest
+Tests: events are written with one insert_many per flush; a failed flush
+keeps the batch for the next one; a full queue drops instead of blocking
+"""
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from modules.analytics import ingest
+from modules.analytics.ingest import EventBuffer
+
+
+class _Collection:
+    def __init__(self, fail=None):
+        self.batches = []
+        self.fail = fail
+
+    async def insert_many(self, docs, ordered=True):
+        if self.fail:
+            err, self.fail = self.fail, None
+            raise err
+        self.batches.append(list(docs))
+
+
+class _Db(dict):
+    def __missing__(self, name):
+        self[name] = _Collection()
+        return self[name]
+
+
+def _run(coro_fn):
+    async def main():
+        buf = EventBuffer()
+        buf.start(_Db())
+        try:
+            return await coro_fn(buf)
+        finally:
+            await buf.stop()
+    return asyncio.run(main())
+
+
+class TestFlush:
+    def test_batched_insert(self):
+        async def scenario(buf):
+            await buf.offer("analytics_events", [{"n": i} for i in range(3)])
+            await buf.offer("events", [{"n": 9}])
+            await buf.flush_all()
+            return buf
+
+        buf = _run(scenario)
+        assert buf.db["analytics_events"].batches == [[{"n": 0}, {"n": 1}, {"n": 2}]]
+        assert buf.db["events"].batches == [[{"n": 9}]]
+        assert buf.metrics["flushed"] == 4 and buf.depth() == 0
+
+    def test_failed_flush_requeues(self):
+        async def scenario(buf):
+            buf.db["events"] = _Collection(fail=RuntimeError("down"))
+            await buf.offer("events", [{"n": 1}, {"n": 2}])
+            await buf.flush_all()
+            assert buf.depth() == 2 and buf.metrics["failed_flushes"] == 1
+            await buf.flush_all()
+            return buf
+
+        buf = _run(scenario)
+        assert buf.db["events"].batches == [[{"n": 1}, {"n": 2}]]
+
+    def test_partial_bulk_error_counts_written(self):
+        async def scenario(buf):
+            buf.db["events"] = _Collection(fail=BulkWriteError({"writeErrors": [{"index": 0}]}))
+            await buf.offer("events", [{"n": 1}, {"n": 2}])
+            await buf.flush_all()
+            return buf
+
+        buf = _run(scenario)
+        assert buf.metrics["flushed"] == 1 and buf.metrics["insert_errors"] == 1
+        assert buf.depth() == 0
+
+
+class TestBackpressure:
+    def test_full_queue_drops(self, monkeypatch):
+        monkeypatch.setattr(ingest, "MAX_QUEUE", 3)
+        monkeypatch.setattr(ingest, "HIGH_WATER", 100)
+        monkeypatch.setattr(ingest, "FLUSH_SIZE", 100)
+
+        async def scenario(buf):
+            accepted = await buf.offer("events", [{"n": i} for i in range(5)])
+            return accepted, buf.metrics["dropped"]
+
+        assert _run(scenario) == (3, 2)
+
+    def test_offer_requires_start(self):
+        with pytest.raises(RuntimeError):
+            asyncio.run(EventBuffer().offer("events", [{}]))
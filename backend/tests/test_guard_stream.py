@@ -0,0 +1,99 @@
+"""
+Guard stream windows
+Tests: order writes apply as deltas (replays and status flips never double
+count); the burst window and day totals roll forward; rules fire on the
+events that change them
+"""
+import asyncio
+from collections import defaultdict
+from datetime import timedelta
+
+import pytest
+
+from core.dates import utcnow
+from modules.guard.guard_engine import day_bounds
+from modules.guard.guard_stream import GuardStream
+
+
+class _Engine:
+    def __init__(self):
+        self.bursts = []
+        self.kpis = 0
+
+    async def config(self):
+        return {"enabled": True}
+
+    async def fire_burst(self, guard, buyer_id, cnt, orders, now):
+        self.bursts.append((buyer_id, cnt))
+        return cnt >= 3
+
+    async def fire_revenue_drop(self, guard, today, yday, day):
+        self.kpis += 1
+        return False
+
+    async def fire_awaiting_spike(self, guard, cnt, day):
+        return False
+
+
+@pytest.fixture
+def stream():
+    s = GuardStream(defaultdict(lambda: None))
+    s.engine = _Engine()
+    return s
+
+
+def _now():
+    # mid-day, so "an hour ago" stays on today
+    return day_bounds(utcnow())[0] + timedelta(hours=12)
+
+
+def _order(oid, status_c, amount=100.0, buyer="b1", created=None):
+    return {"id": oid, "buyer_id": buyer, "status_c": status_c, "total_amount": amount,
+            "created_at": created or _now()}
+
+
+def _today(stream, now):
+    return stream.days.get(day_bounds(now)[0].date().isoformat(), {})
+
+
+class TestApply:
+    def test_status_flip_is_a_delta(self, stream):
+        now = _now()
+        stream._apply(_order("o1", "AWAITING_PAYMENT"), now)
+        assert _today(stream, now) == {"revenue": 0.0, "awaiting": 1}
+        stream._apply(_order("o1", "PAID"), now)
+        stream._apply(_order("o1", "PAID"), now)  # replay
+        assert _today(stream, now) == {"revenue": 100.0, "awaiting": 0}
+        stream._apply(_order("o1", "CANCELED"), now)
+        assert _today(stream, now) == {"revenue": 0.0, "awaiting": 0}
+        assert "o1" not in stream.contrib
+
+    def test_burst_window_counts_each_order_once(self, stream):
+        now = _now()
+        assert stream._apply(_order("o1", "NEW"), now)[0] == "b1"
+        assert stream._apply(_order("o1", "PAID"), now)[0] is None
+        stream._apply(_order("o2", "NEW", created=now - timedelta(hours=2)), now)
+        assert [o for _, o in stream.buyers["b1"]] == ["o1"]
+
+    def test_old_days_ignored(self, stream):
+        now = _now()
+        _, day = stream._apply(_order("o1", "PAID", created=now - timedelta(days=3)), now)
+        assert day is None and stream.days == {}
+
+
+class TestRoll:
+    def test_drops_expired_buyers_and_days(self, stream):
+        now = _now()
+        stream._apply(_order("o1", "PAID", created=now - timedelta(minutes=30)), now)
+        later = now + timedelta(days=2)
+        stream._roll(later)
+        assert stream.buyers == {} and stream.days == {} and stream.contrib == {}
+
+
+class TestOnOrder:
+    def test_burst_fires_on_third_order(self, stream):
+        for i in range(3):
+            asyncio.run(stream._on_order(_order(f"o{i}", "NEW", created=utcnow())))
+        assert stream.engine.bursts[-1] == ("b1", 3)
+        assert stream.metrics["fired"] == 1
+        assert stream.metrics["events"] == 3
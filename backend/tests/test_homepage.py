@@ -0,0 +1,103 @@
+"""
+Homepage payload
+Tests: blocks are served from memory until the shared version changes; a
+build with a failed block is served but not cached; a build racing an
+invalidation is not kept; If-None-Match answers 304
+"""
+import asyncio
+import json
+
+import pytest
+
+from modules.content import homepage
+from modules.content.homepage import HomepageCache, homepage_response
+
+
+class _State:
+    def __init__(self):
+        self.version = 0
+        self.reads = 0
+
+    async def find_one(self, q, projection=None):
+        self.reads += 1
+        return {"version": self.version}
+
+    async def update_one(self, q, update, upsert=False):
+        self.version += update["$inc"]["version"]
+
+
+class _Request:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+@pytest.fixture
+def no_version_window(monkeypatch):
+    # every get() looks at the shared version
+    monkeypatch.setattr(homepage, "VERSION_CHECK_SEC", 0)
+
+
+def _blocks(calls, fail=False):
+    async def slides():
+        calls.append("slides")
+        return [{"id": "s1"}]
+
+    async def offers():
+        calls.append("offers")
+        if fail:
+            raise RuntimeError("boom")
+        return [{"id": "o1"}]
+
+    return {"slides": slides, "offers": offers}
+
+
+class TestCache:
+    def test_hit_does_no_db_calls(self):
+        cache = HomepageCache({"content_state": _State()})
+        calls = []
+        first = asyncio.run(cache.get(_blocks(calls)))
+        second = asyncio.run(cache.get(_blocks(calls)))
+        assert second is first
+        assert calls == ["slides", "offers"]
+        assert cache.state.reads == 1
+        assert json.loads(first.body) == {"slides": [{"id": "s1"}], "offers": [{"id": "o1"}]}
+
+    def test_rebuilt_when_version_changes(self, no_version_window):
+        state = _State()
+        cache = HomepageCache({"content_state": state})
+        calls = []
+        asyncio.run(cache.get(_blocks(calls)))
+        asyncio.run(cache.get(_blocks(calls)))
+        assert len(calls) == 2
+
+        state.version += 1  # another worker invalidated
+        asyncio.run(cache.get(_blocks(calls)))
+        assert len(calls) == 4
+
+    def test_failed_block_not_cached(self):
+        cache = HomepageCache({"content_state": _State()})
+        calls = []
+        payload = asyncio.run(cache.get(_blocks(calls, fail=True)))
+        assert json.loads(payload.body)["offers"] == []
+        asyncio.run(cache.get(_blocks(calls)))
+        assert len(calls) == 4
+
+    def test_build_racing_invalidation_not_kept(self):
+        cache = HomepageCache({"content_state": _State()})
+
+        async def slides():
+            await cache.invalidate()  # an admin write lands mid-build
+            return []
+
+        asyncio.run(cache.get({"slides": slides}))
+        assert cache.payload is None
+
+
+class TestResponse:
+    def test_etag(self):
+        cache = HomepageCache({"content_state": _State()})
+        payload = asyncio.run(cache.get(_blocks([])))
+        assert homepage_response(_Request({}), payload).status_code == 200
+        assert homepage_response(_Request({"if-none-match": payload.etag}), payload).status_code == 304
+        assert homepage_response(_Request({"if-none-match": f'"x", {payload.etag}'}), payload).status_code == 304
+        assert homepage_response(_Request({"if-none-match": '"x"'}), payload).status_code == 200
@@ -0,0 +1,98 @@
+"""
+Image pipeline
+Tests: variants are never upscaled and transparency is flattened; broken
+uploads are rejected; ingest writes content-addressed variants plus a
+manifest, and repeated or concurrent identical uploads are processed once
+"""
+import asyncio
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from modules.media import image_pipeline as pipeline_module
+from modules.media.image_pipeline import ImagePipeline, ImageRejected, process_image
+
+
+def _png(width, height, mode="RGB"):
+    buf = io.BytesIO()
+    Image.new(mode, (width, height), (10, 20, 30, 0) if mode == "RGBA" else (10, 20, 30)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    p = ImagePipeline(root=tmp_path, public_prefix="/uploads/")
+    # threads instead of spawned workers: same code path, no process start-up
+    p._pool = ThreadPoolExecutor(2)
+    calls = []
+    real = pipeline_module.process_image
+    monkeypatch.setattr(pipeline_module, "process_image", lambda *a: calls.append(1) or real(*a))
+    p.calls = calls
+    yield p
+    p.shutdown()
+
+
+class TestProcessImage:
+    def test_small_source_not_upscaled(self):
+        out = process_image(_png(800, 400))
+        widths = sorted({(v["name"], v["width"]) for v in out["variants"]})
+        assert widths == [("card", 640), ("full", 800), ("thumb", 320)]
+        assert {v["format"] for v in out["variants"]} == {"jpeg", "webp"}
+        card = next(v for v in out["variants"] if v["name"] == "card")
+        assert card["height"] == 320
+
+    def test_transparency_flattened_on_white(self):
+        out = process_image(_png(100, 100, "RGBA"))
+        jpeg = next(v for v in out["variants"] if v["format"] == "jpeg")
+        img = Image.open(io.BytesIO(jpeg["data"]))
+        assert img.mode == "RGB"
+        assert min(img.getpixel((50, 50))) > 240
+        # one width only: all buckets collapse onto the source size
+        assert len(out["variants"]) == 2
+
+    def test_undecodable_rejected(self):
+        with pytest.raises(ImageRejected):
+            process_image(b"not an image")
+
+
+class TestIngest:
+    def test_writes_variants_and_manifest(self, pipeline, tmp_path):
+        manifest = asyncio.run(pipeline.ingest(_png(2000, 1000), "products"))
+        assert manifest["deduplicated"] is False
+        digest = manifest["hash"]
+        directory = tmp_path / "products" / digest[:2] / digest
+        stored = json.loads((directory / "manifest.json").read_text())
+        assert stored["url"] == f"/uploads/products/{digest[:2]}/{digest}/full.jpg"
+        assert (directory / "thumb.webp").exists()
+        assert stored["variants"]["full"]["width"] == 1600
+        assert stored["srcset"]["webp"].split(", ")[0].endswith(" 320w")
+
+    def test_small_source_buckets_share_file(self, pipeline):
+        manifest = asyncio.run(pipeline.ingest(_png(500, 500)))
+        assert manifest["variants"]["card"] == manifest["variants"]["full"]
+
+    def test_reupload_deduplicated(self, pipeline):
+        content = _png(50, 50)
+        asyncio.run(pipeline.ingest(content))
+        again = asyncio.run(pipeline.ingest(content))
+        assert again["deduplicated"] is True
+        assert len(pipeline.calls) == 1
+
+    def test_concurrent_identical_processed_once(self, pipeline):
+        content = _png(60, 60)
+
+        async def both():
+            return await asyncio.gather(pipeline.ingest(content), pipeline.ingest(content))
+
+        a, b = asyncio.run(both())
+        assert a["hash"] == b["hash"]
+        assert sorted([a["deduplicated"], b["deduplicated"]]) == [False, True]
+        assert len(pipeline.calls) == 1
+
+    def test_rejects_bad_input(self, pipeline):
+        for content, kind in ((b"", "slides"), (_png(10, 10), "avatars"), (b"junk", "slides")):
+            with pytest.raises(ImageRejected):
+                asyncio.run(pipeline.ingest(content, kind))
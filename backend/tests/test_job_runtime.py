@@ -0,0 +1,141 @@
+"""
+Job runtime leases
+Tests: one run per period across processes; a finished run's hold ends
+before the next tick; run_now takes over a finished hold but not a
+running one; JOBS_MODE routing
+"""
+import asyncio
+from datetime import timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from core.dates import utcnow
+from modules.jobs.runtime import JobRuntime, jobs_enabled
+
+
+def _match(doc, q):
+    for k, v in q.items():
+        if k == "$or":
+            if not any(_match(doc, alt) for alt in v):
+                return False
+        elif isinstance(v, dict):
+            if "$lte" in v and not (doc.get(k) is not None and doc[k] <= v["$lte"]):
+                return False
+        elif doc.get(k) != v:
+            return False
+    return True
+
+
+class _Locks:
+    """job_locks with Mongo's upsert-on-unique-_id behaviour"""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one_and_update(self, q, update, upsert=False, return_document=None):
+        doc = self.docs.get(q["_id"])
+        if doc is None:
+            doc = self.docs[q["_id"]] = {"_id": q["_id"]}
+        elif not _match(doc, q):
+            raise DuplicateKeyError("lock held")
+        doc.update(update["$set"])
+        return dict(doc)
+
+    async def update_one(self, q, update, upsert=False):
+        doc = self.docs.get(q["_id"])
+        if doc is None or not _match(doc, q):
+            return type("R", (), {"matched_count": 0})()
+        doc.update(update.get("$set", {}))
+        return type("R", (), {"matched_count": 1})()
+
+
+def _pair():
+    locks = _Locks()
+    db = {"job_locks": locks}
+    procs = []
+    for _ in range(2):
+        rt = JobRuntime()
+        rt.bind(db)
+        procs.append(rt)
+    return procs, locks
+
+
+def _register(procs, calls, id="job"):
+    async def job():
+        calls.append(id)
+    for rt in procs:
+        rt.add(job, "interval", minutes=10, id=id, jitter=0)
+    return job
+
+
+def _tick(rt, job, id="job"):
+    asyncio.run(rt._run(id, job))
+
+
+class TestLeases:
+    def test_one_run_per_period(self):
+        (a, b), locks = _pair()
+        calls = []
+        job = _register((a, b), calls)
+        _tick(a, job)
+        _tick(b, job)
+        assert calls == ["job"]
+        assert b.stats["job"].skipped_locked == 1
+        assert locks.docs["job"]["owner"] is None
+        assert locks.docs["job"]["locked_until"] > utcnow()
+
+    def test_next_period_runs_again(self):
+        (a, b), locks = _pair()
+        calls = []
+        job = _register((a, b), calls)
+        _tick(a, job)
+        locks.docs["job"]["locked_until"] = utcnow() - timedelta(seconds=1)
+        _tick(b, job)
+        assert calls == ["job", "job"]
+
+    def test_failure_recorded_and_released(self):
+        (a, _), locks = _pair()
+
+        async def boom():
+            raise RuntimeError("bad")
+
+        a.add(boom, "interval", minutes=10, id="boom", jitter=0)
+        _tick(a, boom, "boom")
+        assert a.stats["boom"].failures == 1
+        assert locks.docs["boom"]["last_status"] == "failed"
+        assert locks.docs["boom"]["owner"] is None
+
+
+class TestRunNow:
+    def test_takes_over_finished_hold(self):
+        (a, b), _ = _pair()
+        calls = []
+        job = _register((a, b), calls)
+        _tick(a, job)
+        assert b.run_now("job")
+        _tick(b, job)
+        assert calls == ["job", "job"]
+
+    def test_does_not_take_over_running_holder(self):
+        (a, b), locks = _pair()
+        calls = []
+        job = _register((a, b), calls)
+        locks.docs["job"] = {"_id": "job", "owner": a.owner, "locked_until": utcnow() + timedelta(minutes=5)}
+        assert b.run_now("job")
+        _tick(b, job)
+        assert calls == []
+
+    def test_unknown_job(self):
+        (a, _), _ = _pair()
+        assert not a.run_now("missing")
+
+
+class TestJobsMode:
+    @pytest.mark.parametrize("mode,web,worker", [
+        ("web", True, True), ("worker", False, True), ("off", False, False),
+    ])
+    def test_roles(self, monkeypatch, mode, web, worker):
+        monkeypatch.setenv("JOBS_MODE", mode)
+        assert jobs_enabled("web") is web
+        assert jobs_enabled("worker") is worker
@@ -0,0 +1,84 @@
+"""
+Metrics registry and profiler
+Tests: Prometheus text exposition for counters / histograms; outbound()
+records outcome; the sampling profiler reports self and cumulative frames
+"""
+import asyncio
+from collections import Counter
+
+import pytest
+
+from core.metrics import OUTBOUND_LATENCY, Registry, outbound
+from modules.ops.profiling.sampler import SamplingProfiler
+
+
+class TestRegistry:
+    def test_counter_exposition(self):
+        reg = Registry()
+        c = reg.counter("jobs_total", "Jobs", ["job"])
+        c.inc(job="a")
+        c.inc(2, job='we"ird')
+        text = reg.render()
+        assert "# TYPE jobs_total counter" in text
+        assert 'jobs_total{job="a"} 1' in text
+        assert 'jobs_total{job="we\\"ird"} 2' in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        reg = Registry()
+        h = reg.histogram("lat_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 5.0):
+            h.observe(v, route="/x")
+        text = reg.render()
+        assert 'lat_seconds_bucket{route="/x",le="0.1"} 1' in text
+        assert 'lat_seconds_bucket{route="/x",le="1.0"} 2' in text
+        assert 'lat_seconds_bucket{route="/x",le="+Inf"} 3' in text
+        assert 'lat_seconds_count{route="/x"} 3' in text
+        assert h.summary()[0]["count"] == 3
+
+    def test_same_name_returns_same_metric(self):
+        reg = Registry()
+        assert reg.counter("x", "X") is reg.counter("x", "X")
+
+
+class TestOutbound:
+    def _count(self, outcome):
+        rows = [r for r in OUTBOUND_LATENCY.summary()
+                if r["service"] == "test-svc" and r["outcome"] == outcome]
+        return rows[0]["count"] if rows else 0
+
+    def test_records_ok_and_error(self):
+        ok, err = self._count("ok"), self._count("error")
+
+        async def calls():
+            async with outbound("test-svc", "op"):
+                pass
+            with pytest.raises(ValueError):
+                async with outbound("test-svc", "op"):
+                    raise ValueError("boom")
+
+        asyncio.run(calls())
+        assert self._count("ok") == ok + 1
+        assert self._count("error") == err + 1
+
+
+class TestProfiler:
+    def test_report_counts_self_and_cumulative(self):
+        stacks = Counter({("main", "a", "b"): 3, ("main", "a"): 1})
+        report = SamplingProfiler._report(stacks, 4, 1.0, 0.005, 10)
+        assert report["top"][0] == {"frame": "b", "samples": 3, "pct": 75.0}
+        cumulative = {r["frame"]: r["samples"] for r in report["cumulative"]}
+        assert cumulative == {"main": 4, "a": 4, "b": 3}
+        assert "main;a;b 3" in report["folded"]
+
+    def test_one_profile_at_a_time(self):
+        prof = SamplingProfiler()
+
+        async def busy_loop():
+            task = asyncio.ensure_future(prof.profile(seconds=0.2, interval_ms=5))
+            await asyncio.sleep(0.05)
+            with pytest.raises(RuntimeError):
+                await prof.profile(seconds=0.1)
+            return await task
+
+        report = asyncio.run(busy_loop())
+        assert report["samples"] > 0 and not prof.busy
@@ -0,0 +1,83 @@
+"""
+Nova Poshta bulk labels
+Tests: stored label chunks carry no API key; job reads point at the admin
+proxy; label_pdf fetches the chunk through the NP client
+"""
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+from modules.delivery.labels.np_labels import label_batches, label_url
+from modules.delivery.np.np_local import LocalNPStandIn
+from modules.delivery.np.np_ttn_bulk import NPTTNBulkService
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def limit(self, n):
+        return self
+
+    async def to_list(self, n):
+        return self.rows
+
+
+class _Collection:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+
+    async def find_one(self, q, projection=None):
+        return next((dict(d) for d in self.docs if d.get("id") == q.get("id")), None)
+
+    def find(self, q, projection=None):
+        return _Cursor([])
+
+
+class _Client(LocalNPStandIn):
+    def __init__(self):
+        super().__init__(latency_ms=0)
+        self.api_key = "secret-key"
+        self.fetched = []
+
+    async def fetch_labels(self, ttns, size="100x100"):
+        self.fetched.append((ttns, size, label_url(ttns, size, self.api_key)))
+        return b"%PDF"
+
+
+def _service(jobs):
+    db = defaultdict(_Collection, ttn_bulk_jobs=_Collection(jobs))
+    client = _Client()
+    return NPTTNBulkService(db, client=client), client
+
+
+class TestLabelBatches:
+    def test_chunks_without_key(self):
+        out = label_batches(["1", "2", "2", "3", ""], per_pdf=2)
+        assert out == [{"ttns": ["1", "2"], "size": "100x100"}, {"ttns": ["3"], "size": "100x100"}]
+        assert "apiKey" not in repr(out)
+
+    def test_unsupported_size(self):
+        with pytest.raises(ValueError):
+            label_batches(["1"], size="a4")
+
+    def test_url_built_on_demand(self):
+        assert label_url(["1", "2"], "85x85", "k").endswith("printMarking85x85/orders[]/1,2/type/pdf/apiKey/k")
+
+
+class TestBulkJobLabels:
+    JOB = {"id": "j1", "status": "DONE", "label_size": "85x85", "labels": [{"ttns": ["1", "2"], "size": "85x85"}]}
+
+    def test_get_points_at_proxy(self):
+        svc, _ = _service([self.JOB])
+        job = asyncio.run(svc.get("j1"))
+        assert job["labels"][0]["url"] == "/api/v2/delivery/novaposhta/ttn/bulk/j1/labels/0"
+        assert "secret-key" not in repr(job)
+
+    def test_label_pdf_fetches_chunk(self):
+        svc, client = _service([self.JOB])
+        assert asyncio.run(svc.label_pdf("j1", 0)) == b"%PDF"
+        assert client.fetched[0][:2] == (["1", "2"], "85x85")
+        assert asyncio.run(svc.label_pdf("j1", 1)) is None
+        assert asyncio.run(svc.label_pdf("missing", 0)) is None
@@ -0,0 +1,27 @@
+"""
+Order idempotency helpers
+Tests: stable payload hash, matching hashes stored before the orjson switch
+"""
+from modules.orders.order_idempotency import _legacy_payload_hash, payload_matches, stable_payload_hash
+
+
+class TestPayloadHash:
+    """Retries with the same body match the stored hash"""
+
+    def test_key_order_does_not_matter(self):
+        assert stable_payload_hash({"a": 1, "b": [1, 2]}) == stable_payload_hash({"b": [1, 2], "a": 1})
+
+    def test_current_hash_matches(self):
+        payload = {"items": [{"product_id": "p1", "quantity": 2}], "city": "Київ"}
+        assert payload_matches(stable_payload_hash(payload), payload, stable_payload_hash(payload))
+
+    def test_legacy_hash_matches(self):
+        # keys locked before the switch stored the json.dumps hash (non-ASCII escaped)
+        payload = {"city": "Київ", "quantity": 2}
+        assert payload_matches(_legacy_payload_hash(payload), payload, stable_payload_hash(payload))
+
+    def test_other_payload_does_not_match(self):
+        stored = stable_payload_hash({"quantity": 2})
+        other = {"quantity": 3}
+        assert not payload_matches(stored, other, stable_payload_hash(other))
+        assert not payload_matches(None, other, stable_payload_hash(other))
@@ -0,0 +1,59 @@
+"""
+Order status canonicalization
+Tests: legacy spellings -> canonical values, status_fields write fragment
+"""
+from modules.orders.order_status import (
+    OrderStatus, PaymentStatus, canonical_payment_status, canonical_status, paid_filter, status_fields,
+)
+
+
+class TestCanonicalStatus:
+    """Every stored spelling maps to one OrderStatus / PaymentStatus value"""
+
+    def test_order_statuses(self):
+        assert canonical_status("paid") == "PAID"
+        assert canonical_status(" Shipped ") == "SHIPPED"
+        assert canonical_status("pending") == "AWAITING_PAYMENT"
+        assert canonical_status("confirmed") == "PROCESSING"
+        assert canonical_status("completed") == "DELIVERED"
+        assert canonical_status("cancelled") == "CANCELED"
+        assert canonical_status("returned") == "CANCELED"
+        assert canonical_status(OrderStatus.PAID) == "PAID"
+
+    def test_unknown_order_status(self):
+        assert canonical_status(None) is None
+        assert canonical_status("") is None
+        assert canonical_status("on_the_moon") is None
+
+    def test_payment_statuses(self):
+        assert canonical_payment_status("paid") == "PAID"
+        assert canonical_payment_status("approved") == "PAID"
+        assert canonical_payment_status("success") == "PAID"
+        assert canonical_payment_status("payment_failed") == "FAILED"
+        assert canonical_payment_status("reversed") == "REFUNDED"
+        assert canonical_payment_status("created") == "PENDING"
+        assert canonical_payment_status(None) is None
+
+
+class TestStatusFields:
+    """Writers set the raw status and its canonical copy together"""
+
+    def test_enum_status(self):
+        assert status_fields(status=OrderStatus.PAID) == {"status": "PAID", "status_c": "PAID"}
+
+    def test_legacy_status_keeps_raw(self):
+        assert status_fields(status="cancelled") == {"status": "cancelled", "status_c": "CANCELED"}
+
+    def test_payment_status(self):
+        assert status_fields(payment_status="paid") == {"payment_status": "paid", "payment_status_c": "PAID"}
+        assert status_fields(status=OrderStatus.NEW, payment_status=PaymentStatus.PENDING) == {
+            "status": "NEW", "status_c": "NEW", "payment_status": "PENDING", "payment_status_c": "PENDING",
+        }
+
+    def test_nothing_to_write(self):
+        assert status_fields() == {}
+
+    def test_paid_filter_uses_canonical_fields(self):
+        q = paid_filter()
+        assert {"payment_status_c": "PAID"} in q["$or"]
+        assert {"status_c": {"$in": ["PAID", "PROCESSING", "SHIPPED", "DELIVERED"]}} in q["$or"]
@@ -0,0 +1,248 @@
+"""
+Payment callbacks applied by the webhook inbox
+Tests: Fondy order_id parsing, dedupe marker on failed apply, per-payment
+ordering / backoff of queued callbacks
+"""
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from core.dates import utcnow
+from modules.payments import fondy_webhook
+from modules.payments.fondy_webhook import FondyWebhookHandler, map_fondy_status, parse_fondy_order_id
+from modules.payments.webhook_inbox import DONE, FAILED, MAX_ATTEMPTS, PENDING, WebhookInbox
+
+
+class _Result:
+    def __init__(self, n):
+        self.modified_count = n
+
+
+class _Collection:
+    """Just enough of a Motor collection for the handlers under test"""
+
+    def __init__(self, docs=(), unique=None):
+        self.docs = list(docs)
+        self.unique = unique
+        self.fail_updates = 0
+
+    def _match(self, doc, q):
+        for k, v in q.items():
+            if isinstance(v, dict) and "$in" in v:
+                if doc.get(k) not in v["$in"]:
+                    return False
+            elif doc.get(k) != v:
+                return False
+        return True
+
+    async def create_index(self, *a, **kw):
+        return None
+
+    async def insert_one(self, doc):
+        if self.unique and any(d.get(self.unique) == doc.get(self.unique) for d in self.docs):
+            raise DuplicateKeyError("duplicate")
+        self.docs.append(dict(doc))
+
+    async def find_one(self, q, projection=None):
+        return next((dict(d) for d in self.docs if self._match(d, q)), None)
+
+    async def delete_one(self, q):
+        self.docs = [d for d in self.docs if not self._match(d, q)]
+
+    async def update_one(self, q, update):
+        if self.fail_updates:
+            self.fail_updates -= 1
+            raise RuntimeError("write concern timeout")
+        for d in self.docs:
+            if self._match(d, q):
+                d.update(update["$set"])
+                return _Result(1)
+        return _Result(0)
+
+
+class _SellerOrders:
+    synced = []
+
+    def __init__(self, db):
+        pass
+
+    async def sync_order(self, order_id):
+        self.synced.append(order_id)
+
+
+def _fondy(monkeypatch):
+    monkeypatch.setattr(fondy_webhook, "SellerOrdersService", _SellerOrders)
+    monkeypatch.setattr(FondyWebhookHandler, "indexed", True)
+    db = {
+        "orders": _Collection([{"id": "o1", "status": "AWAITING_PAYMENT"}]),
+        "payments": _Collection([{"id": "p1", "order_id": "o1", "status": "PENDING"}]),
+        "payment_events": _Collection(unique="dedupe_key"),
+        "fondy_logs": _Collection(),
+    }
+    return FondyWebhookHandler(db, fondy_password="secret"), db
+
+
+APPROVED = {"order_id": "o1:ORDER_PAYMENT:p1", "order_status": "approved", "signature": "abc", "amount": 10000}
+
+
+class TestFondyOrderId:
+    """{order_id}:{purpose}:{payment_id} registered with Fondy"""
+
+    def test_full_id(self):
+        assert parse_fondy_order_id("o1:SHIP_DEPOSIT:p1") == ("o1", "SHIP_DEPOSIT", "p1")
+
+    def test_order_id_with_colons(self):
+        assert parse_fondy_order_id("a:b:ORDER_PAYMENT:p1") == ("a:b", "ORDER_PAYMENT", "p1")
+
+    def test_bare_id(self):
+        assert parse_fondy_order_id("o1") == ("o1", "ORDER_PAYMENT", "o1")
+        assert parse_fondy_order_id("") == (None, None, None)
+
+    def test_status_map(self):
+        assert map_fondy_status("approved") == "PAID"
+        assert map_fondy_status("Declined") == "DECLINED"
+        assert map_fondy_status("created") == "PENDING"
+        assert map_fondy_status(None) == "UNKNOWN"
+
+
+class TestFondyApply:
+    """Dedupe marker and order transition of a verified callback"""
+
+    def test_paid_callback(self, monkeypatch):
+        handler, db = _fondy(monkeypatch)
+        res = asyncio.run(handler.apply(APPROVED))
+        assert res["applied"] == "ORDER_PAID"
+        order = db["orders"].docs[0]
+        assert order["status"] == "PAID" and order["status_c"] == "PAID" and order["payment_status_c"] == "PAID"
+        assert db["payments"].docs[0]["status"] == "PAID"
+
+    def test_replay_is_duplicate(self, monkeypatch):
+        handler, _ = _fondy(monkeypatch)
+        asyncio.run(handler.apply(APPROVED))
+        assert asyncio.run(handler.apply(APPROVED)) == {"ok": True, "duplicate": True}
+
+    def test_failed_apply_is_retried(self, monkeypatch):
+        handler, db = _fondy(monkeypatch)
+        db["payments"].fail_updates = 1
+        with pytest.raises(RuntimeError):
+            asyncio.run(handler.apply(APPROVED))
+        # the marker is gone, so the inbox retry applies the callback instead of skipping it
+        assert db["payment_events"].docs == []
+        assert db["orders"].docs[0]["status"] == "AWAITING_PAYMENT"
+        res = asyncio.run(handler.apply(APPROVED))
+        assert res["applied"] == "ORDER_PAID"
+        assert len(db["payment_events"].docs) == 1
+
+    def test_no_downgrade_keeps_marker(self, monkeypatch):
+        handler, db = _fondy(monkeypatch)
+        asyncio.run(handler.apply(APPROVED))
+        res = asyncio.run(handler.apply({**APPROVED, "order_status": "declined"}))
+        assert res["reason"] == "NO_DOWNGRADE"
+        assert len(db["payment_events"].docs) == 2
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    async def to_list(self, n):
+        return self.docs[:n]
+
+
+class _Inbox(_Collection):
+    def __init__(self, docs):
+        super().__init__(docs)
+        self.writes = []
+
+    def find(self, q):
+        return _Cursor([d for d in self.docs if self._match(d, q)])
+
+    async def bulk_write(self, ops, ordered=True):
+        self.writes.append(ops)
+
+
+def _item(seq, due=None, attempts=0):
+    return {"_id": f"fondy:{seq}", "source": "fondy", "key": "fondy:p1", "payload": {"n": seq},
+            "status": PENDING, "attempts": attempts, "seq": seq,
+            "received_at": utcnow(), "next_attempt_at": due or utcnow()}
+
+
+def _inbox(items, handler):
+    inbox = WebhookInbox()
+    inbox.db = {"payment_webhook_inbox": _Inbox(items)}
+    inbox.register("fondy", handler)
+    return inbox
+
+
+class TestInboxProcessKey:
+    """Callbacks of one payment run in arrival order; a failure holds back later ones"""
+
+    def test_runs_in_seq_order(self):
+        seen = []
+
+        async def handler(payload):
+            seen.append(payload["n"])
+            return {"ok": True}
+
+        inbox = _inbox([_item(2), _item(1), _item(3)], handler)
+        assert asyncio.run(inbox.process_key("fondy:p1")) == 3
+        assert seen == [1, 2, 3]
+        assert len(inbox.col.writes) == 1 and len(inbox.col.writes[0]) == 3
+
+    def test_retry_holds_back_later_callbacks(self):
+        seen = []
+
+        async def handler(payload):
+            seen.append(payload["n"])
+            raise RuntimeError("mongo down")
+
+        inbox = _inbox([_item(1), _item(2)], handler)
+        assert asyncio.run(inbox.process_key("fondy:p1")) == 0
+        assert seen == [1]
+        assert len(inbox.col.writes[0]) == 1
+
+    def test_head_backing_off_settles_nothing(self):
+        async def handler(payload):
+            raise AssertionError("not due")
+
+        inbox = _inbox([_item(1, due=utcnow() + timedelta(minutes=5)), _item(2)], handler)
+        assert asyncio.run(inbox.process_key("fondy:p1")) == 0
+        assert inbox.col.writes == []
+
+
+class TestInboxOutcome:
+    """4xx from a handler is final, other errors back off until MAX_ATTEMPTS"""
+
+    def _apply(self, exc, attempts=0):
+        async def handler(payload):
+            if exc:
+                raise exc
+            return {"ok": True}
+
+        inbox = _inbox([], handler)
+        return asyncio.run(inbox._apply(_item(1, attempts=attempts)))
+
+    def test_done(self):
+        update = self._apply(None)
+        assert update["status"] == DONE and update["result"] == {"ok": True}
+
+    def test_client_error_is_final(self):
+        update = self._apply(HTTPException(404, "ORDER_NOT_FOUND"))
+        assert update["status"] == FAILED and update["error"] == "ORDER_NOT_FOUND"
+
+    def test_server_error_backs_off(self):
+        before = utcnow()
+        update = self._apply(RuntimeError("timeout"), attempts=2)
+        assert update["status"] == PENDING
+        assert update["next_attempt_at"] >= before + timedelta(seconds=20)
+
+    def test_gives_up_after_max_attempts(self):
+        update = self._apply(RuntimeError("timeout"), attempts=MAX_ATTEMPTS - 1)
+        assert update["status"] == FAILED
@@ -0,0 +1,100 @@
+"""
+Return policy engine
+Tests: customer window metrics read the ISO-string returns.updated_at written
+by return_repo, also after dual-read is switched off
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core import dates
+from modules.returns.policy_engine import ReturnPolicyEngine
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+
+def _match(doc, q):
+    for k, v in q.items():
+        if k == "$or":
+            if not any(_match(doc, sub) for sub in v):
+                return False
+            continue
+        value = _get(doc, k)
+        if isinstance(v, dict):
+            if "$in" in v and value not in v["$in"]:
+                return False
+            # Mongo only compares values of the same BSON type
+            if "$gte" in v and (value is None or type(value) is not type(v["$gte"]) or value < v["$gte"]):
+                return False
+        elif value != v:
+            return False
+    return True
+
+
+class _Orders:
+    def __init__(self, docs):
+        self.docs = docs
+        self.pipelines = []
+
+    async def count_documents(self, q):
+        return sum(1 for d in self.docs if _match(d, q))
+
+    def aggregate(self, pipeline, **kw):
+        self.pipelines.append(pipeline)
+        return _Empty()
+
+
+class _Empty:
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+
+def _ago(days):
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+@pytest.fixture
+def native_only():
+    prev = dates.is_dual_read()
+    dates.set_dual_read(False)
+    yield
+    dates.set_dual_read(prev)
+
+
+class _DB(dict):
+    def __missing__(self, name):
+        return None
+
+
+def _engine(orders):
+    return ReturnPolicyEngine(_DB(orders=_Orders(orders)))
+
+
+class TestWindowMetrics:
+    """Windows are compared in the representation return_repo writes"""
+
+    def test_customer_windows(self, native_only):
+        phone = "+380501112233"
+        engine = _engine([
+            {"buyer_phone": phone, "returns": {"stage": "RETURNED", "updated_at": _ago(10)}},
+            {"buyer_phone": phone, "returns": {"stage": "RETURNING", "reason": "REFUSED", "updated_at": _ago(20)}},
+            {"buyer_phone": phone, "returns": {"stage": "RETURNED", "reason": "REFUSED", "updated_at": _ago(45)}},
+            {"buyer_phone": phone, "returns": {"stage": "RETURNED", "updated_at": _ago(90)}},
+            {"buyer_phone": "+380000000000", "returns": {"stage": "RETURNED", "updated_at": _ago(1)}},
+        ])
+        m = asyncio.run(engine._customer_window_metrics(phone))
+        assert m == {"returns_60d": 3, "cod_refusals_30d": 1}
+
+    def test_bulk_windows_use_string_bounds(self, native_only):
+        engine = _engine([])
+        asyncio.run(engine._window_metrics_all())
+        match = engine.db["orders"].pipelines[0][0]["$match"]
+        assert isinstance(match["returns.updated_at"]["$gte"], str)
@@ -0,0 +1,137 @@
+"""
+Product cards
+Tests: cards carry the listing fields with the category name; pages use
+stored cards and build missing or outdated ones on the fly; the backfill
+only touches products without a current card; CardsResponse joins the
+pre-serialized strings into valid JSON
+"""
+import asyncio
+import json
+
+import pytest
+
+from modules.products import cards as cards_module
+from modules.products.cards import CARD_VERSION, CardsResponse, ProductCards, build_card, dumps
+from modules.products.catalog_cache import CatalogSnapshot
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def sort(self, field, direction):
+        self.rows.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.rows = self.rows[:n]
+        return self
+
+    async def to_list(self, n):
+        return self.rows
+
+
+class _Products:
+    def __init__(self, docs):
+        self.docs = [dict(d) for d in docs]
+        self.finds = []
+
+    def find(self, q, projection=None):
+        self.finds.append(q)
+        rows = []
+        for d in self.docs:
+            if "id" in q and d["id"] not in q["id"]["$in"]:
+                continue
+            if "card_v" in q and d.get("card_v") == q["card_v"]["$ne"]:
+                continue
+            if "_id" in q and not d["_id"] > q["_id"]["$gt"]:
+                continue
+            if "category_id" in q and d.get("category_id") != q["category_id"]:
+                continue
+            rows.append(dict(d))
+        return _Cursor(rows)
+
+    async def bulk_write(self, ops, ordered=True):
+        for flt, update in ops:
+            doc = next(d for d in self.docs if d["id"] == flt["id"])
+            doc.update(update["$set"])
+
+
+class _Catalog:
+    snap = CatalogSnapshot([{"id": "c1", "name": "Lamps", "parent_id": None}], {}, {}, [])
+
+    async def get(self):
+        return self.snap
+
+
+@pytest.fixture(autouse=True)
+def fake_ops(monkeypatch):
+    monkeypatch.setattr(cards_module, "UpdateOne", lambda flt, upd: (flt, upd))
+    monkeypatch.setattr(cards_module, "get_catalog_cache", lambda db: _Catalog())
+
+
+def _product(i, **kw):
+    return {"_id": i, "id": f"p{i}", "title": f"Lamp {i}", "price": 100 + i, "images": ["a.jpg", "b.jpg"],
+            "stock_level": 0, "category_id": "c1", **kw}
+
+
+def _cards(products):
+    db = {"products": _Products(products)}
+    return ProductCards(db), db["products"]
+
+
+class TestBuildCard:
+    def test_fields(self):
+        card = build_card(_product(1, name="ignored", old_price=150, is_bestseller=1), "Lamps")
+        assert card["title"] == "Lamp 1" and card["image"] == "a.jpg"
+        assert card["compare_price"] == 150 and card["category_name"] == "Lamps"
+        assert card["in_stock"] is False and card["is_bestseller"] is True
+        assert card["rating"] == 0
+
+    def test_v2_products(self):
+        card = build_card({"id": "p", "name": "Desk", "in_stock": False})
+        assert card["title"] == "Desk" and card["in_stock"] is False and card["image"] is None
+
+
+class TestPage:
+    def test_uses_stored_and_builds_stale(self):
+        stored = dumps({"id": "p1", "title": "stored"})
+        svc, products = _cards([_product(1), _product(2), _product(3)])
+        docs = [{"id": "p1", "card_json": stored, "card_v": CARD_VERSION},
+                {"id": "p2", "card_json": "{}", "card_v": CARD_VERSION - 1},
+                {"id": "p3"}]
+        out = asyncio.run(svc.page(docs))
+        assert out[0] == stored
+        assert [json.loads(c)["id"] for c in out] == ["p1", "p2", "p3"]
+        assert json.loads(out[1])["category_name"] == "Lamps"
+        # one lookup for both stale products, and their cards are stored
+        assert products.finds == [{"id": {"$in": ["p2", "p3"]}}]
+        assert products.docs[2]["card_v"] == CARD_VERSION
+
+    def test_deleted_product_dropped(self):
+        svc, _ = _cards([])
+        assert asyncio.run(svc.page([{"id": "gone"}])) == []
+
+
+class TestBackfill:
+    def test_only_missing_or_outdated(self, monkeypatch):
+        monkeypatch.setattr(cards_module, "BATCH_SIZE", 2)
+        monkeypatch.setattr(cards_module, "BATCH_PAUSE_SEC", 0)
+        current = _product(2, card_json="{}", card_v=CARD_VERSION)
+        svc, products = _cards([_product(1), current, _product(3), _product(4, card_v=0)])
+        assert asyncio.run(svc.backfill()) == {"updated": 3}
+        assert products.docs[1]["card_json"] == "{}"
+        assert all(d["card_v"] == CARD_VERSION for d in products.docs)
+
+
+class TestCardsResponse:
+    def test_array(self):
+        body = CardsResponse(['{"id":"a"}', '{"id":"b"}']).body
+        assert json.loads(body) == [{"id": "a"}, {"id": "b"}]
+
+    def test_wrapped_with_extra(self):
+        body = CardsResponse(['{"id":"a"}'], key="products", extra={"total": 1, "q": "лампа"}).body
+        assert json.loads(body) == {"products": [{"id": "a"}], "total": 1, "q": "лампа"}
+
+    def test_empty(self):
+        assert json.loads(CardsResponse([], key="items").body) == {"items": []}
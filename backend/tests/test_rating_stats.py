@@ -0,0 +1,46 @@
+"""
+Review rating counters
+Tests: consistency check of stored counters, expected values from review stats
+"""
+from modules.reviews.rating_stats import _consistent, _expected, average
+
+
+class TestConsistent:
+    """Counters are trusted only when count, sum and histogram agree"""
+
+    def test_matching_counters(self):
+        assert _consistent({"reviews_count": 3, "rating_sum": 12, "rating_hist": {"5": 2, "2": 1}})
+
+    def test_never_reviewed(self):
+        assert _consistent({})
+        assert _consistent({"reviews_count": 0, "rating_sum": 0, "rating_hist": {}})
+
+    def test_product_reviewed_before_counters(self):
+        # legacy products carry reviews_count / rating but no histogram
+        assert not _consistent({"reviews_count": 4, "rating": 4.5})
+
+    def test_drifted_sum(self):
+        assert not _consistent({"reviews_count": 2, "rating_sum": 9, "rating_hist": {"5": 1, "3": 1}})
+
+    def test_negative_count(self):
+        assert not _consistent({"reviews_count": -1, "rating_sum": -5, "rating_hist": {"5": -1}})
+
+
+class TestExpected:
+    """Values a product should carry for given review stats"""
+
+    def test_from_stats(self):
+        assert _expected({"count": 3, "sum": 13, "5": 2, "3": 1}) == {
+            "reviews_count": 3,
+            "rating_sum": 13,
+            "rating_hist": {"1": 0, "2": 0, "3": 1, "4": 0, "5": 2},
+            "rating": 4.3,
+        }
+
+    def test_no_reviews(self):
+        assert _expected(None)["rating"] == 0
+        assert _consistent(_expected(None))
+
+    def test_average(self):
+        assert average(0, 0) == 0
+        assert average(2, 9) == 4.5
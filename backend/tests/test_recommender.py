@@ -0,0 +1,49 @@
+"""
+Item-to-item recommendations
+Tests: co-occurrence counts, neighbour scores and filtering
+"""
+from modules.products.recommender import MAX_BASKET, CoOccurrence
+
+
+def _counts():
+    co = CoOccurrence()
+    co.add(["a", "b", "c"], 3.0)
+    co.add(["a", "b"], 3.0)
+    co.add(["b", "c", "c", None], 1.0)
+    return co
+
+
+class TestCoOccurrence:
+    """Sparse symmetric counts over product ids"""
+
+    def test_weights_and_duplicates(self):
+        co = _counts()
+        assert co.popular() == [("b", 7.0), ("a", 6.0), ("c", 4.0)]
+        assert co.popular(["c", "zzz"]) == [("c", 4.0)]
+
+    def test_neighbors_best_first(self):
+        nb = _counts().neighbors()
+        assert [p for p, _ in nb["a"]] == ["b", "c"]
+        assert [p for p, _ in nb["c"]] == ["b", "a"]
+        # symmetric: a -> b and b -> a share one score
+        assert dict(nb["a"])["b"] == dict(nb["b"])["a"]
+
+    def test_neighbors_score_is_shrunk_cosine(self):
+        score = dict(_counts().neighbors()["a"])["c"]
+        # co = 3, weight a = 6, weight c = 4, shrink 2
+        assert round(3 / (6 * 4) ** 0.5 * (3 / 5), 6) == score
+
+    def test_top_k(self):
+        nb = _counts().neighbors(top_k=1)
+        assert all(len(v) == 1 for v in nb.values())
+
+    def test_allowed_filters_both_sides(self):
+        nb = _counts().neighbors(allowed={"a", "b"})
+        assert set(nb) == {"a", "b"}
+        assert [p for p, _ in nb["a"]] == ["b"]
+
+    def test_basket_is_capped(self):
+        co = CoOccurrence()
+        co.add([f"p{i}" for i in range(MAX_BASKET + 5)], 1.0)
+        assert len(co.ids) == MAX_BASKET
+        assert len(co.pairs) == MAX_BASKET * (MAX_BASKET - 1) // 2
@@ -0,0 +1,128 @@
+"""
+Payment reconciliation
+Tests: the pending-payments window matches the ISO-string created_at the
+payment writers store, also after dual-read is switched off
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core import dates
+from modules.payments.reconciliation_service import PaymentReconciliationService
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d[field])
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, n):
+        return self.docs[:n]
+
+
+def _match(doc, q):
+    for k, v in q.items():
+        value = doc.get(k)
+        if isinstance(v, dict):
+            if "$in" in v and value not in v["$in"]:
+                return False
+            for op in ("$gte", "$gt"):
+                if op in v:
+                    # Mongo only compares values of the same BSON type
+                    if type(value) is not type(v[op]) or value < v[op] or (op == "$gt" and value == v[op]):
+                        return False
+        elif value != v:
+            return False
+    return True
+
+
+class _Payments:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, q, projection=None):
+        return _Cursor([d for d in self.docs if _match(d, q)])
+
+
+class _State:
+    def __init__(self):
+        self.doc = {}
+
+    async def find_one(self, q):
+        return self.doc or None
+
+    async def update_one(self, q, update, upsert=False):
+        self.doc.update(update["$set"])
+
+
+class _Provider:
+    name = "test"
+
+
+def _iso(hours_ago):
+    return (datetime.now(timezone.utc) - timedelta(hours=hours_ago)).isoformat()
+
+
+@pytest.fixture
+def native_only():
+    prev = dates.is_dual_read()
+    dates.set_dual_read(False)
+    yield
+    dates.set_dual_read(prev)
+
+
+class TestRunOnce:
+    """Stuck payments inside the window are polled and applied"""
+
+    def test_scans_pending_payments_with_iso_created_at(self, native_only):
+        db = {
+            "orders": None,
+            "reconciliation_logs": None,
+            "reconciliation_state": _State(),
+            "payments": _Payments([
+                {"_id": 1, "id": "p1", "status": "PENDING", "created_at": _iso(2)},
+                {"_id": 2, "id": "p2", "status": "CREATED", "created_at": _iso(30)},
+                {"_id": 3, "id": "p3", "status": "PAID", "created_at": _iso(1)},
+                {"_id": 4, "id": "p4", "status": "PENDING", "created_at": _iso(200)},
+            ]),
+        }
+        svc = PaymentReconciliationService(db, provider=_Provider())
+        seen = []
+
+        async def poll(page):
+            seen.extend(p["id"] for p in page)
+            return {}
+
+        async def apply(page, statuses):
+            return {"fixed": 0, "transitioned": 0, "errors": 0}
+
+        svc._poll, svc._apply = poll, apply
+        res = asyncio.run(svc.run_once(hours_back=48))
+        assert seen == ["p1", "p2"]
+        assert res["scanned"] == 2 and res["complete"]
+
+
+class TestMarkOrderPaid:
+    def test_writes_raw_payment_status_with_canonical(self, monkeypatch):
+        from modules.payments import reconciliation_service
+
+        calls = []
+
+        async def atomic_transition(order_id, to_status, **kw):
+            calls.append(kw["patch"])
+            return {}
+
+        monkeypatch.setattr(reconciliation_service.order_repository, "atomic_transition", atomic_transition)
+        db = {"orders": None, "payments": None, "reconciliation_logs": None, "reconciliation_state": _State()}
+        svc = PaymentReconciliationService(db, provider=_Provider())
+        assert asyncio.run(svc._mark_order_paid("o1", "2026-01-01T00:00:00+00:00"))
+        assert calls[0]["payment_status"] == "PAID"
+        assert calls[0]["payment_status_c"] == "PAID"
@@ -0,0 +1,94 @@
+"""
+Return analytics over finance_ledger
+Tests: shipping losses match the ISO-string created_at finance_repo writes,
+also after dual-read is switched off
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core import dates
+from modules.returns.return_analytics import ReturnAnalyticsService
+from modules.returns.return_repo import ReturnRepo
+
+
+def _match(doc, q):
+    for k, v in q.items():
+        value = doc.get(k)
+        if isinstance(v, dict):
+            if "$in" in v and value not in v["$in"]:
+                return False
+            # Mongo only compares values of the same BSON type
+            if "$gte" in v and (type(value) is not type(v["$gte"]) or value < v["$gte"]):
+                return False
+        elif value != v:
+            return False
+    return True
+
+
+class _Rows:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for r in self.rows:
+            yield r
+
+    async def to_list(self, n):
+        return self.rows[:n]
+
+
+class _Collection:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+
+    async def count_documents(self, q):
+        return 0
+
+    def find(self, q, projection=None):
+        return _Rows([d for d in self.docs if _match(d, q)])
+
+    def aggregate(self, pipeline, **kw):
+        # shipping losses: $match then a single $sum group
+        docs = [d for d in self.docs if _match(d, pipeline[0]["$match"])]
+        if not docs or "$group" not in pipeline[1]:
+            return _Rows([])
+        return _Rows([{"_id": None, "total": sum(d["amount"] for d in docs)}])
+
+
+class _DB(dict):
+    def __missing__(self, name):
+        return _Collection()
+
+
+def _ago(days):
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+@pytest.fixture
+def db():
+    prev = dates.is_dual_read()
+    dates.set_dual_read(False)
+    yield _DB(finance_ledger=_Collection([
+        {"type": "SHIP_COST_OUT", "amount": 70.0, "created_at": _ago(3)},
+        {"type": "RETURN_COST_OUT", "amount": 55.5, "created_at": _ago(12)},
+        {"type": "RETURN_COST_OUT", "amount": 80.0, "created_at": _ago(45)},
+        {"type": "COD_IN", "amount": 900.0, "created_at": _ago(2)},
+    ]))
+    dates.set_dual_read(prev)
+
+
+class TestShippingLosses:
+    """Ledger windows compare the representation finance_repo writes"""
+
+    def test_analytics_summary(self, db):
+        res = asyncio.run(ReturnAnalyticsService(db).summary())
+        assert res["shipping_losses_30d"] == 125.5
+
+    def test_return_stats(self, db):
+        res = asyncio.run(ReturnRepo(db).get_return_stats(days=30))
+        assert res["shipping_losses"] == 125.5
@@ -0,0 +1,58 @@
+"""
+Customer risk score
+Tests: an unpaid auto-cancelled order counts as a payment failure only,
+buyer cancellations / returns still count as returns
+"""
+import asyncio
+
+from modules.risk.risk_service import RiskService
+
+
+def _match(doc, q):
+    for k, v in q.items():
+        if k in ("$and", "created_at"):
+            continue  # every fixture order is inside the windows
+        value = doc.get(k)
+        if isinstance(v, dict):
+            if "$nin" in v and value in v["$nin"]:
+                return False
+        elif value != v:
+            return False
+    return True
+
+
+class _Orders:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def count_documents(self, q):
+        return sum(1 for d in self.docs if _match(d, q))
+
+
+class _Empty:
+    async def find_one(self, *a, **kw):
+        return None
+
+
+def _components(orders):
+    db = {"users": _Empty(), "user_tags": _Empty(), "orders": _Orders(orders)}
+    return asyncio.run(RiskService(db).compute_for_user("u1")).components
+
+
+def _order(status, status_c="CANCELED", payment_status_c="PENDING"):
+    return {"buyer_id": "u1", "status": status, "status_c": status_c, "payment_status_c": payment_status_c}
+
+
+class TestReturnsCount:
+    def test_auto_cancel_not_counted_as_return(self):
+        comps = _components([
+            _order("CANCELLED_AUTO", payment_status_c="FAILED"),
+            _order("PAYMENT_FAILED", payment_status_c="FAILED"),
+        ])
+        assert comps["returns_60d"]["n"] == 0
+        assert comps["payment_fails_30d"]["n"] == 2
+
+    def test_buyer_cancellations_and_returns_counted(self):
+        comps = _components([_order("cancelled"), _order("RETURNED"), _order("CANCELED"),
+                             _order("DELIVERED", status_c="DELIVERED")])
+        assert comps["returns_60d"]["n"] == 3
@@ -0,0 +1,129 @@
+"""
+Seller sub-order ledger
+Tests: a delivered COD order is not earned until its payment is PAID; a
+payout debited by the backfill and by process_payout at the same time is
+posted once
+"""
+import asyncio
+
+from pymongo.errors import DuplicateKeyError
+
+from modules.orders.seller_orders import SellerOrdersService
+
+
+def _match(doc, q):
+    for k, v in q.items():
+        value = doc.get(k)
+        if isinstance(v, dict):
+            if "$ne" in v and value == v["$ne"]:
+                return False
+            if "$in" in v and value not in v["$in"]:
+                return False
+            if "$nin" in v and value in v["$nin"]:
+                return False
+        elif value != v:
+            return False
+    return True
+
+
+class _Collection:
+    def __init__(self, docs=(), unique=None):
+        self.docs = [dict(d) for d in docs]
+        self.unique = unique
+
+    async def find(self, q, projection=None):
+        for d in [dict(d) for d in self.docs if _match(d, q)]:
+            await asyncio.sleep(0)  # let the concurrent caller interleave
+            yield d
+
+    async def find_one(self, q, projection=None):
+        return next((dict(d) for d in self.docs if _match(d, q)), None)
+
+    async def find_one_and_update(self, q, update, projection=None, return_document=None):
+        doc = next((d for d in self.docs if _match(d, q)), None)
+        if doc is None:
+            return None
+        doc.update(update.get("$set", {}))
+        for k, n in update.get("$inc", {}).items():
+            doc[k] = doc.get(k, 0) + n
+        return dict(doc)
+
+    async def insert_one(self, doc):
+        if self.unique and any(d[self.unique] == doc[self.unique] for d in self.docs):
+            raise DuplicateKeyError("dup")
+        self.docs.append(dict(doc))
+
+    async def update_one(self, q, update, upsert=False):
+        doc = next((d for d in self.docs if _match(d, q)), None)
+        if doc is None:
+            doc = dict(q)
+            self.docs.append(doc)
+        for k, n in update.get("$inc", {}).items():
+            doc[k] = doc.get(k, 0) + n
+
+
+class _Db(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+def _service(sub_orders=(), payouts=()):
+    db = _Db(
+        seller_orders=_Collection(sub_orders),
+        seller_ledger=_Collection(unique="ref"),
+        seller_balances=_Collection(),
+        schema_migrations=_Collection(),
+        payouts=_Collection(payouts),
+    )
+    return SellerOrdersService(db), db
+
+
+def _sub(**kw):
+    return {"_id": 1, "order_id": "o1", "seller_id": "s1", "subtotal": 100.0, "item_count": 1, **kw}
+
+
+class TestEarned:
+    def test_delivered_cod_not_earned_until_paid(self):
+        svc, db = _service([_sub(status_c="DELIVERED", payment_status_c="PENDING")])
+        asyncio.run(svc._apply_ledger("o1", "s1"))
+        assert db.seller_ledger.docs == []
+        assert db.seller_orders.docs[0].get("earned") is not True
+
+        db.seller_orders.docs[0]["payment_status_c"] = "PAID"
+        asyncio.run(svc._apply_ledger("o1", "s1"))
+        assert [e["type"] for e in db.seller_ledger.docs] == ["ORDER_EARNED"]
+
+    def test_refund_reverses_earned(self):
+        svc, db = _service([_sub(status_c="DELIVERED", payment_status_c="PAID")])
+        asyncio.run(svc._apply_ledger("o1", "s1"))
+        db.seller_orders.docs[0]["payment_status_c"] = "REFUNDED"
+        asyncio.run(svc._apply_ledger("o1", "s1"))
+        assert [e["type"] for e in db.seller_ledger.docs] == ["ORDER_EARNED", "ORDER_REVERSED"]
+
+
+class TestPayouts:
+    def test_backfill_racing_process_payout_debits_once(self):
+        payout = {"id": "p1", "seller_id": "s1", "amount": 60.0, "status": "completed"}
+        svc, db = _service(payouts=[payout])
+
+        async def race():
+            await asyncio.gather(svc._backfill_payouts(), svc.sync_payout("p1"))
+
+        asyncio.run(race())
+        assert [e["type"] for e in db.seller_ledger.docs] == ["PAYOUT"]
+        assert db.seller_balances.docs[0]["total_paid"] == 60.0
+
+    def test_leaving_debit_status_credits_back(self):
+        payout = {"id": "p1", "seller_id": "s1", "amount": 60.0, "status": "processing"}
+        svc, db = _service(payouts=[payout])
+        asyncio.run(svc.sync_payout("p1"))
+        db.payouts.docs[0]["status"] = "rejected"
+        asyncio.run(svc.sync_payout("p1"))
+        asyncio.run(svc.sync_payout("p1"))
+        assert [e["type"] for e in db.seller_ledger.docs] == ["PAYOUT", "PAYOUT_RETURNED"]
+        assert db.seller_balances.docs[0]["total_paid"] == 0.0
+
+    def test_pending_payout_not_posted(self):
+        svc, db = _service(payouts=[{"id": "p1", "seller_id": "s1", "amount": 60.0, "status": "pending"}])
+        asyncio.run(svc.sync_payout("p1"))
+        assert db.seller_ledger.docs == []
@@ -0,0 +1,118 @@
+"""
+Sitemap generation
+Tests: products are sharded into gzip files behind an index; a build is
+reused until the catalog version changes; conditional GETs answer 304
+"""
+import asyncio
+import gzip
+
+import pytest
+
+from modules.seo import sitemap_service
+from modules.seo.sitemap_service import SitemapService, file_response
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def batch_size(self, n):
+        return self
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for r in self.rows:
+            yield r
+
+
+class _Find:
+    def __init__(self, rows):
+        self.rows = rows
+        self.scans = 0
+
+    def find(self, q, projection=None):
+        self.scans += 1
+        return _Cursor(list(self.rows))
+
+
+class _State:
+    def __init__(self):
+        self.version = 0
+
+    async def find_one(self, q, projection=None):
+        return {"version": self.version}
+
+    async def update_one(self, q, update, upsert=False):
+        self.version += update["$inc"]["version"]
+
+
+class _Db(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+class _Request:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+@pytest.fixture
+def small_shards(monkeypatch):
+    monkeypatch.setattr(sitemap_service, "SHARD_SIZE", 2)
+
+
+def _service(n_products=3):
+    db = _Db(
+        seo_state=_State(),
+        categories=_Find([{"id": "c1"}]),
+        products=_Find([{"id": f"p{i}", "updated_at": "2026-01-0%dT00:00:00+00:00" % i}
+                        for i in range(1, n_products + 1)]),
+    )
+    return SitemapService(db), db
+
+
+class TestBuild:
+    def test_shards_and_index(self, small_shards):
+        svc, _ = _service(3)
+        index = asyncio.run(svc.get("index"))
+        assert sorted(svc.files) == ["index", "pages.xml.gz", "products-1.xml.gz", "products-2.xml.gz"]
+        assert b"/api/sitemaps/products-2.xml.gz" in index.body
+
+        shard = gzip.decompress(svc.files["products-1.xml.gz"].body).decode()
+        assert shard.count("<url>") == 2
+        assert "/product/p1</loc>" in shard and "<lastmod>2026-01-01</lastmod>" in shard
+        pages = gzip.decompress(svc.files["pages.xml.gz"].body).decode()
+        assert "category_id=c1" in pages
+
+    def test_reused_until_version_changes(self, monkeypatch):
+        svc, db = _service(1)
+        asyncio.run(svc.get("index"))
+        asyncio.run(svc.get("index"))
+        assert db.products.scans == 1
+
+        monkeypatch.setattr(sitemap_service, "MIN_REBUILD_SEC", 0)
+        asyncio.run(svc.get("index"))
+        assert db.products.scans == 1
+        asyncio.run(svc.invalidate())
+        asyncio.run(svc.get("index"))
+        assert db.products.scans == 2
+
+    def test_invalidation_throttled(self):
+        svc, db = _service(1)
+        asyncio.run(svc.get("index"))
+        asyncio.run(svc.invalidate())
+        asyncio.run(svc.get("index"))
+        assert db.products.scans == 1
+
+
+class TestFileResponse:
+    def test_etag_and_last_modified(self):
+        svc, _ = _service(1)
+        f = asyncio.run(svc.get("index"))
+        assert file_response(_Request({}), f).status_code == 200
+        assert file_response(_Request({"if-none-match": f.etag}), f).status_code == 304
+        last_modified = file_response(_Request({}), f).headers["Last-Modified"]
+        assert file_response(_Request({"if-modified-since": last_modified}), f).status_code == 304
+        assert file_response(_Request({"if-none-match": '"other"'}), f).status_code == 200
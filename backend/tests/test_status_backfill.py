@@ -0,0 +1,102 @@
+"""
+Canonical status backfill
+Tests: legacy orders get status_c / payment_status_c; the update is
+conditional on the raw statuses read, so a concurrent status write wins
+"""
+import asyncio
+
+import pytest
+
+from modules.migrations import status_backfill
+from modules.migrations.status_backfill import StatusBackfill, canonical_fields
+
+
+@pytest.fixture(autouse=True)
+def plain_ops(monkeypatch):
+    # record (filter, update) instead of pymongo's write-op objects
+    monkeypatch.setattr(status_backfill, "UpdateOne", lambda flt, upd: (flt, upd))
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        doc = (doc or {}).get(part)
+    return doc
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def sort(self, *a):
+        return self
+
+    def limit(self, n):
+        self.rows = self.rows[:n]
+        return self
+
+    async def to_list(self, n):
+        return [dict(r) for r in self.rows[:n]]
+
+
+class _Result:
+    def __init__(self, n):
+        self.modified_count = n
+
+
+class _Orders:
+    def __init__(self, docs, on_read=None):
+        self.docs = docs
+        self.on_read = on_read
+
+    def find(self, q, projection=None):
+        rows = [d for d in self.docs if "$gt" not in q.get("_id", {}) or d["_id"] > q["_id"]["$gt"]]
+        cur = _Cursor([dict(d) for d in rows])
+        if self.on_read:
+            self.on_read(self.docs)
+        return cur
+
+    async def bulk_write(self, ops, ordered=True):
+        n = 0
+        for op in ops:
+            flt, upd = op
+            for d in self.docs:
+                if all(_get(d, k) == v for k, v in flt.items()):
+                    d.update(upd["$set"])
+                    n += 1
+        return _Result(n)
+
+
+class _Db:
+    def __init__(self, orders):
+        self.orders = orders
+
+    def __getitem__(self, name):
+        return self.orders if name == "orders" else None
+
+
+def _backfill(orders):
+    return asyncio.run(StatusBackfill(_Db(orders)).run_batch())
+
+
+class TestCanonicalFields:
+    def test_legacy_spellings(self):
+        out = canonical_fields({"status": "cancelled", "payment": {"status": "paid"}})
+        assert out == {"status_c": "CANCELED", "payment_status_c": "PAID"}
+
+
+class TestRunBatch:
+    def test_fills_missing_fields(self):
+        orders = _Orders([{"_id": 1, "status": "new", "payment_status": "pending"}])
+        res = _backfill(orders)
+        assert res["updated"] == 1
+        assert orders.docs[0]["status_c"] == canonical_fields(orders.docs[0])["status_c"]
+
+    def test_skips_order_changed_after_read(self):
+        def writer(docs):
+            # a status write lands between the read and the bulk write
+            docs[0].update({"status": "cancelled", "status_c": "CANCELED"})
+
+        orders = _Orders([{"_id": 1, "status": "new", "payment_status": "pending"}], on_read=writer)
+        res = _backfill(orders)
+        assert res["updated"] == 0
+        assert orders.docs[0]["status_c"] == "CANCELED"
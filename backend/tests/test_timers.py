@@ -0,0 +1,177 @@
+"""
+Durable timer queue
+Tests: scheduling is idempotent per key; cancel only touches pending
+timers; due timers run once, snooze, retry with backoff and finally fail;
+timers of a dead dispatcher are reclaimed
+"""
+import asyncio
+from datetime import timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from core.dates import utcnow
+from modules.jobs import timers
+from modules.jobs.timers import (
+    CANCELLED, DONE, FAILED, PENDING, RUNNING, TimerQueue, cancel_timers, schedule_timer,
+)
+
+
+def _match(doc, q):
+    for k, v in q.items():
+        value = doc.get(k)
+        if isinstance(v, dict):
+            if "$in" in v and value not in v["$in"]:
+                return False
+            if "$lte" in v and not (value is not None and value <= v["$lte"]):
+                return False
+            if "$lt" in v and not (value is not None and value < v["$lt"]):
+                return False
+        elif value != v:
+            return False
+    return True
+
+
+class _Result:
+    def __init__(self, n):
+        self.modified_count = n
+
+
+class _Timers:
+    def __init__(self):
+        self.docs = {}
+
+    def _apply(self, doc, update, inserted):
+        doc.update(update.get("$set", {}))
+        if inserted:
+            doc.update(update.get("$setOnInsert", {}))
+        for k, n in update.get("$inc", {}).items():
+            doc[k] = doc.get(k, 0) + n
+
+    async def update_one(self, q, update, upsert=False):
+        doc = self.docs.get(q["_id"])
+        if doc is not None and _match(doc, q):
+            self._apply(doc, update, False)
+            return _Result(1)
+        if upsert:
+            if doc is not None:
+                raise DuplicateKeyError("exists")
+            self.docs[q["_id"]] = doc = {"_id": q["_id"]}
+            self._apply(doc, update, True)
+        return _Result(0)
+
+    async def update_many(self, q, update):
+        hit = [d for d in self.docs.values() if _match(d, q)]
+        for d in hit:
+            self._apply(d, update, False)
+        return _Result(len(hit))
+
+    async def find_one_and_update(self, q, update, sort=None, return_document=None):
+        hit = sorted((d for d in self.docs.values() if _match(d, q)), key=lambda d: d["due_at"])
+        if not hit:
+            return None
+        self._apply(hit[0], update, False)
+        return dict(hit[0])
+
+
+@pytest.fixture
+def db():
+    return {"timers": _Timers()}
+
+
+@pytest.fixture
+def queue(db, monkeypatch):
+    q = TimerQueue()
+    q.db = db
+    # schedule_timer wakes the module-level queue; keep it detached
+    monkeypatch.setattr(timers, "timer_queue", TimerQueue())
+    return q
+
+
+def _status(db, key):
+    return db["timers"].docs[key]["status"]
+
+
+class TestSchedule:
+    def test_idempotent_per_key(self, db, queue):
+        first, later = utcnow() + timedelta(hours=1), utcnow() + timedelta(hours=2)
+        asyncio.run(schedule_timer(db, "remind", "o1", first))
+        asyncio.run(schedule_timer(db, "remind", "o1", later))
+        assert db["timers"].docs["remind:o1"]["due_at"] == first
+
+    def test_reschedule_moves_pending_not_done(self, db, queue):
+        due = utcnow() + timedelta(hours=1)
+        asyncio.run(schedule_timer(db, "remind", "o1", due))
+        moved = due + timedelta(hours=1)
+        asyncio.run(schedule_timer(db, "remind", "o1", moved, reschedule=True))
+        assert db["timers"].docs["remind:o1"]["due_at"] == moved
+
+        db["timers"].docs["remind:o1"]["status"] = DONE
+        asyncio.run(schedule_timer(db, "remind", "o1", moved + timedelta(hours=1), reschedule=True))
+        assert _status(db, "remind:o1") == DONE
+
+    def test_cancel_only_pending(self, db, queue):
+        now = utcnow()
+        asyncio.run(schedule_timer(db, "remind", "o1", now))
+        asyncio.run(schedule_timer(db, "cancel", "o1", now))
+        db["timers"].docs["cancel:o1"]["status"] = RUNNING
+        assert asyncio.run(cancel_timers(db, "o1")) == 1
+        assert _status(db, "remind:o1") == CANCELLED
+        assert _status(db, "cancel:o1") == RUNNING
+
+
+class TestDispatch:
+    def _schedule(self, db, key, due):
+        db["timers"].docs[key] = {"_id": key, "kind": "k", "ref": key, "due_at": due,
+                                  "status": PENDING, "attempts": 0, "payload": {}}
+
+    def test_runs_due_once(self, db, queue):
+        seen = []
+
+        async def handler(task):
+            seen.append(task["_id"])
+
+        queue.register("k", handler)
+        self._schedule(db, "due", utcnow() - timedelta(seconds=1))
+        self._schedule(db, "later", utcnow() + timedelta(hours=1))
+        assert asyncio.run(queue.run_due())["dispatched"] == 1
+        assert asyncio.run(queue.run_due())["dispatched"] == 0
+        assert seen == ["due"]
+        assert _status(db, "due") == DONE and _status(db, "later") == PENDING
+
+    def test_snooze(self, db, queue):
+        until = utcnow() + timedelta(minutes=5)
+
+        async def handler(task):
+            return until
+
+        queue.register("k", handler)
+        self._schedule(db, "t", utcnow())
+        asyncio.run(queue.run_due())
+        doc = db["timers"].docs["t"]
+        assert doc["status"] == PENDING and doc["due_at"] == until and doc["attempts"] == 0
+
+    def test_retry_then_fail(self, db, queue):
+        async def handler(task):
+            raise RuntimeError("provider down")
+
+        queue.register("k", handler)
+        self._schedule(db, "t", utcnow())
+        asyncio.run(queue.run_due())
+        doc = db["timers"].docs["t"]
+        assert doc["status"] == PENDING and doc["due_at"] > utcnow()
+
+        for _ in range(timers.MAX_ATTEMPTS - 1):
+            doc["due_at"] = utcnow() - timedelta(seconds=1)
+            asyncio.run(queue.run_due())
+        assert doc["status"] == FAILED and doc["attempts"] == timers.MAX_ATTEMPTS
+
+    def test_reclaims_stale_running(self, db, queue):
+        async def handler(task):
+            return None
+
+        queue.register("k", handler)
+        self._schedule(db, "t", utcnow() - timedelta(minutes=10))
+        db["timers"].docs["t"].update(status=RUNNING, locked_until=utcnow() - timedelta(seconds=1))
+        asyncio.run(queue.run_due())
+        assert _status(db, "t") == DONE
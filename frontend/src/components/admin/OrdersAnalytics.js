@@ -36,15 +36,8 @@ const OrdersAnalytics = () => {
         headers: { Authorization: `Bearer ${token}` }
       };
 
-      // Fetch all orders
-      const response = await axios.get(
-        `${process.env.REACT_APP_BACKEND_URL}/api/admin/orders`,
-        config
-      );
-
-      let filteredOrders = response.data;
-
-      // Apply time filter
+      // Time filter is applied server-side
+      const params = {};
       if (filter !== 'all') {
         const now = new Date();
         const filterDate = new Date();
@@ -57,11 +50,17 @@ const OrdersAnalytics = () => {
           filterDate.setMonth(now.getMonth() - 1);
         }
 
-        filteredOrders = filteredOrders.filter(order => 
-          new Date(order.created_at) >= filterDate
-        );
+        params.date_from = filterDate.toISOString();
       }
 
+      // Fetch all matching orders (streamed export)
+      const response = await axios.get(
+        `${process.env.REACT_APP_BACKEND_URL}/api/admin/orders/export`,
+        { ...config, params }
+      );
+
+      let filteredOrders = response.data;
+
       // Apply category filter
       if (categoryFilter !== 'all') {
         filteredOrders = filteredOrders.filter(order =>